@@ -12,6 +12,7 @@ import sys
 import socket
 import random
 import logging
+import threading
 import time
 from multiprocessing.pool import ThreadPool
 from ansible.module_utils.basic import AnsibleModule
@@ -84,6 +85,10 @@ BGP_SCALE_T1S = [
     't1-isolated-d510u2', 't1-isolated-d510u2s2'
 ]
 ROUTES_BATCH_SIZE = 200
+# Batch size is adapted to the time exabgp takes to accept a batch of routes, within the limits below
+MIN_ROUTES_BATCH_SIZE = 50
+MAX_ROUTES_BATCH_SIZE = 5000
+TARGET_BATCH_LATENCY = 0.5
 
 # Describe default number of COLOs
 COLO_NUMBER = 30
@@ -171,35 +176,132 @@ def read_topo(topo_name, path):
         return {}
 
 
-def change_routes(action, ptf_ip, port, routes, routes_batch_size=ROUTES_BATCH_SIZE):
-    logging.debug("action = {}, ptf_ip = {}, port = {}, routes_batch_size = {}, routes = {}"
-                  .format(action, ptf_ip, port, routes_batch_size, routes))
-    messages = []
+# One persistent HTTP session per exabgp endpoint, the connection is kept alive across batches
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+# Number of routes changed and the time spent, reported by the module
+_announce_stats = {"routes": 0, "seconds": 0.0, "start": None, "end": None}
+_announce_stats_lock = threading.Lock()
+
+
+def get_http_session(url):
+    with _http_sessions_lock:
+        session = _http_sessions.get(url)
+        if session is None:
+            session = requests.Session()
+            session.trust_env = False
+            session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            _http_sessions[url] = session
+        return session
+
+
+def update_announce_stats(routes, start, end):
+    with _announce_stats_lock:
+        _announce_stats["routes"] += routes
+        _announce_stats["seconds"] += end - start
+        if _announce_stats["start"] is None or start < _announce_stats["start"]:
+            _announce_stats["start"] = start
+        if _announce_stats["end"] is None or end > _announce_stats["end"]:
+            _announce_stats["end"] = end
+
+
+def get_announce_stats():
+    """
+    Returns number of routes changed, the time spent on each exabgp endpoint in total and the rate of
+    changed routes per second of wall clock time, endpoints changed in parallel are counted once.
+    """
+    with _announce_stats_lock:
+        elapsed = (_announce_stats["end"] - _announce_stats["start"]) if _announce_stats["start"] else 0
+        return {
+            "routes": _announce_stats["routes"],
+            "seconds": round(_announce_stats["seconds"], 3),
+            "routes_per_second": int(_announce_stats["routes"] / elapsed) if elapsed > 0 else 0
+        }
+
+
+class AdaptiveBatchSize(object):
+    """
+    Batch size of routes sent to exabgp, adapted to keep the time exabgp takes to accept a batch close to
+    TARGET_BATCH_LATENCY. The size is changed at most by factor 2 each batch.
+    """
+    def __init__(self, size=ROUTES_BATCH_SIZE, min_size=MIN_ROUTES_BATCH_SIZE, max_size=MAX_ROUTES_BATCH_SIZE,
+                 target_latency=TARGET_BATCH_LATENCY):
+        self.min_size = min(min_size, size)
+        self.max_size = max(max_size, size)
+        self.size = size
+        self.target_latency = target_latency
+
+    def update(self, batch_len, latency):
+        if batch_len < self.size:
+            # Last batch of the routes, latency of a partial batch says little
+            return
+        if latency <= 0:
+            size = self.size * 2
+        else:
+            size = int(batch_len * self.target_latency / latency)
+            size = max(self.size // 2, min(self.size * 2, size))
+        self.size = max(self.min_size, min(self.max_size, size))
+
+
+def generate_route_messages(action, routes):
     for prefix, nexthop, aspath in routes:
         if aspath:
-            messages.append(
-                "{} route {} next-hop {} as-path [ {} ]".format(action, prefix, nexthop, aspath))
+            yield "{} route {} next-hop {} as-path [ {} ]".format(action, prefix, nexthop, aspath)
         else:
-            messages.append(
-                "{} route {} next-hop {}".format(action, prefix, nexthop))
+            yield "{} route {} next-hop {}".format(action, prefix, nexthop)
+
+
+def change_routes(action, ptf_ip, port, routes, routes_batch_size=ROUTES_BATCH_SIZE, adaptive_batch_size=True):
+    """
+    Send routes to the exabgp endpoint at ptf_ip:port over a persistent HTTP session.
+
+    Args:
+        routes: Iterable of (prefix, nexthop, aspath), may be a generator, route messages are generated as
+            they are sent.
+        routes_batch_size: Number of routes sent in the first batch.
+        adaptive_batch_size: Adapt batch size to the time exabgp takes to accept a batch, otherwise all batches
+            have routes_batch_size routes.
+    Returns:
+        Number of routes sent.
+    """
+    logging.debug("action = {}, ptf_ip = {}, port = {}, routes_batch_size = {}, routes = {}"
+                  .format(action, ptf_ip, port, routes_batch_size, routes))
+    messages = generate_route_messages(action, routes)
     wait_for_http(ptf_ip, port, timeout=60)
     url = "http://%s:%d" % (ptf_ip, port)
-    for i in range(0, len(messages), routes_batch_size):
-        batch_messages = messages[i:i+routes_batch_size]
+    session = get_http_session(url)
+    batch_size = AdaptiveBatchSize(routes_batch_size)
+    sent = 0
+    start = time.time()
+    while True:
+        batch_messages = list(itertools.islice(messages, batch_size.size if adaptive_batch_size else routes_batch_size))
+        if not batch_messages:
+            break
         data = {"commands": ";".join(batch_messages)}
         logging.debug("Posting to url={} data={}".format(url, json.dumps(data)))
-        post_data_to_url(url, data)
-
-
-def post_data_to_url(url, data):
+        batch_start = time.time()
+        post_data_to_url(url, data, session=session)
+        batch_size.update(len(batch_messages), time.time() - batch_start)
+        sent += len(batch_messages)
+    end = time.time()
+    update_announce_stats(sent, start, end)
+    logging.info("{} {} routes to url={} in {:.2f}s, {:.0f} routes/s, last batch size {}".format(
+        action, sent, url, end - start, sent / max(end - start, 1e-6), batch_size.size))
+    return sent
+
+
+def post_data_to_url(url, data, session=None):
     # nosemgrep-next-line
     # Flaky error `ConnectionResetError(104, 'Connection reset by peer')` may happen while using `requests.post`
     # To avoid this error, we add sleep time before sending request.
     # We use a "backoff" algorithm here, the maximum retry times is five.
     # If one retry fails, we increase the waiting time.
+    # With a session, the connection is reused and reopened by the retry if the peer closed it.
+    sender = session if session is not None else requests
     for i in range(0, 5):
         try:
-            r = requests.post(url, data=data, timeout=360, proxies={"http": None, "https": None})
+            r = sender.post(url, data=data, timeout=360, proxies={"http": None, "https": None})
             break
         except Exception as e:
             logging.debug("Got exception {}, will try to connect again".format(e))
@@ -1753,44 +1855,55 @@ def main():
     try:
         if adhoc:
             adhoc_routes(topo, ptf_ip, peers_routes_to_change, action)
-            module.exit_json(change=True)
+            module.exit_json(change=True, announce_stats=get_announce_stats())
         elif topo_type == "t0":
             fib_t0(topo, ptf_ip, no_default_route=is_storage_backend, action=action,
                    upstream_neighbor_groups=upstream_neighbor_groups, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "t1" or topo_type == "smartswitch-t1":
             fib_t1_lag(
                 topo, ptf_ip, topo_name, no_default_route=is_storage_backend, action=action,
                 tor_default_route=tor_default_route, downstream_neighbor_groups=downstream_neighbor_groups,
                 topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "t2":
             fib_t2_lag(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "t0-mclag":
             fib_t0_mclag(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "m1":
             fib_m1(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "m0":
             fib_m0(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "mx":
             fib_mx(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "c0":
             fib_c0(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "dpu":
             fib_dpu(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "lt2":
             fib_lt2_routes(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         elif topo_type == "ft2":
             fib_ft2_routes(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes))
+            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes),
+                             announce_stats=get_announce_stats())
         else:
             module.exit_json(
                 msg='Unsupported topology "{}" - skipping announcing routes'.format(topo_name))
@@ -7,6 +7,8 @@ import traceback
 import logging.handlers
 import logging
 import hashlib
+import json
+import shutil
 import sys
 import re
 import gzip
@@ -42,6 +44,20 @@ Options:
       required: True
       Default: None
 
+    - option-name: offset_file
+      description: a JSON file with inode and byte offset of the log file recorded before 'start_string'
+        was written to it (see 'loganalyzer.py --action init --offset_file'). When the offset of
+        'start_string' is recorded, only the bytes written after the offset are extracted, rotated
+        files are detected by inode. Falls back to scanning all log files if the offset can not be used.
+      required: False
+      Default: None
+
+    - option-name: compression
+      description: compression of 'target_filename', 'none' or 'gzip'. Compressed files are much faster
+        to fetch from the DUT, e.g. sairedis.rec of route scale tests.
+      required: False
+      Default: none
+
 '''
 
 EXAMPLES = '''
@@ -58,6 +74,22 @@ EXAMPLES = '''
     dest: '/tmp/'
     flat: yes
 
+- name: Extract syslog entries since the start marker using the offset recorded by loganalyzer
+  extract_log:
+    directory: '/var/log'
+    file_prefix: 'syslog'
+    start_string: 'start-LogAnalyzer-test_marker'
+    target_filename: '/tmp/syslog'
+    offset_file: '/tmp/loganalyzer_offsets.json'
+
+- name: Extract syslog entries into a gzip compressed file
+  extract_log:
+    directory: '/var/log'
+    file_prefix: 'syslog'
+    start_string: 'Initializing cgroup subsys cpuset'
+    target_filename: '/tmp/syslog.gz'
+    compression: 'gzip'
+
 - name: Extract all sairedis.rec entries since the last reboot
   extract_log:
     directory: '/var/log/swss'
@@ -88,6 +120,9 @@ EXAMPLES = '''
 
 logger = logging.getLogger('ExtractLog')
 
+# Fast compression level, the extracted logs are compressed only for the transfer from the DUT
+GZIP_COMPRESS_LEVEL = 1
+
 
 def extract_lines(directory, filename, target_string):
     path = os.path.join(directory, filename)
@@ -249,11 +284,17 @@ def calculate_files_to_copy(filenames, file_with_latest_line):
     return files_to_copy
 
 
-def combine_logs_and_save(directory, filenames, start_string, target_string, target_filename):
+def open_target_file(target_filename, compression, mode):
+    if compression == 'gzip':
+        return gzip.open(target_filename, mode=mode, compresslevel=GZIP_COMPRESS_LEVEL)
+    return open(target_filename, mode)
+
+
+def combine_logs_and_save(directory, filenames, start_string, target_string, target_filename, compression='none'):
     do_copy = False
     line_processed = 0
     line_copied = 0
-    with open(target_filename, 'w') as fp:
+    with open_target_file(target_filename, compression, 'wt') as fp:
         for filename in reversed(filenames):
             path = os.path.join(directory, filename)
             dt = datetime.datetime.fromtimestamp(os.path.getctime(path))
@@ -282,7 +323,7 @@ def combine_logs_and_save(directory, filenames, start_string, target_string, tar
                 path, line_processed, line_copied))
 
 
-def extract_log(directory, prefixname, target_string, target_filename):
+def extract_log(directory, prefixname, target_string, target_filename, compression='none'):
     logger.debug("extract_log for start string {}".format(
         target_string.replace("start-", "")))
     filenames = list_files(directory, prefixname)
@@ -296,11 +337,72 @@ def extract_log(directory, prefixname, target_string, target_filename):
     files_to_copy = calculate_files_to_copy(filenames, file_with_latest_line)
     logger.debug("extract_log subsequent files {}".format(files_to_copy))
     combine_logs_and_save(directory, files_to_copy,
-                          latest_line, target_string, target_filename)
+                          latest_line, target_string, target_filename, compression)
     filenames = list_files(directory, prefixname)
     logger.debug("extract_log check logs files {}".format(filenames))
 
 
+def load_offset(offset_file, start_string, path):
+    """Returns (inode, offset) of @path recorded before @start_string was written
+    to it, or None if it was not recorded"""
+    try:
+        with open(offset_file) as fp:
+            offset = json.load(fp)[start_string][path]
+        return offset['inode'], offset['offset']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def open_log_file(path):
+    if 'gz' in path:
+        return gzip.open(path, mode='rb')
+    return open(path, 'rb')
+
+
+def extract_log_from_offset(directory, prefixname, target_string, target_filename, inode, offset,
+                            compression='none'):
+    """Extracts lines starting from @target_string which is expected to be found after @offset
+    in the file with @inode. The file is the current log file or, if the log was rotated after the
+    offset was recorded, one of the not yet compressed rotated files. Files newer than it are copied
+    as is. Returns False if the recorded offset can not be used"""
+    filenames = list_files(directory, prefixname)
+    for index, filename in enumerate(filenames):
+        path = os.path.join(directory, filename)
+        if 'gz' in path:
+            continue
+        stat = os.stat(path)
+        if stat.st_ino == inode and stat.st_size >= offset:
+            break
+    else:
+        logger.debug("extract_log no file with inode {} and size >= {} in {}".format(inode, offset, filenames))
+        return False
+
+    logger.debug("extract_log from offset {} of file {}, subsequent files {}".format(
+        offset, path, filenames[:index]))
+    target_bytes = target_string.encode('utf-8')
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        # readline() instead of iteration, the rest of the file is copied with read() below
+        line = file.readline()
+        while line:
+            if target_bytes in line and b'extract_log' not in line:
+                break
+            line = file.readline()
+        else:
+            logger.debug("extract_log {} was not found after offset {} of file {}".format(
+                target_string, offset, path))
+            return False
+
+        with open_target_file(target_filename, compression, 'wb') as fp:
+            fp.write(line)
+            shutil.copyfileobj(file, fp)
+            for filename in reversed(filenames[:index]):
+                with open_log_file(os.path.join(directory, filename)) as newer_file:
+                    shutil.copyfileobj(newer_file, fp)
+
+    return True
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -308,6 +410,8 @@ def main():
             file_prefix=dict(required=True, type='str'),
             start_string=dict(required=True, type='str'),
             target_filename=dict(required=True, type='str'),
+            offset_file=dict(required=False, type='str', default=None),
+            compression=dict(required=False, type='str', default='none', choices=['none', 'gzip']),
         ),
         supports_check_mode=False)
 
@@ -317,13 +421,23 @@ def main():
 
     p = module.params
 
+    extract_mode = 'full'
     try:
-        extract_log(p['directory'], p['file_prefix'],
-                    p['start_string'], p['target_filename'])
+        recorded_offset = None
+        if p['offset_file']:
+            recorded_offset = load_offset(p['offset_file'], p['start_string'],
+                                          os.path.join(p['directory'], p['file_prefix']))
+        if recorded_offset and extract_log_from_offset(p['directory'], p['file_prefix'], p['start_string'],
+                                                       p['target_filename'], *recorded_offset,
+                                                       compression=p['compression']):
+            extract_mode = 'offset'
+        else:
+            extract_log(p['directory'], p['file_prefix'],
+                        p['start_string'], p['target_filename'], p['compression'])
     except Exception:
         tb = traceback.format_exc()
         module.fail_json(msg=tb)
-    module.exit_json()
+    module.exit_json(extract_mode=extract_mode)
 
 
 if __name__ == '__main__':
@@ -73,6 +73,8 @@ import scapy.all as scapyall
 from scapy.arch.linux import attach_filter as attach_filter
 
 import sad_path as sp
+import pcap_flow
+import fast_sender
 
 from ptf import config
 from ptf.base_tests import BaseTest
@@ -83,7 +85,7 @@ from six.moves import _thread as thread
 from six.moves import queue as Queue
 from multiprocessing.pool import ThreadPool, TimeoutError
 from fcntl import ioctl
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from device_connection import DeviceConnection
 from host_device import HostDevice
 
@@ -180,6 +182,8 @@ class ReloadTest(BaseTest):
         self.check_param('allow_vlan_flooding', False, required=False)
         self.check_param('allow_mac_jumping', False, required=False)
         self.check_param('sniff_time_incr', 300, required=False)
+        # Rate of the data plane flow sent by the fast sender, 0 to send by scapy every send_interval
+        self.check_param('send_rate_pps', 0, required=False)
         self.check_param('vnet', False, required=False)
         self.check_param('vnet_pkts', None, required=False)
         self.check_param('target_version', '', required=False)
@@ -252,6 +256,8 @@ class ReloadTest(BaseTest):
         #   Improve this interval to gain more precision of disruptions.
         self.send_interval = 0.0035
         self.sent_packet_count = 0
+        # Achieved rate of the fast sender, reported with the data plane results
+        self.sender_stats = None
         # Thread pool for background watching operations
         self.pool = ThreadPool(processes=3)
 
@@ -1416,6 +1422,8 @@ class ReloadTest(BaseTest):
         dataplane_report["downtime"] = str(dataplane_downtime)
         dataplane_report["lost_packets"] = str(self.total_disrupt_packets) \
             if self.total_disrupt_packets is not None else ""
+        if self.sender_stats:
+            dataplane_report["sender"] = self.sender_stats
         controlplane_report = dict()
 
         if self.no_control_stop and self.no_control_start:
@@ -1867,32 +1875,35 @@ class ReloadTest(BaseTest):
             self.log("Sender started at %s" % str(sender_start))
 
             self.packets_list = []
-            from_t1_iter = itertools.cycle(self.from_t1)
-            sent_count_vlan_to_t1 = 0
-            sent_count_t1_to_vlan = 0
-
-            while True:
-                time.sleep(self.send_interval)
-                if self.reboot_start and self.finalizer_state == "inactive":
-                    # keep sending packets until device reboots and finalizer enters inactive state
-                    break
-                payload = '0' * 60 + str(self.sent_packet_count)
-                if (self.sent_packet_count % 5) == 0:   # From vlan to T1.
-                    from_port, packet = next(self.watcher_from_server_iter)
-                    packet = scapyall.Ether(packet)
-                    packet.load = payload
-                    sent_count_vlan_to_t1 += 1
-                else:   # From T1 to vlan.
-                    src_port, packet = next(from_t1_iter)
-                    packet = scapyall.Ether(packet)
-                    packet.load = payload
-                    from_port = src_port
-                    sent_count_t1_to_vlan += 1
-                testutils.send_packet(self, from_port, bytes(packet))
-                self.sent_packet_count = self.sent_packet_count + 1
-
-            self.log("Sent count vlan to t1: {}".format(sent_count_vlan_to_t1))
-            self.log("Sent count t1 to vlan: {}".format(sent_count_t1_to_vlan))
+            if self.test_params['send_rate_pps']:
+                self.send_paced()
+            else:
+                from_t1_iter = itertools.cycle(self.from_t1)
+                sent_count_vlan_to_t1 = 0
+                sent_count_t1_to_vlan = 0
+
+                while True:
+                    time.sleep(self.send_interval)
+                    if self.reboot_start and self.finalizer_state == "inactive":
+                        # keep sending packets until device reboots and finalizer enters inactive state
+                        break
+                    payload = '0' * 60 + str(self.sent_packet_count)
+                    if (self.sent_packet_count % 5) == 0:   # From vlan to T1.
+                        from_port, packet = next(self.watcher_from_server_iter)
+                        packet = scapyall.Ether(packet)
+                        packet.load = payload
+                        sent_count_vlan_to_t1 += 1
+                    else:   # From T1 to vlan.
+                        src_port, packet = next(from_t1_iter)
+                        packet = scapyall.Ether(packet)
+                        packet.load = payload
+                        from_port = src_port
+                        sent_count_t1_to_vlan += 1
+                    testutils.send_packet(self, from_port, bytes(packet))
+                    self.sent_packet_count = self.sent_packet_count + 1
+
+                self.log("Sent count vlan to t1: {}".format(sent_count_vlan_to_t1))
+                self.log("Sent count t1 to vlan: {}".format(sent_count_t1_to_vlan))
             self.log("Sender has been running for %s" %
                      str(datetime.datetime.now() - sender_start))
             self.log("Total sent packets by sender: {}".format(self.sent_packet_count))
@@ -1908,11 +1919,58 @@ class ReloadTest(BaseTest):
             time.sleep(1)
             self.kill_sniffer = True
 
+    def get_port_send(self):
+        """
+        Get function sending a frame from a PTF port. Frames are written to the socket of the port directly,
+        without the per packet overhead of testutils.send_packet.
+        """
+        sockets = {}
+
+        def _send(port, frame):
+            sock = sockets.get(port)
+            if sock is None:
+                port_obj = self.dataplane.ports.get((0, port))
+                sock = getattr(port_obj, "socket", None)
+                if sock is None:
+                    return testutils.send_packet(self, port, bytes(frame))
+                sockets[port] = sock
+            return sock.send(frame)
+        return _send
+
+    def send_paced(self):
+        """
+        Send the data plane flow at test parameter send_rate_pps, until device reboots and finalizer enters
+        inactive state. Every 5th packet is sent from vlan to T1, the others from T1 to vlan, same as the
+        scapy sender. Packets of each flow are built once, only the sequence payload is patched for each send.
+        """
+        from_servers = [fast_sender.PacketTemplate(packet, port) for port, packet in self.from_servers]
+        from_t1 = [fast_sender.PacketTemplate(packet, port) for port, packet in self.from_t1]
+
+        def _next_template(seq):
+            if seq % 5 == 0:    # From vlan to T1.
+                return from_servers[(seq // 5) % len(from_servers)]
+            return from_t1[(seq - seq // 5 - 1) % len(from_t1)]
+
+        def _should_stop():
+            # keep sending packets until device reboots and finalizer enters inactive state
+            return self.reboot_start and self.finalizer_state == "inactive"
+
+        sender = fast_sender.PacedSender(self.get_port_send(), self.test_params['send_rate_pps'])
+        stats = sender.run(_next_template, _should_stop, first_seq=self.sent_packet_count)
+        self.sent_packet_count += stats.sent
+        self.sender_stats = stats._asdict()
+        self.log("Fast sender: target {:.0f} pps, achieved {:.0f} pps, sent {} packets in {:.2f} seconds, "
+                 "max batch {}, rescheduled {} times".format(stats.target_pps, stats.achieved_pps, stats.sent,
+                                                             stats.duration, stats.max_batch, stats.reschedules))
+        if stats.achieved_pps < stats.target_pps * 0.95:
+            self.log("WARNING: fast sender achieved {:.0f} pps of target {:.0f} pps, disruptions are measured "
+                     "with resolution of {:.2f} ms".format(stats.achieved_pps, stats.target_pps,
+                                                           1000.0 / max(stats.achieved_pps, 1)))
+
     def sniff_in_background(self, wait=None):
         """
         This function listens on all ports, in both directions, for the TCP src=1234 dst=5000 packets, until timeout.
-        Once found, all packets are dumped to local pcap file,
-        and all packets are saved to self.packets as scapy type(pcap format).
+        Once found, all packets are dumped to local pcap file self.capture_pcap.
         """
         if not wait:
             wait = self.time_to_listen + self.test_params['sniff_time_incr']
@@ -1946,8 +2004,9 @@ class ReloadTest(BaseTest):
             else:
                 self.start_sniffer_on_ptf(self.capture_pcap, sniff_filter, wait)
 
-            self.packets = scapyall.rdpcap(self.capture_pcap)
-            self.log("Number of all packets captured: {}".format(len(self.packets)))
+            # The capture is read by examine_flow, without loading all the packets in memory
+            self.log("Number of all packets captured: {}".format(
+                sum(1 for _ in pcap_flow.read_pcap_records(self.capture_pcap))))
         except Exception:
             traceback_msg = traceback.format_exc()
             self.log("Error in tcpdump_sniff: {}".format(traceback_msg))
@@ -2046,30 +2105,17 @@ class ReloadTest(BaseTest):
         if process.returncode is not None:
             self.log("Dumpcap process killed")
 
-    def check_tcp_payload(self, packet):
-        """
-        This method is used by examine_flow() method.
-        It returns True if a packet is not corrupted and has a valid TCP sequential TCP Payload
-        """
-        try:
-            int(bytes(packet[scapyall.TCP].payload)
-                ) in range(self.sent_packet_count)
-            return True
-        except Exception:
-            return False
-
-    def no_flood(self, packet):
+    def no_flood(self, record):
         """
         This method filters packets which are unique (i.e. no floods).
         """
-        if (not int(bytes(packet[scapyall.TCP].payload)) in self.unique_id) and \
-                (packet[scapyall.Ether].src == self.dut_mac or packet[scapyall.Ether].src == self.vlan_mac):
+        if record.payload_id not in self.unique_id and record.direction & pcap_flow.FROM_DUT:
             # This is a unique (no flooded) received packet.
             # for dualtor, t1->server rcvd pkt will have src MAC as vlan_mac,
             # and server->t1 rcvd pkt will have src MAC as dut_mac
-            self.unique_id.append(int(bytes(packet[scapyall.TCP].payload)))
+            self.unique_id.add(record.payload_id)
             return True
-        elif packet[scapyall.Ether].dst == self.dut_mac or packet[scapyall.Ether].dst == self.vlan_mac:
+        elif record.direction & pcap_flow.TO_DUT:
             # This is a sent packet.
             # for dualtor, t1->server sent pkt will have dst MAC as dut_mac,
             # and server->t1 sent pkt will have dst MAC as vlan_mac
@@ -2077,63 +2123,79 @@ class ReloadTest(BaseTest):
         else:
             return False
 
+    def iter_flow_records(self, filename):
+        """
+        This method is used by examine_flow() method.
+        It yields the TCP src=1234 dst=5000 packets with valid sequential TCP payload of the capture file,
+        and the packets decapsulated from VXLAN if test is for vnet, as (pcap_flow.FlowRecord, frame, decap) tuples.
+        The capture is streamed without dissecting the packets. Captures of link types other than Ethernet
+        are read by scapy.
+        """
+        macs = [self.dut_mac, self.vlan_mac]
+        items = pcap_flow.iter_flow_records(filename, macs, 1234, 5000, vnet=self.vnet)
+        try:
+            # The format and the link type are checked when reading the first packet
+            first_item = next(items, None)
+        except pcap_flow.PcapFormatError as e:
+            self.log("Read {} by scapy: {}".format(filename, str(e)))
+            return pcap_flow.scapy_iter_flow_records(scapyall.rdpcap(filename), macs, 1234, 5000, vnet=self.vnet)
+        return itertools.chain([first_item] if first_item else [], items)
+
+    def filter_floods(self, items):
+        """
+        This method is used by examine_flow() method.
+        It filters the (pcap_flow.FlowRecord, frame, decap) tuples sorted by payload ID with no_flood(), and yields
+        the (pcap_flow.FlowRecord, frame) of the packets kept. Same as filtering all the packets before all the
+        decapsulated packets, only the packets of one payload ID are kept in memory.
+        """
+        for _, group in itertools.groupby(items, key=lambda item: item[0].payload_id):
+            group = list(group)
+            # This set will contain the Payload ID of the group once received, to filter out received floods.
+            self.unique_id = set()
+            kept = set(index for index in sorted(range(len(group)), key=lambda index: group[index][2])
+                       if self.no_flood(group[index][0]))
+            for index, (record, frame, _) in enumerate(group):
+                if index in kept:
+                    yield record, frame
+
     def examine_flow(self, filename=None):
         """
-        This method examines pcap file (if given), or self.packets scapy file.
+        This method examines pcap file (if given), or self.capture_pcap file.
         The method compares TCP payloads of the packets one by one (assuming all payloads are consecutive integers),
         and the losses if found - are treated as disruptions in Dataplane forwarding.
         All disruptions are saved to self.lost_packets dictionary, in format:
         disrupt_start_id = (missing_packets_count, disrupt_time, disrupt_start_timestamp, disrupt_stop_timestamp)
+        The packets are streamed in payload ID order, see pcap_flow.sort_flow_records(), so memory used does not
+        grow with the length of the capture.
         """
-        if filename:
-            all_packets = scapyall.rdpcap(filename)
-        elif self.packets:
-            all_packets = self.packets
-        else:
-            self.log("Filename and self.packets are not defined.")
-            self.fails['dut'].add("Filename and self.packets are not defined")
+        if not filename:
+            filename = self.capture_pcap
+        if not os.path.exists(filename):
+            self.log("Capture file {} does not exist.".format(filename))
+            self.fails['dut'].add("Capture file {} does not exist".format(filename))
             return None
-        # Filter out packets and remove floods:
-        # This list will contain all unique Payload ID, to filter out received floods.
-        self.unique_id = list()
-        filtered_packets = [pkt for pkt in all_packets if
-                            scapyall.TCP in pkt and
-                            scapyall.ICMP not in pkt and
-                            pkt[scapyall.TCP].sport == 1234 and
-                            pkt[scapyall.TCP].dport == 5000 and
-                            self.check_tcp_payload(pkt) and
-                            self.no_flood(pkt)
-                            ]
-
-        if self.vnet:
-            decap_packets = [scapyall.Ether(bytes(pkt.payload.payload.payload)[8:]) for pkt in all_packets if
-                             scapyall.UDP in pkt and
-                             pkt[scapyall.UDP].sport == 1234
-                             ]
-            filtered_decap_packets = [pkt for pkt in decap_packets if
-                                      scapyall.TCP in pkt and
-                                      scapyall.ICMP not in pkt and
-                                      pkt[scapyall.TCP].sport == 1234 and
-                                      pkt[scapyall.TCP].dport == 5000 and
-                                      self.check_tcp_payload(pkt) and
-                                      self.no_flood(pkt)
-                                      ]
-            filtered_packets = filtered_packets + filtered_decap_packets
-
-        # Re-arrange packets, if delayed, by Payload ID and Timestamp:
-        packets = sorted(filtered_packets, key=lambda packet: (
-            int(bytes(packet[scapyall.TCP].payload)), float(packet.time)))
+        # Re-arrange packets, if delayed, by Payload ID and Timestamp, and remove floods:
+        packets = self.filter_floods(pcap_flow.sort_flow_records(self.iter_flow_records(filename)))
+        first_packet = next(packets, None)
         self.lost_packets = dict()
         self.max_disrupt, self.total_disruption = 0, 0
-        sent_packets = dict()
+        self.max_lost_id, self.max_disrupt_time = 0, 0
+        self.total_disrupt_packets, self.total_disrupt_time = 0, 0
+        # Sent packets from the last received packet, as payload_id:timestamp
+        sent_packets = OrderedDict()
         # Track packet id's that were neither sent or received
         missing_sent_and_received_packet_id_sequences = []
         self.fails['dut'].add("Sniffer failed to capture any traffic")
-        self.assertTrue(packets, "Sniffer failed to capture any traffic")
+        self.assertTrue(first_packet, "Sniffer failed to capture any traffic")
         self.fails['dut'].clear()
         prev_payload = None
-        if packets:
+        if first_packet:
+            filtered_filename = ('/tmp/capture_filtered.pcap' if self.logfile_suffix is None
+                                 else "/tmp/capture_filtered_%s.pcap" % self.logfile_suffix)
+            filtered_pcap = pcap_flow.PcapWriter(filtered_filename)
             prev_payload, prev_time = -1, 0
+            max_payload = -1
+            late_packets = 0
             sent_payload = 0
             received_counter = 0    # Counts packets from dut.
             received_but_not_sent_packets = set()
@@ -2144,25 +2206,34 @@ class ReloadTest(BaseTest):
             missed_t1_to_vlan = 0
             flooded_pkts = []
             self.disruption_start, self.disruption_stop = None, None
-            for packet in packets:
-                if packet[scapyall.Ether].dst == self.dut_mac or packet[scapyall.Ether].dst == self.vlan_mac:
+            for packet, frame in itertools.chain([first_packet], packets):
+                filtered_pcap.write(packet.time, frame)
+                if packet.payload_id < max_payload:
+                    # Captured too long after it was sent to be sorted, see pcap_flow.REORDER_WINDOW
+                    late_packets += 1
+                    continue
+                max_payload = packet.payload_id
+                # Only the sent packets after the last received packet are looked up
+                while sent_packets and next(iter(sent_packets)) <= prev_payload < packet.payload_id:
+                    sent_packets.popitem(last=False)
+                if packet.direction & pcap_flow.TO_DUT:
                     # This is a sent packet - keep track of it as payload_id:timestamp.
                     # for dualtor both MACs are needed:
                     #   t1->server sent pkt will have dst MAC as dut_mac,
                     #   and server->t1 sent pkt will have dst MAC as vlan_mac
-                    sent_payload = int(bytes(packet[scapyall.TCP].payload))
+                    sent_payload = packet.payload_id
                     if sent_payload in sent_packets:
                         flooded_pkts.append(sent_payload)
-                    sent_packets[sent_payload] = float(packet.time)
+                    sent_packets[sent_payload] = packet.time
                     sent_counter += 1
                     continue
-                if packet[scapyall.Ether].src == self.dut_mac or packet[scapyall.Ether].src == self.vlan_mac:
+                if packet.direction & pcap_flow.FROM_DUT:
                     # This is a received packet.
                     # for dualtor both MACs are needed:
                     #   t1->server rcvd pkt will have src MAC as vlan_mac,
                     #   and server->t1 rcvd pkt will have src MAC as dut_mac
-                    received_time = float(packet.time)
-                    received_payload = int(bytes(packet[scapyall.TCP].payload))
+                    received_time = packet.time
+                    received_payload = packet.payload_id
                     if (received_payload % 5) == 0:   # From vlan to T1.
                         received_vlan_to_t1 += 1
                     else:
@@ -2219,6 +2290,12 @@ class ReloadTest(BaseTest):
                         # Add disrupt to the dict:
                         self.lost_packets[prev_payload] = (
                             lost_id, disrupt, received_time - disrupt, received_time)
+                        # Find the longest loss with the longest time:
+                        if (lost_id, disrupt) > (self.max_lost_id, self.max_disrupt_time):
+                            (self.max_lost_id, self.max_disrupt_time, self.no_routing_start,
+                             self.no_routing_stop) = self.lost_packets[prev_payload]
+                        self.total_disrupt_packets += lost_id
+                        self.total_disrupt_time += disrupt
                         self.log("Disruption between packet ID %d and %d. For %.4f " % (
                             prev_payload, received_payload, disrupt))
                         for lost_index in range(prev_payload + 1, received_payload):
@@ -2236,6 +2313,7 @@ class ReloadTest(BaseTest):
                             float(received_time))
                 prev_payload = received_payload
                 prev_time = received_time
+            filtered_pcap.close()
             self.log(
                 "**************** Packet received summary: ********************")
             self.log("*********** Sent packets captured - {}".format(sent_counter))
@@ -2244,6 +2322,7 @@ class ReloadTest(BaseTest):
             self.log("*********** Missed received packets - t1-to-vlan - {}".format(missed_t1_to_vlan))
             self.log("*********** Missed received packets - vlan-to-t1 - {}".format(missed_vlan_to_t1))
             self.log("*********** Flooded pkts - {}".format(flooded_pkts))
+            self.log("*********** Pkts captured out of reorder window - {}".format(late_packets))
             self.log("**************************************************************")
         self.fails['dut'].add("Sniffer failed to filter any traffic from DUT")
         self.assertTrue(received_counter,
@@ -2251,14 +2330,6 @@ class ReloadTest(BaseTest):
         self.fails['dut'].clear()
         self.disrupts_count = len(self.lost_packets)  # Total disrupt counter.
         if self.lost_packets:
-            # Find the longest loss with the longest time:
-            max_disrupt_from_id, (self.max_lost_id, self.max_disrupt_time,
-                                  self.no_routing_start, self.no_routing_stop) = \
-                max(self.lost_packets.items(), key=lambda item: item[1][0:2])
-            self.total_disrupt_packets = sum(
-                [item[0] for item in self.lost_packets.values()])
-            self.total_disrupt_time = sum(
-                [item[1] for item in self.lost_packets.values()])
             time_from_reboot_disrupt_start = self.disruption_start - self.reboot_start
             time_from_reboot_disrupt_stop = self.disruption_stop - self.reboot_start
             self.log(
@@ -2270,10 +2341,6 @@ class ReloadTest(BaseTest):
                 )
             )
         else:
-            self.max_lost_id = 0
-            self.max_disrupt_time = 0
-            self.total_disrupt_packets = 0
-            self.total_disrupt_time = 0
             self.log("Gaps in forwarding not found.")
 
         if missing_sent_and_received_packet_id_sequences:
@@ -2313,11 +2380,8 @@ class ReloadTest(BaseTest):
             self.fails["dut"].add(message)
 
         self.log("Total incoming packets captured %d" % received_counter)
-        if packets:
-            filename = ('/tmp/capture_filtered.pcap' if self.logfile_suffix is None
-                        else "/tmp/capture_filtered_%s.pcap" % self.logfile_suffix)
-            scapyall.wrpcap(filename, packets)
-            self.log("Filtered pcap dumped to %s" % filename)
+        if first_packet:
+            self.log("Filtered pcap dumped to %s" % filtered_filename)
 
     def check_forwarding_stop(self, signal):
         self.asic_start_recording_vlan_reachability()
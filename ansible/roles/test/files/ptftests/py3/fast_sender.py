@@ -0,0 +1,155 @@
+"""
+High rate sender of the advanced-reboot data plane flow.
+
+The packets of the flow are built once per flow as PacketTemplate. The sequence number of each packet is patched in
+place into the payload of its template, with the TCP checksum updated incrementally. PacedSender sends the packets in
+batches at a target rate, pacing by the deadline of each packet instead of sleeping a fixed interval after each send,
+and reports the achieved rate.
+"""
+import struct
+import time
+
+from collections import namedtuple
+
+ETH_P_IP = 0x0800
+ETH_P_VLAN = 0x8100
+
+# The payload is the sequence number zero padded to SEQ_PAD + SEQ_WIDTH digits. The integer value is the same as
+# the '0' * 60 + str(seq) payload of the scapy sender, and the length is fixed, so it can be patched in place.
+SEQ_PAD = 60
+SEQ_WIDTH = 10
+
+# Maximum number of packets sent back to back when the sender is behind schedule
+DEFAULT_BATCH_SIZE = 64
+# When the sender is more than this many batches behind schedule, the schedule is restarted from now instead of
+# sending a long burst to catch up, which would distort the measured disruptions.
+MAX_BACKLOG_BATCHES = 4
+# Longest sleep between two checks of the stop condition
+MAX_SLEEP = 0.1
+
+SenderStats = namedtuple("SenderStats", ["target_pps", "achieved_pps", "sent", "duration", "max_batch",
+                                         "reschedules"])
+
+
+def _sum16(data, odd=False):
+    """Sum of the 16 bits words of data, data starting at odd offset of the checksummed bytes if odd is True."""
+    if odd:
+        data = b"\0" + bytes(data)
+    if len(data) % 2:
+        data = bytes(data) + b"\0"
+    return sum(struct.unpack("!%dH" % (len(data) // 2), data))
+
+
+def _fold(value):
+    while value >> 16:
+        value = (value & 0xffff) + (value >> 16)
+    return value
+
+
+class PacketTemplate(object):
+    """
+    Prebuilt bytes of an Ethernet/IPv4/TCP packet of the flow, sent from port.
+
+    The payload of the packet is replaced by the sequence payload. IP total length and checksum are set once for
+    the new length, TCP checksum is updated for each sequence number.
+    """
+
+    def __init__(self, packet, port):
+        self.port = port
+        packet = bytes(packet)
+        l3_offset = 14
+        ethertype = struct.unpack_from("!H", packet, 12)[0]
+        while ethertype == ETH_P_VLAN:
+            ethertype = struct.unpack_from("!H", packet, l3_offset + 2)[0]
+            l3_offset += 4
+        if ethertype != ETH_P_IP:
+            raise ValueError("Packet template must be IPv4, ethertype {:#x}".format(ethertype))
+        ihl = (packet[l3_offset] & 0x0f) * 4
+        l4_offset = l3_offset + ihl
+        payload_offset = l4_offset + (packet[l4_offset + 12] >> 4) * 4
+
+        self.frame = bytearray(packet[:payload_offset] + b"0" * (SEQ_PAD + SEQ_WIDTH))
+        self.seq_offset = payload_offset + SEQ_PAD
+
+        # IP header for the new total length
+        struct.pack_into("!H", self.frame, l3_offset + 2, len(self.frame) - l3_offset)
+        struct.pack_into("!H", self.frame, l3_offset + 10, 0)
+        struct.pack_into("!H", self.frame, l3_offset + 10,
+                         ~_fold(_sum16(self.frame[l3_offset:l4_offset])) & 0xffff)
+
+        # TCP checksum of the pseudo header, TCP header and the payload with all digits '0'
+        self.tcp_checksum_offset = l4_offset + 16
+        struct.pack_into("!H", self.frame, self.tcp_checksum_offset, 0)
+        tcp_len = len(self.frame) - l4_offset
+        pseudo_header = self.frame[l3_offset + 12:l3_offset + 20] + struct.pack("!HH", 6, tcp_len)
+        self.odd_seq = bool((self.seq_offset - l4_offset) % 2)
+        self.zero_seq_sum = _sum16(b"0" * SEQ_WIDTH, self.odd_seq)
+        self.base_sum = _sum16(pseudo_header) + _sum16(self.frame[l4_offset:])
+
+    def build(self, seq):
+        """Patch seq into the template and return the frame. The frame is reused by the next call."""
+        digits = b"%0*d" % (SEQ_WIDTH, seq)
+        self.frame[self.seq_offset:self.seq_offset + SEQ_WIDTH] = digits
+        checksum = ~_fold(self.base_sum - self.zero_seq_sum + _sum16(digits, self.odd_seq)) & 0xffff
+        struct.pack_into("!H", self.frame, self.tcp_checksum_offset, checksum)
+        return self.frame
+
+
+class PacedSender(object):
+    """
+    Send packets at target_pps, in batches of at most batch_size packets.
+
+    Args:
+        send: Function sending a frame from a port, send(port, frame).
+        target_pps: Target rate in packets per second.
+        batch_size: Maximum number of packets sent back to back when the sender is behind schedule.
+    """
+
+    def __init__(self, send, target_pps, batch_size=DEFAULT_BATCH_SIZE):
+        if target_pps <= 0:
+            raise ValueError("Target rate must be positive, got {}".format(target_pps))
+        self.send = send
+        self.target_pps = float(target_pps)
+        self.batch_size = batch_size
+
+    def run(self, next_template, should_stop, first_seq=0):
+        """
+        Send the packets until should_stop() returns True.
+
+        Args:
+            next_template: Function returning the PacketTemplate of a sequence number, next_template(seq).
+            should_stop: Function returning True when the sender should stop, checked before each batch.
+            first_seq: Sequence number of the first packet.
+        Returns:
+            SenderStats of the run. Sequence numbers first_seq to first_seq + stats.sent - 1 were sent.
+        """
+        send = self.send
+        pps = self.target_pps
+        max_backlog = self.batch_size * MAX_BACKLOG_BATCHES
+        seq = first_seq
+        sent = 0
+        max_batch = 0
+        reschedules = 0
+        start = schedule_start = time.monotonic()
+        scheduled = 0
+        while not should_stop():
+            now = time.monotonic()
+            # Number of packets whose deadline has passed
+            due = int((now - schedule_start) * pps) + 1 - scheduled
+            if due <= 0:
+                time.sleep(min((schedule_start + scheduled / pps) - now, MAX_SLEEP))
+                continue
+            if due > max_backlog:
+                schedule_start, scheduled, due = now, 0, 1
+                reschedules += 1
+            batch = min(due, self.batch_size)
+            for _ in range(batch):
+                template = next_template(seq)
+                send(template.port, template.build(seq))
+                seq += 1
+            sent += batch
+            scheduled += batch
+            max_batch = max(max_batch, batch)
+        duration = time.monotonic() - start
+        return SenderStats(target_pps=pps, achieved_pps=sent / duration if duration > 0 else 0.0, sent=sent,
+                           duration=duration, max_batch=max_batch, reschedules=reschedules)
@@ -0,0 +1,379 @@
+"""
+Streaming reader of the data plane flow captured by advanced-reboot.
+
+The capture of a warm/fast reboot test may contain millions of packets. Dissecting each of them into scapy objects
+takes several GB of memory and a long time, while advanced-reboot only needs the TCP payload ID, the timestamp and
+the direction of each packet. This module reads pcap and pcapng records from a memory mapped file and gets these
+fields from fixed header offsets, without building any packet object.
+"""
+import heapq
+import mmap
+import os
+import struct
+
+from collections import namedtuple
+
+LINKTYPE_ETHERNET = 1
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86dd
+ETH_P_VLAN_TAGS = (0x8100, 0x88a8, 0x9100)
+
+IPPROTO_IPIP = 4
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_IPV6 = 41
+
+# UDP ports scapy dissects as VXLAN
+VXLAN_DPORTS = (4789, 4790, 6633, 8472, 48879)
+VXLAN_SPORTS = (4789, 4790, 6633, 8472)
+VXLAN_HEADER_LEN = 8
+
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_OPT_IF_TSRESOL = 9
+
+# The records of a payload ID are captured within this time, in seconds, after the packet is sent. Used to sort the
+# records by payload ID while reading the capture, keeping only the records of this time in memory.
+REORDER_WINDOW = 10.0
+
+# Direction flags of a flow record
+TO_DUT = 1
+FROM_DUT = 2
+
+# A TCP packet of the flow. payload_id is the integer in the TCP payload, time is the capture timestamp and
+# direction is the TO_DUT/FROM_DUT flags of the destination/source MAC of the Ethernet header.
+FlowRecord = namedtuple("FlowRecord", ["payload_id", "time", "direction"])
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+def _read_pcap(buf, byte_order, ts_divisor):
+    linktype = struct.unpack_from(byte_order + "I", buf, 20)[0]
+    record_header = struct.Struct(byte_order + "IIII")
+    offset = 24
+    size = len(buf)
+    while offset + 16 <= size:
+        ts_sec, ts_frac, caplen, _ = record_header.unpack_from(buf, offset)
+        offset += 16
+        # Integer true division is correctly rounded, same as float() of the exact decimal timestamp
+        yield (ts_sec * ts_divisor + ts_frac) / ts_divisor, linktype, buf[offset:offset + caplen]
+        offset += caplen
+
+
+def _read_pcapng(buf):
+    size = len(buf)
+    offset = 0
+    byte_order = "<"
+    interfaces = []
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(byte_order + "I", buf, offset)[0]
+        if block_type == PCAPNG_SHB:
+            magic = struct.unpack_from("<I", buf, offset + 8)[0]
+            byte_order = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        block_len = struct.unpack_from(byte_order + "I", buf, offset + 4)[0]
+        if block_len < 12:
+            raise PcapFormatError("Invalid pcapng block length {} at {}".format(block_len, offset))
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(byte_order + "H", buf, offset + 8)[0]
+            tsresol = 1000000
+            opt_offset, opt_end = offset + 16, offset + block_len - 4
+            while opt_offset + 4 <= opt_end:
+                code, length = struct.unpack_from(byte_order + "HH", buf, opt_offset)
+                if code == 0:
+                    break
+                if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                    resol = buf[opt_offset + 4]
+                    tsresol = 2 ** (resol & 0x7f) if resol & 0x80 else 10 ** resol
+                opt_offset += 4 + ((length + 3) & ~3)
+            interfaces.append((linktype, tsresol))
+        elif block_type == PCAPNG_EPB:
+            if_id, ts_high, ts_low, caplen = struct.unpack_from(byte_order + "IIII", buf, offset + 8)
+            linktype, tsresol = interfaces[if_id]
+            data_offset = offset + 28
+            yield ((ts_high << 32) | ts_low) / tsresol, linktype, buf[data_offset:data_offset + caplen]
+        elif block_type == PCAPNG_SPB:
+            # Simple packet block has no timestamp, scapy reads it as time 0
+            linktype = interfaces[0][0]
+            packet_len = struct.unpack_from(byte_order + "I", buf, offset + 8)[0]
+            caplen = min(packet_len, block_len - 16)
+            yield 0.0, linktype, buf[offset + 12:offset + 12 + caplen]
+        offset += block_len
+
+
+def read_pcap_records(filename):
+    """
+    Read the records of a pcap or pcapng file.
+
+    Yields:
+        Tuple of (timestamp, linktype, frame), frame is the bytes of the captured packet.
+    """
+    with open(filename, "rb") as pcap_file:
+        if os.fstat(pcap_file.fileno()).st_size < 24:
+            raise PcapFormatError("File {} is too short to be a capture".format(filename))
+        buf = mmap.mmap(pcap_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic = struct.unpack_from("<I", buf, 0)[0]
+        if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            records = _read_pcap(buf, "<", 1000000 if magic == PCAP_MAGIC_US else 1000000000)
+        elif struct.unpack_from(">I", buf, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            magic = struct.unpack_from(">I", buf, 0)[0]
+            records = _read_pcap(buf, ">", 1000000 if magic == PCAP_MAGIC_US else 1000000000)
+        elif magic == PCAPNG_SHB:
+            records = _read_pcapng(buf)
+        else:
+            raise PcapFormatError("Unknown capture file format of {}, magic {:#x}".format(filename, magic))
+        for record in records:
+            yield record
+    finally:
+        buf.close()
+
+
+def _find_tcp(frame, offset, ethertype, sport, dport, vxlan_inner):
+    """
+    Find the TCP header with the given ports after the Ethernet header of the frame.
+
+    Returns:
+        Tuple of (tcp_offset, inner_eth_offset) or None if the frame is not such a TCP packet.
+        inner_eth_offset is offset of the Ethernet header of VXLAN encapsulated packet, -1 if not encapsulated.
+    Note:
+        Same as scapy, the TCP payload extends to the end of the frame, including the bytes after the IP total
+        length. The sender of advanced-reboot patches longer payloads into packets without updating the IP length.
+    """
+    while ethertype in ETH_P_VLAN_TAGS:
+        if offset + 4 > len(frame):
+            return None
+        ethertype = (frame[offset + 2] << 8) | frame[offset + 3]
+        offset += 4
+    proto = None
+    while True:
+        if ethertype == ETH_P_IP:
+            if offset + 20 > len(frame):
+                return None
+            ihl = (frame[offset] & 0x0f) * 4
+            frag = ((frame[offset + 6] & 0x1f) << 8) | frame[offset + 7]
+            proto = frame[offset + 9]
+            if frag:
+                # Non first fragment is not dissected by scapy
+                return None
+            offset += ihl
+        elif ethertype == ETH_P_IPV6:
+            if offset + 40 > len(frame):
+                return None
+            proto = frame[offset + 6]
+            offset += 40
+        else:
+            return None
+        # IP in IP
+        if proto == IPPROTO_IPIP:
+            ethertype = ETH_P_IP
+        elif proto == IPPROTO_IPV6:
+            ethertype = ETH_P_IPV6
+        else:
+            break
+    if offset + 4 > len(frame):
+        return None
+    l4_sport = (frame[offset] << 8) | frame[offset + 1]
+    l4_dport = (frame[offset + 2] << 8) | frame[offset + 3]
+    if proto == IPPROTO_TCP:
+        if l4_sport != sport or l4_dport != dport or offset + 13 > len(frame):
+            return None
+        return offset, vxlan_inner
+    if proto == IPPROTO_UDP and vxlan_inner < 0 and (l4_dport in VXLAN_DPORTS or l4_sport in VXLAN_SPORTS):
+        inner = offset + 8 + VXLAN_HEADER_LEN
+        if inner + 14 > len(frame):
+            return None
+        return _find_tcp(frame, inner + 14, (frame[inner + 12] << 8) | frame[inner + 13],
+                         sport, dport, inner)
+    return None
+
+
+def _tcp_payload_id(frame, tcp_offset):
+    data_offset = (frame[tcp_offset + 12] >> 4) * 4
+    try:
+        return int(frame[tcp_offset + data_offset:])
+    except ValueError:
+        return None
+
+
+def _direction(frame, eth_offset, macs):
+    direction = 0
+    if frame[eth_offset:eth_offset + 6] in macs:
+        direction |= TO_DUT
+    if frame[eth_offset + 6:eth_offset + 12] in macs:
+        direction |= FROM_DUT
+    return direction
+
+
+def mac_to_bytes(mac):
+    return bytes.fromhex(mac.replace(":", ""))
+
+
+def iter_flow_records(filename, macs, sport, dport, vnet=False):
+    """
+    Read the TCP packets of a flow from a capture file, in the same way as the scapy filters of advanced-reboot:
+    TCP packets with the given ports and an integer payload, without ICMP.
+
+    Args:
+        filename: Path of the pcap or pcapng file.
+        macs: MAC addresses of the DUT, used to get the direction of the packets.
+        sport: TCP source port of the flow.
+        dport: TCP destination port of the flow.
+        vnet: Also read the packets VXLAN encapsulated in UDP packets with source port sport.
+    Yields:
+        Tuple of (FlowRecord, frame, decap) in capture order. frame is the Ethernet frame of the packet, the inner
+        frame for a decapsulated packet, decap is True for the packets decapsulated from VXLAN.
+    """
+    macs = set(mac_to_bytes(mac) for mac in macs if mac)
+    for timestamp, linktype, frame in read_pcap_records(filename):
+        if linktype != LINKTYPE_ETHERNET:
+            raise PcapFormatError("Unsupported link type {} of {}".format(linktype, filename))
+        if len(frame) < 14:
+            continue
+        ethertype = (frame[12] << 8) | frame[13]
+        found = _find_tcp(frame, 14, ethertype, sport, dport, -1)
+        if found is not None:
+            payload_id = _tcp_payload_id(frame, found[0])
+            if payload_id is not None:
+                yield FlowRecord(payload_id, timestamp, _direction(frame, 0, macs)), frame, False
+        if vnet:
+            decap = _decap_record(frame, ethertype, timestamp, macs, sport, dport)
+            if decap is not None:
+                yield decap[0], decap[1], True
+
+
+def read_flow_records(filename, macs, sport, dport, vnet=False):
+    """
+    Same as iter_flow_records, reading the whole capture.
+
+    Returns:
+        Tuple of two lists of FlowRecord in capture order, the packets and the decapsulated packets.
+    """
+    records = []
+    decap_records = []
+    for record, _, decap in iter_flow_records(filename, macs, sport, dport, vnet=vnet):
+        (decap_records if decap else records).append(record)
+    return records, decap_records
+
+
+def _decap_record(frame, ethertype, timestamp, macs, sport, dport):
+    """
+    Get the flow record and the inner frame of the packet in the UDP payload after a VXLAN header, if the UDP source
+    port is sport.
+    """
+    offset = 14
+    if ethertype == ETH_P_IP and len(frame) >= offset + 20:
+        proto = frame[offset + 9]
+        offset += (frame[offset] & 0x0f) * 4
+    elif ethertype == ETH_P_IPV6 and len(frame) >= offset + 40:
+        proto = frame[offset + 6]
+        offset += 40
+    else:
+        return None
+    if proto != IPPROTO_UDP or offset + 8 > len(frame) or ((frame[offset] << 8) | frame[offset + 1]) != sport:
+        return None
+    inner = offset + 8 + VXLAN_HEADER_LEN
+    if inner + 14 > len(frame):
+        return None
+    found = _find_tcp(frame, inner + 14, (frame[inner + 12] << 8) | frame[inner + 13], sport, dport, inner)
+    if found is None:
+        return None
+    payload_id = _tcp_payload_id(frame, found[0])
+    if payload_id is None:
+        return None
+    return FlowRecord(payload_id, timestamp, _direction(frame, inner, macs)), frame[inner:]
+
+
+def scapy_iter_flow_records(packets, macs, sport, dport, vnet=False):
+    """
+    Same as iter_flow_records, from scapy packets. Used for the captures of link types iter_flow_records does not
+    support.
+    """
+    import scapy.all as scapyall
+
+    def _record(pkt):
+        if scapyall.TCP not in pkt or scapyall.ICMP in pkt or \
+                pkt[scapyall.TCP].sport != sport or pkt[scapyall.TCP].dport != dport:
+            return None
+        try:
+            payload_id = int(bytes(pkt[scapyall.TCP].payload))
+        except ValueError:
+            return None
+        direction = 0
+        if scapyall.Ether in pkt:
+            if pkt[scapyall.Ether].dst in macs:
+                direction |= TO_DUT
+            if pkt[scapyall.Ether].src in macs:
+                direction |= FROM_DUT
+        return FlowRecord(payload_id, float(pkt.time), direction)
+
+    macs = set(mac.lower() for mac in macs if mac)
+    for pkt in packets:
+        record = _record(pkt)
+        if record is not None:
+            yield record, bytes(pkt), False
+        if vnet and scapyall.UDP in pkt and pkt[scapyall.UDP].sport == sport:
+            inner = scapyall.Ether(bytes(pkt.payload.payload.payload)[8:])
+            inner.time = pkt.time
+            record = _record(inner)
+            if record is not None:
+                yield record, bytes(inner), True
+
+
+def scapy_flow_records(packets, macs, sport, dport, vnet=False):
+    """
+    Same as read_flow_records, from a list of scapy packets.
+    """
+    records = []
+    decap_records = []
+    for record, _, decap in scapy_iter_flow_records(packets, macs, sport, dport, vnet=vnet):
+        (decap_records if decap else records).append(record)
+    return records, decap_records
+
+
+def sort_flow_records(items, window=REORDER_WINDOW):
+    """
+    Sort the (FlowRecord, frame, decap) tuples of iter_flow_records by payload ID and time while reading them.
+
+    The order is the same as sorting all the records by (payload_id, time), the packets before the decapsulated
+    packets of same payload ID and time, as long as the packets are sent in payload ID order and all the records of a
+    payload ID are captured within window seconds after it is sent. Only the records of the last window seconds of
+    the capture are kept in memory. A record captured later than that is yielded after records of higher payload IDs.
+    """
+    heap = []
+    latest = None
+    for seq, (record, frame, decap) in enumerate(items):
+        if latest is None or record.time > latest:
+            latest = record.time
+        heapq.heappush(heap, (record.payload_id, record.time, decap, seq, record, frame))
+        # No record captured from now on can sort before a record captured more than window seconds ago
+        while heap[0][1] < latest - window:
+            item = heapq.heappop(heap)
+            yield item[4], item[5], item[2]
+    while heap:
+        item = heapq.heappop(heap)
+        yield item[4], item[5], item[2]
+
+
+class PcapWriter(object):
+    """Writer of Ethernet frames to a pcap file with microsecond timestamps."""
+
+    def __init__(self, filename):
+        self.pcap_file = open(filename, "wb")
+        self.pcap_file.write(struct.pack("<IHHiIII", PCAP_MAGIC_US, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+
+    def write(self, timestamp, frame):
+        usec = int(round(timestamp * 1000000))
+        self.pcap_file.write(struct.pack("<IIII", usec // 1000000, usec % 1000000, len(frame), len(frame)))
+        self.pcap_file.write(frame)
+
+    def close(self):
+        self.pcap_file.close()
@@ -0,0 +1,180 @@
+"""
+Benchmark of pcap_flow.iter_flow_records and sort_flow_records against the scapy rdpcap path advanced-reboot used to
+examine the flow.
+
+Generates a capture of the advanced-reboot data plane flow (sent and received packets, floods, a disruption and
+some unrelated packets), reads it by both and verifies both get the same sorted flow.
+
+Usage:  python pcap_flow_benchmark.py [--packets 20000] [--format pcapng]
+"""
+import argparse
+import itertools
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import scapy.all as scapyall
+
+import pcap_flow
+
+DUT_MAC = "4c:76:25:f5:48:80"
+VLAN_MAC = "00:aa:bb:cc:dd:ee"
+PTF_MAC = "72:06:00:01:00:00"
+SPORT = 1234
+DPORT = 5000
+
+
+def build_template(eth_src, eth_dst):
+    """Packet of 100 bytes, same as simple_tcp_packet used by advanced-reboot."""
+    packet = scapyall.Ether(src=eth_src, dst=eth_dst) / scapyall.IP(src="10.0.0.1", dst="192.168.0.2") / \
+        scapyall.TCP(sport=SPORT, dport=DPORT)
+    return bytes(packet / ("\0" * (100 - len(packet))))
+
+
+def build_frames(packets, seed):
+    """Build the frames of the flow as (timestamp, bytes). Every sent packet is received, except the disruption."""
+    rnd = random.Random(seed)
+    disruption = range(packets // 2, packets // 2 + packets // 100)
+    sent_template = build_template(PTF_MAC, DUT_MAC)
+    received_template = build_template(DUT_MAC, PTF_MAC)
+    other = bytes(scapyall.Ether(src=PTF_MAC, dst=DUT_MAC) / scapyall.IP(src="10.0.0.1", dst="10.0.0.2") /
+                  scapyall.UDP(sport=SPORT, dport=53) / "x")
+    frames = []
+    now = 1700000000.0
+    for payload_id in range(packets):
+        # Same as the sender of advanced-reboot, the payload is set without updating IP length and checksums
+        sent = scapyall.Ether(sent_template)
+        sent.load = "0" * 60 + str(payload_id)
+        frames.append((now, bytes(sent)))
+        if payload_id not in disruption:
+            received = scapyall.Ether(received_template)
+            received.load = sent.load
+            frames.append((now + rnd.uniform(0.00001, 0.0005), bytes(received)))
+            if rnd.random() < 0.01:
+                # Flooded copy of the received packet
+                frames.append((now + 0.0006, bytes(received)))
+        if rnd.random() < 0.05:
+            frames.append((now, other))
+        now += 0.0001
+    frames.sort(key=lambda frame: frame[0])
+    return frames
+
+
+def write_capture(path, frames, fmt):
+    with open(path, "wb") as pcap_file:
+        if fmt == "pcap":
+            pcap_file.write(struct.pack("<IHHiIII", pcap_flow.PCAP_MAGIC_US, 2, 4, 0, 0, 65535, 1))
+            for timestamp, frame in frames:
+                usec = int(round(timestamp * 1000000))
+                pcap_file.write(struct.pack("<IIII", usec // 1000000, usec % 1000000, len(frame), len(frame)))
+                pcap_file.write(frame)
+            return
+        shb_len = 28
+        pcap_file.write(struct.pack("<IIIHHqI", pcap_flow.PCAPNG_SHB, shb_len, pcap_flow.PCAPNG_BYTE_ORDER_MAGIC,
+                                    1, 0, -1, shb_len))
+        # Interface with nanosecond resolution, as written by dumpcap
+        idb_len = 32
+        pcap_file.write(struct.pack("<IIHHIHHB3xHHI", pcap_flow.PCAPNG_IDB, idb_len, 1, 0, 65535,
+                                    pcap_flow.PCAPNG_OPT_IF_TSRESOL, 1, 9, 0, 0, idb_len))
+        for timestamp, frame in frames:
+            nsec = int(round(timestamp * 1000000000))
+            padded = frame + b"\0" * (-len(frame) % 4)
+            epb_len = 32 + len(padded)
+            pcap_file.write(struct.pack("<IIIIIII", pcap_flow.PCAPNG_EPB, epb_len, 0, nsec >> 32, nsec & 0xffffffff,
+                                        len(frame), len(frame)))
+            pcap_file.write(padded)
+            pcap_file.write(struct.pack("<I", epb_len))
+
+
+def legacy_flow(filename, macs):
+    """The filters and sort advanced-reboot examine_flow used to run on the scapy packets."""
+    all_packets = scapyall.rdpcap(filename)
+    unique_id = list()
+
+    def check_tcp_payload(packet):
+        try:
+            int(bytes(packet[scapyall.TCP].payload))
+            return True
+        except Exception:
+            return False
+
+    def no_flood(packet):
+        if (not int(bytes(packet[scapyall.TCP].payload)) in unique_id) and packet[scapyall.Ether].src in macs:
+            unique_id.append(int(bytes(packet[scapyall.TCP].payload)))
+            return True
+        return packet[scapyall.Ether].dst in macs
+
+    filtered_packets = [pkt for pkt in all_packets if
+                        scapyall.TCP in pkt and
+                        scapyall.ICMP not in pkt and
+                        pkt[scapyall.TCP].sport == SPORT and
+                        pkt[scapyall.TCP].dport == DPORT and
+                        check_tcp_payload(pkt) and
+                        no_flood(pkt)]
+    packets = sorted(filtered_packets, key=lambda packet: (
+        int(bytes(packet[scapyall.TCP].payload)), float(packet.time)))
+    return [(int(bytes(pkt[scapyall.TCP].payload)), float(pkt.time), pkt[scapyall.Ether].dst in macs,
+             pkt[scapyall.Ether].src in macs) for pkt in packets]
+
+
+def streaming_flow(filename, macs):
+    """Same as legacy_flow, by pcap_flow.iter_flow_records and pcap_flow.sort_flow_records."""
+    items = pcap_flow.sort_flow_records(pcap_flow.iter_flow_records(filename, macs, SPORT, DPORT))
+    flow = []
+    for _, group in itertools.groupby(items, key=lambda item: item[0].payload_id):
+        received = False
+        for record, _, _ in group:
+            if not received and record.direction & pcap_flow.FROM_DUT:
+                received = True
+            elif not record.direction & pcap_flow.TO_DUT:
+                continue
+            flow.append((record.payload_id, record.time, bool(record.direction & pcap_flow.TO_DUT),
+                         bool(record.direction & pcap_flow.FROM_DUT)))
+    return flow
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pcap_flow against scapy rdpcap")
+    parser.add_argument("--packets", type=int, default=20000, help="number of packets sent by the flow")
+    parser.add_argument("--format", choices=["pcap", "pcapng"], default="pcapng", help="format of the capture")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the capture")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(prefix="pcap_flow_benchmark_")
+    os.close(fd)
+    try:
+        frames = build_frames(args.packets, args.seed)
+        write_capture(path, frames, args.format)
+        print("Capture: {} frames, {} bytes, {}".format(len(frames), os.path.getsize(path), args.format))
+        del frames
+
+        streaming, streaming_time, streaming_peak = measure(streaming_flow, path, [DUT_MAC, VLAN_MAC])
+        legacy, legacy_time, legacy_peak = measure(legacy_flow, path, [DUT_MAC, VLAN_MAC])
+        print("scapy rdpcap: {:8.2f}s, peak memory {:8.1f} MB".format(legacy_time, legacy_peak / 2.0 ** 20))
+        print("pcap_flow:    {:8.2f}s, peak memory {:8.1f} MB".format(streaming_time, streaming_peak / 2.0 ** 20))
+        print("Speedup:      {:8.1f}x".format(legacy_time / max(streaming_time, 1e-9)))
+        if legacy != streaming:
+            print("ERROR: flows read by scapy and pcap_flow differ")
+            return 1
+        print("Flow packets: {}".format(len(streaming)))
+        return 0
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
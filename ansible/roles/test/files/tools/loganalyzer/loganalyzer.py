@@ -29,11 +29,19 @@ import re
 import os
 import os.path
 import csv
+import json
 import time
 import logging
 import logging.handlers
+import hashlib
+from collections import Counter, OrderedDict
 from datetime import datetime
 
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+
 # ---------------------------------------------------------------------
 # Global variables
 # ---------------------------------------------------------------------
@@ -56,6 +64,196 @@ err_start_ignore_marker = -8
 # will not be picked up by the analyzer.
 MAX_LOG_MESSAGE_LENGTH = 1000
 
+# -- Block size used when reading log files backwards.
+# Memory used by the analyzer is bounded by this value plus the longest log line,
+# regardless of the size of the analyzed file.
+READ_BLOCK_SIZE = 64 * 1024
+
+# -- Number of start markers whose log file offsets are kept in the offset file
+MAX_RECORDED_OFFSETS = 16
+
+# -- Shortest literal used to prefilter regular expressions in RegexMatcher.
+# Shorter literals appear in almost every line and do not filter anything out.
+MIN_PREFILTER_LITERAL_LENGTH = 3
+
+# -- Number of compiled RegexMatcher instances kept by get_regex_matcher()
+MATCHER_CACHE_SIZE = 32
+_matcher_cache = OrderedDict()
+
+
+def _required_literal(compiled_regex):
+    '''
+    @summary: Find the longest literal string which must be present in any string matched by the regex.
+
+    Only literals in the top-level sequence of the regex (and in plain groups inside it) are
+    considered, anything optional, repeated or alternated ends the current literal.
+
+    @param compiled_regex: Compiled regular expression.
+
+    @return: The literal string, or None if the regex has no usable literal.
+    '''
+    if compiled_regex.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(compiled_regex.pattern, compiled_regex.flags)
+    except Exception:
+        return None
+
+    literals = ['']
+
+    def walk(items):
+        for op, av in items:
+            if op == sre_parse.LITERAL:
+                literals[-1] += chr(av)
+            elif op == sre_parse.SUBPATTERN and not (len(av) == 4 and av[1] & re.IGNORECASE):
+                walk(av[-1])
+            else:
+                literals.append('')
+
+    walk(parsed)
+    longest = max(literals, key=len)
+    return longest if len(longest) >= MIN_PREFILTER_LITERAL_LENGTH else None
+
+
+def _trie_regex(words):
+    '''
+    @summary: Build a regular expression matching the longest of given words at the current position.
+
+    The words are merged into a character trie, so the regex engine never tries the same
+    prefix twice, which keeps the search fast for hundreds of words.
+    '''
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        # -- greedy '?' prefers the longer word when a shorter one ends on this node
+        return '(?:' + '|'.join(branches) + ')' + ('?' if '' in node else '')
+
+    return to_regex(trie)
+
+
+class RegexMatcher:
+    '''
+    @summary: Matcher for a set of regular expressions, equivalent to their '|'.join() alternation.
+
+    Every regular expression is compiled separately. A literal string required by each regex
+    is extracted and all literals are searched in a line at once, so only the regular
+    expressions whose literal is present in the line are tried. Regular expressions without
+    such literal are prefiltered with their joined alternation.
+
+    The matcher reports which regular expressions matched a line (search_all), so callers
+    can attribute hits to single regular expressions without searching them again.
+    '''
+
+    def __init__(self, regex_list):
+        self.regex_list = list(regex_list)
+        self.pattern = '|'.join(self.regex_list)
+        self.compiled = [re.compile(regex) for regex in self.regex_list]
+
+        # -- map literal: indexes of regexes requiring the literal
+        self.literal_indexes = {}
+        other_indexes = []
+        for index, compiled_regex in enumerate(self.compiled):
+            literal = _required_literal(compiled_regex)
+            if literal is None:
+                other_indexes.append(index)
+            else:
+                self.literal_indexes.setdefault(literal, []).append(index)
+
+        # -- the lookahead finds the longest literal starting at every position of the line,
+        # -- all literals which are prefixes of it start at the same position.
+        self.literal_regex = None
+        self.prefix_indexes = {}
+        if self.literal_indexes:
+            self.literal_regex = re.compile('(?=(%s))' % _trie_regex(self.literal_indexes))
+            for literal in self.literal_indexes:
+                self.prefix_indexes[literal] = sorted(
+                    index for prefix, indexes in self.literal_indexes.items()
+                    if literal.startswith(prefix) for index in indexes)
+
+        self.other_indexes = other_indexes
+        self.other_regex = None
+        if other_indexes:
+            try:
+                self.other_regex = re.compile('|'.join(self.regex_list[index] for index in other_indexes))
+            except re.error:
+                # -- the regexes can not be joined, they will be tried one by one
+                self.other_regex = None
+
+    def candidates(self, line):
+        '''
+        @summary: Get sorted indexes of regexes which may match the line.
+        '''
+        indexes = set()
+        if self.literal_regex is not None:
+            for found in self.literal_regex.finditer(line):
+                indexes.update(self.prefix_indexes[found.group(1)])
+        if self.other_indexes and (self.other_regex is None or self.other_regex.search(line)):
+            indexes.update(self.other_indexes)
+        return sorted(indexes)
+
+    def search(self, line):
+        '''
+        @summary: Same as re.search() for the joined alternation of all regexes.
+
+        @return: Match object of the first matching regex or None.
+        '''
+        for index in self.candidates(line):
+            found = self.compiled[index].search(line)
+            if found:
+                return found
+        return None
+
+    def match(self, line):
+        '''
+        @summary: Same as re.match() for the joined alternation of all regexes.
+
+        @return: Match object of the first matching regex or None.
+        '''
+        for index in self.candidates(line):
+            found = self.compiled[index].match(line)
+            if found:
+                return found
+        return None
+
+    def search_all(self, line):
+        '''
+        @summary: Get indexes of all regexes found in the line.
+        '''
+        return [index for index in self.candidates(line) if self.compiled[index].search(line)]
+
+
+def get_regex_matcher(regex_list):
+    '''
+    @summary: Get a RegexMatcher for the list of regular expressions.
+
+    Matchers are cached by the hash of the regex list, so the same set of regular expressions
+    is compiled only once per process, e.g. once per pytest session.
+
+    @param regex_list: List of regular expressions.
+
+    @return: RegexMatcher instance or None if the list is empty.
+    '''
+    if not regex_list:
+        return None
+    key = hashlib.sha1('\n'.join(regex_list).encode('utf-8')).hexdigest()
+    matcher = _matcher_cache.pop(key, None)
+    if matcher is None:
+        matcher = RegexMatcher(regex_list)
+    _matcher_cache[key] = matcher
+    while len(_matcher_cache) > MATCHER_CACHE_SIZE:
+        _matcher_cache.popitem(last=False)
+    return matcher
+
 
 class AnsibleLogAnalyzer:
     '''
@@ -102,6 +300,10 @@ class AnsibleLogAnalyzer:
         self.run_id = run_id
         self.verbose = verbose
         self.start_marker = start_marker
+        # -- map file_name: throughput statistics of the last analysis of the file
+        self.analysis_stats = {}
+        # -- map index of expect regex: number of expected lines found by the regex
+        self.expect_hits = Counter()
     # ---------------------------------------------------------------------
 
     def print_diagnostic_message(self, message):
@@ -184,6 +386,42 @@ class AnsibleLogAnalyzer:
             file.write('\n')
             file.flush()
 
+    def record_offsets(self, log_file_list, marker, offset_file):
+        '''
+        @summary: Record inode and size of log files before the start marker is placed into them.
+
+        The start marker is written after the recorded offset, so extract_log can seek straight
+        to it instead of scanning all rotated log files. Offsets of several markers are kept
+        in one JSON file, keyed by the marker and the log file path.
+
+        @param log_file_list: List of file paths, to be applied with marker. System log is always recorded.
+        @param marker: Marker to be placed into log files.
+        @param offset_file: Path to the JSON file with recorded offsets.
+        '''
+        try:
+            with open(offset_file) as fp:
+                offsets = json.load(fp, object_pairs_hook=OrderedDict)
+        except (IOError, OSError, ValueError):
+            offsets = OrderedDict()
+
+        files = {}
+        for log_file in [system_log_file] + log_file_list:
+            try:
+                stat = os.stat(log_file)
+            except OSError:
+                continue
+            files[log_file] = {"inode": stat.st_ino, "offset": stat.st_size}
+        offsets.pop(marker, None)
+        offsets[marker] = files
+        while len(offsets) > MAX_RECORDED_OFFSETS:
+            offsets.popitem(last=False)
+
+        tmp_file = offset_file + ".tmp"
+        with open(tmp_file, 'w') as fp:
+            json.dump(offsets, fp)
+        os.rename(tmp_file, offset_file)
+        self.print_diagnostic_message('recorded offsets for marker %s: %s' % (marker, files))
+
     def place_marker_to_syslog(self, marker):
         '''
         @summary: Place marker into '/dev/log'.
@@ -294,7 +532,7 @@ class AnsibleLogAnalyzer:
 
         @param file_list : List of file paths, contains search expressions.
 
-        @return: A regex class instance, corresponding to loaded regex expressions.
+        @return: A RegexMatcher instance, corresponding to loaded regex expressions.
             Will be used for matching operations by callers.
         '''
         messages_regex = []
@@ -346,11 +584,7 @@ class AnsibleLogAnalyzer:
                         print((repr(e)))
                         sys.exit(err_invalid_string_format)
 
-        if (len(messages_regex)):
-            regex = re.compile('|'.join(messages_regex))
-        else:
-            regex = None
-        return regex, messages_regex
+        return get_regex_matcher(messages_regex), messages_regex
     # ---------------------------------------------------------------------
 
     def line_matches(self, str, match_messages_regex, ignore_messages_regex):
@@ -364,21 +598,21 @@ class AnsibleLogAnalyzer:
             'ignore' set - will not be reported (will be ignored)
 
         @param match_messages_regex:
-            regex class instance containing messages to match against.
+            regex class or RegexMatcher instance containing messages to match against.
 
         @param ignore_messages_regex:
-            regex class instance containing messages to ignore match against.
+            regex class or RegexMatcher instance containing messages to ignore match against.
 
         @return: True is str matches regex criteria, otherwise False.
         '''
 
         ret_code = False
 
-        if ((match_messages_regex is not None) and (match_messages_regex.findall(str))):
+        if ((match_messages_regex is not None) and (match_messages_regex.search(str))):
             if (ignore_messages_regex is None):
                 ret_code = True
 
-            elif (not ignore_messages_regex.findall(str)):
+            elif (not ignore_messages_regex.search(str)):
                 self.print_diagnostic_message('matching line: %s' % str)
                 ret_code = True
 
@@ -399,11 +633,85 @@ class AnsibleLogAnalyzer:
             if (expect_messages_regex is not None) and (expect_messages_regex.match(str)):
                 ret_code = True
         else:
-            if (expect_messages_regex is not None) and (expect_messages_regex.findall(str)):
+            if (expect_messages_regex is not None) and (expect_messages_regex.search(str)):
                 ret_code = True
 
         return ret_code
 
+    def get_unused_expected_regex(self, expect_messages_regex):
+        '''
+        @summary: Get expect regexes which did not match any expected line during the last analyze_file_list() call.
+
+        @param expect_messages_regex: RegexMatcher instance used for the analysis.
+
+        @return: List of unused regular expressions.
+        '''
+        if expect_messages_regex is None:
+            return []
+        return [regex for index, regex in enumerate(expect_messages_regex.regex_list)
+                if not self.expect_hits[index]]
+
+    def read_lines_reversed(self, log_file, block_size=READ_BLOCK_SIZE):
+        '''
+        @summary: Generator yielding the lines of a file from the last one to the first one.
+
+        The file is read backwards block by block, so the analysis can stop at the start
+        marker without reading the older part of the file, and memory usage does not
+        depend on the file size. Lines are yielded exactly as readlines() would return them.
+
+        @param log_file: File object opened in binary mode.
+        @param block_size: Number of bytes read from the file at once.
+
+        @return: Tuples of (decoded line, size of the line in bytes).
+        '''
+        log_file.seek(0, os.SEEK_END)
+        position = log_file.tell()
+        remainder = b''
+        # -- the first line found from the end of the file has no trailing newline
+        trailing = True
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            log_file.seek(position)
+            lines = (log_file.read(read_size) + remainder).split(b'\n')
+            # -- the first piece may be an incomplete line, keep it for the next block
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                if trailing:
+                    trailing = False
+                    if line:
+                        yield line.decode('utf-8', 'replace'), len(line)
+                    continue
+                yield line.decode('utf-8', 'replace') + '\n', len(line) + 1
+
+        if trailing:
+            if remainder:
+                yield remainder.decode('utf-8', 'replace'), len(remainder)
+        else:
+            yield remainder.decode('utf-8', 'replace') + '\n', len(remainder) + 1
+    # ---------------------------------------------------------------------
+
+    def update_analysis_stats(self, log_file_path, lines, size, duration):
+        '''
+        @summary: Record throughput of the analysis of a single log file.
+
+        @param log_file_path: Path to the analyzed log file.
+        @param lines: Number of analyzed lines.
+        @param size: Number of analyzed bytes.
+        @param duration: Time spent on the analysis, in seconds.
+        '''
+        self.analysis_stats[log_file_path] = {
+            "lines": lines,
+            "bytes": size,
+            "duration": round(duration, 3),
+            "lines_per_sec": int(lines / duration) if duration > 0 else lines,
+            "bytes_per_sec": int(size / duration) if duration > 0 else size,
+        }
+        self.print_diagnostic_message('analyzed file: %s, stats: %s'
+                                      % (log_file_path, self.analysis_stats[log_file_path]))
+    # ---------------------------------------------------------------------
+
     def analyze_file(self, log_file_path, match_messages_regex, ignore_messages_regex, expect_messages_regex,
                      maximum_log_length=None):
         '''
@@ -440,15 +748,25 @@ class AnsibleLogAnalyzer:
         found_start_marker = False
         found_end_marker = False
         if stdin_as_input:
+            # -- stdin can not be read backwards, it is analyzed from the first line and
+            # -- the results are reversed afterwards.
             log_file = sys.stdin
+            lines = ((line, len(line)) for line in log_file)
         else:
-            log_file = open(log_file_path, 'r')
+            log_file = open(log_file_path, 'rb')
+            lines = self.read_lines_reversed(log_file)
 
         start_marker = self.create_start_marker()
         end_marker = self.create_end_marker()
 
+        analyzed_lines = 0
+        analyzed_bytes = 0
+        start_time = time.time()
+
         ignore_marker_run_ids = []
-        for rev_line in reversed(log_file.readlines()):
+        for rev_line, line_size in lines:
+            analyzed_lines += 1
+            analyzed_bytes += line_size
             if stdin_as_input:
                 in_analysis_range = True
             else:
@@ -512,10 +830,19 @@ class AnsibleLogAnalyzer:
 
                 if self.line_is_expected(rev_line, expect_messages_regex):
                     expected_lines.append(rev_line)
+                    if isinstance(expect_messages_regex, RegexMatcher):
+                        self.expect_hits.update(expect_messages_regex.search_all(rev_line))
 
                 elif self.line_matches(rev_line, match_messages_regex, ignore_messages_regex):
                     matching_lines.append(rev_line)
 
+        if stdin_as_input:
+            matching_lines.reverse()
+            expected_lines.reverse()
+        else:
+            log_file.close()
+        self.update_analysis_stats(log_file_path, analyzed_lines, analyzed_bytes, time.time() - start_time)
+
         # care about the markers only if input is not stdin or no need to check start marker
         if not stdin_as_input and check_marker:
             if (not found_start_marker):
@@ -552,6 +879,7 @@ class AnsibleLogAnalyzer:
         @return: Returns map <file_name, list_of_matching_strings>
         '''
         res = {}
+        self.expect_hits = Counter()
 
         for log_file in log_file_list:
             if not len(log_file):
@@ -595,6 +923,8 @@ def usage():
     print('                                 All the strings from these files will be expected to present')
     print('                                 in one of specified log files during the analysis. Must be present')
     print('                                 when action == analyze.')
+    print('--offset_file path               Path to a file where inode and offset of log files are recorded')
+    print('                                 when action == init. Used by extract_log to seek to the start marker.')
 
 # ---------------------------------------------------------------------
 
@@ -647,7 +977,7 @@ def check_run_id(run_id):
 # ---------------------------------------------------------------------
 
 
-def write_result_file(run_id, out_dir, analysis_result_per_file, messages_regex_e, unused_regex_messages):
+def write_result_file(run_id, out_dir, analysis_result_per_file, unused_regex_messages):
     '''
     @summary: Write results of analysis into a file.
 
@@ -657,12 +987,13 @@ def write_result_file(run_id, out_dir, analysis_result_per_file, messages_regex_
 
     @param analysis_result_per_file: map file_name: [list of found matching strings]
 
+    @param unused_regex_messages: list of expect regexes which did not match any line
+
     @return: void
     '''
 
     match_cnt = 0
     expected_cnt = 0
-    expected_lines_total = []
 
     with open(out_dir + "/result.loganalysis." + run_id + ".log", 'w') as out_file:
         for key, val in list(analysis_result_per_file.items()):
@@ -680,7 +1011,6 @@ def write_result_file(run_id, out_dir, analysis_result_per_file, messages_regex_
 
             for i in expected_lines:
                 out_file.write(i)
-                expected_lines_total.append(i)
             out_file.write('\nExpected and found matches:%d\n' %
                            len(expected_lines))
             expected_cnt += len(expected_lines)
@@ -688,14 +1018,6 @@ def write_result_file(run_id, out_dir, analysis_result_per_file, messages_regex_
         out_file.write(
             "\n-------------------------------------------------\n\n")
         out_file.write('Total matches:%d\n' % match_cnt)
-        # Find unused regex matches
-        for regex in messages_regex_e:
-            for line in expected_lines_total:
-                if re.search(regex, line):
-                    break
-            else:
-                unused_regex_messages.append(regex)
-
         out_file.write('Total expected and found matches:%d\n' % expected_cnt)
         out_file.write('Total expected but not found matches: %d\n\n' %
                        len(unused_regex_messages))
@@ -708,7 +1030,7 @@ def write_result_file(run_id, out_dir, analysis_result_per_file, messages_regex_
 # ---------------------------------------------------------------------
 
 
-def write_summary_file(run_id, out_dir, analysis_result_per_file, unused_regex_messages):
+def write_summary_file(run_id, out_dir, analysis_result_per_file, unused_regex_messages, analysis_stats=None):
     '''
     @summary: This function writes results summary into a file
 
@@ -718,6 +1040,8 @@ def write_summary_file(run_id, out_dir, analysis_result_per_file, unused_regex_m
 
     @param analysis_result_per_file: map file_name:[list of matching strings]
 
+    @param analysis_stats: map file_name:{throughput statistics of the analysis}
+
     @return: void
     '''
 
@@ -734,6 +1058,10 @@ def write_summary_file(run_id, out_dir, analysis_result_per_file, unused_regex_m
                        (key, file_match_cnt))
         out_file.write("FILE:    %s    EXPECTED MATCHES    %d\n" %
                        (key, file_expect_cnt))
+        if analysis_stats and key in analysis_stats:
+            stats = analysis_stats[key]
+            out_file.write("FILE:    %s    LINES %d    BYTES %d    LINES/S %d    BYTES/S %d\n" %
+                           (key, stats["lines"], stats["bytes"], stats["lines_per_sec"], stats["bytes_per_sec"]))
         out_file.flush()
         total_match_cnt += file_match_cnt
         total_expect_cnt += file_expect_cnt
@@ -759,13 +1087,14 @@ def main(argv):
     match_files_in = None
     ignore_files_in = None
     expect_files_in = None
+    offset_file = None
     verbose = False
 
     try:
-        opts, args = getopt.getopt(argv, "a:r:s:l:o:m:i:e:vh",
+        opts, args = getopt.getopt(argv, "a:r:s:l:o:m:i:e:f:vh",
                                    ["action=", "run_id=", "start_marker=", "logs=",
                                     "out_dir=", "match_files_in=", "ignore_files_in=",
-                                    "expect_files_in=", "verbose", "help"])
+                                    "expect_files_in=", "offset_file=", "verbose", "help"])
 
     except getopt.GetoptError:
         print("Invalid option specified")
@@ -801,6 +1130,9 @@ def main(argv):
         elif (opt in ("-e", "--expect_files_in")):
             expect_files_in = arg
 
+        elif (opt in ("-f", "--offset_file")):
+            offset_file = arg
+
         elif (opt in ("-v", "--verbose")):
             verbose = True
 
@@ -815,6 +1147,8 @@ def main(argv):
 
     result = {}
     if action == "init":
+        if offset_file:
+            analyzer.record_offsets(log_file_list, analyzer.create_start_marker(), offset_file)
         analyzer.place_marker(log_file_list, analyzer.create_start_marker())
         return 0
     elif action == "analyze":
@@ -838,10 +1172,9 @@ def main(argv):
 
         result = analyzer.analyze_file_list(log_file_list, match_messages_regex,
                                             ignore_messages_regex, expect_messages_regex)
-        unused_regex_messages = []
-        write_result_file(run_id, out_dir, result,
-                          messages_regex_e, unused_regex_messages)
-        write_summary_file(run_id, out_dir, result, unused_regex_messages)
+        unused_regex_messages = analyzer.get_unused_expected_regex(expect_messages_regex)
+        write_result_file(run_id, out_dir, result, unused_regex_messages)
+        write_summary_file(run_id, out_dir, result, unused_regex_messages, analyzer.analysis_stats)
     elif action == "add_end_marker":
         analyzer.place_marker(
             log_file_list, analyzer.create_end_marker(), wait_for_marker=True)
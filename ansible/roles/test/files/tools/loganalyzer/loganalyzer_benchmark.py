@@ -0,0 +1,110 @@
+'''
+Description:    Benchmark of the loganalyzer regex matching.
+
+                Generates a synthetic syslog and analyzes it with the legacy '|'.join() alternation
+                of all match/ignore/expect regexes and with RegexMatcher, verifies both produce the
+                same result and prints the time spent by each of them.
+
+Usage:          python loganalyzer_benchmark.py [--lines 1000000] [--seed 0]
+'''
+
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+from loganalyzer import AnsibleLogAnalyzer, RegexMatcher
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMON_MATCH = os.path.join(TOOLS_DIR, "loganalyzer_common_match.txt")
+COMMON_IGNORE = os.path.join(TOOLS_DIR, "loganalyzer_common_ignore.txt")
+RUN_ID = "benchmark"
+
+EXPECT_REGEX = [
+    r".*NOTICE swss#orchagent: :- setState: Port Ethernet\d+ oper state set from down to up.*",
+    r".*INFO bgp#bgpcfgd: Peer '.*' admin state is set to 'up'.*",
+    r".*NOTICE syncd#syncd: :- threadFunction: time span.*",
+]
+
+LOG_TEMPLATES = [
+    "INFO systemd[1]: Started Session {n} of user admin.",
+    "INFO kernel: [{n}.123456] Ethernet{port}: link up",
+    "NOTICE swss#orchagent: :- setState: Port Ethernet{port} oper state set from down to up",
+    "INFO bgp#bgpcfgd: Peer '10.0.0.{port}' admin state is set to 'up'",
+    "ERR swss#orchagent: :- addRoute: Failed to create route {n}",
+    "ERR snmp#snmp-subagent [ax_interface] ERROR: MIBUpdater.subscribe_to_update_loop {n}",
+    "WARNING pmon#xcvrd[{n}]: Failed to read sfp {port} eeprom",
+    "INFO dhcp_relay#dhcrelay[{n}]: DHCPREQUEST for 192.168.0.{port}",
+    "NOTICE syncd#syncd: :- threadFunction: time span {n} ms",
+]
+
+
+def generate_syslog(path, lines, seed):
+    rnd = random.Random(seed)
+    with open(path, "w") as log_file:
+        log_file.write("Oct 18 00:00:00.000000 dut INFO start-LogAnalyzer-{}\n".format(RUN_ID))
+        for n in range(lines):
+            message = rnd.choice(LOG_TEMPLATES).format(n=n, port=rnd.randrange(512))
+            log_file.write("Oct 18 00:{:02d}:{:02d}.{:06d} dut {}\n".format(
+                (n // 60) % 60, n % 60, n % 1000000, message))
+        log_file.write("Oct 18 01:00:00.000000 dut INFO end-LogAnalyzer-{}\n".format(RUN_ID))
+
+
+def run_analysis(analyzer, log_path, match_regex, ignore_regex, expect_regex):
+    start = time.time()
+    result = analyzer.analyze_file_list([log_path], match_regex, ignore_regex, expect_regex)
+    return result, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loganalyzer regex matching")
+    parser.add_argument("--lines", type=int, default=1000000, help="number of lines in the synthetic syslog")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic syslog")
+    args = parser.parse_args()
+
+    analyzer = AnsibleLogAnalyzer(RUN_ID, False)
+    match_list = analyzer.create_msg_regex([COMMON_MATCH])[1]
+    ignore_list = analyzer.create_msg_regex([COMMON_IGNORE])[1]
+
+    fd, log_path = tempfile.mkstemp(prefix="loganalyzer_benchmark_")
+    os.close(fd)
+    try:
+        generate_syslog(log_path, args.lines, args.seed)
+        print("Synthetic syslog: {} lines, {} bytes".format(args.lines, os.path.getsize(log_path)))
+        print("Regexes: {} match, {} ignore, {} expect".format(len(match_list), len(ignore_list), len(EXPECT_REGEX)))
+
+        legacy_result, legacy_time = run_analysis(
+            analyzer, log_path, re.compile('|'.join(match_list)), re.compile('|'.join(ignore_list)),
+            re.compile('|'.join(EXPECT_REGEX)))
+        start = time.time()
+        expected_lines = [line for _, expected in legacy_result.values() for line in expected]
+        legacy_unused = [regex for regex in EXPECT_REGEX
+                         if not any(re.search(regex, line) for line in expected_lines)]
+        legacy_time += time.time() - start
+
+        start = time.time()
+        expect_matcher = RegexMatcher(EXPECT_REGEX)
+        matchers = (RegexMatcher(match_list), RegexMatcher(ignore_list), expect_matcher)
+        compile_time = time.time() - start
+        matcher_result, matcher_time = run_analysis(analyzer, log_path, *matchers)
+        matcher_unused = analyzer.get_unused_expected_regex(expect_matcher)
+
+        print("Legacy alternation: {:.2f}s".format(legacy_time))
+        print("RegexMatcher:       {:.2f}s (+{:.2f}s compile)".format(matcher_time, compile_time))
+        print("Speedup:            {:.1f}x".format(legacy_time / max(matcher_time, 1e-9)))
+        for path, (matching, expected) in matcher_result.items():
+            print("Matches: {}, expected matches: {}, expected missing: {}".format(
+                len(matching), len(expected), len(matcher_unused)))
+
+        if legacy_result != matcher_result or legacy_unused != matcher_unused:
+            print("ERROR: results of legacy alternation and RegexMatcher differ")
+            return 1
+        return 0
+    finally:
+        os.remove(log_path)
+
+
+if __name__ == "__main__":
+    exit(main())
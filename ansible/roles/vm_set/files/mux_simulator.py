@@ -33,9 +33,18 @@ MUX_BRIDGE_TEMPLATE = 'mbr-%s-%d'
 
 LIST_PORTS_CMD = 'ovs-vsctl list-ports {}'
 DUMP_FLOW_CMD = 'ovs-ofctl --names dump-flows {}'
-DEL_FLOW_CMD = 'ovs-ofctl --names del-flows {} in_port="{}"'
-ADD_FLOW_CMD = 'ovs-ofctl --names add-flow {} in_port="{}",actions={}'
-MOD_FLOW_CMD = 'ovs-ofctl --names mod-flows {} in_port="{}",actions={}'
+BUNDLE_FLOWS_CMD = 'ovs-ofctl --names --bundle add-flows {} -'
+APPLY_FLOWS_CMD = 'ovs-ofctl --names add-flows {} -'
+
+# Errors of 'ovs-ofctl --bundle' meaning that the bridge does not support bundles (OpenFlow 1.4). Other errors could
+# be transient, bundle is still used for the bridge.
+BUNDLE_UNSUPPORTED_PATTERN = re.compile(
+    r'OpenFlow ?1\.?4|OF1\.4|bundles? (?:is |are )?(?:not supported|unsupported)|version negotiation failed', re.I)
+
+# Flow mods fed to 'ovs-ofctl add-flows' through stdin, one per line
+DEL_FLOW_MOD = 'delete in_port="{}"'
+ADD_FLOW_MOD = 'add in_port="{}",actions={}'
+MOD_FLOW_MOD = 'modify in_port="{}",actions={}'
 
 RANDOM = 'random'
 TOGGLE = 'toggle'
@@ -106,11 +115,12 @@ def adaptive_name(template, vm_set, index):
     return rendered_name
 
 
-def run_cmd(cmdline):
+def run_cmd(cmdline, input_data=None):
     """Use subprocess to run a command line with shell=True
 
     Args:
         cmdline (string): The command to be executed.
+        input_data (string): Optional data written to stdin of the command.
 
     Raises:
         Exception: If return code of running command line is not zero, an exception is raised.
@@ -118,17 +128,18 @@ def run_cmd(cmdline):
     Returns:
         string: The stdout of running the command line.
     """
-    app.logger.debug(cmdline)
+    app.logger.debug(cmdline if input_data is None else '{}\n{}'.format(cmdline, input_data))
     process = subprocess.Popen(
         shlex.split(cmdline),
         stdout=subprocess.PIPE,
         stdin=subprocess.PIPE,
         stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
+    stdout, stderr = process.communicate(input_data.encode('utf-8') if input_data is not None else None)
     ret_code = process.returncode
 
     msg = {
         'cmd': cmdline,
+        'stdin': input_data.splitlines() if input_data is not None else [],
         'ret_code': ret_code,
         'stdout': stdout.decode('utf-8').splitlines(),
         'stderr': stderr.decode('utf-8').splitlines()
@@ -141,6 +152,20 @@ def run_cmd(cmdline):
     return stdout.decode('utf-8')
 
 
+def _bundle_unsupported(e):
+    """Check if the exception raised by run_cmd is about bundles not supported by the bridge.
+
+    Args:
+        e (Exception): Exception raised by run_cmd, its argument is the dict of command result.
+
+    Returns:
+        bool: True if stderr of the command says that bundle or OpenFlow 1.4 is not supported.
+    """
+    msg = e.args[0] if e.args else None
+    stderr = msg.get('stderr', []) if isinstance(msg, dict) else [str(e)]
+    return any(BUNDLE_UNSUPPORTED_PATTERN.search(line) for line in stderr)
+
+
 def config_logging(http_port):
     """Configure log to rotating file
 
@@ -182,6 +207,10 @@ class Mux(object):
         # All the operations of updating mux config and getting mux status must acquire the lock firstly.
         self.lock = threading.Lock()
 
+        # Flow changes of one update are applied in a single 'ovs-ofctl --bundle' transaction. Cleared if the bridge
+        # does not support bundles (OpenFlow 1.4), then the flow mods are still applied by one ovs-ofctl command.
+        self.bundle = True
+
         self.vm_set = vm_set
 
         self.port_index = port_index
@@ -344,6 +373,45 @@ class Mux(object):
                 self.flows['downstream']['out_sides'] = [self.sides[out_port] for out_port, action in
                                                          flows[in_port].items() if action == OUTPUT]
 
+    def _reload_flows(self):
+        """Drop the cached flows and parse them again from the bridge.
+
+        The flows are only changed by this simulator, so self.flows is kept in sync by the updates and the bridge is
+        not dumped again for getting status. Only when applying flow mods failed, the cached flows may no longer match
+        the bridge and need to be reloaded.
+        """
+        self.flows['upstream']['out_sides'] = []
+        self.flows['downstream']['out_sides'] = []
+        self._get_flows()
+
+    def _apply_flow_mods(self, flow_mods):
+        """Apply the flow mods to the bridge by one ovs-ofctl command.
+
+        The flow mods are applied in a bundle, so either all or none of them take effect. If the bundle is rejected
+        because the bridge does not support bundles, stop using bundle for the bridge and apply them again without
+        bundle. The cached flows are reloaded from the bridge if applying the flow mods failed.
+
+        Args:
+            flow_mods (list): Flow mods in format of 'ovs-ofctl add-flows', like 'delete in_port="<port>"'.
+        """
+        if len(flow_mods) == 0:
+            return
+        input_data = '\n'.join(flow_mods) + '\n'
+        try:
+            if self.bundle:
+                try:
+                    run_cmd(BUNDLE_FLOWS_CMD.format(self.bridge), input_data)
+                    return
+                except Exception as e:
+                    if not _bundle_unsupported(e):
+                        raise
+                    self.bundle = False
+                    self.info('bundle is not supported, apply flow mods without bundle: {}'.format(repr(e)))
+            run_cmd(APPLY_FLOWS_CMD.format(self.bridge), input_data)
+        except Exception:
+            self._reload_flows()
+            raise
+
     @property
     def status(self):
         """Property for status of the mux bridge.
@@ -411,18 +479,10 @@ class Mux(object):
 
             if len(self.flows['downstream']['out_sides']) == 1:
                 action_desc = '{}:"{}"'.format(OUTPUT, self.ports[NIC])
-                run_cmd(DEL_FLOW_CMD.format(
-                    self.bridge,
-                    self.active_port))
-                # Immediately update state after flow config changed to ensure consistency
-                self._active_standby_state_helper(None)
-                self.flows['downstream']['in_side'] = self.active_side
-                self.flows['downstream']['out_sides'] = []
-
-                run_cmd(ADD_FLOW_CMD.format(
-                    self.bridge,
-                    new_active_port,
-                    action_desc))
+                # Remove the flow of old active port and add flow for new active port in one transaction
+                self._apply_flow_mods([
+                    DEL_FLOW_MOD.format(self.active_port),
+                    ADD_FLOW_MOD.format(new_active_port, action_desc)])
                 # Immediately update state after flow config changed to ensure consistency
                 self._active_standby_state_helper(new_active_side)
                 self.flows['downstream']['in_side'] = self.active_side
@@ -440,7 +500,8 @@ class Mux(object):
 
             self.info('updated mux active side to {} <<<<<<'.format(new_active_side))
 
-    def _update_downstream_flow(self, new_action):
+    def _update_downstream_flow(self, new_action, flow_mods):
+        """Update downstream flow. Flow mods required are appended to flow_mods, caller needs to apply them."""
         self.debug('updating downstream flow, new_action={}'.format(new_action))
 
         # No action required for below scenarios
@@ -453,9 +514,7 @@ class Mux(object):
 
         if new_action == DROP:
             # Update action from OUTPUT to DROP, del-flow
-            run_cmd(DEL_FLOW_CMD.format(
-                self.bridge,
-                self.active_port))
+            flow_mods.append(DEL_FLOW_MOD.format(self.active_port))
             self.flows['downstream']['out_sides'] = []
 
         else:
@@ -466,10 +525,7 @@ class Mux(object):
             else:
                 active_side = self.active_side
 
-            run_cmd(ADD_FLOW_CMD.format(
-                self.bridge,
-                self.ports[active_side],
-                action_desc))
+            flow_mods.append(ADD_FLOW_MOD.format(self.ports[active_side], action_desc))
             self._active_standby_state_helper(active_side)
             self.flows['downstream']['in_side'] = active_side
             self.flows['downstream']['out_sides'] = [NIC]
@@ -477,11 +533,11 @@ class Mux(object):
         self.debug('updated downstream flow, new_action={}, flows={}'
                    .format(new_action, json.dumps(self.flows, indent=2)))
 
-    def _update_upstream_flow(self, new_action, out_sides=[]):
+    def _update_upstream_flow(self, new_action, flow_mods, out_sides=[]):
         """Update upstream flow. Apply new action to sides specified in out_sides.
 
         The upstream flow has 2 output sides, to UPPER_TOR or LOWER_TOR. This is to update the action (OUTPUT or DROP)
-        for the specified output sides.
+        for the specified output sides. Flow mods required are appended to flow_mods, caller needs to apply them.
         """
         self.debug('updating upstream flow, new_action={}, out_sides={}'.format(new_action, out_sides))
 
@@ -511,23 +567,15 @@ class Mux(object):
                 operation = 'MOD-FLOW'   # Need to modify upstream flow
 
         if operation == 'DEL-FLOW':
-            run_cmd(DEL_FLOW_CMD.format(
-                    self.bridge,
-                    self.ports[NIC]))
+            flow_mods.append(DEL_FLOW_MOD.format(self.ports[NIC]))
             self.flows['upstream']['out_sides'] = []
         elif operation == 'ADD-FLOW':
             action_desc = ','.join(['{}:"{}"'.format(OUTPUT, self.ports[out_side]) for out_side in target_out_sides])
-            run_cmd(ADD_FLOW_CMD.format(
-                    self.bridge,
-                    self.ports[NIC],
-                    action_desc))
+            flow_mods.append(ADD_FLOW_MOD.format(self.ports[NIC], action_desc))
             self.flows['upstream']['out_sides'] = target_out_sides
         elif operation == 'MOD-FLOW':
             action_desc = ','.join(['{}:"{}"'.format(OUTPUT, self.ports[out_side]) for out_side in target_out_sides])
-            run_cmd(MOD_FLOW_CMD.format(
-                    self.bridge,
-                    self.ports[NIC],
-                    action_desc))
+            flow_mods.append(MOD_FLOW_MOD.format(self.ports[NIC], action_desc))
             self.flows['upstream']['out_sides'] = target_out_sides
         self.debug('updated upstream flow, new_action={}, out_sides={}, flows={}'
                    .format(new_action, out_sides, json.dumps(self.flows, indent=2)))
@@ -541,11 +589,14 @@ class Mux(object):
         with self.lock:
             self.info('>>>>> calling update_flows, new_action={}, out_sides={}, current flow:\n{}'
                       .format(new_action, out_sides, json.dumps(self.flows, indent=2)))
+            flow_mods = []
             if NIC in out_sides:
-                self._update_downstream_flow(new_action)
+                self._update_downstream_flow(new_action, flow_mods)
             tor_sides = [out_side for out_side in out_sides if out_side != NIC]
             if len(tor_sides) > 0:
-                self._update_upstream_flow(new_action, tor_sides)
+                self._update_upstream_flow(new_action, flow_mods, tor_sides)
+            # Downstream and upstream flow changes are applied together
+            self._apply_flow_mods(flow_mods)
             self.info('update_flows completed, current flows:\n{} <<<<<<'.format(json.dumps(self.flows, indent=2)))
 
     def reset_flows(self):
@@ -564,12 +615,16 @@ class Mux(object):
 
 class Muxes(object):
 
-    MUXES_CONCURRENCY = 4
+    # Each mux update runs one ovs-ofctl command and holds the lock of its own mux only, so the muxes can be updated
+    # in parallel. The time is mostly spent in waiting for ovs-ofctl, more threads than CPUs are fine.
+    MUXES_CONCURRENCY = 16
 
     def __init__(self, vm_set):
         self.vm_set = vm_set
         self.muxes = {}
         self.thread_pool = ThreadPool(Muxes.MUXES_CONCURRENCY)
+        self.latency_lock = threading.Lock()
+        self.latency = {}
         for bridge in self._mux_bridges():
             bridge_fields = bridge.split('-')
             port_index = int(bridge_fields[-1])
@@ -589,6 +644,32 @@ class Muxes(object):
             [mux.bridge for mux in unhealthy_muxes]))
         list(self.thread_pool.map(lambda mux: mux.reset_flows(), unhealthy_muxes))
 
+    def _run_all_muxes(self, operation, func, args_list):
+        """Run func for all the muxes in the thread pool and record how long it took."""
+        start = time.time()
+        list(self.thread_pool.map(func, args_list))
+        elapsed = time.time() - start
+        with self.latency_lock:
+            stats = self.latency.setdefault(operation, {'count': 0, 'last': 0, 'max': 0, 'total': 0})
+            stats['count'] += 1
+            stats['last'] = elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['total'] += elapsed
+        app.logger.info('{} of {} muxes completed in {:.3f} seconds'.format(operation, len(args_list), elapsed))
+
+    def get_latency(self):
+        """Get statistics of the time used by operations on all muxes, in seconds."""
+        with self.latency_lock:
+            return {
+                operation: {
+                    'count': stats['count'],
+                    'last': round(stats['last'], 6),
+                    'max': round(stats['max'], 6),
+                    'average': round(stats['total'] / stats['count'], 6)
+                }
+                for operation, stats in self.latency.items()
+            }
+
     def _mux_bridges(self):
         """Only collect bridges belong to self.vm_set
 
@@ -616,8 +697,8 @@ class Muxes(object):
             mux.set_active_side(new_active_side)
             return mux.status
         else:
-            list(self.thread_pool.map(lambda args: Mux.set_active_side(*args),
-                                      [(mux, new_active_side) for mux in self.muxes.values()]))
+            self._run_all_muxes('set_active_side', lambda args: Mux.set_active_side(*args),
+                                [(mux, new_active_side) for mux in self.muxes.values()])
             return {mux.bridge: mux.status for mux in self.muxes.values()}
 
     def update_flows(self, new_action, out_sides, port_index=None):
@@ -626,8 +707,8 @@ class Muxes(object):
             mux.update_flows(new_action, out_sides)
             return mux.status
         else:
-            list(self.thread_pool.map(lambda args: Mux.update_flows(*args),
-                                      [(mux, new_action, out_sides) for mux in self.muxes.values()]))
+            self._run_all_muxes('update_flows', lambda args: Mux.update_flows(*args),
+                                [(mux, new_action, out_sides) for mux in self.muxes.values()])
             return {mux.bridge: mux.status for mux in self.muxes.values()}
 
     def reset_flows(self, port_index=None):
@@ -921,6 +1002,15 @@ def clear_flap_counter_handler(vm_set):
         return ret
 
 
+@app.route('/mux/<vm_set>/latency', methods=['GET'])
+def latency_handler(vm_set):
+    """
+    Handler for retrieving the time used by setting active side or updating flows of all muxes
+    """
+    _validate_vm_set(vm_set)
+    return g_muxes.get_latency()
+
+
 @app.route('/mux/<vm_set>/reload', methods=['POST'])
 def reload_muxes(vm_set):
     """Handler for reloading the mux objects
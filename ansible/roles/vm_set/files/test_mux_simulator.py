@@ -0,0 +1,232 @@
+"""
+Tests of applying the flow changes of mux_simulator.py against a fake ovs-ofctl
+
+The fake ovs-vsctl/ovs-ofctl commands keep the flows of each bridge in a json file, so the flows cached by the mux
+simulator can be compared with the flows on the bridge. Skipped when flask is not installed.
+
+    python -m pytest ansible/roles/vm_set/files/test_mux_simulator.py
+"""
+
+import importlib.util
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+pytest.importorskip("flask")
+
+VM_SET = 'vms1-1'
+MUX_COUNT = 4
+
+FAKE_OVS = '''#!{python}
+import json, os, re, sys
+
+STATE = os.environ['FAKE_OVS_STATE']
+prog = os.path.basename(sys.argv[0])
+args = [arg for arg in sys.argv[1:] if arg != '--names']
+with open(os.path.join(STATE, 'calls'), 'a') as f:
+    f.write(' '.join([prog] + args) + '\\n')
+if prog == 'ovs-vsctl':
+    index = int(args[1].split('-')[-1])
+    print('enp.{{}}\\nenp.{{}}\\nmuxy-{{}}'.format(3000 + index * 2, 3001 + index * 2, args[1][4:]))
+    sys.exit(0)
+
+# Failure of the flow mods: "bundle" for a bridge not supporting bundles, "all" for any command, or "once" for the
+# first command applying flow mods to each bridge
+fail = os.environ.get('FAKE_OVS_FAIL', '')
+bundle = '--bundle' in args
+args = [arg for arg in args if arg != '--bundle']
+path = os.path.join(STATE, args[1] + '.json')
+with open(path) as f:
+    flows = json.load(f)
+
+if args[0] == 'dump-flows':
+    for in_port, actions in flows.items():
+        print(' cookie=0x0, duration=1.0s, table=0, n_packets=0, n_bytes=0, in_port="{{}}" actions={{}}'.format(
+            in_port, actions))
+    sys.exit(0)
+if fail == 'bundle' and bundle:
+    sys.stderr.write('ovs-ofctl: {{}}: bundles are not supported\\n'.format(args[1]))
+    sys.exit(1)
+failed = os.path.join(STATE, args[1] + '.failed')
+if fail == 'all' or (fail == 'once' and not os.path.exists(failed)):
+    open(failed, 'w').close()
+    sys.stderr.write('ovs-ofctl: {{}}: failed to connect to socket (Connection refused)\\n'.format(args[1]))
+    sys.exit(1)
+for line in sys.stdin.read().splitlines():
+    op, in_port, actions = re.match(r'(\\w+) in_port="([^"]+)"(?:,actions=(.*))?$', line).groups()
+    if op == 'delete':
+        flows.pop(in_port, None)
+    elif op == 'add' or in_port in flows:
+        flows[in_port] = actions
+with open(path, 'w') as f:
+    json.dump(flows, f)
+'''
+
+
+def _initial_flows(bridge, index):
+    return {
+        'muxy-' + bridge[4:]: 'output:"enp.{}",output:"enp.{}"'.format(3000 + index * 2, 3001 + index * 2),
+        'enp.{}'.format(3000 + index * 2): 'output:"muxy-{}"'.format(bridge[4:])
+    }
+
+
+class FakeOvs(object):
+
+    def __init__(self, path, bridges):
+        self.path = path
+        self.bridges = bridges
+
+    def flows(self, bridge):
+        with open(os.path.join(self.path, bridge + '.json')) as f:
+            return json.load(f)
+
+    def calls(self):
+        with open(os.path.join(self.path, 'calls')) as f:
+            return f.read().splitlines()
+
+    def clear_calls(self):
+        open(os.path.join(self.path, 'calls'), 'w').close()
+
+
+@pytest.fixture
+def mux_simulator(tmp_path):
+    spec = importlib.util.spec_from_file_location(
+        'mux_simulator', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mux_simulator.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def fake_ovs(tmp_path, monkeypatch, mux_simulator):
+    bin_path = tmp_path / 'bin'
+    bin_path.mkdir()
+    for prog in ['ovs-vsctl', 'ovs-ofctl']:
+        path = bin_path / prog
+        path.write_text(FAKE_OVS.format(python=sys.executable))
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bin_path) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_OVS_STATE', str(tmp_path))
+    monkeypatch.delenv('FAKE_OVS_FAIL', raising=False)
+
+    bridges = [mux_simulator.adaptive_name(mux_simulator.MUX_BRIDGE_TEMPLATE, VM_SET, i) for i in range(MUX_COUNT)]
+    for index, bridge in enumerate(bridges):
+        with open(str(tmp_path / (bridge + '.json')), 'w') as f:
+            json.dump(_initial_flows(bridge, index), f)
+    monkeypatch.setattr(mux_simulator.Muxes, '_mux_bridges', lambda self: bridges)
+    fake_ovs = FakeOvs(str(tmp_path), bridges)
+    fake_ovs.clear_calls()
+    return fake_ovs
+
+
+@pytest.fixture
+def client(mux_simulator, fake_ovs):
+    mux_simulator.app.config['VERBOSE'] = False
+    mux_simulator.create_muxes(VM_SET)
+    fake_ovs.clear_calls()
+    return mux_simulator.app.test_client()
+
+
+def _check_cached_flows(client, fake_ovs):
+    """The flows returned by the mux simulator, without dumping the bridges again, match the flows on the bridges."""
+    fake_ovs.clear_calls()
+    status = client.get('/mux/' + VM_SET).get_json()
+    assert fake_ovs.calls() == []
+    for bridge in fake_ovs.bridges:
+        cached = {in_port: ['output:"{}"'.format(flow['out_port']) for flow in flows]
+                  for in_port, flows in status[bridge]['flows'].items() if flows}
+        actual = {in_port: actions.split(',') for in_port, actions in fake_ovs.flows(bridge).items()}
+        assert cached == actual, bridge
+    return status
+
+
+def _add_flows_calls(fake_ovs):
+    return [call for call in fake_ovs.calls() if 'add-flows' in call]
+
+
+def test_cached_flows(client, fake_ovs):
+    for side in ['lower_tor', 'upper_tor', 'lower_tor']:
+        assert client.post('/mux/' + VM_SET, json={'active_side': side}).status_code == 200
+        status = _check_cached_flows(client, fake_ovs)
+        assert all(mux['active_side'] == side for mux in status.values())
+
+    for action, out_sides in [('drop', ['nic', 'upper_tor']), ('output', ['nic', 'upper_tor']),
+                              ('drop', ['lower_tor', 'upper_tor', 'nic'])]:
+        assert client.post('/mux/{}/{}'.format(VM_SET, action), json={'out_sides': out_sides}).status_code == 200
+        _check_cached_flows(client, fake_ovs)
+
+    assert client.post('/mux/{}/reset'.format(VM_SET)).status_code == 200
+    status = _check_cached_flows(client, fake_ovs)
+    assert all(mux['healthy'] for mux in status.values())
+
+
+def test_bundle(client, fake_ovs):
+    assert client.post('/mux/' + VM_SET, json={'active_side': 'lower_tor'}).status_code == 200
+
+    calls = _add_flows_calls(fake_ovs)
+    assert sorted(calls) == sorted(['ovs-ofctl --bundle add-flows {} -'.format(bridge)
+                                    for bridge in fake_ovs.bridges])
+
+
+def test_bundle_not_supported(client, fake_ovs, monkeypatch):
+    monkeypatch.setenv('FAKE_OVS_FAIL', 'bundle')
+
+    calls = []
+    for side in ['lower_tor', 'upper_tor']:
+        assert client.post('/mux/' + VM_SET, json={'active_side': side}).status_code == 200
+        calls.extend(_add_flows_calls(fake_ovs))
+        _check_cached_flows(client, fake_ovs)
+
+    # bundle is tried once per bridge, then the flow mods are applied without bundle
+    for bridge in fake_ovs.bridges:
+        assert [call for call in calls if bridge in call] == ['ovs-ofctl --bundle add-flows {} -'.format(bridge)] + \
+            ['ovs-ofctl add-flows {} -'.format(bridge)] * 2
+
+
+def test_apply_failed(client, fake_ovs, monkeypatch, mux_simulator):
+    monkeypatch.setenv('FAKE_OVS_FAIL', 'all')
+
+    assert client.post('/mux/' + VM_SET, json={'active_side': 'lower_tor'}).status_code == 500
+
+    # the flows are reloaded from the bridges and bundle is still used after a failure not caused by bundle
+    calls = fake_ovs.calls()
+    for bridge in fake_ovs.bridges:
+        assert [call for call in calls if bridge in call] == ['ovs-ofctl --bundle add-flows {} -'.format(bridge),
+                                                              'ovs-ofctl dump-flows {}'.format(bridge)]
+    status = _check_cached_flows(client, fake_ovs)
+    assert all(mux['active_side'] == 'upper_tor' for mux in status.values())
+
+    monkeypatch.setenv('FAKE_OVS_FAIL', '')
+    assert client.post('/mux/' + VM_SET, json={'active_side': 'lower_tor'}).status_code == 200
+    assert all('--bundle' in call for call in _add_flows_calls(fake_ovs))
+    _check_cached_flows(client, fake_ovs)
+
+
+def test_reload_flows(client, fake_ovs, mux_simulator):
+    mux = mux_simulator.g_muxes.muxes[fake_ovs.bridges[0]]
+    # flows changed on the bridge behind the mux simulator
+    with open(os.path.join(fake_ovs.path, fake_ovs.bridges[0] + '.json'), 'w') as f:
+        json.dump({'muxy-' + fake_ovs.bridges[0][4:]: 'output:"enp.3001"', 'enp.3001': 'output:"muxy-vms1-1-0"'}, f)
+
+    mux._reload_flows()
+
+    assert mux.flows['upstream']['out_sides'] == ['lower_tor']
+    assert mux.flows['downstream'] == {'in_side': 'lower_tor', 'out_sides': ['nic']}
+    assert mux.active_side == 'lower_tor'
+
+
+def test_transient_failure(client, fake_ovs, monkeypatch):
+    monkeypatch.setenv('FAKE_OVS_FAIL', 'once')
+
+    assert client.post('/mux/' + VM_SET, json={'active_side': 'lower_tor'}).status_code == 500
+    _check_cached_flows(client, fake_ovs)
+    assert client.post('/mux/' + VM_SET, json={'active_side': 'lower_tor'}).status_code == 200
+
+    # not retried without bundle, bundle is still used for the next update
+    assert sorted(_add_flows_calls(fake_ovs)) == sorted(['ovs-ofctl --bundle add-flows {} -'.format(bridge)
+                                                         for bridge in fake_ovs.bridges])
+    status = _check_cached_flows(client, fake_ovs)
+    assert all(mux['active_side'] == 'lower_tor' for mux in status.values())
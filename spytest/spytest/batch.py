@@ -16,6 +16,7 @@ from spytest import paths
 from spytest import env
 from spytest import tcmap
 from spytest import item_utils
+from spytest import batch_plan
 from spytest.st_time import get_timenow
 from spytest.st_time import get_elapsed
 from spytest.st_time import get_timestamp
@@ -69,6 +70,7 @@ def batch_init():
     wa.tclist_cache = {}
     wa.chip_coverate_history = {}
     wa.platform_coverate_history = {}
+    wa.duration_history = None
 
     # None disable backup/rerun nodes
     # 0 create same number of backup/rerun nodes
@@ -116,6 +118,15 @@ def load_coverage_history():
         tcmap.read_coverage_history(csv_file)
 
 
+def load_duration_history():
+    duration_history = env.get("SPYTEST_BATCH_DURATION_HISTORY", "")
+    if not duration_history:
+        return
+    history_paths = duration_history.split(",")
+    wa.duration_history = batch_plan.read_duration_history(history_paths, printerr=wa.trace)
+    trace("Loaded execution time history of {} modules".format(len(wa.duration_history)))
+
+
 def init_type_nodes():
     node_types = ["one", "two", "three", "four"]
     backup_nodes = env.get("SPYTEST_BATCH_BACKUP_NODES")
@@ -553,6 +564,23 @@ class SpyTestScheduling(object):
         self.max_order = self.default_order
         self._load_buckets()
 
+        # duration aware scheduling using the execution time history
+        self.duration_plan = None
+        self.predicted = {}
+        self.predicted_makespan = 0
+        self.plan_start = None
+        self.finish_time = None
+        self.duration_scale = 1.0
+        self.module_estimate = {}
+        self.module_actual = {}
+        self.module_start = {}
+        self.module_worker = {}
+        self.module_pending = {}
+        self.index_module = {}
+        self.worker_busy = {}
+        self.worker_finish = {}
+        self.node_last_finish = {}
+
         self.test_spytest_infra_first = None
         self.test_spytest_infra_second = None
         self.test_spytest_infra_last = None
@@ -816,6 +844,8 @@ class SpyTestScheduling(object):
         for mname, minfo in self.main_modules.items():
             debug("Collection: {} {} {}".format(mname, ",".join(minfo.nodes),
                   ",".join([str(i) for i in minfo.node_indexes])))
+        if wa.duration_history is not None:
+            self._plan_durations()
         self.collection_is_completed = True
 
         # start worker monitoring
@@ -995,6 +1025,8 @@ class SpyTestScheduling(object):
             self.node_modules[node].remove(item_index)
             report("finish", item_list, name)
             debug("[{}]: ===== Completed {} {}".format(name, item_index, item_list))
+            if self.duration_plan is not None:
+                self._record_duration(name, item_index, duration)
         else:
             trace("[{}]: ===== Already Completed {} {}".format(name, item_index, item_list))
         self._schedule_node_locked(node)
@@ -1014,10 +1046,27 @@ class SpyTestScheduling(object):
                 return True
         return False
 
-    def _assign_test(self, node, modules=None):
+    def _assign_module(self, node, modules, mname):
         name = get_gw_name(node.gateway)
         worker = self.wa.workers[name]
+        minfo = modules.pop(mname)
+        md = self.get_module_data(mname, minfo.used_tpref)
+        self.node_modules[node].extend(minfo.node_indexes)
+        if self.test_spytest_infra_last is not None:
+            if env.match("SPYTEST_BATCH_APPEND_INFRA_TEST", "1", "1"):
+                self.node_modules[node].append(self.test_spytest_infra_last)
+        worker.assigned = worker.assigned + len(minfo.node_indexes)
+        debug("[{}]: ===== Assigned order:{} {} {}".format(name, md.order, mname, minfo.node_indexes))
+        for item_index in minfo.node_indexes:
+            report("add", self.collection[item_index], name)
+        report("save", "", "")
+        return minfo
+
+    def _assign_test(self, node, modules=None):
+        name = get_gw_name(node.gateway)
         modules = modules or self.main_modules
+        if self.duration_plan is not None and modules is self.main_modules:
+            return self._assign_planned_test(node)
         orders = list(range(0, self.max_order + 1))
         if env.match("SPYTEST_BATCH_ORDER_HIGH2LOW", "1", "1"):
             orders = reversed(orders)
@@ -1030,19 +1079,163 @@ class SpyTestScheduling(object):
                     continue
                 if self._assign_pretest(node):
                     return True
-                del modules[mname]
-                self.node_modules[node].extend(minfo.node_indexes)
-                if self.test_spytest_infra_last is not None:
-                    if env.match("SPYTEST_BATCH_APPEND_INFRA_TEST", "1", "1"):
-                        self.node_modules[node].append(self.test_spytest_infra_last)
-                worker.assigned = worker.assigned + len(minfo.node_indexes)
-                debug("[{}]: ===== Assigned order:{} {} {}".format(name, md.order, mname, minfo.node_indexes))
-                for item_index in minfo.node_indexes:
-                    report("add", self.collection[item_index], name)
-                report("save", "", "")
+                self._assign_module(node, modules, mname)
                 return True
         return False
 
+    # rank of the module in the execution order used by _assign_test
+    def _module_rank(self, mname, minfo):
+        if not self.order_support:
+            return 0
+        order = self.get_module_data(mname, minfo.used_tpref).order
+        if env.match("SPYTEST_BATCH_ORDER_HIGH2LOW", "1", "1"):
+            return self.max_order - order
+        return order
+
+    def _plan_workers(self, names):
+        retval = []
+        for name in names:
+            worker = self.wa.workers.get(name)
+            if not worker or worker.completed is not False or worker.excluded:
+                continue
+            if worker.node_type == "ReRun":
+                continue
+            if worker.started or worker.node_type == "Main":
+                retval.append(name)
+        return retval
+
+    def _plan_durations(self):
+        self.plan_start = get_timenow()
+        mnames = list(self.main_modules.keys())
+        self.module_estimate = batch_plan.estimate_durations(wa.duration_history, mnames)
+        unknown = [mname for mname in mnames if batch_plan.lookup_duration(wa.duration_history, mname) is None]
+        if unknown:
+            msg = "No execution time history for {} modules, using {}: {}"
+            trace(msg.format(len(unknown), utils.time_format(int(self.module_estimate[unknown[0]])),
+                             " ".join(unknown)))
+        loads = self._replan_durations()
+        self.predicted = dict(loads)
+        self.predicted_makespan = batch_plan.makespan(loads)
+        header, rows = ["#", "Node", "Modules", "Predicted Time"], []
+        for index, name in enumerate(sorted(self.duration_plan)):
+            rows.append([index + 1, name, len(self.duration_plan[name]),
+                         utils.time_format(int(loads[name]))])
+        trace("Duration Plan: Predicted Makespan {}".format(utils.time_format(int(self.predicted_makespan))))
+        trace("\n" + utils.sprint_vtable(header, rows))
+
+    def _remaining_loads(self):
+        loads = {}
+        for mname, name in self.module_worker.items():
+            if not self.module_pending.get(mname):
+                continue
+            estimate = self.module_estimate.get(mname, 0) * self.duration_scale
+            remaining = max(estimate - self.module_actual.get(mname, 0), 0)
+            loads[name] = loads.get(name, 0) + remaining
+        return loads
+
+    # longest processing time first assignment of the modules not yet assigned
+    # taking into account the remaining time of the modules being executed
+    def _replan_durations(self):
+        durations, candidates, ranks = {}, {}, {}
+        for mname, minfo in self.main_modules.items():
+            names = self._plan_workers(minfo.nodes)
+            if not names:
+                continue
+            candidates[mname] = names
+            ranks[mname] = self._module_rank(mname, minfo)
+            durations[mname] = self.module_estimate.get(mname, batch_plan.default_module_time) * self.duration_scale
+        self.duration_plan, loads = batch_plan.lpt_plan(durations, candidates, self._remaining_loads(), ranks)
+        return loads
+
+    def _next_planned_module(self, name):
+        for mname in self.duration_plan.get(name, []):
+            if mname in self.main_modules and name in self.main_modules[mname].nodes:
+                return mname
+        return None
+
+    def _assign_planned_test(self, node):
+        name = get_gw_name(node.gateway)
+        mname = self._next_planned_module(name)
+        if mname is None:
+            # the worker is ahead of the plan, rebalance with the current estimates
+            self._replan_durations()
+            mname = self._next_planned_module(name)
+        if mname is None:
+            # take the first in order and longest module this worker can execute from the other workers
+            applicable = [m for m, minfo in self.main_modules.items() if name in minfo.nodes]
+            if not applicable:
+                return False
+            mname = min(applicable, key=lambda m: (self._module_rank(m, self.main_modules[m]),
+                                                   -self.module_estimate.get(m, 0)))
+            trace("[{}]: ===== Taking {} out of the duration plan".format(name, mname))
+        if self._assign_pretest(node):
+            return True
+        minfo = self._assign_module(node, self.main_modules, mname)
+        for mnames in self.duration_plan.values():
+            if mname in mnames:
+                mnames.remove(mname)
+        self.module_worker[mname] = name
+        self.module_start[mname] = get_timenow()
+        self.module_actual[mname] = 0
+        self.module_pending[mname] = set(minfo.node_indexes)
+        for item_index in minfo.node_indexes:
+            self.index_module[item_index] = mname
+        return True
+
+    def _record_duration(self, name, item_index, duration):
+        now = get_timenow()
+        last_finish = self.node_last_finish.get(name)
+        self.node_last_finish[name] = now
+        mname = self.index_module.get(item_index)
+        if mname is None or self.module_worker.get(mname) != name:
+            return
+        if not duration:
+            start = self.module_start[mname]
+            if last_finish and last_finish > start:
+                start = last_finish
+            duration = (now - start).total_seconds()
+        self.module_actual[mname] = self.module_actual[mname] + duration
+        pending = self.module_pending[mname]
+        pending.discard(item_index)
+        if pending:
+            return
+
+        # module completed: correct the estimates and rebalance the remaining modules
+        self.worker_busy[name] = self.worker_busy.get(name, 0) + self.module_actual[mname]
+        self.worker_finish[name] = (now - self.plan_start).total_seconds()
+        self.finish_time = now
+        actual, estimated = 0, 0
+        for m, secs in self.module_actual.items():
+            if self.module_pending.get(m) or batch_plan.lookup_duration(wa.duration_history, m) is None:
+                continue
+            actual = actual + secs
+            estimated = estimated + self.module_estimate[m]
+        if estimated > 0:
+            self.duration_scale = actual / estimated
+        loads = self._replan_durations()
+        msg = "[{}]: ===== Module {} Time {} Estimated {} Scale {:.2f} Remaining Makespan {}"
+        debug(msg.format(name, mname, utils.time_format(int(self.module_actual[mname])),
+                         utils.time_format(int(self.module_estimate.get(mname, 0))),
+                         self.duration_scale, utils.time_format(int(batch_plan.makespan(loads)))))
+
+    def report_makespan(self):
+        if self.duration_plan is None or self.plan_start is None:
+            return
+        actual = (self.finish_time - self.plan_start).total_seconds() if self.finish_time else 0
+        header, rows = ["#", "Node", "Modules", "Predicted Time", "Busy Time", "Finish Time"], []
+        names = sorted(set(self.predicted) | set(self.worker_finish))
+        for index, name in enumerate(names):
+            count = len([m for m, n in self.module_worker.items() if n == name and not self.module_pending[m]])
+            rows.append([index + 1, name, count, utils.time_format(int(self.predicted.get(name, 0))),
+                         utils.time_format(int(self.worker_busy.get(name, 0))),
+                         utils.time_format(int(self.worker_finish.get(name, 0)))])
+        rows.append(["", "Makespan", "", utils.time_format(int(self.predicted_makespan)), "",
+                     utils.time_format(int(actual))])
+        trace("Duration Plan: Predicted Makespan {} Actual Makespan {}".format(
+              utils.time_format(int(self.predicted_makespan)), utils.time_format(int(actual))))
+        trace("\n" + utils.sprint_vtable(header, rows))
+        utils.write_csv_file(header, rows, os.path.join(wa.logs_path, "batch_makespan.csv"))
+
     def _pending_count(self, worker, modules=None, dbg=False):
         count, modules = 0, modules or self.main_modules
         for mname, minfo in modules.items():
@@ -1626,6 +1819,7 @@ def configure(config, logs_path, root_logs_path):
     wa.tcmap = dict()
     load_module_csv()
     load_coverage_history()
+    load_duration_history()
     init_stdout(config, logs_path)
     dist.configure(config, logs_path, is_worker(), wa)
     create_dashboard()
@@ -1688,6 +1882,7 @@ def unconfigure(config):
         debug("============== batch unconfigure =====================")
         if wa.custom_scheduling and wa.sched:
             wa.sched._pending_count(None, dbg=True)
+            wa.sched.report_makespan()
     for line in utils.dump_connections("batch unconfig: "):
         trace(line)
     return retval
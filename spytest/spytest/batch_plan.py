@@ -0,0 +1,123 @@
+import os
+import glob
+
+import utilities.common as utils
+
+# module time used when there is no history for any of the modules
+default_module_time = 600
+
+# (module column, time column) of the result CSV files of previous runs
+# modules report has one row per module, functions report has one row per function
+history_columns = [("Module Name", "Exec Time"), ("Module", "TimeTaken")]
+
+
+def _parse_seconds(value):
+    value = str(value).strip()
+    if ":" in value:
+        return utils.time_parse(value.split(".")[0])
+    try:
+        return float(value)
+    except Exception:
+        return 0
+
+
+def _list_history_files(paths):
+    retval = []
+    for entry in paths:
+        entry = entry.strip()
+        if not entry:
+            continue
+        if os.path.isdir(entry):
+            retval.extend(sorted(glob.glob(os.path.join(entry, "*_modules.csv"))))
+        else:
+            retval.extend(sorted(glob.glob(entry)))
+    return retval
+
+
+def read_duration_history(paths, printerr=None):
+    """
+    Read the module execution times from the result CSV files of previous runs.
+
+    paths: list of CSV files, glob patterns or directories
+    returns dict of module name to average execution time in seconds over the runs
+    """
+    totals, counts = {}, {}
+    for filepath in _list_history_files(paths):
+        rows = utils.read_csv(filepath)
+        if not rows:
+            continue
+        cols, run = rows[0], {}
+        for mcol, tcol in history_columns:
+            if mcol in cols and tcol in cols:
+                mindex, tindex = cols.index(mcol), cols.index(tcol)
+                break
+        else:
+            if printerr:
+                printerr("No module execution times in {}".format(filepath))
+            continue
+        for row in rows[1:]:
+            if len(row) <= max(mindex, tindex) or not row[mindex]:
+                continue
+            run[row[mindex]] = run.get(row[mindex], 0) + _parse_seconds(row[tindex])
+        for name, secs in run.items():
+            totals[name] = totals.get(name, 0) + secs
+            counts[name] = counts.get(name, 0) + 1
+    return {name: totals[name] / counts[name] for name in totals}
+
+
+def lookup_duration(history, mname):
+    if mname in history:
+        return history[mname]
+    return history.get(os.path.basename(mname))
+
+
+def estimate_durations(history, mnames):
+    """
+    Estimate the execution time of the modules, the modules without history
+    take the median time of the modules with history
+    """
+    known, retval = [], {}
+    for mname in mnames:
+        secs = lookup_duration(history, mname)
+        if secs is not None:
+            known.append(secs)
+            retval[mname] = secs
+    if known:
+        known.sort()
+        fallback = known[len(known) // 2]
+    else:
+        fallback = default_module_time
+    for mname in mnames:
+        retval.setdefault(mname, fallback)
+    return retval
+
+
+def lpt_plan(durations, candidates, loads=None, ranks=None):
+    """
+    Longest processing time first assignment of modules to workers.
+
+    durations: dict of module name to estimated execution time
+    candidates: dict of module name to list of workers which can execute it
+    loads: dict of worker name to time it is already busy with
+    ranks: dict of module name to its execution order level, the modules of
+           lower rank are planned and executed first, LPT within each rank
+    returns (dict of worker name to list of module names in execution order,
+             dict of worker name to estimated finish time)
+    """
+    loads, ranks = dict(loads or {}), ranks or {}
+    plan = {}
+    for workers in candidates.values():
+        for worker in workers:
+            loads.setdefault(worker, 0)
+    for mname in sorted(durations, key=lambda m: (ranks.get(m, 0), -durations[m], m)):
+        workers = candidates.get(mname)
+        if not workers:
+            continue
+        worker = min(workers, key=lambda w: (loads[w], w))
+        plan.setdefault(worker, []).append(mname)
+        loads[worker] = loads[worker] + durations[mname]
+    return plan, loads
+
+
+def makespan(loads):
+    return max(loads.values()) if loads else 0
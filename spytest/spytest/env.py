@@ -107,6 +107,9 @@ dev_defaults = {
     "SPYTEST_BATCH_MODULE_TOPO_PREF": None,
     "SPYTEST_BATCH_MATCHING_BUCKET_ORDER": "larger,largest",
     "SPYTEST_BATCH_RERUN": None,
+    "SPYTEST_BATCH_DURATION_HISTORY": None,
+    "SPYTEST_GNMI_CLIENT": "auto",
+    "SPYTEST_GNMI_POOL_SIZE": "2",
     "SPYTEST_TESTBED_FILE": "testbed.yaml",
     "SPYTEST_FILE_MODE": "0",
     "SPYTEST_SCHEDULING": None,
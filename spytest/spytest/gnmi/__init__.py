@@ -6,6 +6,7 @@ import pprint
 
 from spytest.dicts import SpyTestDict
 from spytest.gnmi.wrapper import _gnmi_get, _gnmi_set, gnmiCreateJsonFile, gnmiCreateProtoFile
+from spytest.gnmi.session import GnmiUnavailable, is_enabled, session_get, session_set
 
 
 class gNMI(object):
@@ -95,6 +96,31 @@ class gNMI(object):
         self._log(json.dumps(resp))
         return resp
 
+    def _use_session(self, params, encoding):
+        # the in-process client handles JSON without extra CLI parameters
+        if params or encoding or self.cert or not is_enabled():
+            return False
+        return bool(os.getenv("SPYTEST_FILE_MODE", "0") == "0")
+
+    def _session_call(self, func, *args, **kwargs):
+        try:
+            return func(self.target_addr, *args, timeout=self.timeout or 10, username=self.username,
+                        password=self.password, inSecure=self.inSecure, noTls=self.noTls,
+                        ca=self.ca, **kwargs)
+        except GnmiUnavailable as exp:
+            self._log("GNMI using CLI: {}".format(exp))
+        return None
+
+    def _session_get(self, paths, params='', encoding=None):
+        if not self._use_session(params, encoding):
+            return None
+        return self._session_call(session_get, paths)
+
+    def _session_set(self, params='', encoding=None, delete=None, replace=None, update=None):
+        if not self._use_session(params, encoding):
+            return None
+        return self._session_call(session_set, delete=delete, replace=replace, update=update)
+
     def get(self, path, params='', encoding=None):
         from apis.gnmi.gnmi_utils import SanitizePathPayload
         path_change = False
@@ -110,7 +136,9 @@ class gNMI(object):
             param.extend(params.split())
         self._log("GNMI [GET]: {}".format(path))
         try:
-            ret_val = _gnmi_get(param, display=False, encoding=encoding)
+            ret_val = self._session_get([path], params, encoding)
+            if ret_val is None:
+                ret_val = _gnmi_get(param, display=False, encoding=encoding)
 
             if path_change and "return" in ret_val:
                 output = json.loads(ret_val["return"])
@@ -134,6 +162,17 @@ class gNMI(object):
             raise e
 
     def _set(self, path, action, params='', data={}, encoding=None):
+        ret_val = None
+        if action.lower() == 'delete':
+            ret_val = self._session_set(params, encoding, delete=[path])
+        elif action.lower() in ['replace', 'update'] and data:
+            ret_val = self._session_set(params, encoding, **{action.lower(): [(path, data)]})
+        if ret_val is not None:
+            self._log("GNMI [{}]: {}".format(action.upper(), path))
+            if data:
+                self._log("data:\n{}".format(pprint.pformat(data)))
+            return self._result(action.upper(), path, ret_val, data)
+
         data_path = None
         if data and len(data):
             if encoding == 'ANY' and action.lower() not in ['delete']:
@@ -173,6 +212,40 @@ class gNMI(object):
     def delete(self, path, params='', data={}, encoding=None):
         return self._set(path, 'delete', params=params, data=data, encoding=encoding)
 
+    def get_multi(self, paths, params='', encoding=None):
+        """
+        Read several paths, in one RPC when the in-process client is used.
+        The output is the JSON of all the paths merged.
+        """
+        self._log("GNMI [GET]: {}".format(paths))
+        ret_val = self._session_get(paths, params, encoding)
+        if ret_val is None:
+            output, ok = {}, True
+            for path in paths:
+                resp = self.get(path, params=params, encoding=encoding)
+                ok = ok and resp.status
+                if isinstance(resp.output, dict):
+                    output.update(resp.output)
+            ret_val = {"ok": ok, "return": json.dumps(output, ensure_ascii=False)}
+        return self._result('GET', paths, ret_val)
+
+    def set_multi(self, delete=None, replace=None, update=None, params='', encoding=None):
+        """
+        Apply the deletes, replaces and updates, in one RPC when the in-process client is used.
+        delete is a list of paths, replace and update lists of (path, data).
+        """
+        delete, replace, update = delete or [], replace or [], update or []
+        paths = list(delete) + [path for path, _ in replace] + [path for path, _ in update]
+        self._log("GNMI [SET]: {}".format(paths))
+        ret_val = self._session_set(params, encoding, delete=delete, replace=replace, update=update)
+        if ret_val is None:
+            results = [self.delete(path, params=params, encoding=encoding) for path in delete]
+            results.extend([self.replace(path, params=params, data=data, encoding=encoding) for path, data in replace])
+            results.extend([self.update(path, params=params, data=data, encoding=encoding) for path, data in update])
+            ret_val = {"ok": all([resp.status for resp in results]), "return": "",
+                       "operation": [resp.operation for resp in results]}
+        return self._result('SET', paths, ret_val, {"replace": replace, "update": update})
+
     def send(self, path, action='', params='', data=None, encoding=None, timeout=None):
         self.timeout = timeout if timeout else self.defTimeout
         if action.lower() in ['create', 'update', 'replace', 'delete']:
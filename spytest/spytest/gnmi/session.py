@@ -0,0 +1,292 @@
+"""
+In-process gNMI client
+
+Keeps a small pool of long lived gRPC channels per target, so that GET and SET
+requests do not pay for a gnmi_get/gnmi_set process start and a TLS handshake
+each. Paths and JSON payloads are sent in the request, no temporary file is
+written, and several paths can be read or written in one RPC.
+
+Needs the grpc package and the python modules generated from gnmi.proto, either
+from pygnmi or gnmi_pb2/gnmi_pb2_grpc on the python path. When they are missing
+or the target can not be reached GnmiUnavailable is raised and the callers
+fall back to the gnmi_get/gnmi_set CLI.
+
+SPYTEST_GNMI_CLIENT=cli always uses the CLI, SPYTEST_GNMI_POOL_SIZE sets the
+number of channels per target.
+"""
+
+import json
+import ssl
+import threading
+import time
+
+from spytest import env
+
+# seconds before retrying a target which could not be connected
+retry_interval = 60
+
+# seconds to wait for a new channel to connect
+connect_timeout = 10
+
+
+class GnmiUnavailable(Exception):
+    pass
+
+
+_modules = {}
+
+
+def _import_modules():
+    if "grpc" in _modules:
+        return _modules["grpc"], _modules["gnmi_pb2"], _modules["gnmi_pb2_grpc"]
+    grpc, gnmi_pb2, gnmi_pb2_grpc = None, None, None
+    try:
+        import grpc
+        try:
+            from pygnmi.spec.v080 import gnmi_pb2, gnmi_pb2_grpc
+        except Exception:
+            import gnmi_pb2
+            import gnmi_pb2_grpc
+    except Exception:
+        grpc, gnmi_pb2, gnmi_pb2_grpc = None, None, None
+    _modules.update(grpc=grpc, gnmi_pb2=gnmi_pb2, gnmi_pb2_grpc=gnmi_pb2_grpc)
+    return grpc, gnmi_pb2, gnmi_pb2_grpc
+
+
+def is_enabled():
+    if env.get("SPYTEST_GNMI_CLIENT", "auto") == "cli":
+        return False
+    return bool(_import_modules()[0])
+
+
+def split_xpath(xpath):
+    """
+    split the xpath into a list of (name, keys) elements
+    the key values can contain escaped backslash and closing bracket
+    """
+    elems, name, keys = [], [], {}
+    i, n = 0, len(xpath)
+    while i < n:
+        ch = xpath[i]
+        if ch == "/":
+            if name or keys:
+                elems.append(("".join(name), keys))
+                name, keys = [], {}
+            i = i + 1
+        elif ch == "[":
+            eq = xpath.index("=", i)
+            key, value = xpath[i + 1:eq], []
+            i = eq + 1
+            while i < n and xpath[i] != "]":
+                if xpath[i] == "\\" and i + 1 < n:
+                    i = i + 1
+                value.append(xpath[i])
+                i = i + 1
+            keys[key] = "".join(value)
+            i = i + 1
+        else:
+            name.append(ch)
+            i = i + 1
+    if name or keys:
+        elems.append(("".join(name), keys))
+    return elems
+
+
+def _status_name(code):
+    # same spelling as the errors printed by the go CLI e.g. NotFound
+    return "".join([word.capitalize() for word in code.name.split("_")])
+
+
+def _cert_target_name(pem):
+    try:
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+    except Exception:
+        raise GnmiUnavailable("cryptography is needed to skip the certificate verification")
+    cert = x509.load_pem_x509_certificate(pem)
+    try:
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+        names = san.value.get_values_for_type(x509.DNSName)
+        if names:
+            return names[0]
+    except Exception:
+        pass
+    names = cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+    if not names:
+        raise GnmiUnavailable("no name in the target certificate")
+    return names[0].value
+
+
+class GnmiSession(object):
+    """ gRPC channel to a gNMI target """
+
+    def __init__(self, target_addr, username=None, password=None, inSecure=True,
+                 noTls=False, ca=None):
+        grpc, self.pb2, pb2_grpc = _import_modules()
+        if not grpc:
+            raise GnmiUnavailable("grpc or the gnmi_pb2 modules are not installed")
+        self.grpc = grpc
+        self.target_addr = target_addr
+        self.metadata = []
+        if username:
+            self.metadata.append(("username", str(username)))
+        if password:
+            self.metadata.append(("password", str(password)))
+        options = [("grpc.max_receive_message_length", 64 * 1024 * 1024)]
+        if noTls:
+            self.channel = grpc.insecure_channel(target_addr, options=options)
+        else:
+            root = None
+            if ca:
+                with open(ca, "rb") as fh:
+                    root = fh.read()
+            elif inSecure:
+                # trust the certificate presented by the target, like the CLI -insecure option
+                host, port = target_addr.rsplit(":", 1)
+                try:
+                    root = ssl.get_server_certificate((host.strip("[]"), int(port))).encode()
+                except Exception as exp:
+                    raise GnmiUnavailable("failed to get the target certificate: {}".format(exp))
+                options.append(("grpc.ssl_target_name_override", _cert_target_name(root)))
+            creds = grpc.ssl_channel_credentials(root_certificates=root)
+            self.channel = grpc.secure_channel(target_addr, creds, options=options)
+        try:
+            grpc.channel_ready_future(self.channel).result(timeout=connect_timeout)
+        except Exception:
+            self.close()
+            raise GnmiUnavailable("failed to connect {} in {} seconds".format(target_addr, connect_timeout))
+        self.stub = pb2_grpc.gNMIStub(self.channel)
+
+    def close(self):
+        try:
+            self.channel.close()
+        except Exception:
+            pass
+
+    def path(self, xpath):
+        elems = [self.pb2.PathElem(name=name, key=keys) for name, keys in split_xpath(xpath)]
+        return self.pb2.Path(elem=elems)
+
+    def _value(self, data):
+        return self.pb2.TypedValue(json_ietf_val=json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _error(self, op, exp):
+        if exp.code() == self.grpc.StatusCode.UNAVAILABLE:
+            raise GnmiUnavailable("{} failed: {}".format(op, exp.details()))
+        message = "{} failed: rpc error: code = {} desc = {}".format(op, _status_name(exp.code()), exp.details())
+        return {"ok": False, "errorCode": 1, "message": message}
+
+    def get(self, xpaths, timeout=10):
+        """
+        read the xpaths in one GetRequest
+        returns the result like the CLI with the JSON of all the notifications merged in return
+        """
+        request = self.pb2.GetRequest(path=[self.path(xpath) for xpath in xpaths],
+                                      encoding=self.pb2.JSON_IETF)
+        try:
+            response = self.stub.Get(request, timeout=timeout, metadata=self.metadata)
+        except self.grpc.RpcError as exp:
+            return self._error("Get", exp)
+        js = {}
+        for notification in response.notification:
+            for update in notification.update:
+                val = update.val.json_ietf_val or update.val.json_val
+                if val:
+                    js.update(json.loads(val.decode("utf-8")))
+        return {"ok": True, "return": json.dumps(js, ensure_ascii=False)}
+
+    def set(self, delete=None, replace=None, update=None, timeout=10):
+        """
+        apply the deletes, replaces and updates in one SetRequest
+        delete is a list of xpaths, replace and update lists of (xpath, data)
+        """
+        request = self.pb2.SetRequest(
+            delete=[self.path(xpath) for xpath in delete or []],
+            replace=[self.pb2.Update(path=self.path(xpath), val=self._value(data)) for xpath, data in replace or []],
+            update=[self.pb2.Update(path=self.path(xpath), val=self._value(data)) for xpath, data in update or []])
+        try:
+            response = self.stub.Set(request, timeout=timeout, metadata=self.metadata)
+        except self.grpc.RpcError as exp:
+            return self._error("Set", exp)
+        operations = [self.pb2.UpdateResult.Operation.Name(result.op) for result in response.response]
+        return {"ok": True, "return": "", "operation": operations[0] if len(operations) == 1 else operations}
+
+
+class GnmiSessionPool(object):
+    """ sessions per target and credentials, used round robin """
+
+    def __init__(self, size=None):
+        self.size = size or max(env.getint("SPYTEST_GNMI_POOL_SIZE", 2), 1)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.index = {}
+        self.failed = {}
+
+    def get_session(self, target_addr, username=None, password=None, inSecure=True, noTls=False, ca=None):
+        if not target_addr:
+            raise GnmiUnavailable("no target address")
+        key = (target_addr, username, password, bool(inSecure), bool(noTls), ca)
+        with self.lock:
+            failed = self.failed.get(key)
+            if failed and time.time() - failed < retry_interval:
+                raise GnmiUnavailable("{} failed to connect recently".format(target_addr))
+            sessions = self.sessions.setdefault(key, [])
+            index = self.index.get(key, 0)
+            self.index[key] = index + 1
+            if len(sessions) >= self.size:
+                return sessions[index % len(sessions)]
+        # connect without holding the lock, the other targets are not blocked
+        try:
+            session = GnmiSession(target_addr, username, password, inSecure, noTls, ca)
+        except GnmiUnavailable:
+            with self.lock:
+                self.failed[key] = time.time()
+            raise
+        with self.lock:
+            self.failed.pop(key, None)
+            self.sessions.setdefault(key, []).append(session)
+        return session
+
+    def drop(self, session):
+        with self.lock:
+            for sessions in self.sessions.values():
+                if session in sessions:
+                    sessions.remove(session)
+        session.close()
+
+    def close(self):
+        with self.lock:
+            sessions = [session for values in self.sessions.values() for session in values]
+            self.sessions, self.index, self.failed = {}, {}, {}
+        for session in sessions:
+            session.close()
+
+
+pool = GnmiSessionPool()
+
+
+def _call(func, target_addr, options, *args, **kwargs):
+    session = pool.get_session(target_addr, **options)
+    try:
+        return func(session, *args, **kwargs)
+    except GnmiUnavailable:
+        # the channel is broken, connect again on next use
+        pool.drop(session)
+        raise
+
+
+def session_get(target_addr, xpaths, timeout=10, **options):
+    """
+    read the xpaths from the target in one RPC
+    raises GnmiUnavailable when the CLI needs to be used instead
+    """
+    return _call(GnmiSession.get, target_addr, options, xpaths, timeout=timeout)
+
+
+def session_set(target_addr, delete=None, replace=None, update=None, timeout=10, **options):
+    """
+    write to the target in one RPC
+    raises GnmiUnavailable when the CLI needs to be used instead
+    """
+    return _call(GnmiSession.set, target_addr, options, delete=delete, replace=replace,
+                 update=update, timeout=timeout)
@@ -0,0 +1,199 @@
+"""
+Tests of the in-process gNMI client against a stub gNMI server
+
+Skipped when grpc or pygnmi is not installed.
+
+    python -m pytest spytest/spytest/gnmi/test_session.py
+"""
+
+import datetime
+import json
+from concurrent import futures
+
+import pytest
+
+grpc = pytest.importorskip("grpc")
+gnmi_pb2 = pytest.importorskip("pygnmi.spec.v080.gnmi_pb2")
+gnmi_pb2_grpc = pytest.importorskip("pygnmi.spec.v080.gnmi_pb2_grpc")
+
+import spytest.gnmi  # noqa: E402
+from spytest.gnmi import gNMI, session  # noqa: E402
+
+MTU = "/openconfig-interfaces:interfaces/interface[name=Ethernet0]/config/mtu"
+DESCRIPTION = "/openconfig-interfaces:interfaces/interface[name=Eth\\]1]/config/description"
+# path of DESCRIPTION received by the server
+DESCRIPTION_KEY = "/openconfig-interfaces:interfaces/interface[name=Eth]1]/config/description"
+
+
+def _path_str(path):
+    return "".join(["/" + elem.name + "".join(["[{}={}]".format(key, elem.key[key]) for key in sorted(elem.key)])
+                    for elem in path.elem])
+
+
+class StubServicer(gnmi_pb2_grpc.gNMIServicer):
+    """ keeps the JSON values by path, NOT_FOUND for a missing path """
+
+    def __init__(self):
+        self.db = {}
+        self.requests = []
+        self.metadata = []
+
+    def Get(self, request, context):
+        self.metadata.append(dict(context.invocation_metadata()))
+        self.requests.append(("Get", [_path_str(path) for path in request.path]))
+        notifications = []
+        for path in request.path:
+            key = _path_str(path)
+            if key not in self.db:
+                context.abort(grpc.StatusCode.NOT_FOUND, "Resource not found " + key)
+            val = gnmi_pb2.TypedValue(json_ietf_val=self.db[key])
+            notifications.append(gnmi_pb2.Notification(update=[gnmi_pb2.Update(path=path, val=val)]))
+        return gnmi_pb2.GetResponse(notification=notifications)
+
+    def Set(self, request, context):
+        self.requests.append(("Set", len(request.delete), len(request.replace), len(request.update)))
+        results = []
+        for path in request.delete:
+            self.db.pop(_path_str(path), None)
+            results.append(gnmi_pb2.UpdateResult(path=path, op=gnmi_pb2.UpdateResult.DELETE))
+        for op, updates in [(gnmi_pb2.UpdateResult.REPLACE, request.replace),
+                            (gnmi_pb2.UpdateResult.UPDATE, request.update)]:
+            for update in updates:
+                self.db[_path_str(update.path)] = update.val.json_ietf_val
+                results.append(gnmi_pb2.UpdateResult(path=update.path, op=op))
+        return gnmi_pb2.SetResponse(response=results)
+
+
+def _self_signed_cert():
+    x509 = pytest.importorskip("cryptography.x509")
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "stub.gnmi")])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("stub.gnmi")]), False).sign(key, hashes.SHA256())
+    return (key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                              serialization.NoEncryption()),
+            cert.public_bytes(serialization.Encoding.PEM))
+
+
+def _start_server(tls=False):
+    servicer = StubServicer()
+    server = grpc.server(futures.ThreadPoolExecutor(4))
+    gnmi_pb2_grpc.add_gNMIServicer_to_server(servicer, server)
+    if tls:
+        port = server.add_secure_port("127.0.0.1:0", grpc.ssl_server_credentials([_self_signed_cert()]))
+    else:
+        port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    return server, servicer, port
+
+
+@pytest.fixture(autouse=True)
+def session_pool(monkeypatch):
+    monkeypatch.delenv("SPYTEST_GNMI_CLIENT", raising=False)
+    monkeypatch.setenv("SPYTEST_FILE_MODE", "0")
+    pool = session.GnmiSessionPool(size=1)
+    monkeypatch.setattr(session, "pool", pool)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def stub():
+    server, servicer, port = _start_server()
+    servicer.port = port
+    yield servicer
+    server.stop(None)
+
+
+def _client(port, **kwargs):
+    return gNMI().configure(ip="127.0.0.1", port=port, noTls=True, password="secret", **kwargs)
+
+
+def test_split_xpath():
+    assert session.split_xpath("/a/b[name=x]/c") == [("a", {}), ("b", {"name": "x"}), ("c", {})]
+    assert session.split_xpath("/a[k1=v1][k2=v/2]/b") == [("a", {"k1": "v1", "k2": "v/2"}), ("b", {})]
+    assert session.split_xpath("/a[name=Eth\\]1]/b") == [("a", {"name": "Eth]1"}), ("b", {})]
+    assert session.split_xpath("/a[name=x\\\\]") == [("a", {"name": "x\\"})]
+    assert session.split_xpath("/") == []
+
+
+def test_get_set(stub):
+    client = _client(stub.port)
+
+    resp = client.replace(MTU, data={"openconfig-interfaces:mtu": 9100})
+    assert resp.status and resp.operation == "REPLACE" and resp.output == ""
+    resp = client.update(DESCRIPTION, data={"openconfig-interfaces:description": "uplink"})
+    assert resp.status
+    assert sorted(stub.db) == [DESCRIPTION_KEY, MTU]
+
+    ret_val = session.session_get(client.target_addr, [MTU], noTls=True)
+    assert ret_val == {"ok": True, "return": json.dumps({"openconfig-interfaces:mtu": 9100})}
+
+    resp = client.get_multi([MTU, DESCRIPTION])
+    assert resp.status
+    assert resp.output == {"openconfig-interfaces:mtu": 9100, "openconfig-interfaces:description": "uplink"}
+    assert stub.requests[-1] == ("Get", [MTU, DESCRIPTION_KEY])
+    # the credentials are sent in the metadata
+    assert stub.metadata[-1]["username"] == "admin" and stub.metadata[-1]["password"] == "secret"
+
+    resp = client.set_multi(delete=[DESCRIPTION], replace=[(MTU, {"openconfig-interfaces:mtu": 1500})])
+    assert resp.status
+    assert stub.requests[-1] == ("Set", 1, 1, 0)
+    assert sorted(stub.db) == [MTU]
+
+    ret_val = session.session_set(client.target_addr, delete=[MTU], update=[(DESCRIPTION, {"d": "x"})], noTls=True)
+    assert ret_val == {"ok": True, "return": "", "operation": ["DELETE", "UPDATE"]}
+    assert sorted(stub.db) == [DESCRIPTION_KEY]
+
+    # one channel per target and credentials
+    assert len(session.pool.sessions) == 2
+
+
+def test_error_format(stub):
+    ret_val = session.session_get("127.0.0.1:{}".format(stub.port), [MTU], noTls=True)
+    # same message as printed by the gnmi_get CLI
+    assert ret_val == {"ok": False, "errorCode": 1, "message": "Get failed: rpc error: code = NotFound "
+                       "desc = Resource not found /openconfig-interfaces:interfaces/interface[name=Ethernet0]"
+                       "/config/mtu"}
+    resp = _client(stub.port).get_multi([MTU])
+    assert not resp.status
+
+
+def test_tls():
+    server, servicer, port = _start_server(tls=True)
+    try:
+        client = gNMI().configure(ip="127.0.0.1", port=port, password="secret")
+        assert client.replace(MTU, data={"openconfig-interfaces:mtu": 9100}).status
+        assert session.session_get(client.target_addr, [MTU])["ok"]
+    finally:
+        server.stop(None)
+
+
+def test_cli_fallback(monkeypatch):
+    monkeypatch.setattr(session, "connect_timeout", 1)
+    cli_calls = []
+
+    def gnmi_set(param, display=False, encoding=None):
+        cli_calls.append(param)
+        return {"ok": True, "return": "", "operation": "DELETE"}
+
+    monkeypatch.setattr(spytest.gnmi, "_gnmi_set", gnmi_set)
+    # nothing listens on port 1
+    client = _client(1)
+
+    with pytest.raises(session.GnmiUnavailable):
+        session.session_get(client.target_addr, [MTU], noTls=True)
+    assert client._session_get([MTU]) is None
+    resp = client.delete(MTU)
+    assert resp.status and resp.operation == "DELETE"
+    assert cli_calls[0][:4] == ["-delete", MTU, "-target_addr", "127.0.0.1:1"]
+
+    # the CLI is used without trying to connect when asked for
+    monkeypatch.setenv("SPYTEST_GNMI_CLIENT", "cli")
+    assert not session.is_enabled()
+    assert client._session_set(delete=[MTU]) is None
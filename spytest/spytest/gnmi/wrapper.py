@@ -75,8 +75,20 @@ def yamlParser(src):
     return yaml.load(src, ctLoader)
 
 
+def _sessionSend(func, target_addr, inSecure, *args, **kwargs):
+    # in-process client, None when the CLI needs to be used
+    from spytest.gnmi.session import GnmiUnavailable, is_enabled
+    if os.getenv("SPYTEST_FILE_MODE", "0") != "0" or not is_enabled():
+        return None
+    try:
+        return func(target_addr, *args, inSecure=inSecure, **kwargs)
+    except GnmiUnavailable:
+        return None
+
+
 def gnmiSend(action="GET", xpath="", target_addr="", inSecure=True, encoding=None, parameters=""):
     from apis.gnmi.gnmi_utils import SanitizePathPayload
+    from spytest.gnmi.session import session_get
     ret_val = ""
     if (action == "GET"):
         if encoding:
@@ -84,6 +96,10 @@ def gnmiSend(action="GET", xpath="", target_addr="", inSecure=True, encoding=Non
             if new_path != xpath:
                 print("GNMI GET with Encoding Path/Data changed:\n... From path='{}'\n...   To path='{}'".format(xpath, new_path))
             xpath = new_path
+        elif parameters == "":
+            ret_val = _sessionSend(session_get, target_addr, inSecure, [xpath])
+            if ret_val is not None:
+                return ret_val
         param = ['-xpath', xpath, "-alsologtostderr"]
         if target_addr != "":
             param.extend(['-target_addr', target_addr])
@@ -219,11 +235,15 @@ def gnmiCreateJsonFile(data={}, dut_name="sgnmi"):
 
 
 def gnmiReplaceData(data, path, target, dut_name="sgnmi", parameters=""):
+    from spytest.gnmi.session import session_set
     success = False
-    json_file_path = gnmiCreateJsonFile(data, dut_name)
-    jpath = path + ":@" + json_file_path
-
-    val = gnmiSend(action="REPLACE", xpath=jpath, target_addr=target, parameters=parameters)
+    val = None
+    if parameters == "":
+        val = _sessionSend(session_set, target, True, replace=[(path, data)])
+    if val is None:
+        json_file_path = gnmiCreateJsonFile(data, dut_name)
+        jpath = path + ":@" + json_file_path
+        val = gnmiSend(action="REPLACE", xpath=jpath, target_addr=target, parameters=parameters)
     if val["ok"]:
         success = True
     return success
@@ -0,0 +1,114 @@
+"""
+Tests of the planning of the modules to the batch workers
+
+    cd spytest && python -m pytest spytest/test_batch_plan.py
+"""
+
+import pytest
+
+pytest.importorskip("tabulate")
+
+from spytest import batch_plan  # noqa: E402
+from spytest.batch_plan import read_duration_history, estimate_durations, lpt_plan, makespan  # noqa: E402
+
+
+def _write(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_read_duration_history(tmp_path):
+    _write(tmp_path / "run1_modules.csv", ["Module Name,Exec Time,Result",
+                                           "bgp/test_bgp.py,0:10:00,Pass",
+                                           "vlan/test_vlan.py,120,Pass"])
+    _write(tmp_path / "run2_modules.csv", ["Module Name,Exec Time,Result",
+                                           "bgp/test_bgp.py,00:20:00.500,Pass"])
+    # functions report of another run, times of the functions add up per module
+    functions = _write(tmp_path / "run3_functions.csv", ["Module,Function,TimeTaken",
+                                                         "vlan/test_vlan.py,test_a,100",
+                                                         "vlan/test_vlan.py,test_b,80.5"])
+
+    history = read_duration_history([str(tmp_path), functions])
+
+    assert history == {"bgp/test_bgp.py": 900, "vlan/test_vlan.py": 150.25}
+
+
+def test_read_duration_history_malformed(tmp_path):
+    errors = []
+    good = _write(tmp_path / "good_modules.csv", ["Module Name,Exec Time",
+                                                  "bgp/test_bgp.py,60",
+                                                  "short_row",
+                                                  ",30",
+                                                  "vlan/test_vlan.py,not-a-time",
+                                                  "acl/test_acl.py,1:2"])
+    no_columns = _write(tmp_path / "other_modules.csv", ["Name,Time", "bgp/test_bgp.py,1000"])
+    empty = _write(tmp_path / "empty_modules.csv", [])
+    binary = tmp_path / "binary_modules.csv"
+    binary.write_bytes(b"\xff\xfe\x00garbage\x00\n\x80\x81")
+
+    history = read_duration_history([good, no_columns, empty, str(binary), str(tmp_path / "missing.csv"), " "],
+                                    printerr=errors.append)
+
+    assert history == {"bgp/test_bgp.py": 60, "vlan/test_vlan.py": 0, "acl/test_acl.py": 0}
+    assert "No module execution times in {}".format(no_columns) in errors
+
+
+def test_estimate_durations():
+    history = {"bgp/test_bgp.py": 300, "vlan/test_vlan.py": 100, "acl/test_acl.py": 200, "unused.py": 5000}
+
+    durations = estimate_durations(history, ["bgp/test_bgp.py", "vlan/test_vlan.py", "acl/test_acl.py",
+                                             "new/test_new.py", "/path/to/vlan/test_vlan.py"])
+
+    # modules without history take the median of the modules with history
+    assert durations == {"bgp/test_bgp.py": 300, "vlan/test_vlan.py": 100, "acl/test_acl.py": 200,
+                         "new/test_new.py": 200, "/path/to/vlan/test_vlan.py": 200}
+
+    # looked up by the base name too
+    assert estimate_durations({"test_vlan.py": 70}, ["vlan/test_vlan.py", "new/test_new.py"]) == \
+        {"vlan/test_vlan.py": 70, "new/test_new.py": 70}
+
+
+def test_estimate_durations_no_history():
+    default = batch_plan.default_module_time
+    assert estimate_durations({}, ["a.py", "b.py"]) == {"a.py": default, "b.py": default}
+    assert estimate_durations({"other.py": 10}, []) == {}
+
+
+def test_lpt_plan():
+    durations = {"a.py": 70, "b.py": 60, "c.py": 50, "d.py": 40, "e.py": 30, "f.py": 10}
+    workers = ["w1", "w2", "w3"]
+    candidates = {mname: workers for mname in durations}
+
+    plan, loads = lpt_plan(durations, candidates)
+
+    # longest first, each to the least loaded worker
+    assert plan == {"w1": ["a.py", "f.py"], "w2": ["b.py", "e.py"], "w3": ["c.py", "d.py"]}
+    assert loads == {"w1": 80, "w2": 90, "w3": 90}
+    assert makespan(loads) == 90
+
+
+def test_lpt_plan_candidates_and_loads():
+    durations = {"a.py": 100, "b.py": 50, "c.py": 50, "d.py": 20, "e.py": 10}
+    candidates = {"a.py": ["w1", "w2"], "b.py": ["w2"], "c.py": ["w1", "w2", "w3"], "d.py": ["w3"], "e.py": []}
+
+    plan, loads = lpt_plan(durations, candidates, loads={"w1": 200})
+
+    # modules are only planned to their candidate workers, the ones without candidates are not planned
+    assert plan == {"w2": ["a.py", "b.py"], "w3": ["c.py", "d.py"]}
+    assert loads == {"w1": 200, "w2": 150, "w3": 70}
+
+
+def test_lpt_plan_ranks():
+    durations = {"a.py": 10, "b.py": 100, "c.py": 50, "d.py": 30}
+    candidates = {mname: ["w1", "w2"] for mname in durations}
+
+    plan, loads = lpt_plan(durations, candidates, ranks={"a.py": -1, "b.py": 1})
+
+    # lower ranks first, default rank 0, LPT within each rank
+    assert plan == {"w1": ["a.py", "d.py", "b.py"], "w2": ["c.py"]}
+    assert loads == {"w1": 140, "w2": 50}
+
+
+def test_makespan_empty():
+    assert lpt_plan({}, {}) == ({}, {})
+    assert makespan({}) == 0
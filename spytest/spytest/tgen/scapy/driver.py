@@ -149,6 +149,7 @@ class ScapyDriver(object):
         pktlen = 0 if not packet else len(packet)
         framesReceived = self.port.incrStat('framesReceived')
         self.port.incrStat('bytesReceived', pktlen)
+        self.port.rx_rate.add()
         if self.dbg > 2:
             self.logger.debug("{} framesReceived: {}".format(self.iface, framesReceived))
         if pktlen > 1518:
@@ -417,6 +418,7 @@ class ScapyDriver(object):
                     # increment port counters
                     framesSent = self.port.incrStat('framesSent')
                     self.port.incrStat('bytesSent', bytesSent)
+                    self.port.tx_rate.add(1, send_start_time)
                     if self.dbg > 2:
                         self.logger.debug("{} framesSent: {}".format(self.iface, framesSent))
                     pwa.stream.incrStat('framesSent')
@@ -444,6 +446,8 @@ class ScapyDriver(object):
                     pwa_next.tx_time = self.utils.clock() + ipg - build_time - send_time
                     pwa_next_list.append(pwa_next)
             pwa_list = pwa_next_list
+            self.packet.flush()
+        self.packet.flush()
         self.logger.debug("{} {} Completed {}".format(func, self.iface, tx_count))
 
     def pwa_sort(self, pwa):
@@ -453,7 +457,10 @@ class ScapyDriver(object):
         delay = pwa.tx_time - self.utils.clock()
         if self.dbg > 2 or (self.dbg > 1 and pwa.left != 0):
             self.logger.debug("stream: {} delay: {} pps: {}".format(pwa.stream.stream_id, delay, pwa.rate_pps))
-        delay = 0 if delay < 0 else delay
+        if delay <= 0:
+            return
+        # send the frames queued in the TX ring before waiting
+        self.packet.flush()
         if delay > 1.0 / 10:
             self.utils.msleep(delay * 1000, 10)
         elif delay > 1.0 / 100:
@@ -3,10 +3,12 @@ import zlib
 import time
 import copy
 import random
+import struct
 import binascii
 import socket
 import afpacket
 import traceback
+from collections import deque
 
 from scapy.all import hexdump, sendp
 try:
@@ -31,6 +33,8 @@ from interface import PacketInterface
 from bgp_exabgp import ExaBgp
 from dot1x import Dot1x
 from dhcps import Dhcps
+from ring import RxRing, TxRing
+from stream_compiler import compile_stream
 
 try:
     print("SCAPY VERSION = {}".format(Conf().version))
@@ -151,6 +155,14 @@ class ScapyPacket(object):
         self.rx_sock = None
         self.tx_sock = None
         self.tx_sock_failed = False
+        # PACKET_MMAP rings, see ring.py
+        self.use_ring = bool(os.getenv("SPYTEST_SCAPY_USE_RING", "0") != "0")
+        self.rx_ring = None
+        self.tx_ring = None
+        self.rx_frames = deque()
+        # generate the stream frames from precompiled templates, see stream_compiler.py
+        self.use_compiler = bool(os.getenv("SPYTEST_SCAPY_COMPILE_STREAMS", "1") != "0")
+        self.precompute_bytes = self.utils.get_env_int("SPYTEST_SCAPY_PRECOMPUTE_BYTES", 4 * 1024 * 1024)
         self.finished = False
         self.mtu = 9194
         self.use_bridge = bool(os.getenv("SPYTEST_SCAPY_USE_BRIDGE", "1") != "0")
@@ -263,6 +275,9 @@ class ScapyPacket(object):
         self.finished = True
         self.rx_sock = self.close_sock(self.rx_sock)
         self.tx_sock = self.close_sock(self.tx_sock)
+        self.rx_ring = self.close_sock(self.rx_ring)
+        self.tx_ring = self.close_sock(self.tx_ring)
+        self.rx_frames.clear()
         self.tx_sock_failed = False
         self.init_bridge(self.iface)
         self.finished = False
@@ -270,6 +285,15 @@ class ScapyPacket(object):
     def rx_open(self):
         if not self.iface or self.dry:
             return
+        if self.use_ring:
+            try:
+                self.rx_ring = RxRing(self.iface + "-rx")
+                self.tx_ring = TxRing(self.iface)
+                self.logger.info("using PACKET_MMAP rings on {}".format(self.iface))
+                return
+            except Exception as exp:
+                self.error("Failed to create PACKET_MMAP rings {} {}".format(self.iface, exp))
+                self.rx_ring = self.close_sock(self.rx_ring)
         ETH_P_ALL = 3
         self.rx_sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
         self.rx_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 12 * 1024)
@@ -297,17 +321,28 @@ class ScapyPacket(object):
             return None
 
         try:
-            data = afpacket.recv(self.rx_sock, 12 * 1024)
+            if self.rx_ring:
+                if not self.rx_frames:
+                    self.rx_frames.extend(self.rx_ring.recv())
+                    if not self.rx_frames:
+                        return None
+                data = self.rx_frames.popleft()
+            else:
+                data = afpacket.recv(self.rx_sock, 12 * 1024)
         except Exception as exp:
             if self.finished:
                 return None
             raise exp
-        packet = Ether(data)
         self.stats_lock.acquire()
         self.rx_count = self.rx_count + 1
         self.stats_lock.release()
         self.trace_stats()
 
+        # stream matching works on the bytes, dissect only for protocol handlers and traces
+        packet = data
+        if self.show_summary or self.dbg > 3 or self.pp.needs_dissect(data):
+            packet = Ether(data)
+
         if self.dbg > 1:
             cmd = "" if not self.show_summary else packet.command()
             msg = "readp:{} len:{} count:{} {}".format
@@ -317,25 +352,28 @@ class ScapyPacket(object):
             self.trace_packet(packet, self.hex)
 
         # handle protocol packets
-        self.pp.process(port, packet)
+        if packet is data:
+            self.pp.process_periodic(port)
+        else:
+            self.pp.process(port, packet)
 
         return packet
 
-    def sendp(self, pkt, data, iface, stream_name, left):
+    def sendp(self, pkt, data, iface, stream_name, left, flush=True):
         self.stats_lock.acquire()
         self.tx_count = self.tx_count + 1
         self.stats_lock.release()
         self.trace_stats()
 
         if self.dbg > 2 or (self.dbg > 1 and left != 0):
-            cmd = "" if not self.show_summary else pkt.command()
+            cmd = "" if not self.show_summary else self.mkcmd(data)
             msg = "sendp:{}:{} len:{} count:{} {}".format
             self.logger.debug(msg(iface, stream_name, len(data), self.tx_count, cmd))
 
         if self.dbg > 3:
-            self.trace_packet(pkt, self.hex)
+            self.trace_packet(pkt or data, self.hex)
 
-        return self.send(data, iface)
+        return self.send(data, iface, flush=flush)
 
     def mkcmd(self, data):
         try:
@@ -349,7 +387,7 @@ class ScapyPacket(object):
         cmd = self.mkcmd(data)
         return "{}:{} len:{} {} {}".format(func, iface, len(data), cmd, str(exp))
 
-    def send(self, data, iface, trace=False):
+    def send(self, data, iface, trace=False, flush=True):
 
         if trace and self.dbg > 2:
             cmd = self.mkcmd(data)
@@ -359,6 +397,15 @@ class ScapyPacket(object):
         if self.dry:
             return
 
+        # queue in the TX ring, the frames are sent in batches
+        if self.tx_ring and iface == self.iface:
+            try:
+                rv = self.tx_ring.send(self.utils.tobytes(data), flush)
+                if rv is not None:
+                    return rv
+            except Exception as exp:
+                self.logger.error("Failed to send ring {}".format(self.expmsg(data, iface, exp, "ring-send")))
+
         if not self.tx_sock:
             try:
                 self.tx_sock = L2Socket(iface)
@@ -389,6 +436,13 @@ class ScapyPacket(object):
         self.logger.error("Failed to send normal {}".format(err1))
         self.logger.error("Failed to send legacy {}".format(err2))
 
+    def flush(self):
+        if self.tx_ring:
+            try:
+                self.tx_ring.flush()
+            except Exception as exp:
+                self.logger.error("Failed to flush ring {} {}".format(self.iface, exp))
+
     def trace_stats(self):
         # self.logger.debug("Name: {} RX: {} TX: {}".format(self.iface, self.rx_count, self.tx_count))
         pass
@@ -406,7 +460,7 @@ class ScapyPacket(object):
     def trace_packet(self, pkt, hex=True, fields=True, force=False):
         if not fields and not hex:
             return
-        if isinstance(pkt, str):
+        if isinstance(pkt, (str, bytes)):
             pkt = Ether(pkt)
         if fields:
             self.show_pkt(pkt, force)
@@ -414,6 +468,15 @@ class ScapyPacket(object):
             self.logger.debug(hexdump(pkt, dump=True))
 
     def send_packet(self, pwa, iface, stream_name, left):
+        if pwa.compiled:
+            sid = None
+            if pwa.add_signature:
+                sid = binascii.unhexlify(pwa.stream.get_sid() or "DeadBeef")
+            cache = bool(pwa.length_mode == "fixed")
+            bstr = pwa.compiled.frame(pwa.pkt_index, pwa.pad_len, sid, cache)
+            self.sendp(None, bstr, iface, stream_name, left, flush=False)
+            return bstr
+
         if pwa.padding:
             strpkt = self.utils.tobytes(pwa.pkt / pwa.padding)
         else:
@@ -428,12 +491,11 @@ class ScapyPacket(object):
                 strpkt = strpkt[:-len(sid)] + sid
 
         try:
-            crc1 = '{:08x}'.format(socket.htonl(zlib.crc32(strpkt) & 0xFFFFFFFF))
-            crc = binascii.unhexlify(crc1)
+            crc = struct.pack("!I", socket.htonl(zlib.crc32(strpkt) & 0xFFFFFFFF))
         except Exception:
-            crc = binascii.unhexlify('00' * 4)
-        bstr = strpkt + self.utils.tobytes(crc)
-        self.sendp(Ether(bstr), bstr, iface, stream_name, left)
+            crc = b"\x00" * 4
+        bstr = strpkt + crc
+        self.sendp(None, bstr, iface, stream_name, left, flush=False)
         return bstr
 
     def check(self, pkt):
@@ -914,21 +976,34 @@ class ScapyPacket(object):
         pwa.frame_size_min = frame_size_min
         pwa.frame_size_max = frame_size_max
         pwa.frame_size_step = frame_size_step
+        pwa.pkt_len = len(pkt)
+        pwa.pkt_index = 0
+        pwa.compiled = self.compile_stream(pwa)
         self.add_padding(pwa, True)
 
         return pwa
 
+    def compile_stream(self, pwa):
+        if not self.use_compiler:
+            return None
+        try:
+            return compile_stream(pwa.pkt, pwa.stream.kws, self.precompute_bytes)
+        except Exception as exp:
+            self.logger.debug("stream {} not compiled: {}".format(pwa.stream.stream_id, exp))
+        return None
+
     def add_padding(self, pwa, first):
         pwa.padding = None
+        pwa.pad_len = 0
         if pwa.length_mode == "random":
-            pktLen = len(pwa.pkt)
+            pktLen = pwa.pkt_len
             frame_size = random.randrange(pwa.frame_size_min, pwa.frame_size_max + 1)
             padLen = int(frame_size - pktLen - 4)
             if padLen > 0:
-                pwa.padding = Padding(binascii.unhexlify('00' * padLen))
+                pwa.pad_len = padLen
                 pwa.add_signature = True
         elif pwa.length_mode in ["increment", "incr"]:
-            pktLen = len(pwa.pkt)
+            pktLen = pwa.pkt_len
             if first:
                 frame_size = pwa.frame_size_min
             else:
@@ -939,11 +1014,19 @@ class ScapyPacket(object):
                 pwa.frame_size_current = frame_size
             padLen = int(pwa.frame_size_current - pktLen - 4)
             if padLen > 0:
-                pwa.padding = Padding(binascii.unhexlify('00' * padLen))
+                pwa.pad_len = padLen
                 pwa.add_signature = True
+        if pwa.pad_len and not pwa.compiled:
+            pwa.padding = Padding(binascii.unhexlify('00' * pwa.pad_len))
 
     def build_next_dma(self, pwa):
 
+        # the compiled stream computes the fields from the packet index
+        if pwa.compiled:
+            pwa.pkt_index = pwa.pkt_index + 1
+            self.add_padding(pwa, False)
+            return pwa
+
         # Change Ether SRC MAC
         mac_src_mode = pwa.stream.kws.get("mac_src_mode", "fixed").strip()
         mac_src_step = pwa.stream.kws.get("mac_src_step", "00:00:00:00:00:01")
@@ -7,6 +7,7 @@ from logger import Logger
 from utils import Utils
 from lock import Lock
 from stats import port_stats_init
+from stats import RateMeter
 
 
 def incrStat(stats, name, val=1):
@@ -194,6 +195,8 @@ class ScapyPort(object):
         self.track_streams = []
         self.interfaces = SpyTestDict()
         self.stats = port_stats_init()
+        self.tx_rate = RateMeter()
+        self.rx_rate = RateMeter()
         self.driver = ScapyDriver(self, self.dry, self.dbg, self.logger)
         self.admin_status = True
         self.dhcp_clients = SpyTestDict()
@@ -305,6 +308,8 @@ class ScapyPort(object):
     def getStats(self):
         self.stats_lock.acquire()
         rv = self.stats
+        rv.framesSentRate = self.tx_rate.rate()
+        rv.framesReceivedRate = self.rx_rate.rate()
         self.stats_lock.release()
         return rv
 
@@ -334,6 +339,8 @@ class ScapyPort(object):
         elif action == "clear_stats":
             self.stats_lock.acquire()
             port_stats_init(self.stats)
+            self.tx_rate.reset()
+            self.rx_rate.reset()
             for stream in self.streams.values():
                 port_stats_init(stream.stats)
             self.stats_lock.release()
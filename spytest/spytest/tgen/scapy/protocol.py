@@ -46,9 +46,40 @@ class PacketProtocol(object):
         if EAP in pkt:
             self.dot1x_rx(port, pkt)
 
+        self.process_periodic(port)
+
+    def process_periodic(self, port):
         self.igmp_tx_query_periodic(port)
         self.dot1x_tx_periodic(port)
 
+    def needs_dissect(self, data):
+        """
+        Check from the frame bytes if process needs the dissected packet:
+        EAPOL, OSPF, IGMP and BOOTP over IPv4, behind any number of VLAN tags.
+        """
+        data, offset, ether_type = bytearray(data), 12, 0x8100
+        while ether_type in (0x8100, 0x88a8, 0x9100):
+            if len(data) < offset + 2:
+                return False
+            ether_type = (data[offset] << 8) | data[offset + 1]
+            offset = offset + 4
+        offset = offset - 4
+        if ether_type == 0x888e:
+            return True
+        if ether_type != 0x0800:
+            return False
+        ip = data[offset + 2:offset + 22]
+        if len(ip) < 20:
+            return False
+        if ip[9] in (2, 89):
+            return True
+        if ip[9] != 17:
+            return False
+        udp = data[offset + 2 + (ip[0] & 0x0f) * 4:][:4]
+        if len(udp) < 4:
+            return False
+        return ((udp[0] << 8) | udp[1]) in (67, 68) or ((udp[2] << 8) | udp[3]) in (67, 68)
+
     def pkt_write(self, file_path, pkt, append):
         try:
             self.logger.write_pcap(pkt, append=True, filename=file_path)
@@ -874,17 +874,16 @@ class ScapyServer(object):
     def fill_stats(self, res, tx_stats, rx_stats, detailed=False, port=None, stream=None):
         if tx_stats:
             res["tx"] = SpyTestDict()
-            # TODO compute the total_pkt_rate
-            res["tx"]["total_pkt_rate"] = self.stat_value(1, detailed)
+            res["tx"]["total_pkt_rate"] = self.stat_value(tx_stats.get("framesSentRate") or 1, detailed)
             res["tx"]["raw_pkt_count"] = self.stat_value(tx_stats.framesSent, detailed)
             res["tx"]["pkt_byte_count"] = self.stat_value(tx_stats.bytesSent, detailed)
             res["tx"]["total_pkts"] = self.stat_value(tx_stats.framesSent, detailed)
             res["tx"]["name"] = stream.stream_id if stream else ""
         if rx_stats:
             res["rx"] = SpyTestDict()
-            # TODO compute the raw_pkt_rate
-            res["rx"]["total_pkt_rate"] = self.stat_value(1, detailed)
-            res["rx"]["raw_pkt_rate"] = self.stat_value(1, detailed)
+            rx_rate = rx_stats.get("framesReceivedRate") or 1
+            res["rx"]["total_pkt_rate"] = self.stat_value(rx_rate, detailed)
+            res["rx"]["raw_pkt_rate"] = self.stat_value(rx_rate, detailed)
             res["rx"]["raw_pkt_count"] = self.stat_value(rx_stats.framesReceived, detailed)
             res["rx"]["pkt_byte_count"] = self.stat_value(rx_stats.bytesReceived, detailed)
             res["rx"]["total_pkts"] = self.stat_value(rx_stats.framesReceived, detailed)
@@ -1,6 +1,46 @@
+import time
+
 from dicts import SpyTestDict
 
 
+class RateMeter(object):
+    """
+    Measure the rate of frames over the current period of activity,
+    which ends when no frame was counted for idle seconds, the rate
+    is 0 until a new period starts.
+    """
+
+    def __init__(self, idle=1.0):
+        self.idle = idle
+        self.reset()
+
+    def reset(self):
+        self.first_time = 0
+        self.last_time = 0
+        self.first_count = 0
+        self.count = 0
+
+    def add(self, count=1, now=None):
+        now = now or time.time()
+        if now - self.last_time > self.idle:
+            self.first_time = now
+            self.first_count = count
+            self.count = 0
+        self.count = self.count + count
+        self.last_time = now
+
+    def rate(self, now=None):
+        # no frame counted for idle seconds, the period of activity is over
+        now = now or time.time()
+        if now - self.last_time > self.idle:
+            return 0
+        # the frames counted at the start of the period were sent before it
+        elapsed = self.last_time - self.first_time
+        if elapsed <= 0:
+            return 0
+        return int((self.count - self.first_count) / elapsed)
+
+
 def port_stats_init(stats=None):
     stats = stats or SpyTestDict()
     stats.clear()
@@ -8,6 +48,8 @@ def port_stats_init(stats=None):
     stats.bytesSent = 0
     stats.framesReceived = 0
     stats.bytesReceived = 0
+    stats.framesSentRate = 0
+    stats.framesReceivedRate = 0
     stats.oversizeFramesReceived = 0
     stats.userDefinedStat1 = 0
     stats.userDefinedStat2 = 0
@@ -0,0 +1,376 @@
+"""
+Stream compiler
+
+Turns the field modifiers of a stream (mac_src_mode, ip_dst_mode, vlan_id_mode,
+tcp_src_port_mode ...) into byte offsets in the frame built by build_first and
+computes the value of every modified field for the n-th packet directly, the
+same way build_next_dma updates the scapy packet. The frames are produced by
+patching the template bytes, the IPv4 header and L4 checksums are updated
+incrementally from the template checksums.
+
+When all the modifiers cycle, the distinct frames are precomputed once and
+reused for the following packets.
+"""
+
+import socket
+import struct
+import zlib
+
+from scapy.layers.l2 import Ether, Dot1Q, ARP
+from scapy.layers.inet import IP, UDP, TCP
+from scapy.layers.inet6 import IPv6
+
+from utils import Utils
+
+pack_u16 = struct.Struct("!H").pack
+pack_u32 = struct.Struct("!I").pack
+
+
+class UnsupportedStream(Exception):
+    pass
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def _lcm(a, b):
+    return a * b // _gcd(a, b)
+
+
+def _from_bytes(data):
+    value = 0
+    for ch in bytearray(data):
+        value = (value << 8) | ch
+    return value
+
+
+def _to_bytes(value, size):
+    if size == 2:
+        return pack_u16(value)
+    if size == 4:
+        return pack_u32(value)
+    if size == 6:
+        return struct.pack("!HI", value >> 32, value & 0xFFFFFFFF)
+    return struct.pack("!QQ", value >> 64, value & 0xFFFFFFFFFFFFFFFF)
+
+
+def _word_sum(value):
+    total = 0
+    while value:
+        total = total + (value & 0xFFFF)
+        value = value >> 16
+    return total
+
+
+def _mac2int(mac):
+    return int(mac.replace(':', '').replace(".", ''), 16)
+
+
+def _ipv42int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def _ipv62int(ip):
+    return _from_bytes(socket.inet_pton(socket.AF_INET6, ip))
+
+
+class Field(object):
+    """
+    Header field changed by a stream modifier.
+
+    The n-th packet carries the template value when n is 0, else the value
+    from the list for list mode, else the previous value plus step, restarting
+    from reset every count packets. When base is given the value is computed
+    from the base field value of the same packet instead of its own previous
+    value, which is what build_next_dma does for the L4 destination ports.
+    """
+
+    def __init__(self, name, offset, size, initial, step=0, count=0, reset=None,
+                 values=None, base=None, mask=None, keep=0):
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.initial = initial
+        self.step = step
+        self.count = count
+        self.reset = initial if reset is None else reset
+        self.values = values
+        self.base = base
+        self.mask = mask if mask is not None else (1 << (size * 8)) - 1
+        self.keep = keep
+
+    def value(self, n):
+        if n == 0:
+            return self.initial
+        if self.values:
+            return self.values[n % len(self.values)]
+        if self.count > 0:
+            index = n % self.count
+            if index == 0:
+                return self.reset
+        else:
+            index = n
+        if self.base:
+            return (self.base.value(n) + self.step) & self.mask
+        start = self.initial if self.count <= 0 or n < self.count else self.reset
+        return (start + index * self.step) & self.mask
+
+    def period(self):
+        """ (packets after which the values repeat, first packet of the repetition) """
+        if self.values:
+            return len(self.values), 0
+        if self.base:
+            period, warmup = self.base.period()
+            if period is None:
+                return None, None
+            if self.count > 0:
+                period = _lcm(period, self.count)
+            return period, max(warmup, 1)
+        if self.count > 0:
+            return self.count, 0 if self.reset == self.initial else self.count
+        if self.step == 0:
+            return 1, 0
+        return None, None
+
+    def pack(self, value):
+        return _to_bytes(self.keep | value, self.size)
+
+
+class Checksum(object):
+    """ 16 bit ones complement checksum depending on some of the modified fields """
+
+    def __init__(self, offset, value, fields, udp=False):
+        self.offset = offset
+        self.fields = fields
+        self.udp = udp
+        # ones complement sum of the template, with the template values of the fields removed
+        self.base = (~value & 0xFFFF) - sum([_word_sum(field.initial) for field in fields])
+
+    def value(self, values):
+        total = self.base
+        for field in self.fields:
+            total = total + _word_sum(values[field.name])
+        total = total % 0xFFFF or 0xFFFF
+        checksum = ~total & 0xFFFF
+        if checksum == 0 and self.udp:
+            checksum = 0xFFFF
+        return checksum
+
+
+class CompiledStream(object):
+
+    def __init__(self, template, fields, checksums, precompute_bytes=0):
+        self.template = bytearray(template)
+        self.fields = fields
+        self.checksums = checksums
+        self.table = None
+        self.period = 0
+        self.warmup = 0
+        self.finished = None
+        self.finished_key = None
+        self.precompute_bytes = precompute_bytes
+        self.precompute()
+
+    def precompute(self):
+        period, warmup = 1, 0
+        for field in self.fields:
+            field_period, field_warmup = field.period()
+            if field_period is None:
+                return
+            period = _lcm(period, field_period)
+            warmup = max(warmup, field_warmup)
+        if (period + warmup) * len(self.template) > self.precompute_bytes:
+            return
+        self.period, self.warmup = period, warmup
+        self.table = [self.build(n) for n in range(period + warmup)]
+
+    def build(self, n):
+        """ build the bytes of the n-th packet of the stream """
+        if not self.fields:
+            return bytes(self.template)
+        frame = bytearray(self.template)
+        values = {}
+        for field in self.fields:
+            value = field.value(n)
+            values[field.name] = value
+            frame[field.offset:field.offset + field.size] = field.pack(value)
+        for checksum in self.checksums:
+            frame[checksum.offset:checksum.offset + 2] = pack_u16(checksum.value(values))
+        return bytes(frame)
+
+    def frame(self, n, pad_len=0, sid=None, cache=False):
+        """
+        get the n-th frame of the stream with pad_len padding bytes,
+        the signature and the CRC like ScapyPacket.send_packet
+        """
+        if self.table is None:
+            return self.finish(self.build(n), pad_len, sid)
+        if n >= len(self.table):
+            n = self.warmup + (n - self.warmup) % self.period
+        if not cache:
+            return self.finish(self.table[n], pad_len, sid)
+        if self.finished_key != (pad_len, sid):
+            self.finished_key = (pad_len, sid)
+            self.finished = [None] * len(self.table)
+            if len(self.table) * (len(self.template) + pad_len) > self.precompute_bytes:
+                self.finished = None
+        if self.finished is None:
+            return self.finish(self.table[n], pad_len, sid)
+        data = self.finished[n]
+        if data is None:
+            data = self.finish(self.table[n], pad_len, sid)
+            self.finished[n] = data
+        return data
+
+    @staticmethod
+    def finish(data, pad_len, sid):
+        if pad_len > 0:
+            data = data + b"\x00" * pad_len
+        if sid:
+            data = data[:-len(sid)] + sid
+        return data + pack_u32(socket.htonl(zlib.crc32(data) & 0xFFFFFFFF))
+
+
+def _layer_offset(pkt, data, layer):
+    return len(data) - len(bytes(pkt[layer]))
+
+
+def _mode(kws, prop, modes):
+    mode = kws.get(prop, "fixed").strip()
+    if mode == "fixed":
+        return None
+    if mode not in modes:
+        raise UnsupportedStream("unhandled option {} = {}".format(prop, mode))
+    return mode
+
+
+def _address_field(kws, name, offset, size, initial, to_int, step_to_int, default_step, default_reset):
+    mode = _mode(kws, name + "_mode", ["increment", "decrement"])
+    if not mode:
+        return None
+    step = step_to_int(kws.get(name + "_step", default_step))
+    if mode == "decrement":
+        step = -step
+    count = Utils.intval(kws, name + "_count", 0)
+    reset = to_int(kws.get(name + "_addr", default_reset))
+    return Field(name, offset, size, initial, step, count, reset)
+
+
+def _mac_field(kws, name, offset, initial):
+    mode = _mode(kws, name + "_mode", ["increment", "decrement", "list"])
+    if not mode:
+        return None
+    if mode == "list":
+        return Field(name, offset, 6, initial, values=[_mac2int(mac) for mac in kws[name]])
+    step = _mac2int(kws.get(name + "_step", "00:00:00:00:00:01"))
+    if mode == "decrement":
+        step = -step
+    count = Utils.intval(kws, name + "_count", 0)
+    return Field(name, offset, 6, initial, step, count, _mac2int(kws[name][0]))
+
+
+def _port_fields(kws, proto, offset, data):
+    modes = ["increment", "decrement", "incr", "decr"]
+    sport = _from_bytes(data[offset:offset + 2])
+    dport = _from_bytes(data[offset + 2:offset + 4])
+    fields = []
+    src_mode = _mode(kws, proto + "_src_port_mode", modes)
+    src = Field(proto + "_src_port", offset, 2, sport)
+    if src_mode:
+        src.step = Utils.intval(kws, proto + "_src_port_step", 1)
+        if src_mode in ["decrement", "decr"]:
+            src.step = -src.step
+        src.count = Utils.intval(kws, proto + "_src_port_count", 0)
+        src.reset = Utils.intval(kws, proto + "_src_port", 0)
+        fields.append(src)
+    dst_mode = _mode(kws, proto + "_dst_port_mode", modes)
+    if dst_mode:
+        # build_next_dma steps the destination port from the source port
+        step = Utils.intval(kws, proto + "_dst_port_step", 1)
+        if dst_mode in ["decrement", "decr"]:
+            step = -step
+        count = Utils.intval(kws, proto + "_dst_port_count", 0)
+        reset = Utils.intval(kws, proto + "_dst_port", 0)
+        fields.append(Field(proto + "_dst_port", offset + 2, 2, dport, step, count, reset, base=src))
+    return fields
+
+
+def compile_stream(pkt, kws, precompute_bytes=0):
+    """
+    compile the modifiers in the stream kws for the packet built by build_first
+    raises UnsupportedStream when the stream needs build_next_dma
+    """
+    data = bytes(pkt)
+    fields = []
+
+    def add(field):
+        if field:
+            fields.append(field)
+        return field
+
+    def initial(offset, size):
+        return _from_bytes(data[offset:offset + size])
+
+    if not isinstance(pkt, Ether):
+        raise UnsupportedStream("not an ethernet frame")
+    add(_mac_field(kws, "mac_src", 6, initial(6, 6)))
+    add(_mac_field(kws, "mac_dst", 0, initial(0, 6)))
+
+    if ARP in pkt:
+        offset = _layer_offset(pkt, data, ARP)
+        add(_address_field(kws, "arp_src_hw", offset + 8, 6, initial(offset + 8, 6), _mac2int, _mac2int,
+                           "00:00:00:00:00:01", "00:00:01:00:00:02"))
+        add(_address_field(kws, "arp_dst_hw", offset + 18, 6, initial(offset + 18, 6), _mac2int, _mac2int,
+                           "00:00:00:00:00:01", "00:00:00:00:00:00"))
+
+    addresses, ip_checksums = [], []
+    if IP in pkt:
+        offset = _layer_offset(pkt, data, IP)
+        addresses.append(add(_address_field(kws, "ip_src", offset + 12, 4, initial(offset + 12, 4),
+                                            _ipv42int, _ipv42int, "0.0.0.1", "0.0.0.0")))
+        addresses.append(add(_address_field(kws, "ip_dst", offset + 16, 4, initial(offset + 16, 4),
+                                            _ipv42int, _ipv42int, "0.0.0.1", "192.0.0.1")))
+        if pkt[IP].chksum is None:
+            ip_checksums.append(Checksum(offset + 10, initial(offset + 10, 2), [f for f in addresses if f]))
+
+    if IPv6 in pkt:
+        offset = _layer_offset(pkt, data, IPv6)
+        addresses.append(add(_address_field(kws, "ipv6_src", offset + 8, 16, initial(offset + 8, 16),
+                                            _ipv62int, Utils.ipv6_ip2long, "::1", "fe80:0:0:0:0:0:0:12")))
+        addresses.append(add(_address_field(kws, "ipv6_dst", offset + 24, 16, initial(offset + 24, 16),
+                                            _ipv62int, Utils.ipv6_ip2long, "::1", "fe80:0:0:0:0:0:0:22")))
+        for layer in pkt[IPv6].payload.layers():
+            if layer.__name__.startswith("ICMPv6"):
+                if pkt[layer].cksum is None:
+                    offset = _layer_offset(pkt, data, layer)
+                    ip_checksums.append(Checksum(offset + 2, initial(offset + 2, 2), [f for f in addresses if f]))
+                break
+
+    if Dot1Q in pkt:
+        offset = _layer_offset(pkt, data, Dot1Q)
+        mode = _mode(kws, "vlan_id_mode", ["increment", "decrement"])
+        if mode:
+            tci = initial(offset, 2)
+            step = Utils.intval(kws, "vlan_id_step", 1)
+            if mode == "decrement":
+                step = -step
+            count = Utils.intval(kws, "vlan_id_count", 0)
+            reset = Utils.intval(kws, "vlan_id", 0) & 0xFFF
+            add(Field("vlan_id", offset, 2, tci & 0xFFF, step, count, reset, mask=0xFFF, keep=tci & 0xF000))
+
+    for proto, layer, chksum_offset in [("tcp", TCP, 16), ("udp", UDP, 6)]:
+        if layer not in pkt:
+            continue
+        offset = _layer_offset(pkt, data, layer)
+        ports = _port_fields(kws, proto, offset, data)
+        fields.extend(ports)
+        depends = [f for f in addresses if f] + ports
+        if depends and pkt[layer].chksum is None and isinstance(pkt[layer].underlayer, (IP, IPv6)):
+            ip_checksums.append(Checksum(offset + chksum_offset, initial(offset + chksum_offset, 2),
+                                         depends, udp=bool(layer == UDP)))
+
+    checksums = [checksum for checksum in ip_checksums if checksum.fields]
+    return CompiledStream(data, fields, checksums, precompute_bytes)
@@ -0,0 +1,118 @@
+"""
+Tests of the PACKET_MMAP rings and the rate meter
+
+The ring tests send frames over a veth pair, they are skipped when the
+veth pair can not be created, e.g. without CAP_NET_ADMIN and CAP_NET_RAW.
+
+The pytest.ini of this directory keeps pytest from importing the spytest
+package, so the tests run from the repository root or from this directory:
+
+    python -m pytest spytest/spytest/tgen/scapy/test_ring.py
+    cd spytest/spytest/tgen/scapy && python -m pytest test_ring.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import threading
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ring  # noqa: E402
+from stats import RateMeter  # noqa: E402
+
+
+def _ip_link(*args):
+    return subprocess.call(["ip", "link"] + list(args), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def veth():
+    suffix = uuid.uuid4().hex[:6]
+    tx_iface, rx_iface = "rtx{}".format(suffix), "rrx{}".format(suffix)
+    try:
+        rv = _ip_link("add", tx_iface, "type", "veth", "peer", "name", rx_iface)
+    except OSError:
+        pytest.skip("ip command not available")
+    if rv != 0:
+        pytest.skip("can not create veth pair, needs CAP_NET_ADMIN")
+    try:
+        _ip_link("set", tx_iface, "up")
+        _ip_link("set", rx_iface, "up")
+        if not ring.is_supported(tx_iface):
+            pytest.skip("PACKET_MMAP ring not supported, needs CAP_NET_RAW")
+        yield tx_iface, rx_iface
+    finally:
+        _ip_link("del", tx_iface)
+
+
+def _frame(index, src="\x00\x00\x00\x00\x00\x01"):
+    payload = index.to_bytes(4, "big") + b"\x00" * 42
+    return b"\xff" * 6 + src.encode("latin-1") + b"\x08\x00" + payload
+
+
+def test_ring_send_recv(veth):
+    tx_iface, rx_iface = veth
+    count = 1000
+    tx, rx = ring.TxRing(tx_iface), ring.RxRing(rx_iface)
+    received = []
+
+    def rx_main():
+        deadline = time.time() + 10
+        while len(received) < count and time.time() < deadline:
+            for frame in rx.recv(200):
+                # skip the frames sent by the kernel, e.g. IPv6 router solicitations
+                if frame[6:12] == _frame(0)[6:12]:
+                    received.append(int.from_bytes(frame[14:18], "big"))
+
+    try:
+        rx_thread = threading.Thread(target=rx_main)
+        rx_thread.start()
+        for index in range(count):
+            assert tx.send(_frame(index)) == 60
+        tx.flush()
+        rx_thread.join()
+    finally:
+        tx.close()
+        rx.close()
+
+    assert tx.errors == 0
+    assert received == list(range(count))
+
+
+def test_ring_send_too_long(veth):
+    tx = ring.TxRing(veth[0])
+    try:
+        assert tx.send(b"\x00" * (tx.max_len + 1)) is None
+        assert tx.pending == 0
+    finally:
+        tx.close()
+
+
+def test_ring_recv_timeout(veth):
+    _ip_link("set", veth[0], "down")
+    rx = ring.RxRing(veth[1])
+    try:
+        start = time.time()
+        assert rx.recv(100) == []
+        assert time.time() - start < 5
+    finally:
+        rx.close()
+
+
+def test_rate_meter():
+    meter = RateMeter(idle=1.0)
+    assert meter.rate(now=100.0) == 0
+    for i in range(11):
+        meter.add(10, now=100.0 + i * 0.1)
+    assert meter.rate(now=101.0) == 100
+    # traffic stopped, the rate is not the rate of the last period
+    assert meter.rate(now=102.5) == 0
+    # a new period of activity
+    meter.add(5, now=110.0)
+    meter.add(5, now=110.5)
+    assert meter.rate(now=110.5) == 10
@@ -0,0 +1,125 @@
+"""
+Tests of the stream compiler
+
+The frames of the compiled streams are compared with the frames built by
+build_next_dma for the ut_streams.py definitions and for the port, IPv6,
+MAC list, VLAN and length modes.
+
+The pytest.ini of this directory keeps pytest from importing the spytest
+package, so the tests run from the repository root or from this directory:
+
+    python -m pytest spytest/spytest/tgen/scapy/test_stream_compiler.py
+    cd spytest/spytest/tgen/scapy && python -m pytest test_stream_compiler.py
+"""
+
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import packet  # noqa: E402
+from logger import Logger  # noqa: E402
+from packet import ScapyPacket  # noqa: E402
+from port import ScapyStream  # noqa: E402
+from stream_compiler import compile_stream, UnsupportedStream  # noqa: E402
+from ut_streams import ut_stream_get  # noqa: E402
+
+FRAMES = 100
+
+EXTRA_STREAMS = {
+    "udp_ports": dict(l3_protocol="ipv4", l4_protocol="udp", udp_src_port=1000, udp_dst_port=2000,
+                      udp_src_port_mode="increment", udp_src_port_count=7, udp_dst_port_mode="decr",
+                      udp_dst_port_step=3, udp_dst_port_count=5),
+    "tcp_ports_wrap": dict(l3_protocol="ipv4", l4_protocol="tcp", tcp_src_port=65530, tcp_src_port_mode="incr",
+                           tcp_src_port_count=4, tcp_dst_port=80, tcp_dst_port_mode="increment"),
+    "udp_ports_step": dict(l3_protocol="ipv4", l4_protocol="udp", udp_src_port=7, udp_src_port_mode="increment",
+                           udp_src_port_count=3, udp_src_port_step=2, ip_src_mode="increment", ip_src_count=4,
+                           ip_src_addr="10.0.0.1", udp_dst_port_mode="increment"),
+    "ipv4_vlan_decrement": dict(l3_protocol="ipv4", l4_protocol="tcp", ip_src_mode="increment", ip_src_step="0.1.0.1",
+                                ip_dst_mode="decrement", ip_dst_count=0, vlan_id=4094, vlan_id_mode="decrement",
+                                vlan_id_step=5, vlan_id_count=7, vlan_user_priority=5, l2_encap="ethernet_ii_vlan"),
+    "ipv6_tcp": dict(l3_protocol="ipv6", l4_protocol="tcp", ipv6_src_addr="2001::ffff", ipv6_src_mode="increment",
+                     ipv6_src_step="::1:0", ipv6_src_count=6, ipv6_dst_mode="decrement", ipv6_dst_count=3,
+                     tcp_src_port=5, tcp_src_port_mode="decrement", tcp_src_port_count=3),
+    "ipv6_udp": dict(l3_protocol="ipv6", l4_protocol="udp", udp_src_port=0, udp_dst_port=0,
+                     ipv6_src_mode="increment", ipv6_src_count=0),
+    "ipv6_icmp": dict(l3_protocol="ipv6", l4_protocol="icmp", icmp_type=136, ipv6_src_mode="increment",
+                      ipv6_src_count=5, frame_size=128),
+    "mac_list_length_increment": dict(mac_src="00:00:00:00:00:01 00:00:00:00:00:05 00:00:00:00:00:09",
+                                      mac_src_mode="list", mac_dst="00:00:00:00:10:00", mac_dst_mode="decrement",
+                                      mac_dst_count=0, length_mode="increment", frame_size_min=64,
+                                      frame_size_max=200, frame_size_step=17),
+    "length_random": dict(l3_protocol="ipv4", l4_protocol="udp", length_mode="random", frame_size_min=60,
+                          frame_size_max=1500, ip_src_mode="increment", ip_src_count=3,
+                          udp_src_port_mode="increment", udp_src_port_count=0),
+    "icmp": dict(l3_protocol="ipv4", l4_protocol="icmp", ip_src_mode="increment", ip_src_count=9,
+                 ip_dst_mode="increment", ip_dst_count=6),
+}
+
+
+def _ut_streams():
+    streams, index = {}, 0
+    while True:
+        kws = ut_stream_get(index)
+        if not kws:
+            return streams
+        kws.pop("mode", None)
+        streams["ut_stream_{}".format(index)] = kws
+        index = index + 1
+
+
+STREAMS = dict(_ut_streams(), **EXTRA_STREAMS)
+
+
+@pytest.fixture
+def logger(tmp_path):
+    return Logger(dry=True, logs_dir=str(tmp_path))
+
+
+def _frames(logger, kws, use_compiler, count=FRAMES):
+    pkt = ScapyPacket("", dry=True, logger=logger)
+    pkt.use_compiler = use_compiler
+    stream = ScapyStream(1, 3, "s1", None, **kws)
+    # same random frame sizes and fields on both sides
+    random.seed(0)
+    pwa = pkt.build_first(stream)
+    frames = []
+    for _ in range(count):
+        frames.append(pkt.send_packet(pwa, "dummy", "s1", 0))
+        pkt.build_next_dma(pwa)
+    return pwa, frames
+
+
+@pytest.mark.parametrize("name", sorted(STREAMS))
+def test_compiled_frames(logger, name):
+    _, expected = _frames(logger, dict(STREAMS[name]), False)
+    pwa, frames = _frames(logger, dict(STREAMS[name]), True)
+    assert pwa.compiled
+    assert frames == expected
+
+
+def test_unsupported_stream_fallback(logger, monkeypatch):
+    def unsupported(pkt, kws, precompute_bytes=0):
+        raise UnsupportedStream("not supported")
+
+    kws = STREAMS["ipv6_tcp"]
+    _, expected = _frames(logger, dict(kws), False)
+    monkeypatch.setattr(packet, "compile_stream", unsupported)
+    pwa, frames = _frames(logger, dict(kws), True)
+    assert pwa.compiled is None
+    assert frames == expected
+
+
+def test_unhandled_mode_not_compiled(logger):
+    kws = dict(l2_encap="ethernet_ii_vlan", vlan_id=10, vlan_id_mode="random")
+    pkt = ScapyPacket("", dry=True, logger=logger)
+    pwa = pkt.build_first(ScapyStream(1, 3, "s1", None, **kws))
+    with pytest.raises(UnsupportedStream):
+        compile_stream(pwa.pkt, pwa.stream.kws)
+    assert pwa.compiled is None
+    # build_next_dma rejects the mode as before
+    with pytest.raises(ValueError):
+        pkt.build_next_dma(pwa)
@@ -0,0 +1,362 @@
+"""Batched, asynchronous ingestion of report records.
+
+Records put in the IngestionQueue are coalesced per table into NDJSON batches, which are sent when they reach
+a size bound or an age bound, or when the queue is flushed. Each batch is gzip-compressed into one file and sent
+to all the ingestion clients (e.g. the primary and the backup cluster) concurrently.
+
+When a spool directory is set, a batch which could not be sent to a client is kept in the spool directory of the
+client and sent again by retry_spooled(), instead of failing the upload. Several processes may share the spool
+directory, a process claims a spooled batch by renaming it before sending it again, so each batch is sent by one
+process only.
+
+The queue does not depend on the Kusto SDK, an ingestion client is any object with the ingest_from_file method of
+the Kusto ingest client, e.g. the local stand-in clients used by the tests.
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+# Bounds of a batch, it is sent when any of them is reached
+DEFAULT_MAX_BATCH_RECORDS = 50000
+DEFAULT_MAX_BATCH_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_BATCH_AGE = 30.0
+DEFAULT_SEND_WORKERS = 4
+
+BATCH_FILE_SUFFIX = ".json.gz"
+# Marker of a spooled batch claimed by a process, <batch>.claimed.<claim time>.<claim id>.json.gz, the batch file
+# suffix is kept for the ingestion client
+CLAIM_FILE_MARKER = ".claimed."
+# Seconds after which a claimed batch is considered abandoned, e.g. by a killed process, and may be claimed again
+SPOOL_CLAIM_TIMEOUT = 3600
+
+
+class IngestionError(RuntimeError):
+    """Batches could not be sent and were not spooled for retry."""
+
+
+class IngestionStats(object):
+    """Throughput counters of an IngestionQueue."""
+
+    COUNTERS = ["records_queued", "records_sent", "batches_sent", "raw_bytes", "compressed_bytes",
+                "send_failures", "batches_spooled", "batches_resent"]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = None
+        self.send_seconds = 0.0
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+
+    def add(self, **counts):
+        with self._lock:
+            if self._start is None:
+                self._start = time.time()
+            for counter, count in counts.items():
+                setattr(self, counter, getattr(self, counter) + count)
+
+    def snapshot(self) -> Dict:
+        """Get the counters, with the throughput since the first record was queued."""
+        with self._lock:
+            stats = {counter: getattr(self, counter) for counter in self.COUNTERS}
+            stats["send_seconds"] = self.send_seconds
+            elapsed = time.time() - self._start if self._start is not None else 0.0
+        stats["elapsed_seconds"] = elapsed
+        stats["records_per_second"] = stats["records_sent"] / elapsed if elapsed > 0 else 0.0
+        stats["compression_ratio"] = \
+            stats["raw_bytes"] / stats["compressed_bytes"] if stats["compressed_bytes"] else 0.0
+        return stats
+
+
+class _Batch(object):
+    """Encoded NDJSON lines of a table waiting to be sent."""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.lines = []
+        self.size = 0
+        self.created = time.time()
+
+    def add(self, line: bytes):
+        self.lines.append(line)
+        self.size += len(line) + 1
+
+
+class IngestionQueue(object):
+    """Coalesce records per table into batches and send them to the ingestion clients.
+
+    Args:
+        clients: Name of each ingestion client to the client, e.g. {"primary": client, "backup": client}.
+        properties: Function returning the ingestion properties of a table, passed to ingest_from_file.
+        spool_dir: Directory keeping the batches which failed to be sent, for retry. When it is not set,
+            a failed batch is reported by IngestionError from flush().
+        max_batch_records: Maximum number of records of a batch.
+        max_batch_bytes: Maximum size of the uncompressed NDJSON of a batch.
+        max_batch_age: Maximum seconds a record waits in a batch before the batch is sent, 0 to wait for flush().
+        send_workers: Maximum number of batches sent at the same time.
+    """
+
+    def __init__(self, clients: Dict[str, Any], properties: Callable[[str], Any],
+                 spool_dir: Optional[str] = None,
+                 max_batch_records: int = DEFAULT_MAX_BATCH_RECORDS,
+                 max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+                 max_batch_age: float = DEFAULT_MAX_BATCH_AGE,
+                 send_workers: int = DEFAULT_SEND_WORKERS):
+        self.clients = {name: client for name, client in clients.items() if client is not None}
+        if not self.clients:
+            raise ValueError("At least one ingestion client is required")
+        self.properties = properties
+        self.spool_dir = spool_dir
+        self.max_batch_records = max_batch_records
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_age = max_batch_age
+        self.stats = IngestionStats()
+
+        self._lock = threading.Lock()
+        # Held while batches are taken out of self._batches and submitted, so flush() waits for all of them
+        self._submit_lock = threading.RLock()
+        self._batches = {}
+        self._pending = set()
+        self._errors = []
+        self._executor = ThreadPoolExecutor(max_workers=max(send_workers, 1) * len(self.clients))
+        self._closed = threading.Event()
+        self._timer = None
+        if max_batch_age > 0:
+            self._timer = threading.Thread(target=self._send_aged_batches, name="ingestion-queue-timer")
+            self._timer.daemon = True
+            self._timer.start()
+
+    def put(self, table: str, data) -> None:
+        """Queue a record, or a list of records, to be ingested to table."""
+        if self._closed.is_set():
+            raise IngestionError("Ingestion queue is closed")
+        records = data if isinstance(data, list) else [data]
+        lines = [json.dumps(record).encode("utf-8") for record in records]
+        self.stats.add(records_queued=len(lines))
+        with self._submit_lock:
+            full = []
+            with self._lock:
+                for line in lines:
+                    batch = self._batches.get(table)
+                    if batch is None:
+                        batch = self._batches[table] = _Batch(table)
+                    batch.add(line)
+                    if len(batch.lines) >= self.max_batch_records or batch.size >= self.max_batch_bytes:
+                        full.append(self._batches.pop(table))
+            for batch in full:
+                self._submit(batch)
+
+    def flush(self, table: Optional[str] = None) -> None:
+        """Send the queued records, of table or of all tables, and wait until all sent batches are done.
+
+        Raises:
+            IngestionError: Batches failed to be sent to a client and no spool directory is set.
+        """
+        with self._submit_lock:
+            with self._lock:
+                tables = [table] if table is not None else list(self._batches)
+                batches = [self._batches.pop(name) for name in tables if name in self._batches]
+            for batch in batches:
+                self._submit(batch)
+            with self._lock:
+                pending = list(self._pending)
+        wait(pending)
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise IngestionError("Failed to ingest {} batches: {}".format(len(errors), "; ".join(errors)))
+
+    def close(self) -> None:
+        """Flush the queued records and stop the queue."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def spooled_batches(self) -> Dict[str, List[str]]:
+        """Get the batch files in the spool directory, by name of the client.
+
+        Batches claimed by another process are not included, unless the claim timed out.
+        """
+        spooled = {}
+        if not self.spool_dir:
+            return spooled
+        now = time.time()
+        for name in self.clients:
+            client_dir = os.path.join(self.spool_dir, name)
+            if os.path.isdir(client_dir):
+                files = sorted(f for f in os.listdir(client_dir) if f.endswith(BATCH_FILE_SUFFIX) and
+                               (CLAIM_FILE_MARKER not in f or self._claim_expired(f, now)))
+                if files:
+                    spooled[name] = [os.path.join(client_dir, f) for f in files]
+        return spooled
+
+    def retry_spooled(self) -> int:
+        """Send the batches in the spool directory again. A batch is removed from the spool once it is sent.
+
+        A batch is claimed before it is sent, a batch claimed by another process at the same time is skipped.
+
+        Returns:
+            Number of batches sent.
+        """
+        futures = []
+        for name, files in self.spooled_batches().items():
+            for batch_file in files:
+                table = os.path.basename(batch_file).split(".", 1)[0]
+                futures.append(self._executor.submit(self._resend, name, table, batch_file))
+        wait(futures)
+        return sum(1 for future in futures if future.result())
+
+    def _send_aged_batches(self):
+        interval = min(max(self.max_batch_age / 4.0, 0.05), 1.0)
+        while not self._closed.wait(interval):
+            now = time.time()
+            with self._submit_lock:
+                with self._lock:
+                    aged = [table for table, batch in self._batches.items()
+                            if now - batch.created >= self.max_batch_age]
+                    batches = [self._batches.pop(table) for table in aged]
+                for batch in batches:
+                    self._submit(batch)
+
+    def _submit(self, batch: _Batch):
+        batch_file = self._write_batch(batch)
+        self.stats.add(raw_bytes=batch.size, compressed_bytes=os.path.getsize(batch_file))
+        futures = [self._executor.submit(self._send, name, batch.table, batch_file, len(batch.lines))
+                   for name in self.clients]
+        remaining = [len(futures)]
+
+        def _done(_):
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._remove(batch_file)
+
+        with self._lock:
+            self._pending.update(futures)
+        for future in futures:
+            future.add_done_callback(self._discard_pending)
+            future.add_done_callback(_done)
+
+    def _discard_pending(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _write_batch(self, batch: _Batch) -> str:
+        fd, batch_file = tempfile.mkstemp(prefix=batch.table + ".", suffix=BATCH_FILE_SUFFIX)
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+            f.write(b"\n".join(batch.lines))
+        return batch_file
+
+    def _ingest(self, name: str, table: str, batch_file: str):
+        start = time.time()
+        try:
+            self.clients[name].ingest_from_file(batch_file, ingestion_properties=self.properties(table))
+        finally:
+            self.stats.add(send_seconds=time.time() - start)
+
+    def _send(self, name: str, table: str, batch_file: str, records: int):
+        try:
+            self._ingest(name, table, batch_file)
+        except Exception as e:
+            self.stats.add(send_failures=1)
+            message = "table {} to {}: {}".format(table, name, repr(e))
+            if self.spool_dir:
+                spooled = self._spool(name, table, batch_file)
+                print("Ingestion of {} failed, spooled to {}".format(message, spooled))
+                return
+            print("Ingestion of {} failed".format(message))
+            with self._lock:
+                self._errors.append(message)
+            return
+        self.stats.add(records_sent=records, batches_sent=1)
+
+    def _resend(self, name: str, table: str, batch_file: str) -> bool:
+        spooled = self._unclaimed_name(batch_file)
+        claimed = self._claim(batch_file)
+        if claimed is None:
+            return False
+        try:
+            self._ingest(name, table, claimed)
+            with gzip.open(claimed, "rb") as f:
+                records = sum(1 for _ in f)
+        except Exception as e:
+            self.stats.add(send_failures=1)
+            print("Retry of spooled batch {} to {} failed: {}".format(spooled, name, repr(e)))
+            # Release the claim, the batch is retried later
+            os.rename(claimed, spooled)
+            return False
+        self.stats.add(records_sent=records, batches_sent=1, batches_resent=1)
+        self._remove(claimed)
+        return True
+
+    def _spool(self, name: str, table: str, batch_file: str) -> str:
+        client_dir = os.path.join(self.spool_dir, name)
+        os.makedirs(client_dir, exist_ok=True)
+        spooled = os.path.join(client_dir, "{}.{}.{}{}".format(
+            table, time.strftime("%Y%m%d%H%M%S"), uuid.uuid4().hex, BATCH_FILE_SUFFIX))
+        # Copied under a claimed name and renamed, so that no process retries a partially copied batch
+        copying = self._claimed_name(spooled)
+        shutil.copyfile(batch_file, copying)
+        os.rename(copying, spooled)
+        self.stats.add(batches_spooled=1)
+        return spooled
+
+    @staticmethod
+    def _unclaimed_name(batch_file: str) -> str:
+        if CLAIM_FILE_MARKER in batch_file:
+            return batch_file[:batch_file.rindex(CLAIM_FILE_MARKER)] + BATCH_FILE_SUFFIX
+        return batch_file
+
+    @classmethod
+    def _claimed_name(cls, batch_file: str) -> str:
+        return "{}{}{}.{}{}".format(cls._unclaimed_name(batch_file)[:-len(BATCH_FILE_SUFFIX)], CLAIM_FILE_MARKER,
+                                    int(time.time()), uuid.uuid4().hex, BATCH_FILE_SUFFIX)
+
+    @staticmethod
+    def _claim_expired(file_name: str, now: float) -> bool:
+        try:
+            claim_time = int(file_name[file_name.rindex(CLAIM_FILE_MARKER) + len(CLAIM_FILE_MARKER):].split(".")[0])
+        except ValueError:
+            return False
+        return now - claim_time >= SPOOL_CLAIM_TIMEOUT
+
+    @classmethod
+    def _claim(cls, batch_file: str) -> Optional[str]:
+        """Claim a spooled batch by renaming it, rename is atomic so only one process gets the batch.
+
+        Returns:
+            Path of the claimed batch, or None if it was claimed by another process.
+        """
+        claimed = cls._claimed_name(batch_file)
+        try:
+            os.rename(batch_file, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    @staticmethod
+    def _remove(batch_file: str):
+        try:
+            os.unlink(batch_file)
+        except OSError as e:
+            print(f"Warning - failed to clean up batch file {batch_file}: {e}")
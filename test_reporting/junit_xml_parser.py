@@ -6,7 +6,8 @@ This library/script should work for any test result XML file generated by Pytest
 
 CLI Usage:
 % python3 junit_xml_parser.py -h
-usage: junit_xml_parser.py [-h] [--validate-only] [--compact] [--output-file OUTPUT_FILE] file
+usage: junit_xml_parser.py [-h] [--validate-only] [--compact] [--output-file OUTPUT_FILE] [--stream]
+                           [--workers WORKERS] file
 
 Validate and convert SONiC JUnit XML files into JSON.
 
@@ -19,6 +20,9 @@ optional arguments:
 --compact, -c         Output the JSON in a compact form.
 --output-file OUTPUT_FILE, -o OUTPUT_FILE
                         A file to store the JSON output in.
+--stream              Parse the XML files one at a time and write the JSON output in a streaming way.
+--workers WORKERS, -w WORKERS
+                        Number of processes parsing the XML files with --stream.
 
 Examples:
 python3 junit_xml_parser.py tests/files/sample_tr.xml
@@ -26,10 +30,13 @@ python3 junit_xml_parser.py tests/files/sample_tr.xml
 import argparse
 import glob
 import json
+import shutil
 import sys
 import os
+import tempfile
 
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from utilities import TestResultJSONValidationError
 from utilities import validate_json_file
@@ -94,6 +101,10 @@ REQUIRED_TESTCASE_PROPERTIES = [
 
 REQUIRED_TESTCASE_JSON_FIELDS = ["result", "error", "summary"]
 
+# Validated and parsed content of one XML document, see iterparse_junit_xml_file.
+JUnitXMLFileResult = namedtuple("JUnitXMLFileResult", ["document", "metadata", "summary", "test_cases",
+                                                       "check_metadata"])
+
 
 class JUnitXMLValidationError(Exception):
     """Expected errors that are thrown while validating the contents of the JUnit XML file."""
@@ -178,10 +189,7 @@ def validate_junit_xml_archive(directory_name, strict=False):
     roots = []
     metadata_source = None
     metadata = {}
-    doc_list = glob.glob(os.path.join(directory_name, "tr.xml"))
-    doc_list += glob.glob(os.path.join(directory_name, "*test*.xml"))
-    doc_list += glob.glob(os.path.join(directory_name, "**", "*test*.xml"), recursive=True)
-    doc_list = set(doc_list)
+    doc_list = _get_junit_xml_documents(directory_name)
 
     total_size = 0
     for document in doc_list:
@@ -220,6 +228,13 @@ def validate_junit_xml_archive(directory_name, strict=False):
     return roots
 
 
+def _get_junit_xml_documents(directory_name):
+    doc_list = glob.glob(os.path.join(directory_name, "tr.xml"))
+    doc_list += glob.glob(os.path.join(directory_name, "*test*.xml"))
+    doc_list += glob.glob(os.path.join(directory_name, "**", "*test*.xml"), recursive=True)
+    return set(doc_list)
+
+
 def validate_junit_xml_path(path, strict=False):
     if os.path.isfile(path):
         roots = [(validate_junit_xml_file(path), path)]
@@ -229,6 +244,289 @@ def validate_junit_xml_path(path, strict=False):
     return roots
 
 
+def iterparse_junit_xml_file(document_name):
+    """Validate and parse an XML file incrementally, without building the tree of the whole document.
+
+    Each test case is validated and parsed when its end tag is read, then dropped from the tree, so the
+    memory used does not grow with the number of test cases. Only the first testsuite of a testsuites
+    root element is parsed, same as parse_test_result.
+
+    Args:
+        document_name: The name of the document.
+
+    Returns:
+        A JUnitXMLFileResult of the document.
+
+    Raises:
+        JUnitXMLValidationError: if the document is not valid, same as validate_junit_xml_file.
+    """
+    if not os.path.exists(document_name) or not os.path.isfile(document_name):
+        raise JUnitXMLValidationError("file not found")
+
+    if os.path.getsize(document_name) > MAXIMUM_XML_SIZE:
+        raise JUnitXMLValidationError("provided file is too large")
+
+    root = None
+    suite = None
+    # Same as validate_junit_xml_file, metadata and test cases are validated when the root is a testsuite
+    validate_contents = False
+    metadata = {}
+    test_cases = defaultdict(list)
+    parents = []
+    try:
+        for event, elem in ET.iterparse(document_name, events=("start", "end"), forbid_dtd=True):
+            if event == "start":
+                if root is None:
+                    root = elem
+                    if elem.tag == TESTSUITE_TAG:
+                        suite = elem
+                        validate_contents = True
+                        _validate_testsuite_attributes(suite)
+                    elif elem.tag != TESTSUITES_TAG:
+                        raise JUnitXMLValidationError(
+                            f"Either {TESTSUITES_TAG} or {TESTSUITE_TAG} tag are not found on root element")
+                elif suite is None and elem.tag == TESTSUITE_TAG and parents[-1] is root:
+                    suite = elem
+                    _validate_testsuite_attributes(suite)
+                parents.append(elem)
+                continue
+
+            parents.pop()
+            parent = parents[-1] if parents else None
+            if parent is suite and parent is not None:
+                if elem.tag == TESTCASE_TAG:
+                    if validate_contents:
+                        _validate_test_case(elem)
+                    feature, result = _parse_test_case(elem)
+                    if feature is not None and result is not None:
+                        test_cases[feature].append(result)
+                    suite.remove(elem)
+                elif elem.tag == PROPERTIES_TAG and suite.find(PROPERTIES_TAG) is elem:
+                    if validate_contents:
+                        _validate_test_metadata(suite)
+                    metadata = _parse_test_metadata(suite)
+            elif parent is root and elem is not suite:
+                # Content of the testsuites root element out of the parsed testsuite
+                root.remove(elem)
+    except JUnitXMLValidationError:
+        raise
+    except Exception as e:
+        raise JUnitXMLValidationError(f"could not parse {document_name}: {e}") from e
+
+    if suite is None:
+        raise JUnitXMLValidationError(f"{TESTSUITE_TAG} tag not found")
+
+    return JUnitXMLFileResult(document=document_name, metadata=metadata, summary=_parse_test_summary(suite),
+                              test_cases=dict(test_cases), check_metadata=validate_contents)
+
+
+def _iterparse_junit_xml_document(document_name):
+    # Run by the worker processes of iter_junit_xml_results
+    try:
+        return iterparse_junit_xml_file(document_name), None
+    except Exception as e:
+        return None, e
+
+
+def iter_junit_xml_results(path, strict=False, workers=None):
+    """Validate and parse the XML documents of a file or an archive, one document at a time.
+
+    The documents are parsed by iterparse_junit_xml_file in a pool of processes, and yielded in the order of
+    their names. At most two documents per process are parsed ahead of the consumer.
+
+    Args:
+        path: An XML file, or a directory containing XML documents.
+        strict: Fail if ANY document in the directory is not valid, else invalid documents are skipped.
+        workers: Number of processes parsing the documents, defaults to the number of CPUs. 1 parses the
+            documents in the calling process.
+
+    Yields:
+        A JUnitXMLFileResult of each valid document.
+
+    Raises:
+        JUnitXMLValidationError: if path is a file which is not valid, or strict is set and any document in the
+            directory is not valid or has metadata differing from the others.
+    """
+    if os.path.isfile(path):
+        yield iterparse_junit_xml_file(path)
+        return
+
+    if not os.path.exists(path) or not os.path.isdir(path):
+        print("directory {} not found".format(path))
+        return
+
+    doc_list = sorted(_get_junit_xml_documents(path))
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(doc_list) <= 1:
+        parsed = (_iterparse_junit_xml_document(document) for document in doc_list)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        parsed = _map_bounded(executor, _iterparse_junit_xml_document, doc_list, workers * 2)
+
+    metadata_source = None
+    metadata = {}
+    valid = 0
+    try:
+        for document, (result, error) in zip(doc_list, parsed):
+            try:
+                if error is not None:
+                    raise error
+                root_metadata = {k: v for k, v in result.metadata.items()
+                                 if k in REQUIRED_METADATA_PROPERTIES and k != "timestamp"} \
+                    if result.check_metadata else {}
+
+                if root_metadata:
+                    # All metadata from a single test run should be identical, so we
+                    # just use the first one we see to validate the rest.
+                    if not metadata_source:
+                        metadata_source = document
+                        metadata = root_metadata
+
+                    if root_metadata != metadata:
+                        raise JUnitXMLValidationError(f"{document} metadata differs from {metadata_source}\n"
+                                                      f"{document}: {root_metadata}\n"
+                                                      f"{metadata_source}: {metadata}")
+            except Exception as e:
+                if strict:
+                    raise JUnitXMLValidationError(f"could not parse {document}: {e}") from e
+
+                print(f"could not parse {document}: {e} - skipping")
+                continue
+
+            valid += 1
+            yield result
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    if not valid:
+        print("provided directory {} does not contain any valid XML files".format(path))
+
+
+def _map_bounded(executor, fn, items, window):
+    pending = deque()
+    items = iter(items)
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            break
+    while pending:
+        result = pending.popleft().result()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            break
+        yield result
+
+
+class _TestCaseSpool(object):
+    """Parsed test cases kept in a temporary file per feature, until the JSON report is written."""
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix="junit_xml_cases_")
+        self.files = {}
+
+    def add(self, test_cases):
+        for feature, cases in test_cases.items():
+            spool_file = self.files.get(feature)
+            if spool_file is None:
+                spool_file = self.files[feature] = open(
+                    os.path.join(self.directory, str(len(self.files))), "w+", encoding="utf-8")
+            for case in cases:
+                spool_file.write(json.dumps(case))
+                spool_file.write("\n")
+
+    def iter_cases(self, feature):
+        spool_file = self.files[feature]
+        spool_file.seek(0)
+        for line in spool_file:
+            yield json.loads(line)
+
+    def close(self):
+        for spool_file in self.files.values():
+            spool_file.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _write_test_result_json(output, test_result_json, spool, compact=False):
+    # Same text as json.dumps(test_result_json, sort_keys=True) with the test cases of the spool, indented by 4
+    # unless compact is set. Each test case is encoded when it is written.
+    if compact:
+        def _dumps(obj, _level):
+            return json.dumps(obj, separators=(",", ":"), sort_keys=True)
+        newline, indent, item_sep, key_sep = "", "", ",", ":"
+    else:
+        def _dumps(obj, level):
+            return json.dumps(obj, indent=4, sort_keys=True).replace("\n", "\n" + " " * 4 * level)
+        newline, indent, item_sep, key_sep = "\n", " " * 4, ",", ": "
+
+    sections = dict(test_result_json)
+    sections["test_cases"] = None
+    output.write("{")
+    for index, key in enumerate(sorted(sections)):
+        output.write((item_sep if index else "") + newline + indent + json.dumps(key) + key_sep)
+        if key != "test_cases":
+            output.write(_dumps(sections[key], 1))
+            continue
+        features = sorted(spool.files)
+        if not features:
+            output.write("{}")
+            continue
+        output.write("{")
+        for feature_index, feature in enumerate(features):
+            output.write((item_sep if feature_index else "") + newline + indent * 2 + json.dumps(feature) + key_sep)
+            output.write("[")
+            for case_index, case in enumerate(spool.iter_cases(feature)):
+                output.write((item_sep if case_index else "") + newline + indent * 3 + _dumps(case, 3))
+            output.write(newline + indent * 2 + "]")
+        output.write(newline + indent + "}")
+    output.write(newline + "}")
+
+
+def parse_test_result_stream(path, output, strict=False, workers=None, compact=False):
+    """Validate and parse the XML documents of a file or an archive into a JSON report, in a streaming way.
+
+    Same report as parse_test_result of validate_junit_xml_path, but documents are parsed one at a time by
+    iter_junit_xml_results. Summary and metadata are merged as each document is parsed, and the test cases are
+    kept in temporary files until the report is written to output, so the memory used does not grow with the
+    size of the archive. The test cases of a feature are in the order of the documents.
+
+    Args:
+        path: An XML file, or a directory containing XML documents.
+        output: A writable text file, the JSON report is written to it.
+        strict: Fail if ANY document in the directory is not valid.
+        workers: Number of processes parsing the documents, see iter_junit_xml_results.
+        compact: Write the JSON in a compact form.
+
+    Returns:
+        A dict containing the test_metadata and test_summary of the report, None if no document was parsed, and
+        then nothing is written to output.
+    """
+    test_result_json = {"test_metadata": {}, "test_summary": {}}
+    spool = _TestCaseSpool()
+    documents = 0
+    try:
+        for result in iter_junit_xml_results(path, strict, workers):
+            documents += 1
+            test_result_json["test_metadata"] = _update_test_metadata(test_result_json["test_metadata"],
+                                                                      result.metadata)
+            test_result_json["test_summary"] = _update_test_summary(test_result_json["test_summary"],
+                                                                    result.summary)
+            spool.add(result.test_cases)
+
+        if not documents:
+            print("No XML file needs to be parsed or the file is empty.")
+            return None
+
+        _write_test_result_json(output, test_result_json, spool, compact)
+    finally:
+        spool.close()
+
+    print(f"Parsed {documents} XML document(s) into test result JSON.")
+    return test_result_json
+
+
 def _validate_junit_xml(root):
     _validate_test_summary(root)
     _validate_test_metadata(root)
@@ -247,6 +545,10 @@ def _validate_test_summary(root):
     else:
         raise JUnitXMLValidationError(f"Either {TESTSUITES_TAG} or {TESTSUITE_TAG} tag are not found on root element")
 
+    _validate_testsuite_attributes(testsuit_element)
+
+
+def _validate_testsuite_attributes(testsuit_element):
     for xml_field, expected_type in REQUIRED_TESTSUITE_ATTRIBUTES:
         if xml_field not in testsuit_element.keys():
             raise JUnitXMLValidationError(f"{xml_field} not found in <{TESTSUITE_TAG}> element")
@@ -330,16 +632,17 @@ def _validate_test_case_properties(root):
         print("missing testcase property: {}".format(list(missing_testcase_property)))
 
 
-def _validate_test_cases(root):
-    def _validate_test_case(test_case):
-        for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
-            if attribute not in test_case.keys():
-                raise JUnitXMLValidationError(
-                    f'"{attribute}" not found in test case '
-                    f"\"{test_case.get('name', 'Name Not Found')}\""
-                )
-        _validate_test_case_properties(test_case)
+def _validate_test_case(test_case):
+    for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
+        if attribute not in test_case.keys():
+            raise JUnitXMLValidationError(
+                f'"{attribute}" not found in test case '
+                f"\"{test_case.get('name', 'Name Not Found')}\""
+            )
+    _validate_test_case_properties(test_case)
+
 
+def _validate_test_cases(root):
     cases = root.findall(TESTCASE_TAG)
 
     for test_case in cases:
@@ -449,69 +752,70 @@ def _parse_testcase_properties(root):
     return testcase_properties
 
 
-def _parse_test_cases(root):
-    test_case_results = defaultdict(list)
-
-    def _parse_test_case(test_case):
-
-        # For special case like: <testcase time="17.190" />
-        # There is no required attributes in it, then just return None, None
-        for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
-            if attribute not in test_case.keys():
-                return None, None
-
-        result = {}
+def _parse_test_case(test_case):
+
+    # For special case like: <testcase time="17.190" />
+    # There is no required attributes in it, then just return None, None
+    for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
+        if attribute not in test_case.keys():
+            return None, None
+
+    result = {}
+
+    # FIXME: This is specific to pytest, needs to be extended to support spytest.
+    test_class_tokens = test_case.get("classname").split(".")
+    feature = test_class_tokens[0]
+
+    for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
+        result[attribute] = test_case.get(attribute)
+    testcase_properties = _parse_testcase_properties(test_case)
+    for attribute in REQUIRED_TESTCASE_PROPERTIES:
+        if attribute in testcase_properties:
+            result[attribute] = testcase_properties[attribute]
+
+    # NOTE: "if failure" and "if error" does not work with the ETree library.
+    failure = test_case.find("failure")
+    error = test_case.find("error")
+    skipped = test_case.find("skipped")
+
+    # Any test which marked as xfail will drop out a property to the report xml file.
+    # Add prefix "xfail_" to tests which are marked with xfail
+    properties_element = test_case.find(PROPERTIES_TAG)
+    xfail_case = ""
+    if properties_element:
+        for prop in properties_element.iterfind(PROPERTY_TAG):
+            if prop.get("name") == "xfail":
+                xfail_case = "xfail_"
+                break
+
+    # NOTE: "error" is unique in that it can occur alongside a succesful, failed, or skipped test result.
+    # Because of this, we track errors separately so that the error can be correlated with the stage it
+    # occurred.
+    # By looking into test results from past 300 days, error only occur with skipped test result.
+    #
+    # If there is *only* an error tag we note that as well, as this indicates that the framework
+    # errored out during setup or teardown.
+    if failure is not None:
+        result["result"] = "{}failure".format(xfail_case)
+        summary = failure.get("message", "")
+    elif skipped is not None:
+        result["result"] = "{}skipped".format(xfail_case)
+        summary = skipped.get("message", "")
+    elif error is not None:
+        result["result"] = "{}error".format(xfail_case)
+        summary = error.get("message", "")
+    else:
+        result["result"] = "{}success".format(xfail_case)
+        summary = ""
 
-        # FIXME: This is specific to pytest, needs to be extended to support spytest.
-        test_class_tokens = test_case.get("classname").split(".")
-        feature = test_class_tokens[0]
+    result["summary"] = summary[:min(len(summary), MAXIMUM_SUMMARY_SIZE)]
+    result["error"] = error is not None
 
-        for attribute in REQUIRED_TESTCASE_ATTRIBUTES:
-            result[attribute] = test_case.get(attribute)
-        for attribute in REQUIRED_TESTCASE_PROPERTIES:
-            testcase_properties = _parse_testcase_properties(test_case)
-            if attribute in testcase_properties:
-                result[attribute] = testcase_properties[attribute]
-
-        # NOTE: "if failure" and "if error" does not work with the ETree library.
-        failure = test_case.find("failure")
-        error = test_case.find("error")
-        skipped = test_case.find("skipped")
-
-        # Any test which marked as xfail will drop out a property to the report xml file.
-        # Add prefix "xfail_" to tests which are marked with xfail
-        properties_element = test_case.find(PROPERTIES_TAG)
-        xfail_case = ""
-        if properties_element:
-            for prop in properties_element.iterfind(PROPERTY_TAG):
-                if prop.get("name") == "xfail":
-                    xfail_case = "xfail_"
-                    break
-
-        # NOTE: "error" is unique in that it can occur alongside a succesful, failed, or skipped test result.
-        # Because of this, we track errors separately so that the error can be correlated with the stage it
-        # occurred.
-        # By looking into test results from past 300 days, error only occur with skipped test result.
-        #
-        # If there is *only* an error tag we note that as well, as this indicates that the framework
-        # errored out during setup or teardown.
-        if failure is not None:
-            result["result"] = "{}failure".format(xfail_case)
-            summary = failure.get("message", "")
-        elif skipped is not None:
-            result["result"] = "{}skipped".format(xfail_case)
-            summary = skipped.get("message", "")
-        elif error is not None:
-            result["result"] = "{}error".format(xfail_case)
-            summary = error.get("message", "")
-        else:
-            result["result"] = "{}success".format(xfail_case)
-            summary = ""
+    return feature, result
 
-        result["summary"] = summary[:min(len(summary), MAXIMUM_SUMMARY_SIZE)]
-        result["error"] = error is not None
 
-        return feature, result
+def _parse_test_cases(root):
+    test_case_results = defaultdict(list)
 
     for test_case in root.findall("testcase"):
         feature, result = _parse_test_case(test_case)
@@ -693,6 +997,16 @@ python3 junit_xml_parser.py tests/files/sample_tr.xml
         action="store_true",
         help="Fail validation checks if ANY file in a given directory is not parseable."
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse the XML files one at a time and write the JSON output in a streaming way, "
+             "for large archives. Files are parsed in parallel, see --workers.",
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=None,
+        help="Number of processes parsing the XML files with --stream, defaults to the number of CPUs.",
+    )
     parser.add_argument(
         "--json",
         "-j",
@@ -703,6 +1017,10 @@ python3 junit_xml_parser.py tests/files/sample_tr.xml
 
     args = parser.parse_args()
 
+    if args.stream and not args.json:
+        _run_stream(args)
+        return
+
     try:
         if args.json:
             validate_junit_json_file(args.file_name)
@@ -752,5 +1070,32 @@ python3 junit_xml_parser.py tests/files/sample_tr.xml
     csv_file.close()
 
 
+def _run_stream(args):
+    try:
+        if args.validate_only:
+            for _ in iter_junit_xml_results(args.file_name, args.strict, args.workers):
+                pass
+            print(f"{args.file_name} validated succesfully!")
+            sys.exit(0)
+
+        if args.output_file:
+            with open(args.output_file, "w+") as output_file:
+                test_result_json = parse_test_result_stream(args.file_name, output_file, args.strict,
+                                                            args.workers, args.compact)
+        else:
+            test_result_json = parse_test_result_stream(args.file_name, sys.stdout, args.strict,
+                                                        args.workers, args.compact)
+    except JUnitXMLValidationError as e:
+        print(f"XML validation failed: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Unexpected error occured during validation: {e}")
+        sys.exit(2)
+
+    if test_result_json is None:
+        print("XML file doesn't exist or no data in the file.")
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     _run_script()
@@ -1,9 +1,9 @@
 """Wrappers and utilities for storing test reports."""
 import json
 import os
-import tempfile
 
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from azure.kusto.data import KustoConnectionStringBuilder
 
 try:
@@ -25,6 +25,7 @@ try:
 except ImportError:
     DefaultAzureCredential = None
 
+from ingestion_queue import IngestionError, IngestionQueue
 from utilities import validate_json_file
 from datetime import datetime
 from typing import Dict, List
@@ -96,6 +97,7 @@ class KustoConnector(ReportDBConnector):
 
     METADATA_TABLE = "TestReportMetadata"
     SWSSDATA_TABLE = "SwssInvocationReport"
+    SWSS_ATTRIBUTE_SUMMARY_TABLE = "SwssAttributeSummary"
     SUMMARY_TABLE = "TestReportSummary"
     RAW_CASE_TABLE = "RawTestCases"
     RAW_REACHABILITY_TABLE = "RawReachabilityData"
@@ -113,6 +115,7 @@ class KustoConnector(ReportDBConnector):
     TABLE_FORMAT_LOOKUP = {
         METADATA_TABLE: DataFormat.JSON,
         SWSSDATA_TABLE: DataFormat.MULTIJSON,
+        SWSS_ATTRIBUTE_SUMMARY_TABLE: DataFormat.MULTIJSON,
         SUMMARY_TABLE: DataFormat.JSON,
         RAW_CASE_TABLE: DataFormat.MULTIJSON,
         RAW_REACHABILITY_TABLE: DataFormat.MULTIJSON,
@@ -131,6 +134,7 @@ class KustoConnector(ReportDBConnector):
     TABLE_MAPPING_LOOKUP = {
         METADATA_TABLE: "FlatMetadataMappingV1",
         SWSSDATA_TABLE: "SwssInvocationReportMapping",
+        SWSS_ATTRIBUTE_SUMMARY_TABLE: "SwssAttributeSummaryMapping",
         SUMMARY_TABLE: "FlatSummaryMappingV1",
         RAW_CASE_TABLE: "RawCaseMappingV1",
         RAW_REACHABILITY_TABLE: "RawReachabilityMappingV1",
@@ -182,6 +186,19 @@ class KustoConnector(ReportDBConnector):
                 print(f"Could not create backup Kusto connection: {e}")
                 self._ingestion_client_backup = None
 
+        """
+            Records are coalesced per table and sent to the primary and the backup
+            cluster concurrently. Batches failed to be sent are kept in the spool
+            directory, if it is set, and sent again by the next connector.
+        """
+        self._ingestion_queue = IngestionQueue(
+            {"primary": self._ingestion_client, "backup": self._ingestion_client_backup},
+            self._ingestion_properties,
+            spool_dir=os.getenv("TEST_REPORT_INGEST_SPOOL_DIR"))
+        self._batch_depth = 0
+        if self._ingestion_queue.spooled_batches():
+            print("Ingest {} spooled batches".format(self._ingestion_queue.retry_spooled()))
+
     def _create_connection_string_builder(self, cluster: str, auth_method: str, backup: bool = False):
         """Create KustoConnectionStringBuilder based on authentication method.
 
@@ -297,6 +314,39 @@ class KustoConnector(ReportDBConnector):
             result.update({"UTCTimestamp": ping_time})
         self._ingest_data(self.TESTBEDREACHABILITY_TABLE, ping_output)
 
+    @contextmanager
+    def batch_ingestion(self):
+        """Coalesce the records of all the uploads in the context into batches, sent when the context exits.
+
+        Without the context, the records of each upload are sent before the upload returns. Failures to send
+        the batches when the context exits are reported and not raised, so they do not abort the caller.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                try:
+                    self.flush()
+                except IngestionError as e:
+                    print("Failed to ingest the queued records, exception: {}".format(repr(e)))
+
+    def flush(self) -> None:
+        """Send all the queued records and wait until they are ingested or spooled."""
+        self._ingestion_queue.flush()
+        stats = self._ingestion_queue.stats.snapshot()
+        print("Ingested {} records in {} batches, {:.1f} records/s, {} failures, {} batches spooled".format(
+            stats["records_sent"], stats["batches_sent"], stats["records_per_second"],
+            stats["send_failures"], stats["batches_spooled"]))
+
+    def ingestion_stats(self) -> Dict:
+        """Get the throughput counters of the ingestion queue."""
+        return self._ingestion_queue.stats.snapshot()
+
+    def close(self) -> None:
+        self._ingestion_queue.close()
+
     def upload_swss_report_file(self, swss_file: str) -> None:
         """Upload a report to the back-end data store.
         Args:
@@ -304,6 +354,13 @@ class KustoConnector(ReportDBConnector):
         """
         self._upload_swss_log_file(swss_file)
 
+    def upload_swss_attribute_summary_file(self, summary_file: str) -> None:
+        """Upload a report to the back-end data store.
+        Args:
+            summary_file: json_file
+        """
+        self._upload_swss_attribute_summary_file(summary_file)
+
     def upload_case_invoc_report_file(self, file) -> None:
         """Upload a report to the back-end data store.
         Args:
@@ -359,6 +416,9 @@ class KustoConnector(ReportDBConnector):
     def _upload_swss_log_file(self, swss_file: str) -> None:
         self._ingest_data_file(self.SWSSDATA_TABLE, swss_file)
 
+    def _upload_swss_attribute_summary_file(self, summary_file: str) -> None:
+        self._ingest_data_file(self.SWSS_ATTRIBUTE_SUMMARY_TABLE, summary_file)
+
     def _upload_case_invoc_report_file(self, case_invoc_file):
         self._ingest_data_file(self.CASE_INVOC_TABLE, case_invoc_file)
 
@@ -426,42 +486,18 @@ class KustoConnector(ReportDBConnector):
         print("Upload test case")
         self._ingest_data(self.TEST_CASE_TABLE, test_cases)
 
-    def _ingest_data(self, table, data):
-        props = IngestionProperties(
+    def _ingestion_properties(self, table):
+        return IngestionProperties(
             database=self.db_name,
             table=table,
             data_format=self.TABLE_FORMAT_LOOKUP[table],
             ingestion_mapping_reference=self.TABLE_MAPPING_LOOKUP[table]
         )
 
-        # Create temporary file with delete=False to avoid Windows permission issues
-        temp_fd, temp_path = tempfile.mkstemp(suffix='.json', text=True)
-        try:
-            with os.fdopen(temp_fd, 'w') as temp_file:
-                if isinstance(data, list):
-                    temp_file.write('\n'.join([json.dumps(entry) for entry in data]))
-                else:
-                    temp_file.write(json.dumps(data))
-
-            print("Ingest to primary cluster...")
-            self._ingestion_client.ingest_from_file(
-                temp_path, ingestion_properties=props)
-
-            if self._ingestion_client_backup:
-                print("Ingest to backup cluster...")
-                self._ingestion_client_backup.ingest_from_file(
-                    temp_path, ingestion_properties=props)
-
-        except Exception as e:
-            print(f"Ingestion failed with error: {e}")
-            raise
-        finally:
-            # Clean up the temporary file
-            try:
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-            except Exception as cleanup_e:
-                print(f"Warning - failed to clean up temp file {temp_path}: {cleanup_e}")
+    def _ingest_data(self, table, data):
+        self._ingestion_queue.put(table, data)
+        if self._batch_depth == 0:
+            self._ingestion_queue.flush(table)
 
     def _ingest_data_file(self, table, data_file):
         props = IngestionProperties(
@@ -91,23 +91,24 @@ python3 report_uploader.py tests/files/sample_tr.xml -e TRACKING_ID#22
             version = args.version
         else:
             version = "UNKNOWN"
-        for path_name in args.path_list:
-            try:
-                reboot_data_regex = re.compile(
-                    '.*test.*_(reboot|sad|upgrade_path).*_(summary|report).json')
-                if reboot_data_regex.match(path_name):
-                    kusto_db.upload_reboot_report(path_name, tracking_id, report_guid)
-                else:
-                    if args.json:
-                        test_result_json = validate_junit_json_file(path_name)
+        with kusto_db.batch_ingestion():
+            for path_name in args.path_list:
+                try:
+                    reboot_data_regex = re.compile(
+                        '.*test.*_(reboot|sad|upgrade_path).*_(summary|report).json')
+                    if reboot_data_regex.match(path_name):
+                        kusto_db.upload_reboot_report(path_name, tracking_id, report_guid)
                     else:
-                        roots = validate_junit_xml_path(path_name)
-                        test_result_json = parse_test_result(roots)
-                    kusto_db.upload_report(test_result_json, tracking_id, report_guid, testbed, version)
-            except Exception as e:
-                print(f"Failed to upload report '{path_name}', exception: {repr(e)}")
-                import traceback
-                traceback.print_exc()
+                        if args.json:
+                            test_result_json = validate_junit_json_file(path_name)
+                        else:
+                            roots = validate_junit_xml_path(path_name)
+                            test_result_json = parse_test_result(roots)
+                        kusto_db.upload_report(test_result_json, tracking_id, report_guid, testbed, version)
+                except Exception as e:
+                    print(f"Failed to upload report '{path_name}', exception: {repr(e)}")
+                    import traceback
+                    traceback.print_exc()
     elif args.category == "reachability":
         reachability_data = []
         for path_name in args.path_list:
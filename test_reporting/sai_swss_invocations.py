@@ -1,13 +1,29 @@
 import argparse
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from curses.ascii import isupper
+import gzip
 import json
 
 from os import listdir
 from os.path import isfile, join, basename
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 from report_data_storage import KustoConnector
 import yaml
 
+# Fields of one invocation which vary between log entries, the fields of
+# the device (device, os_version, ...) are added when the record is written
+SwssLogRecord = namedtuple('SwssLogRecord', [
+    'log_file', 'log', 'log_time', 'sai_obj', 'sai_object_key',
+    'sai_feature', 'header_file', 'sai_op', 'sai_api',
+    'sai_obj_attr_key', 'sai_obj_attr_value'])
+
+# Buffer size of the json log file, records are written line by line
+JSON_WRITE_BUFFER = 1024 * 1024
+
+# Suffix of the attribute summary file of a device
+ATTRIBUTE_SUMMARY_SUFFIX = ".attribute_summary.json"
+
 
 def _run_script() -> Dict:
     '''
@@ -240,13 +256,117 @@ def process_bulk(line: str) -> Tuple:
     return obj, obj_keys, obj_key_attrs
 
 
+def iter_log_lines(log_file: str) -> Iterator[str]:
+    '''read the log line by line, gzipped log is read without unzipping
+    Args:
+        log_file: log file path, sairedis.rec or sairedis.rec.*.gz
+    Return:
+        line: log entry without trailing whitespace
+    '''
+    opener = gzip.open if log_file.endswith('.gz') else open
+    with opener(log_file, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield line.rstrip()
+
+
+def iter_log_records(config: Dict,
+                     log_file: str,
+                     features: List,
+                     sai_feature_file_map: Dict,
+                     sai_obj_feature_map: Dict) -> Iterator[SwssLogRecord]:
+    '''parse log to swss records, a record per attribute
+    Args:
+        config: swss config
+        log_file: log file path
+        features: sai features list
+        sai_feature_file_map: sai feature maps to header file
+        sai_obj_feature_map: sai obgject maps to feature
+    Return:
+        record: SwssLogRecord of an attribute, or of an object key
+                without attribute
+    '''
+    operation_map = config['operation_map']
+    # sai object -> (feature, header file), header file is None when the
+    # feature has no header and the object is skipped
+    obj_headers = {}
+    for line in iter_log_lines(log_file):
+        if 'SAI_OBJECT_TYPE' not in line:
+            continue
+        is_bulk, op = get_sai_op(line, operation_map)
+        if not op:
+            continue
+        if is_bulk:  # bulk op
+            sai_obj, sai_object_key, obj_key_attrs = process_bulk(line)
+        else:
+            obj_type = get_object_type_from_log(line)
+            if obj_type is None:
+                continue
+            sai_obj, sai_object_key = obj_type
+            obj_key_attrs = get_sai_obj_type(line)
+        if sai_obj not in obj_headers:
+            feature = get_sai_feature_from_sai_obj(
+                sai_obj, features, sai_obj_feature_map)
+            obj_headers[sai_obj] = (feature, get_sai_header_file_from_sai_obj(
+                feature, sai_feature_file_map))
+        sai_feature, header_file = obj_headers[sai_obj]
+        if not header_file:
+            continue
+        log_time = get_log_time(line)
+        sai_api = get_sai_api(op, sai_obj)
+        for obj_key, attributes in zip(sai_object_key, obj_key_attrs):
+            if len(attributes) == 0:
+                yield SwssLogRecord(log_file, line, log_time, sai_obj,
+                                    obj_key, sai_feature, header_file, op,
+                                    sai_api, None, None)
+                continue
+            for attribute in attributes:
+                yield SwssLogRecord(log_file, line, log_time, sai_obj,
+                                    obj_key, sai_feature, header_file, op,
+                                    sai_api, attribute[0],
+                                    attribute[1] if len(attribute) > 1
+                                    else None)
+
+
+def get_device_fields(config: Dict, info: Dict) -> Dict:
+    '''
+    Args:
+        config: swss config
+        info: info of the one device log config
+    Return:
+        fields of the device written with each record
+    '''
+    return {
+        'device': info['device'],
+        'os_version': info['os_version'],
+        'deployment_type': info['deployment_type'],
+        'deployment_subtype': info['deployment_subtype'],
+        'ngsdevice_type': config['ngsdevice_type'],
+    }
+
+
+def get_json_file(config: Dict, log_file: str, info: Dict) -> str:
+    '''
+    Args:
+        config: swss config
+        log_file: log file path
+        info: info of the one device log config
+    Return:
+        json file of the log, named after the log file, the .gz suffix
+        is kept so that sairedis.rec.N and sairedis.rec.N.gz do not
+        overwrite each other
+    '''
+    return config['json_log_path'] + "/" + \
+        basename(log_file) + "." + info['device'] + ".json"
+
+
 def convert_log_item(config: Dict,
                      log_file: str,
                      features: List,
                      sai_feature_file_map: Dict,
                      sai_obj_feature_map: Dict,
-                     info: Dict) -> None:
-    '''convert log to swss item
+                     info: Dict) -> Counter:
+    '''convert log to swss items, written to the json file as one json
+    object per line, and count the unique (feature, object, attribute)
     Args:
         config: swss config
         log_file: log file path
@@ -254,135 +374,146 @@ def convert_log_item(config: Dict,
         sai_feature_file_map: sai feature maps to header file
         sai_obj_feature_map: sai obgject maps to feature
         info: info of the one device log config
+    Return:
+        counts: (sai_feature, sai_obj, sai_obj_attr_key) -> invocations
     '''
-    f = open(log_file, 'r', encoding='utf-8')
-    log_name = basename(log_file)
-    Lines = f.readlines()
-    items = []
-    for line in Lines:
-        line = line.rstrip()
-        if 'SAI_OBJECT_TYPE' in line:
-            is_bulk, op = get_sai_op(line, config['operation_map'])
-            if op:
-                if is_bulk:  # bulk op
-                    sai_obj, sai_object_key, obj_key_attrs = process_bulk(line)
-                else:
-                    sai_obj, sai_object_key = get_object_type_from_log(
-                        line)
-                    obj_key_attrs = get_sai_obj_type(line)
-                for obj_key, attributes in zip(sai_object_key, obj_key_attrs):
-                    if len(attributes) == 0:
-                        log_item = Swss_log_item(config,
-                                                 info,
-                                                 sai_obj,
-                                                 obj_key,
-                                                 log_file,
-                                                 line,
-                                                 features,
-                                                 sai_feature_file_map,
-                                                 sai_obj_feature_map)
-                        if log_item.sai_feature and log_item.header_file:
-                            items.append(log_item)
-                    else:
-                        for attribute in attributes:
-                            log_item = Swss_log_item(config,
-                                                     info,
-                                                     sai_obj,
-                                                     obj_key,
-                                                     log_file,
-                                                     line,
-                                                     features,
-                                                     sai_feature_file_map,
-                                                     sai_obj_feature_map,
-                                                     attribute)
-                            if log_item.sai_feature and log_item.header_file:
-                                items.append(log_item)
-    json_file = config['json_log_path'] + "/" + \
-        log_name + "." + info['device'] + ".json"
+    counts = Counter()
+    records = iter_log_records(config, log_file, features,
+                               sai_feature_file_map, sai_obj_feature_map)
+    if not config.get('emit_events', True):
+        for record in records:
+            counts[(record.sai_feature, record.sai_obj,
+                    record.sai_obj_attr_key)] += 1
+        return counts
+
+    device_fields = get_device_fields(config, info)
+    json_file = get_json_file(config, log_file, info)
     print("write to file {}".format(json_file))
-    with open(json_file, 'w') as f:
-        json.dump([ob.__dict__ for ob in items], f, sort_keys=True, indent=4)
+    with open(json_file, 'w', buffering=JSON_WRITE_BUFFER) as f:
+        for record in records:
+            counts[(record.sai_feature, record.sai_obj,
+                    record.sai_obj_attr_key)] += 1
+            item = record._asdict()
+            item.update(device_fields)
+            f.write(json.dumps(item, sort_keys=True))
+            f.write('\n')
+    return counts
+
+
+def _convert_log_file(args: Tuple) -> Counter:
+    '''convert_log_item of a file in a worker process'''
+    return convert_log_item(*args)
+
+
+def write_attribute_summary(config: Dict,
+                            info: Dict,
+                            counts: Counter) -> str:
+    '''write the unique (feature, object, attribute) of a device with
+    their invocation counts, one json object per line
+    Args:
+        config: swss config
+        info: info of the one device log config
+        counts: (sai_feature, sai_obj, sai_obj_attr_key) -> invocations
+    Return:
+        summary_file: path of the summary file
+    '''
+    device_fields = get_device_fields(config, info)
+    summary_file = config['json_log_path'] + "/" + \
+        info['device'] + ATTRIBUTE_SUMMARY_SUFFIX
+    with open(summary_file, 'w') as f:
+        for (feature, obj, attr), count in sorted(
+                counts.items(), key=lambda item: tuple(
+                    '' if i is None else i for i in item[0])):
+            item = {'sai_feature': feature, 'sai_obj': obj,
+                    'sai_obj_attr_key': attr, 'count': count}
+            item.update(device_fields)
+            f.write(json.dumps(item, sort_keys=True))
+            f.write('\n')
+    print("write {} unique attributes to file {}".format(
+        len(counts), summary_file))
+    return summary_file
 
 
 def generate_json_logs(config: Dict,
                        info: Dict,
-                       sai_obj_feature_map: Dict) -> None:
-    '''get all the files and convert log to item
+                       sai_obj_feature_map: Dict) -> Counter:
+    '''get all the files and convert log to item, files are converted
+    by a pool of processes unless config workers is 1
     Args:
         config: swss config
         info: info of the one device log config
         sai_obj_feature_map: sai obgject maps to feature
+    Return:
+        counts: (sai_feature, sai_obj, sai_obj_attr_key) -> invocations
+                of all the files
     '''
     file_list = get_files_from_path(config['sai_path'])
     sai_feature_file_map = generate_sai_feature_file_map_from_header_files(
         file_list)
     features = generate_sai_feature_from_header_files(file_list)
-    files = get_files_from_path_and_name_pattern(
-        info['log_path'], "sairedis.rec", ".gz")
+    files = sorted(get_files_from_path_and_name_pattern(
+        info['log_path'], "sairedis.rec", ".json"))
     file_sum = len(files)
-    count = 0
-    for f in files:
-        count += 1
-        print("Generate json from file {}, {}/{}".format(f, count, file_sum))
-        convert_log_item(config, f,
-                         features, sai_feature_file_map,
-                         sai_obj_feature_map, info)
+    counts = Counter()
+    workers = config.get('workers') or None
+    if workers == 1 or file_sum <= 1:
+        for count, f in enumerate(files, 1):
+            print("Generate json from file {}, {}/{}".format(
+                f, count, file_sum))
+            counts.update(convert_log_item(config, f,
+                                           features, sai_feature_file_map,
+                                           sai_obj_feature_map, info))
+        return counts
+
+    tasks = [(config, f, features, sai_feature_file_map,
+              sai_obj_feature_map, info) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for count, (f, file_counts) in enumerate(
+                zip(files, executor.map(_convert_log_file, tasks)), 1):
+            print("Generated json from file {}, {}/{}".format(
+                f, count, file_sum))
+            counts.update(file_counts)
+    return counts
+
+
+def get_json_logs(json_log_path: str) -> Tuple[List, List]:
+    '''
+    Args:
+        json_log_path: json path
+    Return:
+        log_files: json files of the records
+        summary_files: attribute summary json files of the devices
+    '''
+    files = sorted(get_files_from_path(json_log_path))
+    log_files = [join(json_log_path, f) for f in files
+                 if "sairedis.rec" in f and f.endswith(".json")]
+    summary_files = [join(json_log_path, f) for f in files
+                     if f.endswith(ATTRIBUTE_SUMMARY_SUFFIX)]
+    return log_files, summary_files
 
 
 def ingest_json_logs(json_log_path: str) -> None:
-    '''ingest json to the kusto table
+    '''ingest the records to the SwssInvocationReport table and the
+    attribute summaries to the SwssAttributeSummary table
     Args:
         path:json path
     '''
     kusto_db = KustoConnector("SaiTestData")
-    files = get_files_from_path_and_name_pattern(
-        json_log_path, "sairedis.rec", ".gz")
-    file_sum = len(files)
+    log_files, summary_files = get_json_logs(json_log_path)
+    uploads = [(kusto_db.upload_swss_report_file, f) for f in log_files] + \
+        [(kusto_db.upload_swss_attribute_summary_file, f)
+         for f in summary_files]
+    file_sum = len(uploads)
     count = 0
     try:
-        for f in files:
-            kusto_db.upload_swss_report_file(f)
+        for upload, f in uploads:
+            upload(f)
             count += 1
             print("Ingested file {}, {}/{}".format(f, count, file_sum))
     except Exception as e:
         print("upload to kusto", e)
 
 
-class Swss_log_item:
-
-    def __init__(self, config: Dict, info: Dict,
-                 sai_obj: str, sai_object_key: str,
-                 log_file: str, line: str, features: List,
-                 sai_feature_file_map: Dict,
-                 sai_obj_feature_map: Dict,
-                 attribute=None):
-        self.log_file = log_file
-        self.log = line
-        self.sai_obj = sai_obj
-        self.sai_object_key = sai_object_key
-        self.log_time = get_log_time(line)
-        self.sai_feature = get_sai_feature_from_sai_obj(
-            self.sai_obj, features, sai_obj_feature_map)
-        self.header_file = get_sai_header_file_from_sai_obj(
-            self.sai_feature, sai_feature_file_map)
-        _, self.sai_op = get_sai_op(line, config['operation_map'])
-        self.sai_api = get_sai_api(self.sai_op, self.sai_obj)
-        self.sai_obj_attr_key = attribute[0] if attribute else None
-        self.sai_obj_attr_value = attribute[1] if attribute else None
-        self.device = info['device']
-        self.os_version = info['os_version']
-        self.deployment_type = info['deployment_type']
-        self.deployment_subtype = info['deployment_subtype']
-        self.ngsdevice_type = config['ngsdevice_type']
-
-    def dump_to_json(self):
-        '''
-        class item dumps to json
-        '''
-        return json.dumps(self, default=lambda o: o.__dict__,
-                          sort_keys=True, indent=4)
-
-
 if __name__ == "__main__":
     '''Before run this command, need to
     1. clone the sai repo to local disk and change sai_path
@@ -393,5 +524,6 @@ if __name__ == "__main__":
     config = _run_script()
     sai_obj_feature_map = {}
     for info in config['swss_device_log_items']:
-        generate_json_logs(config, info, sai_obj_feature_map)
+        counts = generate_json_logs(config, info, sai_obj_feature_map)
+        write_attribute_summary(config, info, counts)
     ingest_json_logs(config['json_log_path'])
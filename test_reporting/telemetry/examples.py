@@ -3,6 +3,7 @@ from datetime import datetime
 from typing import Dict
 from reporter_factory import TelemetryReporterFactory
 from metrics import GaugeMetric
+from exporters import OtlpJsonFileExporter, PrometheusTextExporter
 # flake8: noqa
 from metric_definitions import *
 
@@ -27,9 +28,14 @@ def MetricReporter():
     current_time = now.strftime("%H:%M:%S")
     common_labels[METRIC_LABEL_TEST_JOBID] = f"{common_labels[METRIC_LABEL_TEST_CASE]}_{today_date}_{current_time}"
 
-    # Create a MetricReporterFactory and build a PeriodicMetricsReporter
-    periodic_reporter = TelemetryReporterFactory.create_periodic_metrics_reporter(common_labels)
-    final_reporter = TelemetryReporterFactory.create_final_metrics_reporter(common_labels)
+    # Create a MetricReporterFactory and build a PeriodicMetricsReporter. In this example, metrics are exported
+    # to local files, OTLP/JSON lines and Prometheus text.
+    periodic_reporter = TelemetryReporterFactory.create_periodic_metrics_reporter(
+        common_labels,
+        exporters=[OtlpJsonFileExporter("periodic_metrics.jsonl"), PrometheusTextExporter("periodic_metrics.prom")])
+    final_reporter = TelemetryReporterFactory.create_final_metrics_reporter(
+        common_labels,
+        exporters=[OtlpJsonFileExporter("final_metrics.jsonl")])
 
     return periodic_reporter, final_reporter
 
@@ -196,6 +202,10 @@ def main():
     test_telemetry_example2(periodic_reporter, psu_metrics)
     test_telemetry_example3(final_reporter, bgp_metrics)
 
+    # Export the remaining metrics and close the exporters
+    periodic_reporter.close()
+    final_reporter.close()
+
 
 if __name__ == '__main__':
     main()
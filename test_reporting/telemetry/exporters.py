@@ -0,0 +1,181 @@
+"""
+This file defines the exporters of the metrics reporters, see metrics.py.
+
+An exporter receives the batches of records of a reporter by export(batch) and releases its resources on
+shutdown(). Exporters keep no reference to the batches they export.
+"""
+import json
+import os
+import re
+import threading
+
+from typing import Callable, Dict, List
+
+OTLP_SCOPE_NAME = "sonic-mgmt.test_reporting.telemetry"
+
+
+def _otlp_attributes(labels: Dict[str, str]) -> List[Dict]:
+    return [{"key": key, "value": {"stringValue": str(value)}} for key, value in labels.items()]
+
+
+class OtlpJsonFileExporter:
+    """
+    Append each batch to a file as one OTLP/JSON ExportMetricsServiceRequest per line, as written by the file
+    exporter of the OpenTelemetry collector. The common labels of the reporter are the resource attributes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        # Encoded attributes of each label set, by id of the label set in the reporter interner
+        self._attributes = {}
+
+    def _label_set_attributes(self, batch, label_set_id):
+        key = (id(batch.reporter), label_set_id)
+        attributes = self._attributes.get(key)
+        if attributes is None:
+            attributes = self._attributes[key] = _otlp_attributes(batch.reporter.interner.label_sets[label_set_id])
+        return attributes
+
+    def export(self, batch):
+        data_points = {}
+        for name_id, label_set_id, value, timestamp in zip(batch.name_ids, batch.label_set_ids, batch.values,
+                                                           batch.timestamps):
+            data_points.setdefault(name_id, []).append({
+                "attributes": self._label_set_attributes(batch, label_set_id),
+                "timeUnixNano": str(timestamp),
+                "asDouble": value,
+            })
+        metrics = []
+        for name_id, points in data_points.items():
+            metric = batch.metric(name_id)
+            metrics.append({"name": metric.name, "description": metric.description, "unit": metric.unit,
+                            "gauge": {"dataPoints": points}})
+        request = {"resourceMetrics": [{
+            "resource": {"attributes": _otlp_attributes(batch.common_labels)},
+            "scopeMetrics": [{"scope": {"name": OTLP_SCOPE_NAME}, "metrics": metrics}],
+        }]}
+        line = json.dumps(request, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line)
+            self._file.write("\n")
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def _prometheus_name(name: str) -> str:
+    name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+    return "_" + name if not name or name[0].isdigit() else name
+
+
+def _prometheus_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class PrometheusTextExporter:
+    """
+    Keep the last value of each series and write them to a file in the Prometheus text exposition format, e.g.
+    for the textfile collector of the node exporter. The file is replaced atomically after each batch. Samples
+    are written without timestamp, which the textfile collector does not accept.
+
+    Metrics are told apart by their identity, like in the reporter. A metric sharing its name with another metric,
+    e.g. with another unit, is written with its unit appended to the name, and a number if the name is still taken.
+
+    Memory is bounded by the number of series, not by the number of records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # metric identity -> (name, help and type lines), (metric identity, encoded labels) -> value
+        self._metrics = {}
+        self._names = set()
+        self._series = {}
+        self._encoded_labels = {}
+
+    def _metric(self, metric):
+        identity = metric.identity
+        if identity not in self._metrics:
+            name = _prometheus_name(metric.name)
+            if name in self._names:
+                name = "{}_{}".format(name, _prometheus_name(metric.unit))
+            unique_name, index = name, 1
+            while unique_name in self._names:
+                index += 1
+                unique_name = "{}_{}".format(name, index)
+            self._names.add(unique_name)
+            self._metrics[identity] = (unique_name, "# HELP {} {} ({})\n# TYPE {} gauge\n".format(
+                unique_name, metric.description.replace("\n", " "), metric.unit, unique_name))
+        return identity
+
+    def _labels(self, batch, label_set_id):
+        key = (id(batch.reporter), label_set_id)
+        encoded = self._encoded_labels.get(key)
+        if encoded is None:
+            labels = batch.labels(label_set_id)
+            encoded = self._encoded_labels[key] = ",".join(
+                '{}="{}"'.format(_prometheus_name(name), _prometheus_label_value(value))
+                for name, value in sorted(labels.items()))
+        return encoded
+
+    def export(self, batch):
+        with self._lock:
+            for name_id, label_set_id, value in zip(batch.name_ids, batch.label_set_ids, batch.values):
+                identity = self._metric(batch.metric(name_id))
+                labels = self._labels(batch, label_set_id)
+                self._series[(identity, labels)] = value
+            self._write()
+
+    def _write(self):
+        lines = []
+        series_by_name = {}
+        for (identity, labels), value in self._series.items():
+            name, header = self._metrics[identity]
+            series_by_name.setdefault(name, (header, []))[1].append((labels, value))
+        for name in sorted(series_by_name):
+            header, series = series_by_name[name]
+            lines.append(header)
+            for labels, value in sorted(series):
+                lines.append("{}{{{}}} {}\n".format(name, labels, repr(float(value))))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+    def shutdown(self):
+        pass
+
+
+class KustoBatchExporter:
+    """
+    Flatten each batch into one record per value and hand them to an ingestion function, e.g. the put method of
+    test_reporting/ingestion_queue.py IngestionQueue, which coalesces them into batches for Kusto.
+
+    Args:
+        put: Function queuing a list of records for a table, put(table, records).
+        table: Name of the Kusto table.
+        max_records: Maximum number of records passed to put at once.
+    """
+
+    def __init__(self, put: Callable[[str, List[Dict]], None], table: str, max_records: int = 10000):
+        self.put = put
+        self.table = table
+        self.max_records = max_records
+
+    def export(self, batch):
+        records = []
+        for metric, labels, value, timestamp in batch.records():
+            records.append({"name": metric.name, "unit": metric.unit, "labels": labels, "value": value,
+                            "timestamp_ns": timestamp})
+            if len(records) >= self.max_records:
+                self.put(self.table, records)
+                records = []
+        if records:
+            self.put(self.table, records)
+
+    def shutdown(self):
+        pass
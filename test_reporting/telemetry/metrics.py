@@ -1,58 +1,237 @@
 """
 This file defines the classes receiving metrics from snappi tests and processing them.
+
+Records are kept in columnar buffers: the metric name and the label set of each record are interned once per
+reporter and stored as ids, the value and the timestamp as numbers, so a record costs a few bytes whatever the
+number of its labels. Buffered records are handed to the exporters (see exporters.py) in batches, by a background
+thread on an interval and whenever the buffers reach their bound, so memory stays bounded however long a test
+records metrics.
 """
+import threading
 import time
 
-from copy import deepcopy
-from typing import Dict, Union
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# Default bound of the records buffered by a reporter before they are exported
+DEFAULT_MAX_BUFFERED_RECORDS = 100000
+# Default interval in seconds of the background export of a periodic reporter
+DEFAULT_FLUSH_INTERVAL = 10.0
+
 
+class LabelSetInterner:
+    """Map label dicts to ids, keeping one copy of each distinct label set."""
 
-class PeriodicMetricsReporter:
     def __init__(self, common_labels: Dict[str, str]):
-        # Will be replaced with a real initializer such as OpenTelemetry
-        self.common_labels = deepcopy(common_labels)
-        self.metrics = []
+        self.common_labels = dict(common_labels)
+        self.label_sets: List[Dict[str, str]] = []
+        # labels of each label set merged with the common labels, built when an exporter needs them
+        self._merged: Dict[int, Dict[str, str]] = {}
+        self._ids_by_items: Dict[Tuple, int] = {}
+        self._ids_by_canonical: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
 
-    def stash_record(self, new_metric: 'Metric', labels: Dict[str, str], name: str, value: Union[int, float]):
-        # add a new periodic metric
-        copied_labels = deepcopy(labels)
-        self.metrics.append({"labels": copied_labels, "name": name, "value": value})
+    def intern(self, labels: Dict[str, str]) -> int:
+        """Get the id of a label set. The labels are copied the first time the label set is seen only."""
+        items = tuple(labels.items())
+        label_set_id = self._ids_by_items.get(items)
+        if label_set_id is not None:
+            return label_set_id
+        with self._lock:
+            canonical = tuple(sorted(items))
+            label_set_id = self._ids_by_canonical.get(canonical)
+            if label_set_id is None:
+                label_set_id = len(self.label_sets)
+                self.label_sets.append(dict(canonical))
+                self._ids_by_canonical[canonical] = label_set_id
+            self._ids_by_items[items] = label_set_id
+        return label_set_id
 
-    def report(self, timestamp=time.time_ns()):
-        """
-        Report metrics at a given timestamp.
-        The input timestamp must be UNIX Epoch time in nanoseconds since 00:00:00 UTC on 1 January 1970
+    def labels(self, label_set_id: int) -> Dict[str, str]:
+        """Get the labels of a label set merged with the common labels. The dict is shared, do not modify it."""
+        merged = self._merged.get(label_set_id)
+        if merged is None:
+            merged = dict(self.common_labels)
+            merged.update(self.label_sets[label_set_id])
+            self._merged[label_set_id] = merged
+        return merged
 
-        # save the metrics in a local variable and release the metrics in the object
-        stashed_metrics = self.metrics
-        self.metrics = []
+    def __len__(self):
+        return len(self.label_sets)
 
-        """
-        pass
 
+class MetricBatch:
+    """Columnar batch of records handed to the exporters."""
 
-class FinalMetricsReporter:
-    def __init__(self, common_labels: Dict[str, str]):
-        # Will be replaced with a real initializer such as Kusto
-        self.common_labels = deepcopy(common_labels)
-        self.metrics = []
+    def __init__(self, reporter: 'MetricsReporter'):
+        self.reporter = reporter
+        self.name_ids = array('I')
+        self.label_set_ids = array('I')
+        self.values = array('d')
+        self.timestamps = array('q')
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def common_labels(self) -> Dict[str, str]:
+        return self.reporter.interner.common_labels
+
+    def metric(self, name_id: int) -> 'Metric':
+        return self.reporter.metrics[name_id]
+
+    def labels(self, label_set_id: int) -> Dict[str, str]:
+        return self.reporter.interner.labels(label_set_id)
+
+    def records(self) -> Iterator[Tuple['Metric', Dict[str, str], float, int]]:
+        """Iterate the records as (metric, labels merged with the common labels, value, timestamp in ns)."""
+        metrics = self.reporter.metrics
+        labels = self.reporter.interner.labels
+        for name_id, label_set_id, value, timestamp in zip(self.name_ids, self.label_set_ids, self.values,
+                                                           self.timestamps):
+            yield metrics[name_id], labels(label_set_id), value, timestamp
+
+
+class MetricsReporter:
+    """
+    Base class of the reporters, buffering records and exporting them to the exporters.
+
+    Args:
+        common_labels: Labels added to all the records, e.g. test case and testbed.
+        exporters: Objects with export(batch) and shutdown() methods, see exporters.py. Records are dropped when
+            they are exported if there is no exporter.
+        max_buffered_records: Records are exported from the caller of stash_record or report when this many are
+            buffered, so memory stays bounded even if the background export does not keep up.
+        flush_interval: Seconds between two exports by the background thread, None to export on report only.
+    """
+
+    def __init__(self, common_labels: Dict[str, str], exporters: Optional[List] = None,
+                 max_buffered_records: int = DEFAULT_MAX_BUFFERED_RECORDS,
+                 flush_interval: Optional[float] = None):
+        self.interner = LabelSetInterner(common_labels)
+        self.common_labels = self.interner.common_labels
+        self.exporters = list(exporters) if exporters else []
+        self.max_buffered_records = max_buffered_records
+        self.metrics: List['Metric'] = []
+        # ids of the metrics by (type, name, description, unit), and by metric object for the lookup of each record
+        self._metric_ids: Dict[Tuple, int] = {}
+        self._ids_by_metric: Dict['Metric', int] = {}
+        self._pending = MetricBatch(self)
+        self._reported: List[MetricBatch] = []
+        self._reported_records = 0
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self.exported_records = 0
+
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,),
+                                             name="metrics-reporter-flush")
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _metric_id(self, metric: 'Metric', name: str) -> int:
+        metric_id = self._ids_by_metric.get(metric)
+        if metric_id is None:
+            # metrics sharing a name but differing in type, description or unit are distinct metrics
+            key = metric.identity
+            with self._lock:
+                metric_id = self._metric_ids.get(key)
+                if metric_id is None:
+                    metric_id = len(self.metrics)
+                    self.metrics.append(metric)
+                    self._metric_ids[key] = metric_id
+                self._ids_by_metric[metric] = metric_id
+        return metric_id
 
     def stash_record(self, new_metric: 'Metric', labels: Dict[str, str], name: str, value: Union[int, float]):
-        # add a new final metric
-        copied_labels = deepcopy(labels)
-        self.metrics.append({"labels": copied_labels, "name": name, "value": value})
+        # add a new record, it is timestamped when it is reported
+        name_id = self._metric_id(new_metric, name)
+        label_set_id = self.interner.intern(labels)
+        with self._lock:
+            pending = self._pending
+            pending.name_ids.append(name_id)
+            pending.label_set_ids.append(label_set_id)
+            pending.values.append(value)
+            full = len(pending) + self._reported_records > self.max_buffered_records
+        if full:
+            # Records stashed without being reported are timestamped now
+            self.report()
 
-    def report(self, timestamp=time.time_ns()):
+    def report(self, timestamp: Optional[int] = None):
         """
         Report metrics at a given timestamp.
-        The input timestamp must be UNIX Epoch time in nanoseconds since 00:00:00 UTC on 1 January 1970
-
-        # save the metrics in a local variable and release the metrics in the object
-        stashed_metrics = self.metrics
-        self.metrics = []
+        The input timestamp must be UNIX Epoch time in nanoseconds since 00:00:00 UTC on 1 January 1970,
+        it defaults to the current time.
 
+        The records stashed since the last report are timestamped and queued for the exporters.
         """
-        pass
+        if timestamp is None:
+            timestamp = time.time_ns()
+        with self._lock:
+            batch = self._pending
+            if len(batch):
+                self._pending = MetricBatch(self)
+                batch.timestamps = array('q', [timestamp]) * len(batch)
+                self._reported.append(batch)
+                self._reported_records += len(batch)
+            full = self._reported_records >= self.max_buffered_records
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Export the reported records to all the exporters."""
+        with self._export_lock:
+            with self._lock:
+                batches, self._reported, self._reported_records = self._reported, [], 0
+            for batch in batches:
+                for exporter in self.exporters:
+                    exporter.export(batch)
+                self.exported_records += len(batch)
+
+    def close(self):
+        """Report the records not reported yet, export all the records and shut the exporters down."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.report()
+        self.flush()
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+    def _flush_periodically(self, interval: float):
+        while not self._closed.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print("Failed to export metrics: {}".format(repr(e)))
+
+
+class PeriodicMetricsReporter(MetricsReporter):
+    """Reporter of the metrics sampled periodically during a test, e.g. port counters every second.
+
+    Reported records are exported by a background thread every flush_interval seconds.
+    """
+
+    def __init__(self, common_labels: Dict[str, str], exporters: Optional[List] = None,
+                 max_buffered_records: int = DEFAULT_MAX_BUFFERED_RECORDS,
+                 flush_interval: Optional[float] = DEFAULT_FLUSH_INTERVAL):
+        super().__init__(common_labels, exporters, max_buffered_records, flush_interval)
+
+
+class FinalMetricsReporter(MetricsReporter):
+    """Reporter of the final results of a test, e.g. convergence time. Records are exported when reported."""
+
+    def __init__(self, common_labels: Dict[str, str], exporters: Optional[List] = None,
+                 max_buffered_records: int = DEFAULT_MAX_BUFFERED_RECORDS):
+        super().__init__(common_labels, exporters, max_buffered_records, flush_interval=None)
+
+    def report(self, timestamp: Optional[int] = None):
+        super().report(timestamp)
+        self.flush()
 
 
 class Metric:
@@ -60,19 +239,24 @@ class Metric:
                  name: str,
                  description: str,
                  unit: str,
-                 reporter: PeriodicMetricsReporter):
+                 reporter: MetricsReporter):
         """
         Args:
             name (str): metric name (e.g., psu power, sensor temperature, port stats, etc.)
             description (str): brief description of the metric
             unit (str): metric unit (e.g., seconds, bytes)
-            reporter (PeriodicMetricsReporter): object of PeriodicMetricsReporter
+            reporter (MetricsReporter): object of PeriodicMetricsReporter or FinalMetricsReporter
         """
         self.name = name
         self.description = description
         self.unit = unit
         self.reporter = reporter
 
+    @property
+    def identity(self) -> Tuple:
+        """Metrics with the same identity are the same metric, even if they are different objects."""
+        return (type(self), self.name, self.description, self.unit)
+
     def __repr__(self):
         return (f"Metric(name={self.name!r}, "
                 f"description={self.description!r}, "
@@ -85,7 +269,7 @@ class GaugeMetric(Metric):
                  name: str,
                  description: str,
                  unit: str,
-                 reporter: PeriodicMetricsReporter):
+                 reporter: MetricsReporter):
         # Initialize the base class
         super().__init__(name, description, unit, reporter)
 
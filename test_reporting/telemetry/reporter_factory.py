@@ -1,5 +1,5 @@
-from typing import Dict
-from metrics import PeriodicMetricsReporter, FinalMetricsReporter
+from typing import Dict, List, Optional
+from metrics import PeriodicMetricsReporter, FinalMetricsReporter, DEFAULT_FLUSH_INTERVAL
 
 
 class TelemetryReporterFactory:
@@ -7,9 +7,10 @@ class TelemetryReporterFactory:
         return
 
     @staticmethod
-    def create_periodic_metrics_reporter(common_labels: Dict[str, str]):
-        return (PeriodicMetricsReporter(common_labels))
+    def create_periodic_metrics_reporter(common_labels: Dict[str, str], exporters: Optional[List] = None,
+                                         flush_interval: Optional[float] = DEFAULT_FLUSH_INTERVAL):
+        return (PeriodicMetricsReporter(common_labels, exporters, flush_interval=flush_interval))
 
     @staticmethod
-    def create_final_metrics_reporter(common_labels: Dict[str, str]):
-        return (FinalMetricsReporter(common_labels))
+    def create_final_metrics_reporter(common_labels: Dict[str, str], exporters: Optional[List] = None):
+        return (FinalMetricsReporter(common_labels, exporters))
@@ -0,0 +1,182 @@
+"""Tests for the batched ingestion queue, with local stand-in ingestion clients."""
+import gzip
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from test_reporting import ingestion_queue
+from test_reporting.ingestion_queue import IngestionQueue, IngestionError
+
+
+class LocalIngestClient(object):
+    """Stand-in of the Kusto ingest client, keeping the ingested records per table."""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.tables = {}
+        self.files = []
+        self._lock = threading.Lock()
+
+    def ingest_from_file(self, path, ingestion_properties):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("cluster unavailable")
+        assert path.endswith(".json.gz")
+        with gzip.open(path, "rt") as f:
+            records = [json.loads(line) for line in f]
+        with self._lock:
+            self.files.append(path)
+            self.tables.setdefault(ingestion_properties["table"], []).extend(records)
+
+    def records(self, table):
+        return self.tables.get(table, [])
+
+
+def _properties(table):
+    return {"table": table}
+
+
+def _records(count, start=0):
+    return [{"id": i, "name": "case_{}".format(i)} for i in range(start, start + count)]
+
+
+def test_records_coalesced_per_table():
+    primary = LocalIngestClient()
+    with IngestionQueue({"primary": primary}, _properties, max_batch_age=0) as queue:
+        queue.put("TestCases", _records(3))
+        queue.put("TestCases", _records(2, start=3))
+        queue.put("TestReportSummary", {"tests": 5})
+        assert primary.files == []
+        queue.flush()
+
+    assert primary.records("TestCases") == _records(5)
+    assert primary.records("TestReportSummary") == [{"tests": 5}]
+    assert len(primary.files) == 2
+    stats = queue.stats.snapshot()
+    assert stats["records_queued"] == 6
+    assert stats["records_sent"] == 6
+    assert stats["batches_sent"] == 2
+    assert stats["compressed_bytes"] > 0
+
+
+def test_batch_sent_at_size_bound():
+    primary = LocalIngestClient()
+    with IngestionQueue({"primary": primary}, _properties, max_batch_records=4, max_batch_age=0) as queue:
+        queue.put("TestCases", _records(10))
+        queue.flush()
+
+    assert primary.records("TestCases") == _records(10)
+    assert len(primary.files) == 3
+
+
+def test_batch_sent_at_age_bound():
+    primary = LocalIngestClient()
+    with IngestionQueue({"primary": primary}, _properties, max_batch_age=0.1) as queue:
+        queue.put("TestCases", _records(2))
+        deadline = time.time() + 5
+        while not primary.records("TestCases") and time.time() < deadline:
+            time.sleep(0.05)
+        assert primary.records("TestCases") == _records(2)
+
+
+def test_primary_and_backup_sent_concurrently():
+    primary = LocalIngestClient(delay=0.5)
+    backup = LocalIngestClient(delay=0.5)
+    with IngestionQueue({"primary": primary, "backup": backup, "missing": None}, _properties,
+                        max_batch_age=0) as queue:
+        queue.put("TestCases", _records(3))
+        start = time.time()
+        queue.flush()
+        elapsed = time.time() - start
+
+    assert primary.records("TestCases") == _records(3)
+    assert backup.records("TestCases") == _records(3)
+    assert elapsed < 0.9
+
+
+def test_failure_without_spool_raises():
+    primary = LocalIngestClient()
+    backup = LocalIngestClient(fail=True)
+    queue = IngestionQueue({"primary": primary, "backup": backup}, _properties, max_batch_age=0)
+    queue.put("TestCases", _records(3))
+    with pytest.raises(IngestionError):
+        queue.flush()
+    queue.close()
+
+    assert primary.records("TestCases") == _records(3)
+    assert queue.stats.snapshot()["send_failures"] == 1
+
+
+def test_failure_spooled_and_retried(tmp_path):
+    primary = LocalIngestClient()
+    backup = LocalIngestClient(fail=True)
+    spool_dir = str(tmp_path)
+    with IngestionQueue({"primary": primary, "backup": backup}, _properties, spool_dir=spool_dir,
+                        max_batch_age=0) as queue:
+        queue.put("TestCases", _records(3))
+        queue.flush()
+
+        spooled = queue.spooled_batches()
+        assert list(spooled) == ["backup"]
+        assert len(spooled["backup"]) == 1
+        assert queue.stats.snapshot()["batches_spooled"] == 1
+
+        # Still failing, the batch is kept in the spool
+        assert queue.retry_spooled() == 0
+        assert os.path.exists(spooled["backup"][0])
+
+        backup.fail = False
+        assert queue.retry_spooled() == 1
+        assert queue.spooled_batches() == {}
+
+    assert primary.records("TestCases") == _records(3)
+    assert backup.records("TestCases") == _records(3)
+    assert queue.stats.snapshot()["batches_resent"] == 1
+
+
+def test_spooled_batch_claimed_by_one_process(tmp_path):
+    spool_dir = str(tmp_path)
+    with IngestionQueue({"backup": LocalIngestClient(fail=True)}, _properties, spool_dir=spool_dir,
+                        max_batch_age=0) as queue:
+        queue.put("TestCases", _records(3))
+        queue.flush()
+    batch_file = queue.spooled_batches()["backup"][0]
+
+    # Another process claimed the batch while this one was about to send it
+    claimed = IngestionQueue._claim(batch_file)
+    assert claimed is not None
+    backup = LocalIngestClient()
+    with IngestionQueue({"backup": backup}, _properties, spool_dir=spool_dir, max_batch_age=0) as other:
+        assert other.spooled_batches() == {}
+        assert other._resend("backup", "TestCases", batch_file) is False
+    assert backup.records("TestCases") == []
+    assert os.path.exists(claimed)
+
+
+def test_abandoned_claim_retried(tmp_path, monkeypatch):
+    spool_dir = str(tmp_path)
+    with IngestionQueue({"backup": LocalIngestClient(fail=True)}, _properties, spool_dir=spool_dir,
+                        max_batch_age=0) as queue:
+        queue.put("TestCases", _records(3))
+        queue.flush()
+    claimed = IngestionQueue._claim(queue.spooled_batches()["backup"][0])
+
+    backup = LocalIngestClient()
+    with IngestionQueue({"backup": backup}, _properties, spool_dir=spool_dir, max_batch_age=0) as other:
+        monkeypatch.setattr(ingestion_queue, "SPOOL_CLAIM_TIMEOUT", 0)
+        assert other.spooled_batches() == {"backup": [claimed]}
+        assert other.retry_spooled() == 1
+        assert other.spooled_batches() == {}
+    assert backup.records("TestCases") == _records(3)
+    assert os.listdir(os.path.join(spool_dir, "backup")) == []
+
+
+def test_put_after_close_raises():
+    queue = IngestionQueue({"primary": LocalIngestClient()}, _properties, max_batch_age=0)
+    queue.close()
+    with pytest.raises(IngestionError):
+        queue.put("TestCases", _records(1))
@@ -1,9 +1,12 @@
 """Tests for the JUnit XML parser."""
+import io
+import json
 import os
 import pytest
 
 from test_reporting.junit_xml_parser import validate_junit_xml_stream, validate_junit_xml_file
 from test_reporting.junit_xml_parser import validate_junit_xml_archive, parse_test_result, JUnitXMLValidationError
+from test_reporting.junit_xml_parser import iterparse_junit_xml_file, iter_junit_xml_results, parse_test_result_stream
 
 
 VALID_TEST_RESULT = """<?xml version="1.0" encoding="utf-8"?>
@@ -247,6 +250,60 @@ def test_xml_file_not_found():
         validate_junit_xml_file("nonexistent.xml")
 
 
+@pytest.mark.parametrize("compact", [False, True])
+def test_stream_json_output_from_file(compact):
+    output = io.StringIO()
+    parse_test_result_stream(VALID_TEST_RESULT_FILE, output, compact=compact)
+
+    expected = parse_test_result([(validate_junit_xml_file(VALID_TEST_RESULT_FILE), VALID_TEST_RESULT_FILE)])
+    if compact:
+        assert output.getvalue() == json.dumps(expected, separators=(",", ":"), sort_keys=True)
+    else:
+        assert output.getvalue() == json.dumps(expected, indent=4, sort_keys=True)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stream_json_output_from_archive(workers):
+    output = io.StringIO()
+    parse_test_result_stream(VALID_TEST_RESULT_ARCHIVE, output, workers=workers)
+
+    expected = parse_test_result(validate_junit_xml_archive(VALID_TEST_RESULT_ARCHIVE))
+    assert ordered(json.loads(output.getvalue())) == ordered(expected)
+
+
+@pytest.mark.parametrize(
+    "token,replacement,message",
+    [
+        ("testsuite", "fail", ".* tag are not found on root element"),
+        ("errors", "bunnies", ".* not found in .* element"),
+        ("hwsku", "host", "duplicate metadata element: .*"),
+        ("classname", "hehe", ".* not found in test case .*"),
+        ("</", "<", "could not parse .*"),
+    ],
+)
+def test_stream_invalid_junit_xml(tmp_path, token, replacement, message):
+    document = tmp_path / "test_invalid.xml"
+    document.write_text(VALID_TEST_RESULT.replace(token, replacement))
+    with pytest.raises(JUnitXMLValidationError, match=message):
+        iterparse_junit_xml_file(str(document))
+
+
+def test_stream_archive_skips_invalid_unless_strict(tmp_path):
+    (tmp_path / "test_valid.xml").write_text(VALID_TEST_RESULT)
+    (tmp_path / "test_invalid.xml").write_text(VALID_TEST_RESULT.replace("classname", "hehe"))
+
+    results = list(iter_junit_xml_results(str(tmp_path), workers=1))
+    assert [os.path.basename(result.document) for result in results] == ["test_valid.xml"]
+
+    with pytest.raises(JUnitXMLValidationError, match="could not parse .*test_invalid.xml"):
+        list(iter_junit_xml_results(str(tmp_path), strict=True, workers=1))
+
+
+def test_stream_xml_file_not_found():
+    with pytest.raises(JUnitXMLValidationError, match="file not found"):
+        iterparse_junit_xml_file("nonexistent.xml")
+
+
 # credit to: https://stackoverflow.com/questions/25851183/
 def ordered(obj):
     if isinstance(obj, dict):
@@ -0,0 +1,180 @@
+"""Tests for the sairedis log scanner."""
+import gzip
+import json
+import os
+import shutil
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("azure.kusto.data")
+
+from test_reporting import sai_swss_invocations  # noqa: E402
+from test_reporting.sai_swss_invocations import SwssLogRecord, iter_log_records, convert_log_item  # noqa: E402
+from test_reporting.sai_swss_invocations import generate_json_logs, write_attribute_summary  # noqa: E402
+from test_reporting.sai_swss_invocations import ingest_json_logs  # noqa: E402
+
+OPERATION_MAP = {"r": "remove", "c": "create", "g": "get", "s": "set", "q": "query",
+                 "C": "bulk_create", "R": "bulk_reomve", "S": "bulk_set"}
+
+HEADER_FILES = ["saiport.h", "sairoute.h", "saiswitch.h"]
+
+SAIREDIS_LOG = """2024-01-01.00:00:00.000001|a|INIT_VIEW
+2024-01-01.00:00:00.000002|c|SAI_OBJECT_TYPE_SWITCH:oid:0x21000000000000|SAI_SWITCH_ATTR_INIT_SWITCH=true|SAI_SWITCH_ATTR_SRC_MAC_ADDRESS=00:11:22:33:44:55
+2024-01-01.00:00:00.000003|s|SAI_OBJECT_TYPE_PORT:oid:0x1000000000002|SAI_PORT_ATTR_ADMIN_STATE=true
+2024-01-01.00:00:00.000004|C|SAI_OBJECT_TYPE_ROUTE_ENTRY||{"dest":"10.0.0.0/24"}|SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION=SAI_PACKET_ACTION_FORWARD||{"dest":"10.0.1.0/24"}|SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION=SAI_PACKET_ACTION_DROP
+2024-01-01.00:00:00.000005|r|SAI_OBJECT_TYPE_ROUTE_ENTRY:{"dest":"10.0.0.0/24"}
+2024-01-01.00:00:00.000006|c|SAI_OBJECT_TYPE_HOSTIF:oid:0xd000000000003|SAI_HOSTIF_ATTR_NAME=Ethernet0
+2024-01-01.00:00:00.000007|x|SAI_OBJECT_TYPE_PORT:oid:0x1000000000002
+"""
+
+EXPECTED_COUNTS = Counter({
+    ("switch", "SAI_OBJECT_TYPE_SWITCH", "SAI_SWITCH_ATTR_INIT_SWITCH"): 1,
+    ("switch", "SAI_OBJECT_TYPE_SWITCH", "SAI_SWITCH_ATTR_SRC_MAC_ADDRESS"): 1,
+    ("port", "SAI_OBJECT_TYPE_PORT", "SAI_PORT_ATTR_ADMIN_STATE"): 1,
+    ("route", "SAI_OBJECT_TYPE_ROUTE_ENTRY", "SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION"): 2,
+    ("route", "SAI_OBJECT_TYPE_ROUTE_ENTRY", None): 1,
+})
+
+DEVICE_INFO = {"device": "dut-01", "os_version": "20231110.01", "deployment_type": "type",
+               "deployment_subtype": "subtype"}
+
+
+@pytest.fixture
+def config(tmp_path):
+    sai_path = tmp_path / "sai"
+    sai_path.mkdir()
+    for header_file in HEADER_FILES:
+        (sai_path / header_file).write_text("")
+    json_log_path = tmp_path / "json"
+    json_log_path.mkdir()
+    return {"sai_path": str(sai_path), "json_log_path": str(json_log_path), "operation_map": OPERATION_MAP,
+            "ngsdevice_type": "ToRRouter", "emit_events": True, "workers": 1}
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    log_path = tmp_path / "logs"
+    log_path.mkdir()
+    (log_path / "sairedis.rec").write_text(SAIREDIS_LOG)
+    with gzip.open(str(log_path / "sairedis.rec.1.gz"), "wt") as f:
+        f.write(SAIREDIS_LOG)
+    return log_path
+
+
+def _records(config, log_file):
+    features = [f.replace("sai", "").replace(".h", "") for f in HEADER_FILES]
+    feature_files = dict(zip(features, HEADER_FILES))
+    return list(iter_log_records(config, log_file, features, feature_files, {}))
+
+
+@pytest.mark.parametrize("log_name", ["sairedis.rec", "sairedis.rec.1.gz"])
+def test_iter_log_records(config, log_path, log_name):
+    log_file = str(log_path / log_name)
+    records = _records(config, log_file)
+    lines = SAIREDIS_LOG.splitlines()
+
+    assert records == [
+        SwssLogRecord(log_file, lines[1], "2024-01-01.00:00:00.000002", "SAI_OBJECT_TYPE_SWITCH",
+                      "oid:0x21000000000000", "switch", "saiswitch.h", "create", "create_switch",
+                      "SAI_SWITCH_ATTR_INIT_SWITCH", "true"),
+        SwssLogRecord(log_file, lines[1], "2024-01-01.00:00:00.000002", "SAI_OBJECT_TYPE_SWITCH",
+                      "oid:0x21000000000000", "switch", "saiswitch.h", "create", "create_switch",
+                      "SAI_SWITCH_ATTR_SRC_MAC_ADDRESS", "00:11:22:33:44:55"),
+        SwssLogRecord(log_file, lines[2], "2024-01-01.00:00:00.000003", "SAI_OBJECT_TYPE_PORT",
+                      "oid:0x1000000000002", "port", "saiport.h", "set", "set_port",
+                      "SAI_PORT_ATTR_ADMIN_STATE", "true"),
+        SwssLogRecord(log_file, lines[3], "2024-01-01.00:00:00.000004", "SAI_OBJECT_TYPE_ROUTE_ENTRY",
+                      '{"dest":"10.0.0.0/24"}', "route", "sairoute.h", "bulk_create", "bulk_create_route_entry",
+                      "SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION", "SAI_PACKET_ACTION_FORWARD"),
+        SwssLogRecord(log_file, lines[3], "2024-01-01.00:00:00.000004", "SAI_OBJECT_TYPE_ROUTE_ENTRY",
+                      '{"dest":"10.0.1.0/24"}', "route", "sairoute.h", "bulk_create", "bulk_create_route_entry",
+                      "SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION", "SAI_PACKET_ACTION_DROP"),
+        SwssLogRecord(log_file, lines[4], "2024-01-01.00:00:00.000005", "SAI_OBJECT_TYPE_ROUTE_ENTRY",
+                      '{"dest":"10.0.0.0/24"}', "route", "sairoute.h", "remove", "remove_route_entry",
+                      None, None),
+    ]
+
+
+@pytest.mark.parametrize("emit_events", [True, False])
+def test_convert_log_item(config, log_path, emit_events):
+    config["emit_events"] = emit_events
+    features = [f.replace("sai", "").replace(".h", "") for f in HEADER_FILES]
+    feature_files = dict(zip(features, HEADER_FILES))
+    log_file = str(log_path / "sairedis.rec.1.gz")
+
+    counts = convert_log_item(config, log_file, features, feature_files, {}, DEVICE_INFO)
+
+    assert counts == EXPECTED_COUNTS
+    json_file = os.path.join(config["json_log_path"], "sairedis.rec.1.gz.dut-01.json")
+    if not emit_events:
+        assert not os.path.exists(json_file)
+        return
+    with open(json_file) as f:
+        items = [json.loads(line) for line in f]
+    assert len(items) == len(_records(config, log_file))
+    assert items[0]["device"] == "dut-01"
+    assert items[0]["ngsdevice_type"] == "ToRRouter"
+    assert items[0]["sai_obj_attr_key"] == "SAI_SWITCH_ATTR_INIT_SWITCH"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_generate_json_logs_counts(config, log_path, workers):
+    config["workers"] = workers
+    # the json files of an earlier run are not read again
+    shutil.copy(str(log_path / "sairedis.rec"), str(log_path / "sairedis.rec.dut-01.json"))
+    info = dict(DEVICE_INFO, log_path=str(log_path))
+
+    counts = generate_json_logs(config, info, {})
+
+    assert counts == EXPECTED_COUNTS + EXPECTED_COUNTS
+    assert sorted(os.listdir(config["json_log_path"])) == ["sairedis.rec.1.gz.dut-01.json",
+                                                           "sairedis.rec.dut-01.json"]
+
+
+def test_write_attribute_summary(config):
+    summary_file = write_attribute_summary(config, DEVICE_INFO, EXPECTED_COUNTS)
+
+    assert summary_file == os.path.join(config["json_log_path"], "dut-01.attribute_summary.json")
+    with open(summary_file) as f:
+        items = [json.loads(line) for line in f]
+    assert [(item["sai_feature"], item["sai_obj"], item["sai_obj_attr_key"], item["count"]) for item in items] == [
+        ("port", "SAI_OBJECT_TYPE_PORT", "SAI_PORT_ATTR_ADMIN_STATE", 1),
+        ("route", "SAI_OBJECT_TYPE_ROUTE_ENTRY", None, 1),
+        ("route", "SAI_OBJECT_TYPE_ROUTE_ENTRY", "SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION", 2),
+        ("switch", "SAI_OBJECT_TYPE_SWITCH", "SAI_SWITCH_ATTR_INIT_SWITCH", 1),
+        ("switch", "SAI_OBJECT_TYPE_SWITCH", "SAI_SWITCH_ATTR_SRC_MAC_ADDRESS", 1),
+    ]
+    assert all(item["device"] == "dut-01" for item in items)
+
+
+class LocalKustoConnector(object):
+    """Stand-in of the Kusto connector, keeping the uploaded files per table."""
+
+    uploads = []
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+
+    def upload_swss_report_file(self, swss_file):
+        self.uploads.append(("SwssInvocationReport", os.path.basename(swss_file)))
+
+    def upload_swss_attribute_summary_file(self, summary_file):
+        self.uploads.append(("SwssAttributeSummary", os.path.basename(summary_file)))
+
+
+@pytest.mark.parametrize("emit_events", [True, False])
+def test_ingest_json_logs(config, log_path, monkeypatch, emit_events):
+    monkeypatch.setattr(sai_swss_invocations, "KustoConnector", LocalKustoConnector)
+    monkeypatch.setattr(LocalKustoConnector, "uploads", [])
+    config["emit_events"] = emit_events
+    info = dict(DEVICE_INFO, log_path=str(log_path))
+    write_attribute_summary(config, info, generate_json_logs(config, info, {}))
+
+    ingest_json_logs(config["json_log_path"])
+
+    expected = [("SwssAttributeSummary", "dut-01.attribute_summary.json")]
+    if emit_events:
+        expected = [("SwssInvocationReport", "sairedis.rec.1.gz.dut-01.json"),
+                    ("SwssInvocationReport", "sairedis.rec.dut-01.json")] + expected
+    assert LocalKustoConnector.uploads == expected
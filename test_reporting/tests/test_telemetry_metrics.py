@@ -0,0 +1,163 @@
+"""Tests for the telemetry metrics reporters and exporters."""
+import json
+
+from test_reporting.telemetry.metrics import PeriodicMetricsReporter, FinalMetricsReporter, GaugeMetric
+from test_reporting.telemetry.exporters import OtlpJsonFileExporter, PrometheusTextExporter, KustoBatchExporter
+
+COMMON_LABELS = {"test.testcase": "mock-case", "test.testbed": "TB-XYZ"}
+
+
+class ListExporter(object):
+    """Exporter keeping the exported records."""
+
+    def __init__(self):
+        self.records = []
+        self.batches = 0
+        self.closed = False
+
+    def export(self, batch):
+        self.batches += 1
+        self.records.extend((metric.name, dict(labels), value, timestamp)
+                            for metric, labels, value, timestamp in batch.records())
+
+    def shutdown(self):
+        self.closed = True
+
+
+class MetricListExporter(ListExporter):
+    """Exporter keeping the type and the unit of the metric of each exported record."""
+
+    def __init__(self):
+        super().__init__()
+        self.metrics = []
+
+    def export(self, batch):
+        super().export(batch)
+        self.metrics.extend((type(metric), metric.unit, value) for metric, _, value, _ in batch.records())
+
+
+def test_label_sets_interned():
+    exporter = ListExporter()
+    reporter = PeriodicMetricsReporter(COMMON_LABELS, [exporter], flush_interval=None)
+    voltage = GaugeMetric("psu.voltage", "PSU voltage", "V", reporter)
+
+    labels = {"device.id": "switch-A", "device.psu.id": "PSU 1"}
+    voltage.record(labels, 12.09)
+    # Same label set in another order, then the labels are changed after being recorded
+    voltage.record({"device.psu.id": "PSU 1", "device.id": "switch-A"}, 12.08)
+    labels["device.psu.id"] = "PSU 2"
+    voltage.record(labels, 12.01)
+    reporter.report(timestamp=1000)
+    reporter.close()
+
+    assert len(reporter.interner) == 2
+    assert exporter.records == [
+        ("psu.voltage", dict(COMMON_LABELS, **{"device.id": "switch-A", "device.psu.id": "PSU 1"}), 12.09, 1000),
+        ("psu.voltage", dict(COMMON_LABELS, **{"device.id": "switch-A", "device.psu.id": "PSU 1"}), 12.08, 1000),
+        ("psu.voltage", dict(COMMON_LABELS, **{"device.id": "switch-A", "device.psu.id": "PSU 2"}), 12.01, 1000),
+    ]
+    assert exporter.closed
+
+
+def test_periodic_reporter_bounded():
+    exporter = ListExporter()
+    reporter = PeriodicMetricsReporter(COMMON_LABELS, [exporter], max_buffered_records=12, flush_interval=None)
+    rx_bps = GaugeMetric("port.rx.bps", "Port rx rate", "bps", reporter)
+
+    for second in range(5):
+        for port in range(4):
+            rx_bps.record({"device.port.id": "Ethernet{}".format(port)}, 1e9)
+        reporter.report(timestamp=second)
+        # Reported records are exported once the bound is reached
+        assert reporter._reported_records < 12
+
+    reporter.close()
+    assert len(exporter.records) == 20
+    assert reporter.exported_records == 20
+    assert [record[3] for record in exporter.records] == [second for second in range(5) for _ in range(4)]
+
+
+def test_final_reporter_exports_on_report():
+    exporter = ListExporter()
+    reporter = FinalMetricsReporter(COMMON_LABELS, [exporter])
+    convergence = GaugeMetric("bgp.convergence_time.port_restart", "BGP convergence time", "s", reporter)
+
+    convergence.record({"device.id": "switch-A"}, 15)
+    reporter.report()
+    assert [record[2] for record in exporter.records] == [15]
+    reporter.close()
+
+
+def test_metrics_identified_by_type_name_description_unit():
+    class CounterMetric(GaugeMetric):
+        pass
+
+    exporter = MetricListExporter()
+    reporter = FinalMetricsReporter(COMMON_LABELS, [exporter])
+    temp_c = GaugeMetric("sensor.temperature", "Sensor temperature", "C", reporter)
+    temp_f = GaugeMetric("sensor.temperature", "Sensor temperature", "F", reporter)
+    temp_c_again = GaugeMetric("sensor.temperature", "Sensor temperature", "C", reporter)
+    temp_counter = CounterMetric("sensor.temperature", "Sensor temperature", "C", reporter)
+
+    for metric, value in [(temp_c, 40), (temp_f, 104), (temp_c_again, 41), (temp_counter, 1)]:
+        metric.record({"device.id": "switch-A"}, value)
+    reporter.report(timestamp=1000)
+
+    assert len(reporter.metrics) == 3
+    assert [(type(metric), metric.unit) for metric in reporter.metrics] == \
+        [(GaugeMetric, "C"), (GaugeMetric, "F"), (CounterMetric, "C")]
+    assert exporter.metrics == [(GaugeMetric, "C", 40), (GaugeMetric, "F", 104), (GaugeMetric, "C", 41),
+                                (CounterMetric, "C", 1)]
+    reporter.close()
+
+
+def test_exporters(tmp_path):
+    put_records = []
+    otlp_path = str(tmp_path / "metrics.jsonl")
+    prometheus_path = str(tmp_path / "metrics.prom")
+    reporter = PeriodicMetricsReporter(COMMON_LABELS, [
+        OtlpJsonFileExporter(otlp_path),
+        PrometheusTextExporter(prometheus_path),
+        KustoBatchExporter(lambda table, records: put_records.append((table, records)), "TestMetrics"),
+    ], flush_interval=None)
+    rx_bps = GaugeMetric("port.rx.bps", "Port rx rate", "bps", reporter)
+
+    rx_bps.record({"device.port.id": "Ethernet0"}, 100)
+    reporter.report(timestamp=1000000000)
+    rx_bps.record({"device.port.id": "Ethernet0"}, 200)
+    reporter.report(timestamp=2000000000)
+    reporter.close()
+
+    with open(otlp_path) as f:
+        requests = [json.loads(line) for line in f]
+    assert len(requests) == 2
+    metric = requests[1]["resourceMetrics"][0]["scopeMetrics"][0]["metrics"][0]
+    assert metric["name"] == "port.rx.bps"
+    assert metric["gauge"]["dataPoints"] == [{
+        "attributes": [{"key": "device.port.id", "value": {"stringValue": "Ethernet0"}}],
+        "timeUnixNano": "2000000000",
+        "asDouble": 200.0,
+    }]
+
+    with open(prometheus_path) as f:
+        samples = [line for line in f if not line.startswith("#")]
+    assert samples == ['port_rx_bps{device_port_id="Ethernet0",test_testbed="TB-XYZ",test_testcase="mock-case"} '
+                       '200.0\n']
+
+    assert [table for table, _ in put_records] == ["TestMetrics", "TestMetrics"]
+    assert put_records[1][1] == [{"name": "port.rx.bps", "unit": "bps", "value": 200.0, "timestamp_ns": 2000000000,
+                                  "labels": dict(COMMON_LABELS, **{"device.port.id": "Ethernet0"})}]
+
+
+def test_prometheus_exporter_keeps_metrics_sharing_a_name_apart(tmp_path):
+    prometheus_path = str(tmp_path / "metrics.prom")
+    reporter = FinalMetricsReporter({}, [PrometheusTextExporter(prometheus_path)])
+    GaugeMetric("rx", "Port rx rate", "bps", reporter).record({}, 1)
+    GaugeMetric("rx", "Port rx rate", "pps", reporter).record({}, 2)
+    GaugeMetric("", "Unnamed", "", reporter).record({}, 3)
+    reporter.report(timestamp=1000000000)
+    reporter.close()
+
+    with open(prometheus_path) as f:
+        samples = [line for line in f if not line.startswith("#")]
+    assert samples == ["_{} 3.0\n", "rx{} 1.0\n", "rx_pps{} 2.0\n"]
@@ -1,4 +1,5 @@
 from .facts_cache import FactsCache
 from .facts_cache import cached
+from .facts_cache import host_fingerprint
 
-__all__ = [FactsCache, cached]
+__all__ = [FactsCache, cached, host_fingerprint]
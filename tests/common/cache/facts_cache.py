@@ -4,13 +4,13 @@ import inspect
 import logging
 import os
 import pickle
-import random
 import shutil
+import sqlite3
 import sys
+import tempfile
 import time
 
 from collections import defaultdict
-from pickle import UnpicklingError
 from threading import Lock
 from six import with_metaclass
 
@@ -24,6 +24,13 @@ SIZE_LIMIT = 1000000000  # 1G bytes, max disk usage allowed by cache
 ENTRY_LIMIT = 1000000    # Max number of pickle files allowed in cache.
 DISABLE_CACHE_PARAM = "disable_cache"
 
+# Key marking cached facts stored together with the time they were cached and their fingerprint
+CACHED_ENTRY_KEY = "__facts_cache_entry__"
+
+# Environment variable used to select the storage backend of cached facts, see CACHE_BACKENDS
+CACHE_BACKEND_ENV = "FACTS_CACHE_BACKEND"
+DEFAULT_CACHE_BACKEND = "pickle"
+
 
 class Singleton(type):
 
@@ -38,6 +45,224 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+class PickleFileBackend(object):
+    """Store each cached facts in a pickle file <cache_location>/<zone>/<key>.pickle.
+
+    Files are written to a temporary file and renamed, so readers never see a partially written file.
+    Disk usage is computed by walking the cache folder once and then tracked on write. When the usage
+    exceeds SIZE_LIMIT or ENTRY_LIMIT, the least recently used files are removed.
+    """
+
+    def __init__(self, cache_location):
+        self._cache_location = cache_location
+        self._usage = None
+
+    def _facts_file(self, zone, key):
+        return os.path.join(self._cache_location, zone, '{}.pickle'.format(key))
+
+    def _list_files(self):
+        for root, _, files in os.walk(self._cache_location):
+            for f in files:
+                if f.endswith('.pickle'):
+                    yield os.path.join(root, f)
+
+    def usage(self):
+        """Returns tuple (total_size, total_entries) of the cache."""
+        if self._usage is None:
+            sizes = [os.path.getsize(fp) for fp in self._list_files()]
+            self._usage = [sum(sizes), len(sizes)]
+        return tuple(self._usage)
+
+    def load(self, zone, key):
+        """Returns pickled facts or None if the facts are not cached."""
+        facts_file = self._facts_file(zone, key)
+        try:
+            with open(facts_file, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError) as e:
+            if not os.path.exists(facts_file):
+                return None
+            raise e
+        # Update modification time used for the LRU eviction
+        os.utime(facts_file, None)
+        return data
+
+    def store(self, zone, key, data):
+        """Store pickled facts. Returns list of (zone, key) evicted from the cache."""
+        cache_subfolder = os.path.join(self._cache_location, zone)
+        if not os.path.exists(cache_subfolder):
+            logger.info('[Cache] Create cache dir {}'.format(cache_subfolder))
+            os.makedirs(cache_subfolder, exist_ok=True)
+
+        self.usage()
+        facts_file = self._facts_file(zone, key)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_subfolder, prefix='.{}.'.format(key), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            old_size = os.path.getsize(facts_file) if os.path.exists(facts_file) else None
+            os.rename(tmp_file, facts_file)
+        except Exception:
+            os.remove(tmp_file)
+            raise
+
+        if old_size is None:
+            self._usage[0] += len(data)
+            self._usage[1] += 1
+        else:
+            self._usage[0] += len(data) - old_size
+        return self._evict()
+
+    def _evict(self):
+        total_size, total_entries = self.usage()
+        if total_size <= SIZE_LIMIT and total_entries <= ENTRY_LIMIT:
+            return []
+
+        evicted = []
+        files = sorted((os.path.getmtime(fp), os.path.getsize(fp), fp) for fp in self._list_files())
+        for _, size, fp in files[:-1]:
+            if total_size <= SIZE_LIMIT and total_entries <= ENTRY_LIMIT:
+                break
+            os.remove(fp)
+            total_size -= size
+            total_entries -= 1
+            zone = os.path.basename(os.path.dirname(fp))
+            evicted.append((zone, os.path.basename(fp)[:-len('.pickle')]))
+        self._usage = [total_size, total_entries]
+        return evicted
+
+    def delete(self, zone, key=None):
+        """Remove cached facts of the key or all keys of the zone."""
+        if key:
+            os.remove(self._facts_file(zone, key))
+        else:
+            shutil.rmtree(os.path.join(self._cache_location, zone))
+        self._usage = None
+
+    def clear(self):
+        """Remove all cached facts."""
+        self._usage = None
+        shutil.rmtree(self._cache_location)
+
+
+class SqliteBackend(object):
+    """Store all cached facts in a single sqlite database <cache_location>/facts_cache.db.
+
+    The database uses write-ahead logging, so concurrent pytest-xdist / parallel_run processes can read
+    while another process writes, and every write is an atomic transaction. Total size and number of
+    entries are kept in table 'usage' by triggers. When the usage exceeds SIZE_LIMIT or ENTRY_LIMIT,
+    the least recently used entries are removed.
+    """
+
+    DB_FILE = 'facts_cache.db'
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS facts (zone TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, '
+        'size INTEGER NOT NULL, last_access REAL NOT NULL, PRIMARY KEY (zone, key))',
+        'CREATE INDEX IF NOT EXISTS facts_last_access ON facts (last_access)',
+        'CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), '
+        'total_size INTEGER NOT NULL, total_entries INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO usage VALUES (0, 0, 0)',
+        'CREATE TRIGGER IF NOT EXISTS facts_insert AFTER INSERT ON facts BEGIN '
+        'UPDATE usage SET total_size = total_size + NEW.size, total_entries = total_entries + 1; END',
+        'CREATE TRIGGER IF NOT EXISTS facts_delete AFTER DELETE ON facts BEGIN '
+        'UPDATE usage SET total_size = total_size - OLD.size, total_entries = total_entries - 1; END',
+        'CREATE TRIGGER IF NOT EXISTS facts_update AFTER UPDATE OF size ON facts BEGIN '
+        'UPDATE usage SET total_size = total_size - OLD.size + NEW.size; END',
+    ]
+    TIMEOUT = 60
+
+    def __init__(self, cache_location):
+        self._cache_location = cache_location
+        self._db_file = os.path.join(cache_location, self.DB_FILE)
+        self._conn = None
+        self._pid = None
+        self._lock = Lock()
+
+    def _connection(self):
+        # sqlite connections must not be shared with forked processes
+        if self._conn is None or self._pid != os.getpid():
+            if not os.path.exists(self._cache_location):
+                os.makedirs(self._cache_location, exist_ok=True)
+            conn = sqlite3.connect(self._db_file, timeout=self.TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def usage(self):
+        """Returns tuple (total_size, total_entries) of the cache."""
+        with self._lock:
+            return tuple(self._connection().execute('SELECT total_size, total_entries FROM usage').fetchone())
+
+    def load(self, zone, key):
+        """Returns pickled facts or None if the facts are not cached."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT value FROM facts WHERE zone = ? AND key = ?', (zone, key)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE facts SET last_access = ? WHERE zone = ? AND key = ?', (time.time(), zone, key))
+            return bytes(row[0])
+
+    def store(self, zone, key, data):
+        """Store pickled facts. Returns list of (zone, key) evicted from the cache."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('INSERT INTO facts (zone, key, value, size, last_access) VALUES (?, ?, ?, ?, ?) '
+                             'ON CONFLICT (zone, key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+                             'last_access = excluded.last_access',
+                             (zone, key, sqlite3.Binary(data), len(data), time.time()))
+                return self._evict(conn)
+
+    def _evict(self, conn):
+        evicted = []
+        total_size, total_entries = conn.execute('SELECT total_size, total_entries FROM usage').fetchone()
+        while (total_size > SIZE_LIMIT or total_entries > ENTRY_LIMIT) and total_entries > 1:
+            zone, key, size = conn.execute(
+                'SELECT zone, key, size FROM facts ORDER BY last_access LIMIT 1').fetchone()
+            conn.execute('DELETE FROM facts WHERE zone = ? AND key = ?', (zone, key))
+            total_size -= size
+            total_entries -= 1
+            evicted.append((zone, key))
+        return evicted
+
+    def delete(self, zone, key=None):
+        """Remove cached facts of the key or all keys of the zone."""
+        if not os.path.exists(self._db_file):
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if key:
+                    conn.execute('DELETE FROM facts WHERE zone = ? AND key = ?', (zone, key))
+                else:
+                    conn.execute('DELETE FROM facts WHERE zone = ?', (zone,))
+
+    def clear(self):
+        """Remove all cached facts."""
+        with self._lock:
+            self._close()
+            shutil.rmtree(self._cache_location)
+
+
+CACHE_BACKENDS = {
+    'pickle': PickleFileBackend,
+    'sqlite': SqliteBackend,
+}
+
+
 class FactsCache(with_metaclass(Singleton, object)):
     """Singleton class for reading from cache and write to cache.
 
@@ -49,32 +274,25 @@ class FactsCache(with_metaclass(Singleton, object)):
 
     NOTEXIST = object()
 
-    def __init__(self, cache_location=CACHE_LOCATION):
+    def __init__(self, cache_location=CACHE_LOCATION, backend=None):
         self._cache_location = os.path.abspath(cache_location)
         self._cache = defaultdict(dict)
         self._write_lock = Lock()
+        backend = backend or os.environ.get(CACHE_BACKEND_ENV, DEFAULT_CACHE_BACKEND)
+        self._backend = CACHE_BACKENDS[backend](self._cache_location)
+        self._stats = {'hits': 0, 'misses': 0, 'bytes_read': 0, 'bytes_written': 0, 'evictions': 0}
+        self._load_latency = {}
 
-    def _check_usage(self):
-        """Check cache usage, raise exception if usage exceeds the limitations.
-        """
-        total_size = 0
-        total_entries = 0
-        for root, _, files in os.walk(self._cache_location):
-            for f in files:
-                fp = os.path.join(root, f)
-                total_size += os.path.getsize(fp)
-                total_entries += 1
-
-        if total_size > SIZE_LIMIT or total_entries > ENTRY_LIMIT:
-            msg = 'Cache usage exceeds limitations. total_size={}, SIZE_LIMIT={}, total_entries={}, ENTRY_LIMIT={}' \
-                .format(total_size, SIZE_LIMIT, total_entries, ENTRY_LIMIT)
-            raise Exception(msg)
+    def stats(self):
+        """Get cache statistics.
 
-    def _read_facts_file(self, facts_file, z, k):
-        with open(facts_file, 'rb') as f:
-            self._cache[z][k] = pickle.load(f)
-            logger.debug('[Cache] Loaded cached facts "{}.{}" from {}'.format(z, k, facts_file))
-            return self._cache[z][k]
+        Returns:
+            dict: Counters of hits, misses, bytes read from and written to the backend, evicted entries and
+                latency in seconds of loading each '<zone>.<key>' from the backend.
+        """
+        stats = dict(self._stats)
+        stats['load_latency'] = dict(self._load_latency)
+        return stats
 
     def read(self, zone, key):
         """Read cached facts.
@@ -90,39 +308,29 @@ class FactsCache(with_metaclass(Singleton, object)):
         # Lazy load
         if zone in self._cache and key in self._cache[zone]:
             logger.debug('[Cache] Read cached facts "{}.{}"'.format(zone, key))
+            self._stats['hits'] += 1
             return self._cache[zone][key]
-        else:
-            facts_file = os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
-            try:
-                return self._read_facts_file(facts_file, zone, key)
-            except (IOError, ValueError) as e:
-                logger.info('[Cache] Load cache file "{}" failed with IOError or ValueError: {}'
-                            .format(os.path.abspath(facts_file), repr(e)))
-                return self.NOTEXIST
-            except (EOFError, UnpicklingError) as e:
-                # When parallel run is enabled, multiple processes may try to read/write the same cache file,
-                # so there will be a chance that
-                #   - a file is being written by process1 while process2 is reading it, causing EOFError in process2
-                #   - a file is being read by multiple processes at the same time, causing UnpicklingError in some of
-                #     the processes
-                # In these cases, we will retry to read the file after a short random sleep. If we still get the same
-                # error after retrying, we will return NOTEXIST to overwrite the file.
-                retry_attempts = 3
-                for attempt in range(retry_attempts):
-                    time.sleep(random.randint(3, 6))
-                    try:
-                        return self._read_facts_file(facts_file, zone, key)
-                    except (EOFError, UnpicklingError):
-                        logger.warning('[Cache] Retry {}/{} failed for file "{}"'
-                                       .format(attempt + 1, retry_attempts, facts_file))
-
-                logger.error('[Cache] Load cache file "{}" failed with EOFError or UnpicklingError: {}'
-                             .format(facts_file, repr(e)))
-                return self.NOTEXIST
-            except Exception as e:
-                logger.info('[Cache] Load cache file "{}" failed with unknown exception: {}'
-                            .format(os.path.abspath(facts_file), repr(e)))
+
+        start = time.time()
+        try:
+            data = self._backend.load(zone, key)
+            if data is None:
+                logger.info('[Cache] Cached facts "{}.{}" not found in {}'.format(zone, key, self._cache_location))
+                self._stats['misses'] += 1
                 return self.NOTEXIST
+            value = pickle.loads(data)
+        except Exception as e:
+            # Writes are atomic, a broken entry will be overwritten by the next write
+            logger.error('[Cache] Load cached facts "{}.{}" failed with exception: {}'.format(zone, key, repr(e)))
+            self._stats['misses'] += 1
+            return self.NOTEXIST
+
+        self._cache[zone][key] = value
+        self._stats['hits'] += 1
+        self._stats['bytes_read'] += len(data)
+        self._load_latency['{}.{}'.format(zone, key)] = time.time() - start
+        logger.debug('[Cache] Loaded cached facts "{}.{}" from {}'.format(zone, key, self._cache_location))
+        return value
 
     def write(self, zone, key, value):
         """Store facts to cache.
@@ -137,23 +345,22 @@ class FactsCache(with_metaclass(Singleton, object)):
             boolean: Caching facts is successful or not.
         """
         with self._write_lock:
-            self._check_usage()
-            facts_file = os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
             try:
-                cache_subfolder = os.path.join(self._cache_location, zone)
-                if not os.path.exists(cache_subfolder):
-                    logger.info('[Cache] Create cache dir {}'.format(cache_subfolder))
-                    os.makedirs(cache_subfolder)
-
-                with open(facts_file, 'wb') as f:
-                    pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
-                    self._cache[zone][key] = value
-                    logger.info('[Cache] Cached facts "{}.{}" to {}'.format(zone, key, facts_file))
-                    return True
-            except (IOError, ValueError) as e:
-                logger.error('[Cache] Dump cache file "{}" failed with exception: {}'.format(facts_file, repr(e)))
+                data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                evicted = self._backend.store(zone, key, data)
+            except (IOError, OSError, ValueError, pickle.PicklingError, sqlite3.Error) as e:
+                logger.error('[Cache] Dump cached facts "{}.{}" failed with exception: {}'.format(zone, key, repr(e)))
                 return False
 
+            self._cache[zone][key] = value
+            self._stats['bytes_written'] += len(data)
+            self._stats['evictions'] += len(evicted)
+            if evicted:
+                logger.info('[Cache] Cache usage exceeds limitations, evicted least recently used facts: {}'
+                            .format(evicted))
+            logger.info('[Cache] Cached facts "{}.{}" to {}'.format(zone, key, self._cache_location))
+            return True
+
     def cleanup(self, zone=None, key=None):
         """Cleanup cached files.
 
@@ -169,26 +376,24 @@ class FactsCache(with_metaclass(Singleton, object)):
                     del self._cache[zone][key]
                     logger.debug('[Cache] Removed "{}.{}" from cache.'.format(zone, key))
                 try:
-                    cache_file = os.path.join(self._cache_location, zone, '{}.pickle'.format(key))
-                    os.remove(cache_file)
-                    logger.debug('[Cache] Removed cache file "{}.pickle"'.format(cache_file))
-                except OSError as e:
-                    logger.error('[Cache] Cleanup cache {}.{}.pickle failed with exception: {}'
+                    self._backend.delete(zone, key)
+                    logger.debug('[Cache] Removed cached facts "{}.{}"'.format(zone, key))
+                except (OSError, sqlite3.Error) as e:
+                    logger.error('[Cache] Cleanup cache {}.{} failed with exception: {}'
                                  .format(zone, key, repr(e)))
             else:
                 if zone in self._cache:
                     del self._cache[zone]
                     logger.debug('[Cache] Removed zone "{}" from cache'.format(zone))
                 try:
-                    cache_subfolder = os.path.join(self._cache_location, zone)
-                    shutil.rmtree(cache_subfolder)
-                    logger.debug('[Cache] Removed cache subfolder "{}"'.format(cache_subfolder))
-                except OSError as e:
-                    logger.error('[Cache] Remove cache subfolder "{}" failed with exception: {}'.format(zone, repr(e)))
+                    self._backend.delete(zone)
+                    logger.debug('[Cache] Removed cached facts of zone "{}"'.format(zone))
+                except (OSError, sqlite3.Error) as e:
+                    logger.error('[Cache] Remove cache zone "{}" failed with exception: {}'.format(zone, repr(e)))
         else:
             self._cache = defaultdict(dict)
             try:
-                shutil.rmtree(self._cache_location)
+                self._backend.clear()
                 logger.debug('[Cache] Removed all cache files under "{}"'.format(self._cache_location))
             except OSError as e:
                 logger.error('[Cache] Remove cache folder "{}" failed with exception: {}'
@@ -241,7 +446,37 @@ def _get_disable_cache(target, args, kwargs):
     return bound_args.arguments.get(DISABLE_CACHE_PARAM, False)
 
 
-def cached(name, zone_getter=None, after_read=None, before_write=None):
+def host_fingerprint(function, func_args, func_kargs):
+    """
+        Fingerprint getter used for decorator cached.
+        Get fingerprint of the state of the host which the decorated method is bound to, see
+        SonicHost.get_facts_fingerprint. Facts cached with another fingerprint are considered stale.
+    """
+    host = func_args[0] if func_args else None
+    get_facts_fingerprint = getattr(host, "get_facts_fingerprint", None)
+    if get_facts_fingerprint is None:
+        raise ValueError("Failed to get fingerprint of instance of type %s." % type(host))
+    return get_facts_fingerprint()
+
+
+def _validate_entry(entry, ttl, check_fingerprint, fingerprint):
+    """
+        Get the facts from a cached entry written by decorator cached with ttl or fingerprint.
+        Returns FactsCache.NOTEXIST if the entry expired, its fingerprint does not match or it was
+        cached without ttl and fingerprint. A fingerprint of None means the state is unknown and never matches.
+    """
+    if not isinstance(entry, dict) or not entry.get(CACHED_ENTRY_KEY):
+        return FactsCache.NOTEXIST
+    if ttl is not None and time.time() - entry["cached_timestamp"] > ttl:
+        logger.debug("[Cache] Cached facts expired, cached at {}, ttl {}".format(entry["cached_timestamp"], ttl))
+        return FactsCache.NOTEXIST
+    if check_fingerprint and (fingerprint is None or entry["fingerprint"] != fingerprint):
+        logger.debug("[Cache] Cached facts fingerprint {} does not match {}".format(entry["fingerprint"], fingerprint))
+        return FactsCache.NOTEXIST
+    return entry["cached_facts"]
+
+
+def cached(name, zone_getter=None, after_read=None, before_write=None, ttl=None, fingerprint=None):
     """Decorator for enabling cache for facts.
 
     The cached facts are to be stored by <name>.pickle. Because the cached pickle files must be stored under subfolder
@@ -258,6 +493,10 @@ def cached(name, zone_getter=None, after_read=None, before_write=None):
         zone_getter ([function]): Function used to get hostname used as zone.
         after_read ([function]): Hook function used to process facts after read from cache.
         before_write ([function]): Hook function used to process facts before write into cache.
+        ttl ([int]): Number of seconds the cached facts are valid for. Default is None, facts never expire.
+        fingerprint ([function]): Function used to get fingerprint of the state the facts depend on, with the
+            same signature as zone getter, e.g. host_fingerprint. Facts cached with a different fingerprint
+            are gathered again. Default is None, facts are not validated by fingerprint.
     Returns:
         [function]: Decorator function.
     """
@@ -274,7 +513,10 @@ def cached(name, zone_getter=None, after_read=None, before_write=None):
             _zone_getter = zone_getter or _get_default_zone
             zone = _zone_getter(target, args, kargs)
 
+            current_fingerprint = fingerprint(target, args, kargs) if fingerprint else None
             cached_facts = cache.read(zone, name)
+            if (ttl is not None or fingerprint) and cached_facts is not FactsCache.NOTEXIST:
+                cached_facts = _validate_entry(cached_facts, ttl, bool(fingerprint), current_fingerprint)
             if after_read:
                 cached_facts = after_read(cached_facts, target, args, kargs)
             if cached_facts is not FactsCache.NOTEXIST:
@@ -282,20 +524,30 @@ def cached(name, zone_getter=None, after_read=None, before_write=None):
                 return cached_facts
             else:
                 facts = target(*args, **kargs)
-                if before_write:
-                    _facts = before_write(facts, target, args, kargs)
-                    cache.write(zone, name, _facts)
-                else:
-                    cache.write(zone, name, facts)
+                _facts = before_write(facts, target, args, kargs) if before_write else facts
+                if ttl is not None or fingerprint:
+                    _facts = {CACHED_ENTRY_KEY: True, "cached_timestamp": time.time(),
+                              "fingerprint": current_fingerprint, "cached_facts": _facts}
+                cache.write(zone, name, _facts)
                 return facts
         return wrapper
     return decorator
 
 
 if __name__ == '__main__':
-    cache = FactsCache()
     if len(sys.argv) == 2:
         zone = sys.argv[1]
     else:
         zone = None
-    cache.cleanup(zone)
+    # Cleanup facts cached by all backends, the backend used by tests may be selected by environment
+    for backend in CACHE_BACKENDS:
+        cache_location = os.path.abspath(CACHE_LOCATION)
+        if not os.path.exists(cache_location):
+            break
+        try:
+            if zone:
+                CACHE_BACKENDS[backend](cache_location).delete(zone)
+            else:
+                CACHE_BACKENDS[backend](cache_location).clear()
+        except (OSError, sqlite3.Error) as e:
+            logger.error('[Cache] Cleanup {} cache failed with exception: {}'.format(backend, repr(e)))
@@ -288,6 +288,9 @@ def config_reload(sonic_host, config_source='config_db', wait=120, start_bgp=Tru
             cmd = f'config reload -y -f -l {golden_path}'
         sonic_host.shell(cmd, executable="/bin/bash")
 
+    # Configuration was changed, facts cached with the previous fingerprint must not be reused
+    sonic_host.invalidate_facts_fingerprint()
+
     modular_chassis = sonic_host.get_facts().get("modular_chassis")
     wait = max(wait, 600) if modular_chassis else wait
 
@@ -1,12 +1,81 @@
+import copy
 import logging
 import sys
+import time
+
+from threading import Lock
+
+from ansible.parsing.dataloader import DataLoader
+from ansible.vars.manager import VariableManager
 
 from tests.common.devices.multi_asic import MultiAsicSonicHost
+from tests.common.helpers.multi_thread_utils import SafeThreadPoolExecutor
 from tests.common.helpers.parallel_utils import is_initial_checks_active
 
 logger = logging.getLogger(__name__)
 NON_INITIAL_CHECKS_STAGE = "non_initial_checks"
 INITIAL_CHECKS_STAGE = "initial_checks"
+# Maximum number of DUT nodes initialized in parallel
+DEFAULT_INIT_WORKERS = 8
+
+
+def _copy_inventory_manager(inventory_manager):
+    """ Copy an ansible inventory manager, the copy shares the parsed inventory data and has its own subset,
+    restriction and pattern caches, which the host managers change when running modules.
+    """
+    inventory_manager = copy.copy(inventory_manager)
+    inventory_manager.clear_caches()
+    inventory_manager.subset(None)
+    inventory_manager.remove_restriction()
+    return inventory_manager
+
+
+def _parsed_inventory_host_manager(host_manager_class):
+    """ Subclass of the pytest-ansible host manager class taking the parsed inventory managers from its options,
+    instead of parsing the inventory again.
+    """
+    class ParsedInventoryHostManager(host_manager_class):
+        def initialize_inventory(self):
+            self.options["loader"] = DataLoader()
+            self.options["variable_manager"] = VariableManager(loader=self.options["loader"],
+                                                               inventory=self.options["inventory_manager"])
+            if self.options.get("extra_inventory_manager", None):
+                self.options["extra_loader"] = DataLoader()
+                self.options["extra_variable_manager"] = VariableManager(
+                    loader=self.options["extra_loader"], inventory=self.options["extra_inventory_manager"])
+
+    return ParsedInventoryHostManager
+
+
+class SharedAnsibleAdhoc(object):
+    """ Wrapper of the pytest-ansible fixture ansible_adhoc sharing the parsed inventory between the nodes.
+
+    Every call of ansible_adhoc parses the ansible inventory. With this wrapper the inventory is parsed once for the
+    same arguments, and each call returns a host manager with its own copy of the inventory manager, loader and
+    variable manager. Extra vars set by a node, like the credentials set by SonicHost, and the host subset of the
+    modules run on a node only apply to that node.
+    """
+    def __init__(self, ansible_adhoc):
+        self._ansible_adhoc = ansible_adhoc
+        self._host_managers = {}
+        self._host_manager_classes = {}
+        self._lock = Lock()
+
+    def __call__(self, *args, **kwargs):
+        key = repr((args, sorted(kwargs.items())))
+        with self._lock:
+            if key not in self._host_managers:
+                self._host_managers[key] = self._ansible_adhoc(*args, **kwargs)
+            shared = self._host_managers[key]
+            if type(shared) not in self._host_manager_classes:
+                self._host_manager_classes[type(shared)] = _parsed_inventory_host_manager(type(shared))
+            host_manager_class = self._host_manager_classes[type(shared)]
+
+            options = dict(shared.options)
+            options["inventory_manager"] = _copy_inventory_manager(options["inventory_manager"])
+            if options.get("extra_inventory_manager", None):
+                options["extra_inventory_manager"] = _copy_inventory_manager(options["extra_inventory_manager"])
+        return host_manager_class(**options)
 
 
 class DutHosts(object):
@@ -48,7 +117,8 @@ class DutHosts(object):
             """ To support hash operator on the DUTs (nodes) in the testbed """
             return list.__hash__()
 
-    def __init__(self, ansible_adhoc, tbinfo, request, duts, target_hostname=None, is_parallel_leader=False):
+    def __init__(self, ansible_adhoc, tbinfo, request, duts, target_hostname=None, is_parallel_leader=False,
+                 init_workers=DEFAULT_INIT_WORKERS):
         """ Initialize a multi-dut testbed with all the DUT's defined in testbed info.
 
         Args:
@@ -56,12 +126,16 @@ class DutHosts(object):
             tbinfo - Testbed info whose "duts" holds the hostnames for the DUT's in the multi-dut testbed.
             duts - list of DUT hostnames from the `--host-pattern` CLI option. Can be specified if only a subset of
                    DUTs in the testbed should be used
+            init_workers - Maximum number of DUT nodes initialized in parallel, 1 to initialize them one by one.
 
         """
         self.ansible_adhoc = ansible_adhoc
         self.tbinfo = tbinfo
         self.request = request
         self.duts = duts
+        self.init_workers = init_workers
+        # Seconds spent on initializing each of the nodes
+        self.node_init_timings = {}
         self.is_parallel_run = target_hostname is not None
         # Initialize _nodes to None to avoid recursion in __getattr__
         self._nodes = None
@@ -69,7 +143,6 @@ class DutHosts(object):
         self._supervisor_nodes = None
         self._frontend_nodes = None
 
-        # TODO: Initialize the nodes in parallel using multi-threads?
         if self.is_parallel_run:
             self.parallel_run_stage = NON_INITIAL_CHECKS_STAGE
             self.target_hostname = target_hostname
@@ -78,30 +151,48 @@ class DutHosts(object):
         else:
             self.__initialize_nodes()
 
+    def __create_nodes(self, hostnames):
+        """ Create MultiAsicSonicHost of the hostnames using a bounded thread pool.
+
+        The nodes share one parsed ansible inventory, each has its own variable manager. SSH connections are kept
+        open by the ControlPersist option in ansible.cfg and reused by later commands to the same node.
+
+        Returns:
+            _Nodes: MultiAsicSonicHost of the hostnames, in the same order.
+        """
+        ansible_adhoc = SharedAnsibleAdhoc(self.ansible_adhoc)
+
+        def _create_node(hostname):
+            start = time.time()
+            node = MultiAsicSonicHost(ansible_adhoc, hostname, self, self.tbinfo['topo']['type'])
+            self.node_init_timings[hostname] = time.time() - start
+            return node
+
+        start = time.time()
+        workers = max(1, min(self.init_workers or 1, len(hostnames)))
+        if workers == 1:
+            nodes = [_create_node(hostname) for hostname in hostnames]
+        else:
+            with SafeThreadPoolExecutor(max_workers=workers) as executor:
+                results = [executor.submit(_create_node, hostname) for hostname in hostnames]
+            nodes = [result.get() for result in results]
+
+        if hostnames:
+            logger.info("Initialized {} DUT nodes by {} workers in {:.1f}s: {}".format(
+                len(hostnames), workers, time.time() - start,
+                ", ".join("{} {:.1f}s".format(hostname, self.node_init_timings[hostname]) for hostname in hostnames)))
+        return self._Nodes(nodes)
+
     def __initialize_nodes_for_parallel(self):
         if self.is_parallel_leader:
-            self._nodes_for_parallel_initial_checks = self._Nodes([
-                MultiAsicSonicHost(
-                    self.ansible_adhoc,
-                    hostname,
-                    self,
-                    self.tbinfo['topo']['type'],
-                ) for hostname in self.tbinfo["duts"]
-            ])
+            self._nodes_for_parallel_initial_checks = self.__create_nodes(self.tbinfo["duts"])
 
             self._nodes_for_parallel_tests = self._Nodes([
                 node for node in self._nodes_for_parallel_initial_checks if node.hostname == self.target_hostname
             ])
         else:
             self._nodes_for_parallel_initial_checks = None
-            self._nodes_for_parallel_tests = self._Nodes([
-                MultiAsicSonicHost(
-                    self.ansible_adhoc,
-                    self.target_hostname,
-                    self,
-                    self.tbinfo['topo']['type'],
-                )
-            ])
+            self._nodes_for_parallel_tests = self.__create_nodes([self.target_hostname])
 
         self._nodes_for_parallel = (
             self._nodes_for_parallel_initial_checks if self.is_parallel_leader else self._nodes_for_parallel_tests
@@ -116,14 +207,7 @@ class DutHosts(object):
         ])
 
     def __initialize_nodes(self):
-        self._nodes = self._Nodes([
-            MultiAsicSonicHost(
-                self.ansible_adhoc,
-                hostname,
-                self,
-                self.tbinfo['topo']['type'],
-            ) for hostname in self.tbinfo["duts"] if hostname in self.duts
-        ])
+        self._nodes = self.__create_nodes([hostname for hostname in self.tbinfo["duts"] if hostname in self.duts])
 
         self._supervisor_nodes = self._Nodes([node for node in self._nodes if node.is_supervisor_node()])
         self._frontend_nodes = self._Nodes([node for node in self._nodes if node.is_frontend_node()])
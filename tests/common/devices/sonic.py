@@ -1,3 +1,4 @@
+import hashlib
 import ipaddress
 import json
 import logging
@@ -8,6 +9,7 @@ import time
 import sys
 
 from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 from ansible import constants as ansible_constants
@@ -17,9 +19,10 @@ from tests.common.devices.base import AnsibleHostBase
 from tests.common.devices.constants import ACL_COUNTERS_UPDATE_INTERVAL_IN_SEC
 from tests.common.helpers.dut_utils import is_supervisor_node, is_macsec_capable_node
 from tests.common.utilities import get_host_visible_vars
-from tests.common.cache import cached
+from tests.common.cache import cached, host_fingerprint
 from tests.common.helpers.constants import DEFAULT_ASIC_ID, DEFAULT_NAMESPACE
 from tests.common.helpers.platform_api.chassis import is_inband_port
+from tests.common.helpers.show_parser import parse_column_positions, parse_show
 from tests.common.errors import RunAnsibleModuleFail
 from tests.common import constants
 from typing import TypedDict
@@ -37,6 +40,115 @@ class ShellResult(TypedDict):
 
 
 logger = logging.getLogger(__name__)
+
+# Maximum number of queued commands of a ShellBatch sent to the DUT in one ansible task
+DEFAULT_MAX_BATCH_CMDS = 256
+
+
+class ShellFuture(object):
+    """
+    Lazily resolved result of a command queued in a ShellBatch.
+
+    The result is resolved when the batch is flushed, which happens on exit of SonicHost.batch(), when the batch
+    is full, or when result() of any unresolved future of the batch is called.
+    """
+
+    def __init__(self, batch=None, parent=None, func=None):
+        self._batch = batch
+        self._parent = parent
+        self._func = func
+        self._resolved = False
+        self._value = None
+        self._error = None
+
+    def _set(self, value, error=None):
+        self._value = value
+        self._error = error
+        self._resolved = True
+
+    def done(self):
+        """Return True if the command was run."""
+        if self._parent is not None:
+            return self._parent.done()
+        return self._resolved
+
+    def result(self):
+        """
+        Get the result, flushing the batch if the command was not run yet.
+
+        Returns:
+            The ShellResult of the command, or the value returned by the function passed to then().
+        Raises:
+            RunAnsibleModuleFail if the command failed and was not queued with module_ignore_errors.
+        """
+        if self._parent is not None:
+            if not self._resolved:
+                self._set(self._func(self._parent.result()))
+            return self._value
+        if not self._resolved:
+            self._batch.flush()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def then(self, func):
+        """Return a future of func(result), func is called once on first access of the result."""
+        return ShellFuture(parent=self, func=func)
+
+
+class ShellBatch(object):
+    """
+    Queue of shell commands run on the DUT by a single shell_cmds ansible task.
+
+    Each command is run by its own shell, its stdout, stderr and rc are returned separately as a ShellResult.
+    """
+
+    def __init__(self, host, timeout=0, max_cmds=DEFAULT_MAX_BATCH_CMDS):
+        self._host = host
+        self._timeout = timeout
+        self._max_cmds = max_cmds
+        self._pending = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def shell(self, cmd, module_ignore_errors=False):
+        """
+        Queue a command.
+
+        Returns:
+            ShellFuture of the ShellResult of the command.
+        """
+        future = ShellFuture(batch=self)
+        self._pending.append((cmd, module_ignore_errors, future))
+        if len(self._pending) >= self._max_cmds:
+            self.flush()
+        return future
+
+    def flush(self):
+        """Run all queued commands and resolve their futures."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            results = self._host.shell_batch([cmd for cmd, _, _ in pending], module_ignore_errors=True,
+                                             timeout=self._timeout)
+        except Exception as e:
+            for _, _, future in pending:
+                future._set(None, e)
+            return
+        for (cmd, module_ignore_errors, future), result in zip(pending, results):
+            error = None
+            if result["failed"] and not module_ignore_errors:
+                error = RunAnsibleModuleFail("run module shell_cmds failed for command '{}'".format(cmd), result)
+            future._set(result, error)
+
+
+# Cached facts are reused across test runs as long as the DUT image and configuration do not change
+FACTS_CACHE_TTL = 7 * 24 * 3600
+FACTS_FINGERPRINT_CMD = "grep build_version /etc/sonic/sonic_version.yml; " \
+    "md5sum /etc/sonic/config_db*.json; stat -c %Y /etc/sonic/minigraph.xml"
+
 PROCESS_TO_CONTAINER_MAP = {
     "orchagent": "swss",
     "syncd": "syncd"
@@ -93,6 +205,7 @@ class SonicHost(AnsibleHostBase):
             }
             self.host.options['variable_manager'].extra_vars.update(evars)
 
+        self._facts_fingerprint = None
         _gathered_facts = self._gather_facts()
 
         self._facts = _gathered_facts.get('basic_facts', {})
@@ -213,7 +326,97 @@ class SonicHost(AnsibleHostBase):
 
         self.critical_services = service_list
 
-    @cached(name='basic_facts')
+    def shell_batch(self, cmds, module_ignore_errors=False, timeout=0):
+        """
+        Run multiple shell commands in one ansible task, saving the module transfer and SSH round trip of each.
+
+        Args:
+            cmds (list): Commands to run, each of them is run regardless of the result of the others.
+            module_ignore_errors (bool): Do not raise if any of the commands failed.
+            timeout (int): Time limit in seconds of each command, 0 means no limit.
+        Returns:
+            list: ShellResult of each command, in the order of cmds.
+        Raises:
+            RunAnsibleModuleFail if any of the commands failed and module_ignore_errors is False.
+        """
+        if not cmds:
+            return []
+        res = self.shell_cmds(cmds=list(cmds), continue_on_fail=True, timeout=timeout, module_ignore_errors=True)
+        if "results" not in res:
+            raise RunAnsibleModuleFail("run module shell_cmds failed", res)
+        results = []
+        for result in res["results"]:
+            results.append(ShellResult(cmd=result["cmd"], rc=result["rc"], stdout=result["stdout"],
+                                       stderr=result["stderr"], stdout_lines=result["stdout_lines"],
+                                       stderr_lines=result["stderr_lines"], failed=result["rc"] != 0,
+                                       changed=True))
+        if not module_ignore_errors and any(result["failed"] for result in results):
+            raise RunAnsibleModuleFail("run module shell_cmds failed", res)
+        return results
+
+    @contextmanager
+    def batch(self, timeout=0, max_cmds=DEFAULT_MAX_BATCH_CMDS):
+        """
+        Context providing a ShellBatch. Helpers supporting batching queue their command in it when it is passed as
+        their batch argument, and return a ShellFuture instead of the result. Calls without the batch argument are
+        not affected.
+
+        All queued commands are sent to the DUT in one ansible task on exit of the context, or earlier when result()
+        of any of the futures is called. Example:
+
+            with duthost.batch() as batch:
+                speeds = {port: duthost.get_speed(port, batch=batch) for port in ports}
+                uptime = batch.shell("uptime")
+            speeds = {port: speed.result() for port, speed in speeds.items()}
+        """
+        batch = ShellBatch(self, timeout=timeout, max_cmds=max_cmds)
+        yield batch
+        batch.flush()
+
+    def _shell_and_parse(self, cmd, parse, module_ignore_errors=False, batch=None):
+        """
+        Run a command and return parse(result). If batch is given, the command is queued in it instead and a
+        ShellFuture of parse(result) is returned.
+        """
+        if batch is not None:
+            return batch.shell(cmd, module_ignore_errors=module_ignore_errors).then(parse)
+        return parse(self.shell(cmd, module_ignore_errors=module_ignore_errors))
+
+    def get_facts_fingerprint(self):
+        """
+        Get fingerprint of the DUT state the cached facts depend on: the image version, checksums of the
+        config_db files and the modification time of the minigraph. The fingerprint is computed by one shell
+        command and reused until it is invalidated by a reboot or a config reload, see invalidate_facts_fingerprint.
+
+        Returns:
+            str: md5 hex digest of the state, or None if it could not be got.
+        """
+        if self._facts_fingerprint:
+            return self._facts_fingerprint
+        res = self.shell(FACTS_FINGERPRINT_CMD, module_ignore_errors=True)
+        if res.get("failed") and not res.get("stdout"):
+            logger.warning("Failed to get facts fingerprint of {}: {}".format(self.hostname, res.get("stderr")))
+            return None
+        self._facts_fingerprint = hashlib.md5(res["stdout"].encode("utf-8")).hexdigest()
+        return self._facts_fingerprint
+
+    def invalidate_facts_fingerprint(self):
+        """
+        Forget the fingerprint of the DUT state, it will be computed again on next use of cached facts.
+        Called when the image or configuration of the DUT may have changed: by config_reload, and by meta
+        clear_facts which is run once the DUT is back up after a reboot.
+        """
+        self._facts_fingerprint = None
+
+    def meta(self, *module_args, **complex_args):
+        """
+        Run the meta module. Facts are cleared after a reboot, the DUT may now run another image or configuration.
+        """
+        if "clear_facts" in module_args:
+            self.invalidate_facts_fingerprint()
+        return self._run("meta", *module_args, **complex_args)
+
+    @cached(name='basic_facts', ttl=FACTS_CACHE_TTL, fingerprint=host_fingerprint)
     def _gather_facts(self):
         """
         Gather facts about the platform for this SONiC device.
@@ -418,9 +621,16 @@ class SonicHost(AnsibleHostBase):
         @return: A dictionary in which key is the service name and values are service status
                  and service type.
         """
-        monit_services_status = {}
         services_status_result = self.shell("sudo monit status", module_ignore_errors=True, verbose=True)
+        return self.parse_monit_services_status(services_status_result)
 
+    @staticmethod
+    def parse_monit_services_status(services_status_result):
+        """
+        @summary: Parse the result of command 'sudo monit status'.
+        @return: Same as get_monit_services_status.
+        """
+        monit_services_status = {}
         exit_code = services_status_result["rc"]
         if exit_code != 0:
             return monit_services_status
@@ -1505,7 +1715,7 @@ Totals               6450                 6449
 
         return container_autorestart_states
 
-    @cached(name='feature_status')
+    @cached(name='feature_status', ttl=FACTS_CACHE_TTL, fingerprint=host_fingerprint)
     def get_feature_status(self, disable_cache=True):
         """
         Gets the list of features and states
@@ -1548,61 +1758,11 @@ Totals               6450                 6449
             Returns a list. Each item is a tuple with two elements. The first element is start position of a column.
             The second element is the end position of the column.
         """
-        prev = ' ',
-        positions = []
-        for pos, char in enumerate(sep_line + ' '):
-            if char == sep_char:
-                if char != prev:
-                    left = pos
-            else:
-                if char != prev:
-                    right = pos
-                    positions.append((left, right))
-            prev = char
-        return positions
-
-    def _parse_show(self, output_lines, header_len=1):
-
-        result = []
-
-        sep_line_pattern = re.compile(r"^( *-+ *)+$")
-        sep_line_found = False
-        for idx, line in enumerate(output_lines):
-            if sep_line_pattern.match(line):
-                sep_line_found = True
-                header_lines = output_lines[idx - header_len:idx]
-                sep_line = output_lines[idx]
-                content_lines = output_lines[idx + 1:]
-                break
+        return parse_column_positions(sep_line, sep_char)
 
-        if not sep_line_found:
-            logging.error('Failed to find separation line in the show command output')
-            return result
-
-        try:
-            positions = self._parse_column_positions(sep_line)
-        except Exception as e:
-            logging.error('Possibly bad command output, exception: {}'.format(repr(e)))
-            return result
-
-        headers = []
-        for (left, right) in positions:
-            header = " ".join([header_line[left:right].strip().lower() for header_line in header_lines]).strip()
-            headers.append(header)
-
-        for content_line in content_lines:
-            # When an empty line is encountered while parsing the tabulate content, it is highly possible that the
-            # tabulate content has been drained. The empty line and rest of the lines should not be parsed.
-            if len(content_line) == 0:
-                break
-            item = {}
-            for idx, (left, right) in enumerate(positions):
-                k = headers[idx]
-                v = content_line[left:right].strip()
-                item[k] = v
-            result.append(item)
-
-        return result
+    def _parse_show(self, output_lines, header_len=1, columnar=False):
+        """Parse the table in output lines of a show command, see tests/common/helpers/show_parser.py."""
+        return parse_show(output_lines, header_len, columnar=columnar)
 
     def show_and_parse(self, show_cmd, header_len=1, **kwargs):
         """Run a show command and parse the output using a generic pattern.
@@ -1672,18 +1832,27 @@ Totals               6450                 6449
         Returns:
             Return the parsed output of the show command in a list of dictionary. Each list item is a dictionary,
             corresponding to one content line under the header in the output. Keys of the dictionary are the column
-            headers in lowercase.
+            headers in lowercase. If a ShellBatch is passed as batch keyword argument, the command is queued in it
+            and a ShellFuture of the parsed output is returned instead.
         """
         start_line_index = kwargs.pop("start_line_index", 0)
         end_line_index = kwargs.pop("end_line_index", None)
-        output = self.shell(show_cmd, **kwargs)["stdout_lines"]
-        if end_line_index is None:
-            output = output[start_line_index:]
-        else:
-            output = output[start_line_index:end_line_index]
-        return self._parse_show(output, header_len)
+        batch = kwargs.pop("batch", None)
 
-    @cached(name='mg_facts')
+        def _parse(out):
+            output = out["stdout_lines"]
+            if end_line_index is None:
+                output = output[start_line_index:]
+            else:
+                output = output[start_line_index:end_line_index]
+            return self._parse_show(output, header_len)
+        if batch is not None:
+            if not set(kwargs) <= {"module_ignore_errors"}:
+                raise ValueError("show_and_parse in batch only supports module_ignore_errors, got {}".format(kwargs))
+            return self._shell_and_parse(show_cmd, _parse, batch=batch, **kwargs)
+        return _parse(self.shell(show_cmd, **kwargs))
+
+    @cached(name='mg_facts', ttl=FACTS_CACHE_TTL, fingerprint=host_fingerprint)
     def get_extended_minigraph_facts(self, tbinfo, namespace=DEFAULT_NAMESPACE):
         mg_facts = self.minigraph_facts(host=self.hostname, namespace=namespace)['ansible_facts']
         mg_facts['minigraph_ptf_indices'] = {}
@@ -2169,18 +2338,22 @@ Totals               6450                 6449
                 pass
         return up_ip_ports
 
-    def get_supported_speeds(self, interface_name):
+    def get_supported_speeds(self, interface_name, batch=None):
         """Get supported speeds for a given interface
 
         Args:
             interface_name (str): Interface name
+            batch (ShellBatch): Optional; queue the command in the batch and return a ShellFuture of the result
 
         Returns:
             list: A list of supported speed strings or None
         """
         cmd = 'sonic-db-cli STATE_DB HGET \"PORT_TABLE|{}\" \"{}\"'.format(interface_name, 'supported_speeds')
-        supported_speeds = self.shell(cmd)['stdout'].strip()
-        return None if not supported_speeds else supported_speeds.split(',')
+
+        def _parse(out):
+            supported_speeds = out['stdout'].strip()
+            return None if not supported_speeds else supported_speeds.split(',')
+        return self._shell_and_parse(cmd, _parse, batch=batch)
 
     def set_auto_negotiation_mode(self, interface_name, mode):
         """Set auto negotiation mode for a given interface
@@ -2240,18 +2413,18 @@ Totals               6450                 6449
         self.shell(cmd)
         return True
 
-    def get_speed(self, interface_name):
+    def get_speed(self, interface_name, batch=None):
         """Get interface speed
 
         Args:
             interface_name (str): Interface name
+            batch (ShellBatch): Optional; queue the command in the batch and return a ShellFuture of the result
 
         Returns:
             str: SONiC style interface speed value. E.g, 1G=1000, 10G=10000, 100G=100000.
         """
         cmd = 'sonic-db-cli STATE_DB HGET \"PORT_TABLE|{}\" \"{}\"'.format(interface_name, 'speed')
-        speed = self.shell(cmd)['stdout'].strip()
-        return speed
+        return self._shell_and_parse(cmd, lambda out: out['stdout'].strip(), batch=batch)
 
     def get_rsyslog_ipv4(self):
         if not self.is_multi_asic:
@@ -2641,13 +2814,14 @@ Totals               6450                 6449
         output = self.shell('show interface status {}'.format(interface))
         return re.search('up +up', output['stdout_lines'][-1])
 
-    def get_port_fec(self, portname):
-        out = self.shell('redis-cli -n 4 HGET "PORT|{}" "fec"'.format(portname))
-        assert_exit_non_zero(out)
-        if out["stdout_lines"] and out["stdout_lines"][0] != "(nil)":
-            return out["stdout_lines"][0]
-        else:
-            return None
+    def get_port_fec(self, portname, batch=None):
+        def _parse(out):
+            assert_exit_non_zero(out)
+            if out["stdout_lines"] and out["stdout_lines"][0] != "(nil)":
+                return out["stdout_lines"][0]
+            else:
+                return None
+        return self._shell_and_parse('redis-cli -n 4 HGET "PORT|{}" "fec"'.format(portname), _parse, batch=batch)
 
     def set_port_fec(self, portname, state):
         if not state:
@@ -2655,17 +2829,20 @@ Totals               6450                 6449
         res = self.shell('sudo config interface fec {} {}'.format(portname, state))
         return res['rc'] == 0
 
-    def count_portlanes(self, portname):
-        out = self.shell('redis-cli -n 4 HGET "PORT|{}" "lanes"'.format(portname))
-        assert_exit_non_zero(out)
-        lanes = out["stdout_lines"][0].split(',')
-        return len(lanes)
+    def count_portlanes(self, portname, batch=None):
+        def _parse(out):
+            assert_exit_non_zero(out)
+            lanes = out["stdout_lines"][0].split(',')
+            return len(lanes)
+        return self._shell_and_parse('redis-cli -n 4 HGET "PORT|{}" "lanes"'.format(portname), _parse, batch=batch)
 
-    def get_sfp_type(self, portname):
-        out = self.shell('redis-cli -n 6 HGET "TRANSCEIVER_INFO|{}" "type"'.format(portname))
-        assert_exit_non_zero(out)
-        sfp_type = re.search(r'[QO]?SFP-?[\d\w]{0,3}', out["stdout_lines"][0]).group()
-        return sfp_type
+    def get_sfp_type(self, portname, batch=None):
+        def _parse(out):
+            assert_exit_non_zero(out)
+            sfp_type = re.search(r'[QO]?SFP-?[\d\w]{0,3}', out["stdout_lines"][0]).group()
+            return sfp_type
+        return self._shell_and_parse('redis-cli -n 6 HGET "TRANSCEIVER_INFO|{}" "type"'.format(portname), _parse,
+                                     batch=batch)
 
     def get_switch_hash_capabilities(self):
         out = self.shell('show switch-hash capabilities --json')
@@ -176,13 +176,15 @@ class SonicAsic(object):
         cmd = "{} {}".format(self.sonic_db_cli, sonic_db_cmd)
         return self.sonichost.command(cmd, verbose=False)
 
-    def run_redis_cli_cmd(self, redis_cmd):
+    def get_redis_cli_cmd(self, redis_cmd):
+        redis_cli = "/usr/bin/redis-cli"
         if self.namespace != DEFAULT_NAMESPACE:
-            redis_cli = "/usr/bin/redis-cli"
-            cmd = "sudo ip netns exec {} {} {}".format(self.namespace, redis_cli, redis_cmd)
-            return self.sonichost.command(cmd, verbose=False)
+            return "sudo ip netns exec {} {} {}".format(self.namespace, redis_cli, redis_cmd)
         # for single asic platforms there are not Namespaces, so the redis-cli command is same the DUT host
-        return self.sonichost.run_redis_cli_cmd(redis_cmd)
+        return "{} {}".format(redis_cli, redis_cmd)
+
+    def run_redis_cli_cmd(self, redis_cmd):
+        return self.sonichost.command(self.get_redis_cli_cmd(redis_cmd), verbose=False)
 
     def get_ip_route_info(self, dstip):
         return self.sonichost.get_ip_route_info(dstip, self.cli_ns_option)
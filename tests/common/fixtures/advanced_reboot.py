@@ -126,6 +126,7 @@ class AdvancedReboot:
         self.vnetPkts = self.request.config.getoption("--vnet_pkts")
         self.rebootLimit = self.request.config.getoption("--reboot_limit")
         self.sniffTimeIncr = self.request.config.getoption("--sniff_time_incr")
+        self.sendRatePps = self.request.config.getoption("--send_rate_pps")
         self.allowVlanFlooding = self.request.config.getoption("--allow_vlan_flooding")
         self.stayInTargetImage = self.request.config.getoption("--stay_in_target_image")
         self.newSonicImage = self.request.config.getoption("--new_sonic_image")
@@ -938,6 +939,7 @@ class AdvancedReboot:
             "nexthop_ips": self.rebootData['nexthop_ips'],
             "allow_vlan_flooding": self.allowVlanFlooding,
             "sniff_time_incr": self.sniffTimeIncr,
+            "send_rate_pps": self.sendRatePps,
             "setup_fdb_before_test": True,
             "vnet": self.vnet,
             "vnet_pkts": self.vnetPkts,
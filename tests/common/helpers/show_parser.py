@@ -0,0 +1,134 @@
+"""
+Parser of the fixed-width tables printed by SONiC show commands, e.g. 'show interface status':
+
+      Interface            Lanes    Speed    MTU    FEC    Alias             Vlan    Oper    Admin
+---------------  ---------------  -------  -----  -----  -------  ---------------  ------  -------
+      Ethernet0          0,1,2,3      40G   9100    N/A     etp1  PortChannel0002      up       up
+
+Column spans are computed once from the separation line with a compiled regex and turned into slice objects,
+every content line is then cut by a single itemgetter call. The layout of the table is cached by its header and
+separation lines, so repeated polls of the same command skip parsing the header.
+"""
+import logging
+import re
+
+from collections import OrderedDict
+from itertools import takewhile
+from operator import itemgetter
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+SEP_LINE_PATTERN = re.compile(r"^( *-+ *)+$")
+SEP_COLUMN_PATTERNS = {'-': re.compile(r"-+")}
+
+# Maximum number of table layouts kept in cache
+LAYOUT_CACHE_SIZE = 128
+
+_layout_cache = OrderedDict()
+_layout_cache_lock = Lock()
+
+
+def parse_column_positions(sep_line, sep_char='-'):
+    """Parse the position of each column from the separation line of a table.
+
+    Args:
+        sep_line: The output line separating actual data and column headers
+        sep_char: The character used in separation line. Defaults to '-'.
+
+    Returns:
+        Returns a list. Each item is a tuple with two elements. The first element is start position of a column.
+        The second element is the end position of the column.
+    """
+    pattern = SEP_COLUMN_PATTERNS.get(sep_char)
+    if pattern is None:
+        pattern = SEP_COLUMN_PATTERNS.setdefault(sep_char, re.compile(re.escape(sep_char) + "+"))
+    return [match.span() for match in pattern.finditer(sep_line)]
+
+
+class TableLayout(object):
+    """Headers and column slices of a fixed-width table."""
+
+    def __init__(self, header_lines, sep_line):
+        positions = parse_column_positions(sep_line)
+        self.headers = [" ".join([line[left:right].strip().lower() for line in header_lines]).strip()
+                        for (left, right) in positions]
+        self.slices = [slice(left, right) for (left, right) in positions]
+        # Get the tuple of raw values of all columns of a content line
+        if not self.slices:
+            self.getter = lambda line: ()
+        elif len(self.slices) == 1:
+            single = self.slices[0]
+            self.getter = lambda line: (line[single],)
+        else:
+            self.getter = itemgetter(*self.slices)
+
+
+def get_table_layout(header_lines, sep_line, use_cache=True):
+    """Get the TableLayout of a table, from cache if a table with same header and separation lines was parsed."""
+    if not use_cache:
+        return TableLayout(header_lines, sep_line)
+    key = (tuple(header_lines), sep_line)
+    with _layout_cache_lock:
+        layout = _layout_cache.get(key)
+        if layout is not None:
+            _layout_cache.move_to_end(key)
+            return layout
+    layout = TableLayout(header_lines, sep_line)
+    with _layout_cache_lock:
+        _layout_cache[key] = layout
+        while len(_layout_cache) > LAYOUT_CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    return layout
+
+
+def clear_layout_cache():
+    with _layout_cache_lock:
+        _layout_cache.clear()
+
+
+def parse_show(output_lines, header_len=1, columnar=False, use_cache=True):
+    """Parse the table in output lines of a show command.
+
+    Args:
+        output_lines: List of output lines of the show command.
+        header_len: Number of header lines above the separation line.
+        columnar: Return the table as dict of lists instead of list of dicts.
+        use_cache: Get the layout of the table from cache.
+
+    Returns:
+        Return a list of dictionary. Each list item is a dictionary, corresponding to one content line under the
+        header in the output. Keys of the dictionary are the column headers in lowercase.
+        If columnar is True, return a dictionary of the column headers in lowercase to list of the column values.
+    """
+    result = {} if columnar else []
+
+    for idx, line in enumerate(output_lines):
+        if SEP_LINE_PATTERN.match(line):
+            header_lines = output_lines[idx - header_len:idx]
+            sep_line = line
+            content_lines = output_lines[idx + 1:]
+            break
+    else:
+        logger.error('Failed to find separation line in the show command output')
+        return result
+
+    try:
+        layout = get_table_layout(header_lines, sep_line, use_cache)
+    except Exception as e:
+        logger.error('Possibly bad command output, exception: {}'.format(repr(e)))
+        return result
+
+    # When an empty line is encountered while parsing the tabulate content, it is highly possible that the
+    # tabulate content has been drained. The empty line and rest of the lines should not be parsed.
+    content_lines = takewhile(len, content_lines)
+    headers = layout.headers
+    getter = layout.getter
+    strip = str.strip
+    if columnar:
+        columns = list(zip(*[getter(line) for line in content_lines])) or [()] * len(headers)
+        # Same as list of dicts, the last of duplicated headers wins
+        for header, column in zip(headers, columns):
+            result[header] = list(map(strip, column))
+        return result
+    return [dict(zip(headers, map(strip, getter(line)))) for line in content_lines]
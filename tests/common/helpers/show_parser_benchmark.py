@@ -0,0 +1,135 @@
+"""
+Micro-benchmark of show_parser.parse_show against the previous character by character implementation of
+SonicHost._parse_show, on synthetic 'show interfaces counters' like tables.
+
+Usage:  python tests/common/helpers/show_parser_benchmark.py [--rows 4096] [--repeat 20]
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from show_parser import clear_layout_cache, parse_show     # noqa: E402
+
+HEADERS = ["IFACE", "STATE", "RX_OK", "RX_BPS", "RX_UTIL", "RX_ERR", "RX_DRP", "RX_OVR",
+           "TX_OK", "TX_BPS", "TX_UTIL", "TX_ERR", "TX_DRP", "TX_OVR"]
+
+
+class LegacyShowParser(object):
+    """ SonicHost._parse_column_positions and SonicHost._parse_show before show_parser, copied verbatim """
+
+    def _parse_column_positions(self, sep_line, sep_char='-'):
+        """Parse the position of each columns in the command output
+
+        Args:
+            sep_line: The output line separating actual data and column headers
+            sep_char: The character used in separation line. Defaults to '-'.
+
+        Returns:
+            Returns a list. Each item is a tuple with two elements. The first element is start position of a column.
+            The second element is the end position of the column.
+        """
+        prev = ' ',
+        positions = []
+        for pos, char in enumerate(sep_line + ' '):
+            if char == sep_char:
+                if char != prev:
+                    left = pos
+            else:
+                if char != prev:
+                    right = pos
+                    positions.append((left, right))
+            prev = char
+        return positions
+
+    def _parse_show(self, output_lines, header_len=1):
+
+        result = []
+
+        sep_line_pattern = re.compile(r"^( *-+ *)+$")
+        sep_line_found = False
+        for idx, line in enumerate(output_lines):
+            if sep_line_pattern.match(line):
+                sep_line_found = True
+                header_lines = output_lines[idx - header_len:idx]
+                sep_line = output_lines[idx]
+                content_lines = output_lines[idx + 1:]
+                break
+
+        if not sep_line_found:
+            logging.error('Failed to find separation line in the show command output')
+            return result
+
+        try:
+            positions = self._parse_column_positions(sep_line)
+        except Exception as e:
+            logging.error('Possibly bad command output, exception: {}'.format(repr(e)))
+            return result
+
+        headers = []
+        for (left, right) in positions:
+            header = " ".join([header_line[left:right].strip().lower() for header_line in header_lines]).strip()
+            headers.append(header)
+
+        for content_line in content_lines:
+            # When an empty line is encountered while parsing the tabulate content, it is highly possible that the
+            # tabulate content has been drained. The empty line and rest of the lines should not be parsed.
+            if len(content_line) == 0:
+                break
+            item = {}
+            for idx, (left, right) in enumerate(positions):
+                k = headers[idx]
+                v = content_line[left:right].strip()
+                item[k] = v
+            result.append(item)
+
+        return result
+
+
+def legacy_parse_show(output_lines, header_len=1):
+    return LegacyShowParser()._parse_show(output_lines, header_len)
+
+
+def generate_table(rows):
+    table = [[header for header in HEADERS]]
+    for row in range(rows):
+        table.append(["Ethernet{}".format(row * 4), "U"] +
+                     ["{:,}".format(row * 7919 + col) for col in range(len(HEADERS) - 2)])
+    widths = [max(len(line[col]) for line in table) for col in range(len(HEADERS))]
+    lines = ["  ".join(value.rjust(width) for value, width in zip(line, widths)) for line in table]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark show_parser.parse_show")
+    parser.add_argument("--rows", type=int, default=4096, help="number of rows of the table")
+    parser.add_argument("--repeat", type=int, default=20, help="number of parses timed")
+    args = parser.parse_args()
+
+    lines = generate_table(args.rows)
+    if legacy_parse_show(lines) != parse_show(lines):
+        print("ERROR: results of legacy parser and parse_show differ")
+        return 1
+
+    benchmarks = [
+        ("legacy", lambda: legacy_parse_show(lines)),
+        ("parse_show, cold cache", lambda: (clear_layout_cache(), parse_show(lines))),
+        ("parse_show", lambda: parse_show(lines)),
+        ("parse_show, columnar", lambda: parse_show(lines, columnar=True)),
+        ("header only, legacy", lambda: legacy_parse_show(lines[:2])),
+        ("header only, parse_show", lambda: parse_show(lines[:2])),
+    ]
+    print("Table: {} rows, {} columns".format(args.rows, len(HEADERS)))
+    for name, func in benchmarks:
+        seconds = min(timeit.repeat(func, number=args.repeat, repeat=3)) / args.repeat
+        print("{:<28} {:10.3f} ms".format(name, seconds * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
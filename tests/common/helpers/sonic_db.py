@@ -7,6 +7,64 @@ from tests.common.devices.sonic_asic import SonicAsic
 
 logger = logging.getLogger(__name__)
 
+# Lua script run by EVAL to read many entries in one sonic-db-cli call.
+#   ARGV[1]: "keys" if the following arguments are keys, "match" if they are key patterns.
+#   ARGV[2]: "value" to return {key: value}, "digest" to return {key: sha1 of value} or "both" to return
+#            {key: [sha1 of value, value]}. The value of a hash is a {field: value} table, the value of a string is
+#            the string, other key types are skipped.
+#   ARGV[3..]: keys or key patterns.
+# The result is returned as a single json string.
+BULK_QUERY_SCRIPT = """
+local by_pattern = ARGV[1] == 'match'
+local mode = ARGV[2]
+local result = {}
+local function add_entry(key)
+    local key_type = redis.call('TYPE', key)['ok']
+    local value = nil
+    local digest_data = nil
+    if key_type == 'hash' then
+        local kv = redis.call('HGETALL', key)
+        if mode ~= 'digest' then
+            value = {}
+            for i = 1, #kv, 2 do
+                value[kv[i]] = kv[i + 1]
+            end
+        end
+        if mode ~= 'value' then
+            local field_values = {}
+            for i = 1, #kv, 2 do
+                table.insert(field_values, {kv[i], kv[i + 1]})
+            end
+            table.sort(field_values, function(a, b) return a[1] < b[1] end)
+            digest_data = cjson.encode(field_values)
+        end
+    elseif key_type == 'string' then
+        value = redis.call('GET', key)
+        digest_data = value
+    else
+        return
+    end
+    if mode == 'value' then
+        result[key] = value
+    elseif mode == 'digest' then
+        result[key] = redis.sha1hex(digest_data)
+    else
+        result[key] = {redis.sha1hex(digest_data), value}
+    end
+end
+for i = 3, #ARGV do
+    if by_pattern then
+        local keys = redis.call('KEYS', ARGV[i])
+        for j = 1, #keys do
+            add_entry(keys[j])
+        end
+    else
+        add_entry(ARGV[i])
+    end
+end
+return cjson.encode(result)
+"""
+
 
 class SonicDbCli(object):
     """Base class for interface to SonicDb using sonic-db-cli command.
@@ -16,6 +74,10 @@ class SonicDbCli(object):
             database: database number.
         """
 
+    # Limits of keys or key patterns passed to one bulk query command.
+    BULK_BATCH_SIZE = 1000
+    BULK_BATCH_BYTES = 256 * 1024
+
     def __init__(self, host, database='APPL_DB'):
         """Initializes base class with defaults"""
         self.host = host
@@ -206,6 +268,140 @@ class SonicDbCli(object):
         parsed = json.loads(output["stdout"])
         return parsed
 
+    def _bulk_batches(self, args):
+        """Splits the keys or key patterns into batches small enough for one command line."""
+        batch = []
+        batch_bytes = 0
+        for arg in args:
+            if batch and (len(batch) >= self.BULK_BATCH_SIZE or batch_bytes + len(arg) > self.BULK_BATCH_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(arg)
+            batch_bytes += len(arg)
+        if batch:
+            yield batch
+
+    def _bulk_query(self, args, by_pattern, mode):
+        """
+        Runs BULK_QUERY_SCRIPT for the keys or key patterns, one sonic-db-cli EVAL command per batch.
+
+        Args:
+            args: List of keys or key patterns.
+            by_pattern: True if args are key patterns.
+            mode: "value", "digest" or "both", see BULK_QUERY_SCRIPT.
+
+        Returns:
+            Dictionary of the entries found, merged from all the batches.
+        """
+        # We are on an asic, it could be single asic card, or multiasic and need a namespace.
+        if isinstance(self.host, SonicAsic):
+            cli = self.host.sonic_db_cli.split()
+        else:
+            cli = ["sonic-db-cli"]
+
+        entries = {}
+        for batch in self._bulk_batches(args):
+            argv = cli + [self.database, "EVAL", BULK_QUERY_SCRIPT, "0",
+                          "match" if by_pattern else "keys", mode] + batch
+            logger.debug("SONIC-DB-CLI: bulk %s query of %d %s", mode, len(batch),
+                         "patterns" if by_pattern else "keys")
+            output = self.host.sonichost.command(argv=argv, verbose=False)
+            if output["stdout"].strip():
+                entries.update(json.loads(output["stdout"]))
+        return entries
+
+    def bulk_get(self, keys=None, patterns=None):
+        """
+        Gets many entries with one sonic-db-cli command per batch instead of one command per key.
+
+        The keys and the keys matching the patterns are read by a Lua script running in redis, the batches are
+        limited by BULK_BATCH_SIZE and BULK_BATCH_BYTES.
+
+        Args:
+            keys: Optional; list of full names of the keys to get.
+            patterns: Optional; list of key patterns as used by the redis KEYS command, like "ROUTE_TABLE:*".
+
+        Returns:
+            Dictionary of key to value. The value of a hash is a dictionary of the fields, the value of a string is
+            the string. Keys not found or of other types are not in the dictionary.
+        """
+        entries = {}
+        if keys:
+            entries.update(self._bulk_query(keys, False, "value"))
+        if patterns:
+            entries.update(self._bulk_query(patterns, True, "value"))
+        return entries
+
+    def snapshot(self, patterns):
+        """
+        Creates a snapshot of the keys matching the patterns, to poll the changes with SonicDbSnapshot.refresh().
+
+        Args:
+            patterns: List of key patterns as used by the redis KEYS command.
+
+        Returns:
+            SonicDbSnapshot with all the matching entries loaded.
+        """
+        snapshot = SonicDbSnapshot(self, patterns)
+        snapshot.refresh()
+        return snapshot
+
+
+class SonicDbSnapshot(object):
+    """
+    Snapshot of the entries matching key patterns in a database, to poll changes in convergence loops.
+
+    Each refresh reads only a sha1 digest of each matching entry and then the entries whose digest changed, so a
+    poll of a large table which did not change much transfers little more than the key names.
+
+        Attributes:
+            db_cli: the SonicDbCli of the database.
+            patterns: key patterns of the snapshot.
+            entries: dictionary of key to value as returned by SonicDbCli.bulk_get, updated by refresh().
+        """
+
+    def __init__(self, db_cli, patterns):
+        self.db_cli = db_cli
+        self.patterns = list(patterns)
+        self.entries = {}
+        self.digests = {}
+
+    def refresh(self):
+        """
+        Reads the changes since the previous refresh and applies them to the snapshot.
+
+        Returns:
+            Dictionary with the changes:
+                "added": dictionary of key to value of the new keys.
+                "changed": dictionary of key to new value of the modified keys.
+                "removed": list of the keys deleted.
+        """
+        digests = self.db_cli._bulk_query(self.patterns, True, "digest")
+        stale_keys = [key for key, digest in digests.items() if self.digests.get(key) != digest]
+        # The entries may have changed again after reading the digests, keep the digest read with the value
+        fresh = self.db_cli._bulk_query(stale_keys, False, "both") if stale_keys else {}
+
+        changes = {"added": {}, "changed": {}, "removed": []}
+        for key, (digest, value) in fresh.items():
+            if key in self.entries:
+                if self.entries[key] != value:
+                    changes["changed"][key] = value
+            else:
+                changes["added"][key] = value
+            self.entries[key] = value
+            digests[key] = digest
+        # Keys deleted after reading the digests are gone as well
+        for key in stale_keys:
+            if key not in fresh:
+                del digests[key]
+        for key in list(self.entries.keys()):
+            if key not in digests:
+                changes["removed"].append(key)
+                del self.entries[key]
+        self.digests = digests
+        return changes
+
 
 class AsicDbCli(SonicDbCli):
     """
@@ -0,0 +1,183 @@
+import fnmatch
+import hashlib
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from tests.common.helpers.sonic_db import SonicDbCli, BULK_QUERY_SCRIPT
+
+
+class FakeRedis(object):
+    """Runs the bulk queries of SonicDbCli on a dict, in place of the sonichost.command running sonic-db-cli EVAL."""
+
+    def __init__(self, db):
+        self.db = db
+        self.queries = []
+        # Called after a query, to change the database between the queries of a refresh
+        self.after_query = None
+
+    @staticmethod
+    def digest(value):
+        data = json.dumps(sorted(value.items())) if isinstance(value, dict) else value
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def command(self, argv, verbose=True):
+        cli, database, eval_cmd, script, numkeys, by, mode = argv[:7]
+        args = argv[7:]
+        assert (cli, database, eval_cmd, script, numkeys) == ("sonic-db-cli", "APPL_DB", "EVAL", BULK_QUERY_SCRIPT, "0")
+        self.queries.append((by, mode, args))
+
+        if by == "match":
+            keys = [key for pattern in args for key in sorted(self.db) if fnmatch.fnmatchcase(key, pattern)]
+        else:
+            keys = [key for key in args if key in self.db]
+        result = {}
+        for key in keys:
+            value = self.db[key]
+            if mode == "value":
+                result[key] = value
+            elif mode == "digest":
+                result[key] = self.digest(value)
+            else:
+                result[key] = [self.digest(value), value]
+
+        if self.after_query:
+            self.after_query(len(self.queries))
+        return {"stdout": json.dumps(result)}
+
+
+class TestBulkBatches(unittest.TestCase):
+    """Test cases for splitting the keys of a bulk query into batches."""
+
+    def setUp(self):
+        self.db_cli = SonicDbCli(MagicMock())
+
+    def test_empty(self):
+        self.assertEqual(list(self.db_cli._bulk_batches([])), [])
+
+    def test_batch_size(self):
+        self.db_cli.BULK_BATCH_SIZE = 3
+        keys = ["KEY:{}".format(i) for i in range(7)]
+
+        self.assertEqual(list(self.db_cli._bulk_batches(keys)), [keys[0:3], keys[3:6], keys[6:7]])
+
+    def test_batch_bytes(self):
+        self.db_cli.BULK_BATCH_BYTES = 10
+        keys = ["aaaa", "bbbb", "cc", "dddddddddddd", "e"]
+
+        # a key longer than the limit is still sent, in a batch of its own
+        self.assertEqual(list(self.db_cli._bulk_batches(keys)), [["aaaa", "bbbb", "cc"], ["dddddddddddd"], ["e"]])
+
+    def test_bulk_get_batches(self):
+        db = {"ROUTE_TABLE:10.0.{}.0/24".format(i): {"nexthop": "10.1.0.{}".format(i)} for i in range(5)}
+        db["PORT_TABLE:Ethernet0"] = {"admin_status": "up"}
+        db["STRING_KEY"] = "value"
+        fake_redis = FakeRedis(db)
+        self.db_cli.host.sonichost.command = fake_redis.command
+        self.db_cli.BULK_BATCH_SIZE = 2
+
+        entries = self.db_cli.bulk_get(keys=["PORT_TABLE:Ethernet0", "STRING_KEY", "MISSING"],
+                                       patterns=["ROUTE_TABLE:*"])
+
+        self.assertEqual(entries, db)
+        self.assertEqual([(by, mode, len(args)) for by, mode, args in fake_redis.queries],
+                         [("keys", "value", 2), ("keys", "value", 1), ("match", "value", 1)])
+
+
+class TestSonicDbSnapshot(unittest.TestCase):
+    """Test cases for polling the changes of a database with SonicDbSnapshot."""
+
+    def setUp(self):
+        self.db = {
+            "ROUTE_TABLE:10.0.0.0/24": {"nexthop": "10.1.0.1"},
+            "ROUTE_TABLE:10.0.1.0/24": {"nexthop": "10.1.0.2"},
+            "ROUTE_TABLE:10.0.2.0/24": {"nexthop": "10.1.0.3"},
+            "PORT_TABLE:Ethernet0": {"admin_status": "up"},
+        }
+        self.fake_redis = FakeRedis(self.db)
+        self.db_cli = SonicDbCli(MagicMock())
+        self.db_cli.host.sonichost.command = self.fake_redis.command
+
+    def test_initial_snapshot(self):
+        snapshot = self.db_cli.snapshot(["ROUTE_TABLE:*"])
+
+        self.assertEqual(sorted(snapshot.entries), ["ROUTE_TABLE:10.0.0.0/24", "ROUTE_TABLE:10.0.1.0/24",
+                                                    "ROUTE_TABLE:10.0.2.0/24"])
+        self.assertEqual(snapshot.entries["ROUTE_TABLE:10.0.1.0/24"], {"nexthop": "10.1.0.2"})
+
+    def test_no_changes(self):
+        snapshot = self.db_cli.snapshot(["ROUTE_TABLE:*"])
+        self.fake_redis.queries = []
+
+        self.assertEqual(snapshot.refresh(), {"added": {}, "changed": {}, "removed": []})
+        # only the digests are read
+        self.assertEqual([(by, mode) for by, mode, _ in self.fake_redis.queries], [("match", "digest")])
+
+    def test_changes(self):
+        snapshot = self.db_cli.snapshot(["ROUTE_TABLE:*"])
+        self.fake_redis.queries = []
+        self.db["ROUTE_TABLE:10.0.1.0/24"] = {"nexthop": "10.1.0.20"}
+        del self.db["ROUTE_TABLE:10.0.2.0/24"]
+        self.db["ROUTE_TABLE:10.0.3.0/24"] = {"nexthop": "10.1.0.4"}
+        self.db["PORT_TABLE:Ethernet0"] = {"admin_status": "down"}
+
+        changes = snapshot.refresh()
+
+        self.assertEqual(changes, {"added": {"ROUTE_TABLE:10.0.3.0/24": {"nexthop": "10.1.0.4"}},
+                                   "changed": {"ROUTE_TABLE:10.0.1.0/24": {"nexthop": "10.1.0.20"}},
+                                   "removed": ["ROUTE_TABLE:10.0.2.0/24"]})
+        self.assertEqual(snapshot.entries, {k: v for k, v in self.db.items() if k.startswith("ROUTE_TABLE:")})
+        # only the entries with a changed digest are read
+        self.assertEqual(self.fake_redis.queries[1],
+                         ("keys", "both", ["ROUTE_TABLE:10.0.1.0/24", "ROUTE_TABLE:10.0.3.0/24"]))
+        self.assertEqual(snapshot.refresh(), {"added": {}, "changed": {}, "removed": []})
+
+    def test_key_deleted_after_digest(self):
+        snapshot = self.db_cli.snapshot(["ROUTE_TABLE:*"])
+        self.db["ROUTE_TABLE:10.0.0.0/24"] = {"nexthop": "10.1.0.10"}
+        self.db["ROUTE_TABLE:10.0.3.0/24"] = {"nexthop": "10.1.0.4"}
+
+        def delete_keys(query_count):
+            # deleted between reading the digests and reading the values
+            if query_count == 1:
+                del self.db["ROUTE_TABLE:10.0.0.0/24"]
+                del self.db["ROUTE_TABLE:10.0.3.0/24"]
+        self.fake_redis.queries = []
+        self.fake_redis.after_query = delete_keys
+
+        changes = snapshot.refresh()
+
+        self.assertEqual(changes, {"added": {}, "changed": {}, "removed": ["ROUTE_TABLE:10.0.0.0/24"]})
+        self.assertEqual(sorted(snapshot.entries), ["ROUTE_TABLE:10.0.1.0/24", "ROUTE_TABLE:10.0.2.0/24"])
+        self.assertEqual(sorted(snapshot.digests), ["ROUTE_TABLE:10.0.1.0/24", "ROUTE_TABLE:10.0.2.0/24"])
+
+        # the keys added again are reported as added
+        self.fake_redis.after_query = None
+        self.db["ROUTE_TABLE:10.0.0.0/24"] = {"nexthop": "10.1.0.1"}
+        self.db["ROUTE_TABLE:10.0.3.0/24"] = {"nexthop": "10.1.0.4"}
+        self.assertEqual(snapshot.refresh(), {"added": {"ROUTE_TABLE:10.0.0.0/24": {"nexthop": "10.1.0.1"},
+                                                        "ROUTE_TABLE:10.0.3.0/24": {"nexthop": "10.1.0.4"}},
+                                              "changed": {}, "removed": []})
+
+    def test_key_changed_after_digest(self):
+        snapshot = self.db_cli.snapshot(["ROUTE_TABLE:*"])
+        self.db["ROUTE_TABLE:10.0.0.0/24"] = {"nexthop": "10.1.0.10"}
+
+        def change_key(query_count):
+            if query_count == 1:
+                self.db["ROUTE_TABLE:10.0.0.0/24"] = {"nexthop": "10.1.0.11"}
+        self.fake_redis.queries = []
+        self.fake_redis.after_query = change_key
+
+        changes = snapshot.refresh()
+
+        # the value read is kept with its own digest, so it is not read again by the next refresh
+        self.assertEqual(changes["changed"], {"ROUTE_TABLE:10.0.0.0/24": {"nexthop": "10.1.0.11"}})
+        self.fake_redis.after_query = None
+        self.fake_redis.queries = []
+        self.assertEqual(snapshot.refresh(), {"added": {}, "changed": {}, "removed": []})
+        self.assertEqual(len(self.fake_redis.queries), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,6 +61,14 @@ def add_advanced_reboot_args(parser):
         help="Sniff time increment",
     )
 
+    parser.addoption(
+        "--send_rate_pps",
+        action="store",
+        type=int,
+        default=0,
+        help="Rate of the data plane flow sent by the fast sender during reboot, 0 to use the scapy sender",
+    )
+
     parser.addoption(
         "--new_sonic_image",
         action="store",
@@ -3,6 +3,7 @@
 This plugin supports adding any mark to specified test cases based on conditions. All the information of test cases,
 marks, and conditions can be specified in a centralized file.
 """
+import hashlib
 import json
 import logging
 import os
@@ -13,7 +14,7 @@ import glob
 import pytest
 
 from tests.common.testbed import TestbedInfo
-from .issue import check_issues
+from .issue import check_issues, IssueStateCache, DEFAULT_ISSUE_STATE_TTL
 from tests.common.utilities import get_duts_from_host_pattern
 
 logger = logging.getLogger(__name__)
@@ -31,6 +32,21 @@ MARK_CONDITIONS_CONSTANTS = {
                      't2', 't2_2lc_36p-masic', 't2_2lc_min_ports-masic',
                      'lt2-p32o64', 'lt2-o128', 'ft2-64', 't2_one_hwsku_min', 't2_one_hwsku_max', 't2-single-node-min']
 }
+# Key of the trie node holding indexes of the conditions whose test case name ends at the node
+TRIE_END = None
+
+# Index of the conditions list last used by find_all_matches, as tuple (conditions, ConditionsIndex)
+_conditions_index = (None, None)
+# Condition strings compiled to code objects
+_compiled_conditions = {}
+# Globals used to evaluate conditions, by fingerprint of basic facts
+_condition_globals = {}
+# Results of evaluated condition strings, by fingerprint of basic facts and condition string
+_condition_results = {}
+# States of issues in conditions, prefetched at collection time
+_issue_status = {}
+_issue_state_cache = None
+ISSUE_URL_PATTERN = re.compile('https?://[^ )]+')
 
 
 def pytest_addoption(parser):
@@ -66,6 +82,29 @@ def pytest_addoption(parser):
         help="Dynamically update the skip reason based on the conditions, "
              "by default it will not use the static reason specified in the mark conditions file")
 
+    parser.addoption(
+        '--issue-state-cache-file',
+        action='store',
+        dest='issue_state_cache_file',
+        default=None,
+        help="Location of the cache file of states of issues in conditions. "
+             "If it is not specified, the file is kept in the pytest cache directory.")
+
+    parser.addoption(
+        '--issue-state-ttl',
+        action='store',
+        dest='issue_state_ttl',
+        type=int,
+        default=DEFAULT_ISSUE_STATE_TTL,
+        help="Seconds a cached issue state is used before it is checked again.")
+
+    parser.addoption(
+        '--issue-state-offline',
+        action='store_true',
+        dest='issue_state_offline',
+        default=False,
+        help="Only use issue states in the cache file, issues not in the cache are considered active.")
+
 
 def load_conditions(session):
     """Load the content from mark conditions file
@@ -447,12 +486,86 @@ def load_basic_facts(dut_name, session):
     return results
 
 
-def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, basic_facts):
+class ConditionsIndex(object):
+    """Index of the conditions list for finding the entries matching a test case name.
+
+    The test case names of literal entries are put in a prefix trie, so all of them that are prefix of a test case
+    name are found by walking the name once. The patterns of 'regex: true' entries are compiled once, together with
+    an alternation of all of them used to skip the test case names matching none of them.
+    """
+
+    def __init__(self, conditions):
+        self.trie = {}
+        self.regex_entries = []
+        self.regex_prefilter = None
+
+        for idx, condition in enumerate(conditions):
+            # condition is a dict which has only one item, so we use condition.keys()[0] to get its key.
+            condition_entry = list(condition.keys())[0]
+            condition_items = condition[condition_entry]
+            if "regex" in condition_items.keys():
+                assert isinstance(condition_items["regex"], bool), \
+                    "The value of 'regex' in the mark conditions yaml should be bool type."
+                if condition_items["regex"] is True:
+                    self.regex_entries.append((idx, re.compile(condition_entry)))
+                continue
+            if "use_longest" in condition_items.keys():
+                assert isinstance(condition_items["use_longest"], bool), \
+                    "The value of 'use_longest' in the mark conditions yaml should be bool type."
+            node = self.trie
+            for char in condition_entry:
+                node = node.setdefault(char, {})
+            node.setdefault(TRIE_END, []).append(idx)
+
+        patterns = [pattern.pattern for _, pattern in self.regex_entries]
+        # Group numbers are shifted in the alternation, patterns with back references can't be put together
+        if len(patterns) > 1 and not any(re.search(r"\\[1-9]|\(\?P=", pattern) for pattern in patterns):
+            try:
+                self.regex_prefilter = re.compile("|".join("(?:{})".format(pattern) for pattern in patterns))
+            except re.error:
+                self.regex_prefilter = None
+
+    def match(self, nodeid):
+        """Get indexes of the conditions matching the test case name, in the order of the conditions list."""
+        indexes = []
+        node = self.trie
+        for char in nodeid:
+            if TRIE_END in node:
+                indexes.extend(node[TRIE_END])
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            if TRIE_END in node:
+                indexes.extend(node[TRIE_END])
+
+        if self.regex_entries and (self.regex_prefilter is None or self.regex_prefilter.search(nodeid)):
+            indexes.extend(idx for idx, pattern in self.regex_entries if pattern.search(nodeid))
+        return sorted(indexes)
+
+
+def get_conditions_index(conditions):
+    """Get the ConditionsIndex of the conditions list, it is built once for the same list."""
+    global _conditions_index
+    indexed_conditions, index = _conditions_index
+    if indexed_conditions is not conditions:
+        index = ConditionsIndex(conditions)
+        _conditions_index = (conditions, index)
+    return index
+
+
+def get_facts_fingerprint(basic_facts):
+    """Get fingerprint of the basic facts, results of evaluated conditions are memoized by it."""
+    return hashlib.sha1(json.dumps(basic_facts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, basic_facts, facts_fingerprint=None):
     """Find all matches of the given test case name in the conditions list.
 
     Args:
         nodeid (str): Full test case name
         conditions (list): List of conditions
+        facts_fingerprint (str): Fingerprint of basic facts, computed from basic_facts if not specified.
 
     Returns:
         list: All match test case name or None if not found
@@ -461,31 +574,15 @@ def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, ba
     max_length = -1
     conditional_marks = {}
     matches = []
+    if facts_fingerprint is None:
+        facts_fingerprint = get_facts_fingerprint(basic_facts)
 
-    for condition in conditions:
-        # condition is a dict which has only one item, so we use condition.keys()[0] to get its key.
-        condition_entry = list(condition.keys())[0]
-        condition_items = condition[condition_entry]
-        if "regex" in condition_items.keys():
-            assert isinstance(condition_items["regex"], bool), \
-                "The value of 'regex' in the mark conditions yaml should be bool type."
-            if condition_items["regex"] is True:
-                match = re.search(condition_entry, nodeid)
-            else:
-                match = None
-
-        elif "use_longest" in condition_items.keys():
-            assert isinstance(condition_items["use_longest"], bool), \
-                "The value of 'use_longest' in the mark conditions yaml should be bool type."
-            if nodeid.startswith(condition_entry) and condition_items["use_longest"] is True:
-                all_matches = []
-
-            match = nodeid.startswith(condition_entry)
-        else:
-            match = nodeid.startswith(condition_entry)
-
-        if match:
-            all_matches.append(condition)
+    for idx in get_conditions_index(conditions).match(nodeid):
+        condition = conditions[idx]
+        condition_items = list(condition.values())[0]
+        if "regex" not in condition_items.keys() and condition_items.get("use_longest") is True:
+            all_matches = []
+        all_matches.append(condition)
 
     for match in all_matches:
         case_starting_substring = list(match.keys())[0]
@@ -498,7 +595,8 @@ def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, ba
             condition_value = evaluate_conditions(dynamic_update_skip_reason, match[case_starting_substring][mark],
                                                   match[case_starting_substring][mark].get('conditions'), basic_facts,
                                                   match[case_starting_substring][mark].get(
-                                                      'conditions_logical_operator', 'AND').upper(), session)
+                                                      'conditions_logical_operator', 'AND').upper(), session,
+                                                  facts_fingerprint)
 
             if condition_value:
                 if mark in conditional_marks:
@@ -526,11 +624,54 @@ def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, ba
     return matches
 
 
+def get_issue_state_cache(session):
+    """Get the on-disk cache of issue states, loaded once per session."""
+    global _issue_state_cache
+    if _issue_state_cache is None:
+        path = session.config.option.issue_state_cache_file
+        if not path:
+            path = os.path.join(str(session.config.cache.mkdir('conditional_mark')), 'issue_states.json')
+        _issue_state_cache = IssueStateCache(path, ttl=session.config.option.issue_state_ttl)
+    return _issue_state_cache
+
+
+def find_issue_urls(conditions):
+    """Find all issue URLs in the conditions of all entries of the conditions list."""
+    issues = []
+    for condition in conditions:
+        for mark_details in list(condition.values())[0].values():
+            if not isinstance(mark_details, dict):
+                continue
+            mark_conditions = mark_details.get('conditions')
+            if isinstance(mark_conditions, str):
+                mark_conditions = [mark_conditions]
+            for mark_condition in mark_conditions or []:
+                if isinstance(mark_condition, str):
+                    issues.extend(ISSUE_URL_PATTERN.findall(mark_condition))
+    return list(dict.fromkeys(issues))
+
+
+def prefetch_issue_status(conditions, session):
+    """Check states of all issues in the conditions at once, before conditions are evaluated for the test cases.
+
+    Args:
+        conditions (list): List of conditions.
+        session (obj): Pytest session object.
+    """
+    issues = find_issue_urls(conditions)
+    if not issues:
+        return
+    results = check_issues(issues, proxies=session.config.cache.get('PROXIES', {}),
+                           cache=get_issue_state_cache(session), offline=session.config.option.issue_state_offline)
+    _issue_status.update(results)
+
+
 def update_issue_status(condition_str, session):
     """Replace issue URL with 'True' or 'False' based on its active state.
 
     If there is an issue URL is found, this function will try to query state of the issue and replace the URL
-    in the condition string with 'True' or 'False' based on its active state.
+    in the condition string with 'True' or 'False' based on its active state. States of issues in the conditions
+    files are prefetched by prefetch_issue_status.
 
     The issue URL may be Github, Jira, Redmine, etc.
 
@@ -541,23 +682,21 @@ def update_issue_status(condition_str, session):
     Returns:
         str: New condition string with issue URLs already replaced with 'True' or 'False'.
     """
-    issues = re.findall('https?://[^ )]+', condition_str)
+    issues = ISSUE_URL_PATTERN.findall(condition_str)
     if not issues:
         logger.debug('No issue specified in condition')
         return condition_str
 
-    issue_status_cache = session.config.cache.get('ISSUE_STATUS', {})
-    proxies = session.config.cache.get('PROXIES', {})
-
-    unknown_issues = [issue_url for issue_url in issues if issue_url not in issue_status_cache]
+    unknown_issues = [issue_url for issue_url in issues if issue_url not in _issue_status]
     if unknown_issues:
-        results = check_issues(unknown_issues, proxies=proxies)
-        issue_status_cache.update(results)
-        session.config.cache.set('ISSUE_STATUS', issue_status_cache)
+        results = check_issues(unknown_issues, proxies=session.config.cache.get('PROXIES', {}),
+                               cache=get_issue_state_cache(session),
+                               offline=session.config.option.issue_state_offline)
+        _issue_status.update(results)
 
     for issue_url in issues:
-        if issue_url in issue_status_cache:
-            replace_str = str(issue_status_cache[issue_url])
+        if issue_url in _issue_status:
+            replace_str = str(_issue_status[issue_url])
         else:
             # Consider the issue as active anyway if unable to get issue state
             replace_str = 'True'
@@ -566,9 +705,26 @@ def update_issue_status(condition_str, session):
     return condition_str
 
 
-def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basic_facts, session):
+def get_condition_globals(basic_facts, facts_fingerprint):
+    """Get the globals used to evaluate condition strings, built once for the same basic facts."""
+    safe_globals = _condition_globals.get(facts_fingerprint)
+    if safe_globals is None:
+        safe_globals = {k: v for k, v in basic_facts.items()}
+
+        for var in ["asic_type", "platform", "hwsku", "asic_gen"]:
+            if var not in safe_globals:
+                logger.warning("Variable %s not found in basic_facts, defaulting to None", var)
+                safe_globals[var] = None
+        _condition_globals[facts_fingerprint] = safe_globals
+    return safe_globals
+
+
+def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basic_facts, session,
+                       facts_fingerprint=None):
     """Evaluate a condition string based on supplied basic facts.
 
+    The condition string is compiled once, its result is memoized by the fingerprint of basic facts.
+
     Args:
         dynamic_update_skip_reason(bool): Dynamically update the skip reason based on the conditions, if it is true,
             it will update the skip reason, else will not.
@@ -578,6 +734,7 @@ def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basi
         basic_facts (dict): A one level dict with basic facts. Keys of the dict can be used as variables in the
             condition string evaluation.
         session (obj): Pytest session object, for getting cached data.
+        facts_fingerprint (str): Fingerprint of basic facts, computed from basic_facts if not specified.
 
     Returns:
         bool: True or False based on condition string evaluation result.
@@ -586,17 +743,17 @@ def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basi
         return True    # Empty condition item will be evaluated as True. Equivalent to be ignored.
 
     condition_str = update_issue_status(condition, session)
+    if facts_fingerprint is None:
+        facts_fingerprint = get_facts_fingerprint(basic_facts)
     try:
-        safe_facts = {k: v for k, v in basic_facts.items()}
-        safe_globals = {}
-        safe_globals.update(safe_facts)
-
-        for var in ["asic_type", "platform", "hwsku", "asic_gen"]:
-            if var not in safe_globals:
-                logger.warning("Variable %s not found in basic_facts, defaulting to None", var)
-                safe_globals[var] = None
-
-        condition_result = bool(eval(condition_str, safe_globals))
+        result_key = (facts_fingerprint, condition_str)
+        condition_result = _condition_results.get(result_key)
+        if condition_result is None:
+            code = _compiled_conditions.get(condition_str)
+            if code is None:
+                code = _compiled_conditions[condition_str] = compile(condition_str, '<condition>', 'eval')
+            condition_result = bool(eval(code, get_condition_globals(basic_facts, facts_fingerprint)))
+            _condition_results[result_key] = condition_result
 
         if condition_result and dynamic_update_skip_reason:
             mark_details['reason'].append(condition)
@@ -608,7 +765,7 @@ def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basi
 
 
 def evaluate_conditions(dynamic_update_skip_reason, mark_details, conditions, basic_facts,
-                        conditions_logical_operator, session):
+                        conditions_logical_operator, session, facts_fingerprint=None):
     """Evaluate all the condition strings.
 
     Evaluate a single condition or multiple conditions. If multiple conditions are supplied, apply AND or OR
@@ -623,24 +780,30 @@ def evaluate_conditions(dynamic_update_skip_reason, mark_details, conditions, ba
             condition string evaluation.
         conditions_logical_operator (str): logical operator which should be applied to conditions(by default 'AND')
         session (obj): Pytest session object, for getting cached data.
+        facts_fingerprint (str): Fingerprint of basic facts, computed from basic_facts if not specified.
 
     Returns:
         bool: True or False based on condition strings evaluation result.
     """
     if dynamic_update_skip_reason:
         mark_details['reason'] = []
+    if facts_fingerprint is None:
+        facts_fingerprint = get_facts_fingerprint(basic_facts)
     if isinstance(conditions, list):
         # Apply 'AND' or 'OR' operation to list of conditions based on conditions_logical_operator(by default 'AND')
         if conditions_logical_operator == 'OR':
-            return any([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session)
+            return any([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session,
+                                           facts_fingerprint)
                         for c in conditions])
         else:
-            return all([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session)
+            return all([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session,
+                                           facts_fingerprint)
                         for c in conditions])
     else:
         if conditions is None or conditions.strip() == '':
             return True
-        return evaluate_condition(dynamic_update_skip_reason, mark_details, conditions, basic_facts, session)
+        return evaluate_condition(dynamic_update_skip_reason, mark_details, conditions, basic_facts, session,
+                                  facts_fingerprint)
 
 
 def pytest_collection(session):
@@ -666,6 +829,8 @@ def pytest_collection(session):
         # Only load basic facts if conditions are defined.
         get_basic_facts(session)
 
+        prefetch_issue_status(conditions, session)
+
 
 def pytest_collection_modifyitems(session, config, items):
     """Hook for adding marks to test cases based on conditions defined in a centralized file.
@@ -690,13 +855,15 @@ def pytest_collection_modifyitems(session, config, items):
         json.dumps(basic_facts, indent=2)))
     dynamic_update_skip_reason = session.config.option.dynamic_update_skip_reason
     basic_facts['constants'] = MARK_CONDITIONS_CONSTANTS
+    facts_fingerprint = get_facts_fingerprint(basic_facts)
     # Normalize nodeids: strip root directory prefix if present (pytest 9.0+ includes it)
     root_prefix = os.path.basename(str(session.config.rootpath)) + "/"
     for item in items:
         nodeid = item.nodeid
         if nodeid.startswith(root_prefix):
             nodeid = nodeid[len(root_prefix):]
-        all_matches = find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, basic_facts)
+        all_matches = find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, basic_facts,
+                                       facts_fingerprint)
 
         if all_matches:
             logger.debug('Found match "{}" for test case "{}"'.format(all_matches, item.nodeid))
@@ -717,7 +884,8 @@ def pytest_collection_modifyitems(session, config, items):
                             add_mark = True
                         else:
                             add_mark = evaluate_conditions(dynamic_update_skip_reason, mark_details, mark_conditions,
-                                                           basic_facts, conditions_logical_operator, session)
+                                                           basic_facts, conditions_logical_operator, session,
+                                                           facts_fingerprint)
 
                     if add_mark:
                         reason = ''
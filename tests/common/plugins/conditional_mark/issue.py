@@ -1,10 +1,13 @@
 """For checking issue state based on supplied issue URL.
 """
+import json
 import logging
-import multiprocessing
 import os
 import re
+import tempfile
+import time
 from abc import ABCMeta, abstractmethod
+from multiprocessing.pool import ThreadPool
 from urllib.parse import urlencode
 
 import requests
@@ -12,6 +15,63 @@ import six
 
 logger = logging.getLogger(__name__)
 
+# Seconds the cached state of an issue is used without checking it again
+DEFAULT_ISSUE_STATE_TTL = 6 * 3600
+# Maximum number of issues checked concurrently
+MAX_ISSUE_CHECK_WORKERS = 16
+
+
+class IssueStateCache(object):
+    """On-disk cache of issue states.
+
+    The cache file is a JSON dict of issue URL to its state, for example:
+        {
+            "https://github.com/sonic-net/sonic-mgmt/issues/1234": {
+                "active": false,
+                "checked": 1760000000.0,
+                "etag": "W/\"6f1c...\"",
+                "last_modified": "Mon, 13 Oct 2025 08:00:00 GMT"
+            }
+        }
+    States checked more than ttl seconds ago are revalidated by conditional request with the saved ETag and
+    Last-Modified. A cache file seeded with "active" of each issue can be used for running offline.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_ISSUE_STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.states = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.states = json.load(f)
+            except (IOError, ValueError) as e:
+                logger.warning('Failed to load issue state cache {}: {}'.format(path, repr(e)))
+
+    def get(self, url):
+        """Get the cached state of the issue, or None if the issue is not cached."""
+        return self.states.get(url)
+
+    def is_fresh(self, url):
+        state = self.states.get(url)
+        return state is not None and time.time() - state.get('checked', 0) < self.ttl
+
+    def update(self, url, state):
+        self.states[url] = state
+
+    def save(self):
+        """Write the cache file atomically, so concurrent runs never read a partial file."""
+        if not self.path:
+            return
+        try:
+            cache_dir = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.issue_states_')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.states, f, indent=2, sort_keys=True)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            logger.warning('Failed to save issue state cache {}: {}'.format(self.path, repr(e)))
+
 
 class IssueCheckerBase(six.with_metaclass(ABCMeta, object)):
     """Base class for issue checker
@@ -27,6 +87,15 @@ class IssueCheckerBase(six.with_metaclass(ABCMeta, object)):
         """
         return True
 
+    def check(self, cached_state=None):
+        """
+        Check state of the issue, revalidating the cached state if the checker supports it.
+
+        Returns:
+            dict: State of the issue like {"active": True, "checked": <timestamp>}, or None if failed to check.
+        """
+        return {'active': self.is_active(), 'checked': time.time()}
+
 
 class GitHubIssueChecker(IssueCheckerBase):
     """GitHub issue state checker
@@ -42,22 +111,43 @@ class GitHubIssueChecker(IssueCheckerBase):
     def is_active(self):
         """Check if the GitHub issue is still active.
 
-        Attempt to fetch issue details via proxy if configured. If proxy fails, retry with direct GitHub API URL.
         If unable to retrieve issue state, assume the issue is active (safe default).
 
         Returns:
             bool: False if the issue is closed else True.
         """
+        state = self.check()
+        return True if state is None else state['active']
+
+    def check(self, cached_state=None):
+        """Check state of the GitHub issue.
+
+        Attempt to fetch issue details via proxy if configured. If proxy fails, retry with direct GitHub API URL.
+        If a cached state is supplied, the request is conditional on its ETag and Last-Modified, and the cached state
+        is used if the issue is not modified. Conditional requests answered by 304 do not count against the rate limit.
+
+        Returns:
+            dict: State of the issue, see IssueStateCache, or None if unable to retrieve issue state.
+        """
+        headers = {}
+        if cached_state:
+            if cached_state.get('etag'):
+                headers['If-None-Match'] = cached_state['etag']
+            if cached_state.get('last_modified'):
+                headers['If-Modified-Since'] = cached_state['last_modified']
 
         def fetch_issue(url):
-            response = requests.get(url, proxies=self.proxies, timeout=10)
+            response = requests.get(url, proxies=self.proxies, timeout=10, headers=headers)
+            if response.status_code == 304:
+                return None, response
             response.raise_for_status()
-            return response.json()
+            return response.json(), response
 
         direct_url = self.api_url
         proxy_url = os.getenv("SONIC_AUTOMATION_PROXY_GITHUB_ISSUES_URL")
 
         issue_data = None
+        response = None
 
         # Attempt to access via proxy first (if configured)
         # The proxy is used to work around GitHub's unauthenticated rate limit (60 requests/hour per IP).
@@ -67,19 +157,29 @@ class GitHubIssueChecker(IssueCheckerBase):
             try:
                 proxy_endpoint = f"{proxy_url.rstrip('/')}/?{urlencode({'github_issue_url': direct_url})}"
                 logger.info("Attempting to access GitHub API via proxy.")
-                issue_data = fetch_issue(proxy_endpoint)
+                issue_data, response = fetch_issue(proxy_endpoint)
             except Exception as proxy_err:
                 logger.warning(f"Proxy access failed: {proxy_err}. Falling back to direct API.")
 
         # Fallback to direct URL if proxy is not set or fails
-        if issue_data is None:
+        if response is None:
             try:
                 logger.info(f"Accessing GitHub API directly: {direct_url}")
-                issue_data = fetch_issue(direct_url)
+                issue_data, response = fetch_issue(direct_url)
             except Exception as direct_err:
                 logger.error(f"Access GitHub API directly failed for {direct_url}: {direct_err}")
-                logger.debug(f"Issue {direct_url} is considered active due to API access failure.")
-                return True
+                return None
+
+        if issue_data is None:
+            logger.debug(f"Issue {direct_url} is not modified since last check.")
+            return dict(cached_state, checked=time.time())
+
+        state = {
+            'active': True,
+            'checked': time.time(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
 
         # Check issue state
         if issue_data.get('state') == 'closed':
@@ -89,10 +189,11 @@ class GitHubIssueChecker(IssueCheckerBase):
                 logger.warning(
                     f"GitHub issue {direct_url} appears to be a duplicate and was closed. "
                     f"Consider ignoring related test failures.")
-            return False
+            state['active'] = False
+            return state
 
         logger.debug(f"Issue {direct_url} is active.")
-        return True
+        return state
 
 
 def issue_checker_factory(url, proxies):
@@ -115,35 +216,60 @@ def issue_checker_factory(url, proxies):
     return None
 
 
-def check_issues(issues, proxies=None):
+def check_issues(issues, proxies=None, cache=None, offline=False):
     """Check state of the specified issues.
 
-    Because issue state checking may involve sending HTTP request. This function uses parallel run to speed up
-    issue status checking.
+    Because issue state checking may involve sending HTTP request. This function checks the issues concurrently
+    using a bounded thread pool. Issues having a fresh state in the cache are not checked again.
 
     Args:
         issues (list of str): List of issue URLs.
+        cache (IssueStateCache): Cache of issue states, updated and saved with the checked states.
+        offline (bool): Only use states in the cache, no matter how old they are.
 
     Returns:
         dict: Issue state check result. Key is issue URL, value is either True or False based on issue state.
     """
-    checkers = [c for c in [issue_checker_factory(issue, proxies) for issue in issues] if c is not None]
-    if not checkers:
-        logger.error('No checker created for issues: {}'.format(issues))
-        return {}
-
-    check_results = multiprocessing.Manager().dict()
-    check_procs = []
-
-    def _check_issue(checker, results):
-        results[checker.url] = checker.is_active()
-
-    for checker in checkers:
-        check_procs.append(multiprocessing.Process(target=_check_issue, args=(checker, check_results,)))
-
-    for proc in check_procs:
-        proc.start()
-    for proc in check_procs:
-        proc.join(timeout=60)
+    results = {}
+    to_check = []
+    for issue in dict.fromkeys(issues):
+        if cache is not None and (cache.is_fresh(issue) or (offline and cache.get(issue) is not None)):
+            results[issue] = cache.get(issue)['active']
+        elif offline:
+            logger.warning('No cached state of issue {} while running offline'.format(issue))
+        else:
+            to_check.append(issue)
+    if not to_check:
+        return results
 
-    return dict(check_results)
+    checkers = [c for c in [issue_checker_factory(issue, proxies) for issue in to_check] if c is not None]
+    if not checkers:
+        logger.error('No checker created for issues: {}'.format(to_check))
+        return results
+
+    def _check_issue(checker):
+        return checker.check(cache.get(checker.url) if cache is not None else None)
+
+    pool = ThreadPool(processes=min(len(checkers), MAX_ISSUE_CHECK_WORKERS))
+    try:
+        states = pool.map(_check_issue, checkers)
+    finally:
+        pool.close()
+        pool.join()
+
+    for checker, state in zip(checkers, states):
+        if state is not None:
+            results[checker.url] = state['active']
+            if cache is not None:
+                cache.update(checker.url, state)
+        elif cache is not None and cache.get(checker.url) is not None:
+            logger.warning('Failed to check issue {}, using its state cached at {}'.format(
+                checker.url, cache.get(checker.url).get('checked')))
+            results[checker.url] = cache.get(checker.url)['active']
+        else:
+            logger.debug(f"Issue {checker.url} is considered active due to API access failure.")
+            results[checker.url] = True
+    if cache is not None:
+        cache.save()
+    logger.info('Checked state of {} issues, {} from cache'.format(len(results), len(results) - len(checkers)))
+    return results
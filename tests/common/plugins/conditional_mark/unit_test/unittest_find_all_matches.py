@@ -292,6 +292,55 @@ class TestFindAllMatches(unittest.TestCase):
         self.assertEqual(len(marks_found), 1)
         self.assertIn('xfail', marks_found)
 
+    # Test regex entries
+    def test_regex_match(self):
+        conditions, session_mock = load_test_conditions()
+        nodeid = "test_conditional_mark_regex.py::test_regex_12[param]"
+
+        marks_found = []
+        matches = find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON, CUSTOM_BASIC_FACTS)
+
+        for match in matches:
+            for mark_name, mark_details in list(list(match.values())[0].items()):
+                if mark_name == "regex":
+                    continue
+                marks_found.append(mark_name)
+
+                if mark_name == "skip":
+                    self.assertEqual(mark_details.get("reason"),
+                                     "Skip test_conditional_mark_regex.py::test_regex_[0-9]+")
+
+        self.assertEqual(len(marks_found), 1)
+        self.assertIn('skip', marks_found)
+
+    def test_regex_no_match(self):
+        conditions, session_mock = load_test_conditions()
+        nodeid = "test_conditional_mark_regex.py::test_regex_x"
+
+        matches = find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON, CUSTOM_BASIC_FACTS)
+
+        self.assertFalse(matches)
+
+    def test_regex_disabled(self):
+        conditions, session_mock = load_test_conditions()
+        nodeid = "test_conditional_mark_regex.py::test_regex_disabled"
+
+        matches = find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON, CUSTOM_BASIC_FACTS)
+
+        self.assertFalse(matches)
+
+    # Test conditions are evaluated again for different basic facts
+    def test_conditions_with_different_basic_facts(self):
+        conditions, session_mock = load_test_conditions()
+        nodeid = "test_conditional_mark.py::test_mark"
+
+        matches = find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON, CUSTOM_BASIC_FACTS)
+        self.assertEqual(len(matches), 1)
+
+        matches = find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON,
+                                   {"asic_type": "vs", "topo_type": "t1"})
+        self.assertFalse(matches)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from tests.common.plugins import conditional_mark
+from tests.common.plugins.conditional_mark import issue
+from tests.common.plugins.conditional_mark.issue import IssueStateCache, check_issues
+
+ISSUE_1 = "https://github.com/sonic-net/sonic-mgmt/issues/1"
+ISSUE_2 = "https://github.com/sonic-net/sonic-mgmt/issues/2"
+ISSUE_3 = "https://github.com/sonic-net/sonic-mgmt/issues/3"
+
+
+class FakeIssueChecker(object):
+    """Issue checker returning the states given by URL, or None for a failed check."""
+
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+    checked = []
+
+    def __init__(self, url, states):
+        self.url = url
+        self.states = states
+
+    def check(self, cached_state=None):
+        with self.lock:
+            FakeIssueChecker.running += 1
+            FakeIssueChecker.max_running = max(FakeIssueChecker.max_running, FakeIssueChecker.running)
+            FakeIssueChecker.checked.append((self.url, cached_state))
+        time.sleep(0.01)
+        with self.lock:
+            FakeIssueChecker.running -= 1
+        active = self.states.get(self.url)
+        return None if active is None else {'active': active, 'checked': time.time()}
+
+
+def fake_checker_factory(states):
+    FakeIssueChecker.running = 0
+    FakeIssueChecker.max_running = 0
+    FakeIssueChecker.checked = []
+    return patch.object(issue, 'issue_checker_factory', lambda url, proxies: FakeIssueChecker(url, states))
+
+
+class TestIssueStateCache(unittest.TestCase):
+    """Test cases for the on-disk cache of issue states."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'issue_states.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_load(self):
+        cache = IssueStateCache(self.path)
+        cache.update(ISSUE_1, {'active': False, 'checked': 100.0, 'etag': 'W/"1"'})
+        cache.save()
+
+        self.assertEqual(os.listdir(self.tmp_dir), ['issue_states.json'])
+        self.assertEqual(IssueStateCache(self.path).get(ISSUE_1), {'active': False, 'checked': 100.0, 'etag': 'W/"1"'})
+        self.assertIsNone(IssueStateCache(self.path).get(ISSUE_2))
+
+    def test_load_corrupted_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{"partial')
+
+        self.assertEqual(IssueStateCache(self.path).states, {})
+
+    def test_ttl(self):
+        cache = IssueStateCache(self.path, ttl=60)
+        cache.update(ISSUE_1, {'active': True, 'checked': 1000.0})
+
+        with patch.object(issue.time, 'time', return_value=1059.0):
+            self.assertTrue(cache.is_fresh(ISSUE_1))
+            self.assertFalse(cache.is_fresh(ISSUE_2))
+        with patch.object(issue.time, 'time', return_value=1061.0):
+            self.assertFalse(cache.is_fresh(ISSUE_1))
+
+
+class TestCheckIssues(unittest.TestCase):
+    """Test cases for checking the states of issues with the cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'issue_states.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fresh_states_not_checked(self):
+        cache = IssueStateCache(self.path)
+        cache.update(ISSUE_1, {'active': False, 'checked': time.time()})
+
+        with fake_checker_factory({ISSUE_2: True}):
+            results = check_issues([ISSUE_1, ISSUE_2, ISSUE_2], cache=cache)
+
+        self.assertEqual(results, {ISSUE_1: False, ISSUE_2: True})
+        self.assertEqual(FakeIssueChecker.checked, [(ISSUE_2, None)])
+        with open(self.path) as f:
+            self.assertEqual(sorted(json.load(f)), [ISSUE_1, ISSUE_2])
+
+    def test_stale_states_revalidated(self):
+        cache = IssueStateCache(self.path, ttl=60)
+        stale = {'active': True, 'checked': time.time() - 120, 'etag': 'W/"1"'}
+        cache.update(ISSUE_1, stale)
+
+        with fake_checker_factory({ISSUE_1: False}):
+            results = check_issues([ISSUE_1], cache=cache)
+
+        self.assertEqual(results, {ISSUE_1: False})
+        self.assertEqual(FakeIssueChecker.checked, [(ISSUE_1, stale)])
+        self.assertTrue(cache.is_fresh(ISSUE_1))
+
+    def test_failed_checks(self):
+        cache = IssueStateCache(self.path, ttl=60)
+        cache.update(ISSUE_1, {'active': False, 'checked': time.time() - 120})
+
+        with fake_checker_factory({}):
+            results = check_issues([ISSUE_1, ISSUE_2], cache=cache)
+
+        # the stale cached state is used, an issue never checked is considered active
+        self.assertEqual(results, {ISSUE_1: False, ISSUE_2: True})
+        self.assertIsNone(cache.get(ISSUE_2))
+
+    def test_offline(self):
+        cache = IssueStateCache(self.path, ttl=60)
+        cache.update(ISSUE_1, {'active': False, 'checked': 0.0})
+
+        with fake_checker_factory({ISSUE_1: True, ISSUE_2: True}):
+            results = check_issues([ISSUE_1, ISSUE_2], cache=cache, offline=True)
+
+        self.assertEqual(results, {ISSUE_1: False})
+        self.assertEqual(FakeIssueChecker.checked, [])
+
+    def test_checked_concurrently(self):
+        issues = ["https://github.com/sonic-net/sonic-mgmt/issues/{}".format(i) for i in range(40)]
+
+        with fake_checker_factory(dict.fromkeys(issues, True)):
+            results = check_issues(issues)
+
+        self.assertEqual(results, dict.fromkeys(issues, True))
+        self.assertEqual(sorted(url for url, _ in FakeIssueChecker.checked), sorted(issues))
+        self.assertGreater(FakeIssueChecker.max_running, 1)
+        self.assertLessEqual(FakeIssueChecker.max_running, issue.MAX_ISSUE_CHECK_WORKERS)
+
+
+class TestIssueStatus(unittest.TestCase):
+    """Test cases for prefetching the states of the issues in the conditions."""
+
+    def setUp(self):
+        conditional_mark._issue_status.clear()
+        self.session = MagicMock()
+        self.session.config.cache.get.return_value = {}
+        self.session.config.option.issue_state_offline = False
+
+    def tearDown(self):
+        conditional_mark._issue_status.clear()
+
+    def test_prefetch_in_one_batch(self):
+        conditions = [
+            {"a/test_a.py": {"skip": {"reason": "a", "conditions": ["{} and asic_type in ['vs']".format(ISSUE_1)]}}},
+            {"b/test_b.py": {"xfail": {"reason": "b", "conditions": "{} or {}".format(ISSUE_2, ISSUE_1)}}},
+            {"c/test_c.py": {"skip": {"reason": "c"}}},
+        ]
+        check = MagicMock(return_value={ISSUE_1: True, ISSUE_2: False})
+
+        with patch.object(conditional_mark, 'check_issues', check), \
+                patch.object(conditional_mark, 'get_issue_state_cache'):
+            conditional_mark.prefetch_issue_status(conditions, self.session)
+            condition = conditional_mark.update_issue_status("{} or {}".format(ISSUE_2, ISSUE_1), self.session)
+
+        check.assert_called_once()
+        self.assertEqual(check.call_args[0][0], [ISSUE_1, ISSUE_2])
+        self.assertEqual(condition, "False or True")
+
+    def test_unknown_issue_checked(self):
+        check = MagicMock(return_value={})
+
+        with patch.object(conditional_mark, 'check_issues', check), \
+                patch.object(conditional_mark, 'get_issue_state_cache'):
+            condition = conditional_mark.update_issue_status(ISSUE_3, self.session)
+
+        self.assertEqual(check.call_args[0][0], [ISSUE_3])
+        # considered active when the state is unknown
+        self.assertEqual(condition, "True")
@@ -2,6 +2,7 @@ import logging
 import pytest
 
 from .loganalyzer import LogAnalyzer, DisableLogrotateCronContext
+from .loganalyzer import DEFAULT_TRANSFER_COMPRESSION, DEFAULT_DEBUG_LOG_SIZE, COMPRESSED_FILE_EXT
 from tests.common.errors import RunAnsibleModuleFail
 from tests.common.helpers.parallel import parallel_run, reset_ansible_local_tmp
 from .bug_handler_helper import get_bughandler_instance
@@ -20,6 +21,12 @@ def pytest_addoption(parser):
                      help="params that may needed in log_analyzer_bug_handler when err detected, "
                           "log_analyzer_bug_handler is called in _post_err_msg_handler, "
                           "vendor can implement their own logic in log_analyzer_bug_handler.")
+    parser.addoption("--loganalyzer_transfer_compression", action="store", default=DEFAULT_TRANSFER_COMPRESSION,
+                     choices=list(COMPRESSED_FILE_EXT.keys()),
+                     help="compression of the extracted log files fetched from the DUT for analysis")
+    parser.addoption("--loganalyzer_debug_log_size", action="store", type=int, default=DEFAULT_DEBUG_LOG_SIZE,
+                     help="number of trailing bytes of each extracted log file printed to the debug log, "
+                          "0 to disable, -1 to print the whole file")
     parser.addoption("--force_load_err_list", action="store_true", default=False,
                      help="Load the user defined err msgs which is not included in the common ignore file,"
                           "even when disable_loganalyzer is true")
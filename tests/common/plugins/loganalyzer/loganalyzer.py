@@ -1,3 +1,4 @@
+import gzip
 import json
 import logging
 import os
@@ -10,6 +11,7 @@ from . import system_msg_handler
 from .bug_handler_helper import get_bughandler_instance, BugHandler
 
 from .system_msg_handler import AnsibleLogAnalyzer as ansible_loganalyzer
+from .system_msg_handler import get_regex_matcher
 from os.path import join, split
 
 ANSIBLE_LOGANALYZER_MODULE = system_msg_handler.__file__.replace(r".pyc", ".py")
@@ -17,6 +19,12 @@ COMMON_MATCH = join(split(__file__)[0], "loganalyzer_common_match.txt")
 COMMON_IGNORE = join(split(__file__)[0], "loganalyzer_common_ignore.txt")
 COMMON_EXPECT = join(split(__file__)[0], "loganalyzer_common_expect.txt")
 SYSLOG_TMP_FOLDER = "/tmp/syslog"
+# Compression of extracted log files for the transfer from the DUT, "none" or "gzip"
+DEFAULT_TRANSFER_COMPRESSION = "gzip"
+COMPRESSED_FILE_EXT = {"none": "", "gzip": ".gz"}
+# Number of trailing bytes of each extracted log file printed to the debug log, 0 - disabled, -1 - whole file
+DEFAULT_DEBUG_LOG_SIZE = 64 * 1024
+TRANSFER_CHUNK_SIZE = 1024 * 1024
 
 
 class DisableLogrotateCronContext:
@@ -162,6 +170,8 @@ class LogAnalyzer:
         ansible_host.loganalyzer = self
         self.dut_run_dir = dut_run_dir
         self.extracted_syslog = os.path.join(self.dut_run_dir, "syslog")
+        # inode and offset of log files recorded at init, used to extract only the new part of logs
+        self.offset_file = os.path.join(self.dut_run_dir, "loganalyzer_offsets.json")
         self.marker_prefix = marker_prefix.replace(' ', '_')
         # use existing syslog msg as marker to search in logs instead of writing a new one
         self.start_marker = start_marker
@@ -174,6 +184,8 @@ class LogAnalyzer:
         self._markers = []
         self.fail = True
         self.store_la_logs = False
+        self.transfer_compression = DEFAULT_TRANSFER_COMPRESSION
+        self.debug_log_size = DEFAULT_DEBUG_LOG_SIZE
 
         self.additional_files = list(additional_files.keys())
         self.additional_start_str = list(additional_files.values())
@@ -182,6 +194,10 @@ class LogAnalyzer:
             # override the fail and store_la_logs if they are set in the request config options
             self.fail = not (self.request.config.getoption("--ignore_la_failure"))
             self.store_la_logs = self.request.config.getoption("--store_la_logs")
+            self.transfer_compression = self.request.config.getoption(
+                "--loganalyzer_transfer_compression", default=DEFAULT_TRANSFER_COMPRESSION)
+            self.debug_log_size = self.request.config.getoption(
+                "--loganalyzer_debug_log_size", default=DEFAULT_DEBUG_LOG_SIZE)
 
         self._la_logs_dir = "/tmp/loganalyzer/{}".format(self.ansible_host.hostname)
         self.bughandler = bughandler
@@ -409,8 +425,8 @@ class LogAnalyzer:
         Adds the marker to the log files
         """
         start_marker = ".".join((self.marker_prefix, time.strftime("%Y-%m-%d-%H:%M:%S", time.gmtime())))
-        cmd = "python {run_dir}/loganalyzer.py --action init --run_id {start_marker}"\
-            .format(run_dir=self.dut_run_dir, start_marker=start_marker)
+        cmd = "python {run_dir}/loganalyzer.py --action init --run_id {start_marker} --offset_file {offset_file}"\
+            .format(run_dir=self.dut_run_dir, start_marker=start_marker, offset_file=self.offset_file)
         if log_files:
             cmd += " --logs {}".format(','.join(log_files))
 
@@ -438,7 +454,8 @@ class LogAnalyzer:
                             "match_files": {},
                             "match_messages": {},
                             "expect_messages": {},
-                            "unused_expected_regexp": []
+                            "unused_expected_regexp": [],
+                            "analysis_stats": {}
                             }
         timestamp = time.strftime("%Y-%m-%d-%H:%M:%S", time.gmtime())
         tmp_folder = ".".join((SYSLOG_TMP_FOLDER, self.ansible_host.hostname, timestamp))
@@ -456,7 +473,8 @@ class LogAnalyzer:
 
             # On DUT extract syslog files from /var/log/ and create one file by location - /tmp/syslog
             self.ansible_host.extract_log(directory='/var/log', file_prefix='syslog', start_string=start_string,
-                                          target_filename=self.extracted_syslog)
+                                          target_filename=self._transfer_path(self.extracted_syslog),
+                                          offset_file=self.offset_file, compression=self.transfer_compression)
             for idx, path in enumerate(self.additional_files):
                 file_dir, file_name = split(path)
                 extracted_file_name = os.path.join(self.dut_run_dir, file_name)
@@ -465,7 +483,8 @@ class LogAnalyzer:
                 else:
                     start_str = start_string
                 self.ansible_host.extract_log(directory=file_dir, file_prefix=file_name, start_string=start_str,
-                                              target_filename=extracted_file_name)
+                                              target_filename=self._transfer_path(extracted_file_name),
+                                              offset_file=self.offset_file, compression=self.transfer_compression)
 
         # Download extracted logs from the DUT to the temporal folder defined in SYSLOG_TMP_FOLDER
         self.save_extracted_log(dest=tmp_folder)
@@ -478,9 +497,10 @@ class LogAnalyzer:
             self.save_extracted_file(dest=tmp_folder, src=extracted_file_name)
             file_list.append(tmp_folder)
 
-        match_messages_regex = re.compile('|'.join(self.match_regex)) if len(self.match_regex) else None
-        ignore_messages_regex = re.compile('|'.join(self.ignore_regex)) if len(self.ignore_regex) else None
-        expect_messages_regex = re.compile('|'.join(self.expect_regex)) if len(self.expect_regex) else None
+        # Matchers are cached by the set of regular expressions and reused by the following tests
+        match_messages_regex = get_regex_matcher(self.match_regex)
+        ignore_messages_regex = get_regex_matcher(self.ignore_regex)
+        expect_messages_regex = get_regex_matcher(self.expect_regex)
 
         logging.debug("Analyze files {}".format(file_list))
         logging.debug('    match_regex="{}"'.format(match_messages_regex.pattern if match_messages_regex else ''))
@@ -491,13 +511,9 @@ class LogAnalyzer:
             maximum_log_length=maximum_log_length)
         # Print file content and remove the file
         for folder in file_list:
-            with open(folder) as fo:
-                logging.debug("{} file content:\n\n{}".format(folder, fo.read()))
+            self._log_file_content(folder)
             os.remove(folder)
 
-        expected_lines_total = []
-        unused_regex_messages = []
-
         for key, value in list(analyzer_parse_result.items()):
             matching_lines, expecting_lines = value
             analyzer_summary["total"]["match"] += len(matching_lines)
@@ -506,15 +522,14 @@ class LogAnalyzer:
                                                     "expected_match": len(expecting_lines)}
             analyzer_summary["match_messages"][key] = matching_lines
             analyzer_summary["expect_messages"][key] = expecting_lines
-            expected_lines_total.extend(expecting_lines)
-
-        # Find unused regex matches
-        for regex in self.expect_regex:
-            for line in expected_lines_total:
-                if re.search(regex, line):
-                    break
-            else:
-                unused_regex_messages.append(regex)
+            if key in self.ansible_loganalyzer.analysis_stats:
+                analyzer_summary["analysis_stats"][key] = self.ansible_loganalyzer.analysis_stats[key]
+                logging.info("Analyzed {}: {lines} lines, {bytes} bytes in {duration}s "
+                             "({lines_per_sec} lines/s, {bytes_per_sec} bytes/s)"
+                             .format(key, **self.ansible_loganalyzer.analysis_stats[key]))
+
+        # Expect regexes which matched the expected lines are recorded during the analysis
+        unused_regex_messages = self.ansible_loganalyzer.get_unused_expected_regex(expect_messages_regex)
         analyzer_summary["total"]["expected_missing_match"] = len(unused_regex_messages)
         analyzer_summary["unused_expected_regexp"] = unused_regex_messages
         logging.debug("Analyzer summary: {}".format(pprint.pformat(analyzer_summary)))
@@ -535,13 +550,55 @@ class LogAnalyzer:
             logging.warning("Skip bug handler execution because it is not a valid BugHandler")
         return analyzer_summary
 
+    def _transfer_path(self, path):
+        """
+        @summary: Get path of the extracted file on the DUT, including the extension of the transfer compression.
+        """
+        return path + COMPRESSED_FILE_EXT[self.transfer_compression]
+
+    def _fetch_extracted_file(self, dest, src):
+        """
+        @summary: Download extracted file from the DUT and decompress it in chunks if it was compressed.
+        """
+        if self.transfer_compression == "none":
+            self.ansible_host.fetch(dest=dest, src=src, flat="yes")
+            return
+
+        compressed_dest = self._transfer_path(dest)
+        self.ansible_host.fetch(dest=compressed_dest, src=self._transfer_path(src), flat="yes")
+        with gzip.open(compressed_dest, "rb") as compressed, open(dest, "wb") as fo:
+            shutil.copyfileobj(compressed, fo, TRANSFER_CHUNK_SIZE)
+        logging.debug("Downloaded {} compressed to {} bytes, decompressed to {} bytes".format(
+            src, os.path.getsize(compressed_dest), os.path.getsize(dest)))
+        os.remove(compressed_dest)
+
+    def _log_file_content(self, path):
+        """
+        @summary: Print the end of the extracted file to the debug log, bounded by debug_log_size.
+        """
+        if self.debug_log_size == 0 or not logging.getLogger().isEnabledFor(logging.DEBUG):
+            return
+
+        with open(path, "rb") as fo:
+            header = "{} file content".format(path)
+            if self.debug_log_size > 0:
+                fo.seek(0, os.SEEK_END)
+                size = fo.tell()
+                if size > self.debug_log_size:
+                    header += " (last {} of {} bytes)".format(self.debug_log_size, size)
+                    fo.seek(size - self.debug_log_size)
+                else:
+                    fo.seek(0)
+            content = fo.read().decode("utf-8", "replace")
+        logging.debug("{}:\n\n{}".format(header, content))
+
     def save_extracted_log(self, dest):
         """
         @summary: Download extracted syslog log file to the ansible host.
 
         @param dest: File path to store downloaded log file.
         """
-        self.ansible_host.fetch(dest=dest, src=self.extracted_syslog, flat="yes")
+        self._fetch_extracted_file(dest=dest, src=self.extracted_syslog)
 
     def save_extracted_file(self, dest, src):
         """
@@ -551,4 +608,4 @@ class LogAnalyzer:
 
         @param src: Source path to store downloaded file.
         """
-        self.ansible_host.fetch(dest=dest, src=src, flat="yes")
+        self._fetch_extracted_file(dest=dest, src=src)
@@ -1,16 +1,21 @@
 import logging
 import copy
 import json
+import multiprocessing
+import traceback
 from contextlib import contextmanager
+from multiprocessing.connection import wait
 
 import pytest
 
 from collections import defaultdict
 
 from tests.common.helpers.multi_thread_utils import SafeThreadPoolExecutor
+from tests.common.helpers.parallel import fix_logging_handler_fork_lock
 from tests.common.helpers.parallel_utils import ParallelCoordinator, ParallelStatus
 from tests.common.plugins.sanity_check import constants
 from tests.common.plugins.sanity_check import checks
+from tests.common.plugins.sanity_check import snapshot
 from tests.common.plugins.sanity_check.checks import *      # noqa: F401, F403
 from tests.common.plugins.sanity_check.recover import recover, recover_chassis
 from tests.common.plugins.sanity_check.constants import STAGE_PRE_TEST, STAGE_POST_TEST
@@ -143,11 +148,94 @@ def filter_check_items(tbinfo, duthosts, check_items):
     return filtered_check_items
 
 
+def _run_check_item(conn, check_fixture, args, kwargs):
+    """
+    @summary: Run a check item in the forked process and send its results, or its exception, to the parent.
+    """
+    try:
+        outcome = (True, check_fixture(*args, **kwargs), None)
+    except Exception as e:
+        outcome = (False, e, traceback.format_exc())
+    try:
+        conn.send(outcome)
+    except Exception:
+        # Results or exception can not be pickled
+        if outcome[0]:
+            outcome = (True, json.loads(json.dumps(outcome[1], default=fallback_serializer)), None)
+        else:
+            outcome = (False, RuntimeError(repr(outcome[1])), outcome[2])
+        conn.send(outcome)
+    finally:
+        conn.close()
+
+
+def run_checks_in_processes(check_items, check_fixtures, workers, *args, **kwargs):
+    """
+    @summary: Run the check items concurrently, each in its own process.
+
+    The check items fork processes by parallel_run, which may deadlock when done from a multi-threaded process.
+    The processes running the check items are forked one by one from the main thread, so each check item runs
+    in the main thread of a single-threaded process, like when the check items are run one after another.
+    @param workers: Maximum number of check items run at the same time.
+    @return: List of results of the check items, in the order of check_items. If a check item raised an
+             exception, the exception of the first of them is raised after all the check items are done.
+    """
+    ctx = multiprocessing.get_context("fork")
+    fix_logging_handler_fork_lock()
+    pending = list(range(len(check_fixtures)))
+    running = {}
+    items_results = [None] * len(check_fixtures)
+    errors = {}
+    while pending or running:
+        while pending and len(running) < workers:
+            index = pending.pop(0)
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_run_check_item, name="sanity_check--{}".format(check_items[index]),
+                                  args=(child_conn, check_fixtures[index], args, kwargs))
+            process.start()
+            child_conn.close()
+            running[parent_conn] = (index, process)
+
+        for conn in wait(list(running)):
+            index, process = running.pop(conn)
+            try:
+                ok, result, tb = conn.recv()
+            except Exception as e:
+                ok, result, tb = False, RuntimeError("No results of check item {}: {}".format(
+                    check_items[index], repr(e))), None
+            conn.close()
+            process.join()
+            if ok:
+                items_results[index] = result
+            else:
+                logger.error("Check item {} failed in process {}, exit code {}:\n{}".format(
+                    check_items[index], process.pid, process.exitcode, tb))
+                errors[index] = result
+
+    if errors:
+        raise errors[min(errors)]
+    return items_results
+
+
 def do_checks(request, check_items, *args, **kwargs):
+    """
+    @summary: Run the check items concurrently against one snapshot of the DUT state.
+    @param check_items: Names of the check fixtures to run.
+    @return: List of results of all the check items, in the order of check_items.
+    """
+    # Fixtures must be got in the main process
+    check_fixtures = [request.getfixturevalue(item) for item in check_items]
+    kwargs["snapshots"] = snapshot.collect_snapshots(request.getfixturevalue("duthosts"), check_items)
+
+    workers = min(request.config.getoption("--sanity_check_workers", default=constants.SANITY_CHECK_WORKERS),
+                  len(check_fixtures))
+    if workers > 1:
+        items_results = run_checks_in_processes(check_items, check_fixtures, workers, *args, **kwargs)
+    else:
+        items_results = [check_fixture(*args, **kwargs) for check_fixture in check_fixtures]
+
     check_results = []
-    for item in check_items:
-        check_fixture = request.getfixturevalue(item)
-        results = check_fixture(*args, **kwargs)
+    for results in items_results:
         logger.debug("check results of each item {}".format(results))
         if results and isinstance(results, list):
             check_results.extend(results)
@@ -156,6 +244,25 @@ def do_checks(request, check_items, *args, **kwargs):
     return check_results
 
 
+def get_recheck_items(check_items, failed_results, applied_methods):
+    """
+    @summary: Get the check items to run again after recovery. Only the failed check items are run again, unless
+              a recover method was run on any DUT. All the recover methods reload the config, load minigraph or
+              reboot the whole DUT, which could break the passed check items.
+    @param applied_methods: Recover methods actually run on the DUTs, as returned by recover(). None for a DUT
+                            recovered by item specific actions only.
+    """
+    if any(applied_method is not None for applied_method in applied_methods):
+        return check_items
+    failed_items = set()
+    for failed_result in failed_results:
+        item = failed_result["check_item"]
+        failed_items.add(item if item.startswith("check_") else "check_" + item)
+    if not failed_items.issubset(check_items):
+        return check_items
+    return [item for item in check_items if item in failed_items]
+
+
 @pytest.fixture(scope="module")
 def prepare_parallel_run(request, parallel_run_context):
     par_ctx = parallel_run_context
@@ -401,6 +508,7 @@ def recover_on_sanity_check_failure(ptfhost, duthosts, failed_results, fanouthos
         sanity_failed_cache_key = "post_sanity_check_failed"
         recovery_failed_cache_key = "post_sanity_recovery_failed"
 
+    applied_methods = []
     try:
         dut_failed_results = defaultdict(list)
         infra_recovery_actions = []
@@ -423,8 +531,8 @@ def recover_on_sanity_check_failure(ptfhost, duthosts, failed_results, fanouthos
         else:
             for dut_name, dut_results in list(dut_failed_results.items()):
                 # Attempt to restore DUT state
-                recover(ptfhost, duthosts[dut_name], localhost, fanouthosts, nbrhosts, tbinfo, dut_results,
-                        recover_method)
+                applied_methods.append(recover(ptfhost, duthosts[dut_name], localhost, fanouthosts, nbrhosts,
+                                               tbinfo, dut_results, recover_method))
 
     except BaseException as e:
         request.config.cache.set(sanity_failed_cache_key, True)
@@ -436,8 +544,10 @@ def recover_on_sanity_check_failure(ptfhost, duthosts, failed_results, fanouthos
             f"!!!!!!!!!!!!!!!! Recovery of sanity check failed !!!!!!!!!!!!!!!!"
             f"Exception: {repr(e)}"
         )
-    logger.info("Run sanity check again after recovery")
-    new_check_results = do_checks(request, check_items, stage=sanity_check_stage, after_recovery=True)
+    recheck_items = check_items if is_modular_chassis else \
+        get_recheck_items(check_items, failed_results, applied_methods)
+    logger.info("Run sanity check {} again after recovery".format(recheck_items))
+    new_check_results = do_checks(request, recheck_items, stage=sanity_check_stage, after_recovery=True)
     logger.debug(f"{sanity_check_stage} sanity check after recovery results: \n%s" %
                  json.dumps(new_check_results, indent=4, default=fallback_serializer))
     new_failed_results = [result for result in new_check_results if result['failed']]
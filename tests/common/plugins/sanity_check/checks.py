@@ -14,6 +14,7 @@ from tests.common.dualtor.nic_simulator_control import restart_nic_simulator
 from tests.common.dualtor.constants import UPPER_TOR, LOWER_TOR, NIC
 from tests.common.dualtor.dual_tor_common import CableType, active_standby_ports                # noqa: F401
 from tests.common.cache import FactsCache
+from tests.common.plugins.sanity_check import snapshot
 from tests.common.plugins.sanity_check.constants import STAGE_PRE_TEST, STAGE_POST_TEST
 from tests.common.helpers.parallel import parallel_run, reset_ansible_local_tmp
 from tests.common.dualtor.mux_simulator_control import _probe_mux_ports
@@ -113,7 +114,7 @@ def check_interfaces(duthosts, tbinfo):
         results = kwargs['results']
         logger.info("Checking interfaces status on %s..." % dut.hostname)
 
-        networking_uptime = dut.get_networking_uptime().seconds
+        networking_uptime = snapshot.get_networking_uptime(dut, kwargs.get('snapshots')).seconds
         timeout = max((SYSTEM_STABILIZE_MAX_TIME - networking_uptime), 0)
         if dut.get_facts().get("modular_chassis"):
             timeout = max(timeout, 600)
@@ -297,7 +298,7 @@ def check_bgp(duthosts, tbinfo):
             results[dut.hostname] = check_result
             return
 
-        networking_uptime = dut.get_networking_uptime().seconds
+        networking_uptime = snapshot.get_networking_uptime(dut, kwargs.get('snapshots')).seconds
         if SYSTEM_STABILIZE_MAX_TIME - networking_uptime + 480 > 500:
             # If max_timeout is higher than 600, it will exceed parallel_run's timeout
             # the check will be killed by parallel_run, we can't get expected results.
@@ -374,11 +375,10 @@ def check_dbmemory(duthosts):
         results = kwargs['results']
 
         logger.info("Checking database memory on %s..." % dut.hostname)
-        redis_cmd = "client list"
         check_result = {"failed": False, "check_item": "dbmemory", "host": dut.hostname}
         # check the db memory on the redis instance running on each instance
-        for asic in dut.asics:
-            res = asic.run_redis_cli_cmd(redis_cmd)['stdout_lines']
+        client_lists = snapshot.get_redis_client_list(dut, kwargs.get('snapshots'))
+        for asic, res in zip(dut.asics, client_lists):
             result, total_omem, non_zero_output = _is_db_omem_over_threshold(res)
             check_result["total_omem"] = total_omem
             if result:
@@ -841,7 +841,7 @@ def check_monit(duthosts):
         results = kwargs['results']
 
         logger.info("Checking status of each Monit service...")
-        networking_uptime = dut.get_networking_uptime().seconds
+        networking_uptime = snapshot.get_networking_uptime(dut, kwargs.get('snapshots')).seconds
         timeout = max((MONIT_STABILIZE_MAX_TIME - networking_uptime), 0)
         interval = 20
         logger.info("networking_uptime = {} seconds, timeout = {} seconds, interval = {} seconds"
@@ -850,7 +850,7 @@ def check_monit(duthosts):
         check_result = {"failed": False, "check_item": "monit", "host": dut.hostname}
 
         if timeout == 0:
-            monit_services_status = dut.get_monit_services_status()
+            monit_services_status = snapshot.get_monit_services_status(dut, kwargs.get('snapshots'))
             if not monit_services_status:
                 logger.info("Monit was not running.")
                 check_result["failed"] = True
@@ -866,7 +866,8 @@ def check_monit(duthosts):
             is_monit_running = False
             while elapsed < timeout:
                 check_result["failed"] = False
-                monit_services_status = dut.get_monit_services_status()
+                # Only the first poll is taken from the snapshot, retries poll the DUT
+                monit_services_status = snapshot.get_monit_services_status(dut, kwargs.get('snapshots'))
                 if not monit_services_status:
                     wait(interval, msg="Monit was not started and wait {} seconds to retry. Remaining time: {}."
                          .format(interval, timeout - elapsed))
@@ -913,7 +914,7 @@ def check_processes(duthosts):
         results = kwargs['results']
         logger.info("Checking process status on %s..." % dut.hostname)
 
-        networking_uptime = dut.get_networking_uptime().seconds
+        networking_uptime = snapshot.get_networking_uptime(dut, kwargs.get('snapshots')).seconds
         timeout = max((SYSTEM_STABILIZE_MAX_TIME - networking_uptime), 0)
         interval = 20
         logger.info("networking_uptime=%d seconds, timeout=%d seconds, interval=%d seconds" %
@@ -65,6 +65,9 @@ RECOVER_METHODS = {
     },
 }       # All supported recover methods
 
+# Default number of check items run concurrently, each of them in its own process forked from the main thread
+SANITY_CHECK_WORKERS = 8
+
 STAGE_PRE_TEST = 'stage_pre_test'
 STAGE_POST_TEST = 'stage_post_test'
 PRE_SANITY_CHECK_FAILED_RC = 10
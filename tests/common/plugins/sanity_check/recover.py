@@ -163,6 +163,8 @@ def neighbor_vm_restore(duthost, nbrhosts, tbinfo, result=None):
 
 def _recover_with_command(dut, cmd, wait_time):
     dut.command(cmd)
+    # The command loads minigraph or reboots, the facts fingerprint is stale
+    dut.invalidate_facts_fingerprint()
     wait(wait_time, msg="Wait {} seconds for system to be stable.".format(wait_time))
 
 
@@ -209,6 +211,13 @@ def re_announce_routes(ptfhost, localhost, topo_name, ptf_ip, neighbor_number):
 
 
 def adaptive_recover(ptfhost, dut, localhost, fanouthosts, nbrhosts, tbinfo, check_results, wait_time):
+    """
+    Recover the failed check items with the action proposed for each of them.
+
+    Returns:
+        The recover method run for the whole DUT, e.g. 'config_reload' or 'reboot', or None if only item specific
+        actions were run.
+    """
     outstanding_action = None
     for result in check_results:
         if result['failed']:
@@ -259,15 +268,23 @@ def adaptive_recover(ptfhost, dut, localhost, fanouthosts, nbrhosts, tbinfo, che
             reboot_dut(dut, localhost, method["cmd"], reboot_with_running_golden_config=True)
         else:
             _recover_with_command(dut, method['cmd'], wait_time)
+    return outstanding_action
 
 
 def recover(ptfhost, dut, localhost, fanouthosts, nbrhosts, tbinfo, check_results, recover_method):
+    """
+    Recover the DUT with the recover method.
+
+    Returns:
+        The recover method actually run. For 'adaptive' it is the method adaptive_recover chose for the whole DUT,
+        or None if only item specific actions were run.
+    """
     logger.warning("Try to recover %s using method %s" % (dut.hostname, recover_method))
 
     method = constants.RECOVER_METHODS[recover_method]
     wait_time = method['recover_wait']
     if method["adaptive"]:
-        adaptive_recover(ptfhost, dut, localhost, fanouthosts, nbrhosts, tbinfo, check_results, wait_time)
+        return adaptive_recover(ptfhost, dut, localhost, fanouthosts, nbrhosts, tbinfo, check_results, wait_time)
     elif method["reload"]:
         running_golden_config_file_check = dut.shell("[ -f /etc/sonic/running_golden_config.json ]",
                                                      module_ignore_errors=True)
@@ -281,6 +298,7 @@ def recover(ptfhost, dut, localhost, fanouthosts, nbrhosts, tbinfo, check_result
         reboot_dut(dut, localhost, method["cmd"])
     else:
         _recover_with_command(dut, method['cmd'], wait_time)
+    return recover_method
 
 
 def recover_chassis(duthosts):
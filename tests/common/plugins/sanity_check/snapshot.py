@@ -0,0 +1,168 @@
+"""
+Snapshot of the DUT state shared by sanity check items.
+
+Several check items poll the same state of a DUT, e.g. the networking uptime is got by check_interfaces, check_bgp,
+check_monit and check_processes, each of them in its own process and by two round trips to the DUT. Before running
+the check items, the commands of all the facets needed by them are sent to each DUT in one shell_cmds task, the
+check items then take the facets from the snapshot for their first poll and only poll the DUT again when they retry.
+A check item started more than SNAPSHOT_MAX_AGE seconds after the snapshot was taken polls the DUT instead, so it
+never judges the DUT on stale state.
+"""
+import logging
+import time
+
+from datetime import datetime
+
+from tests.common.helpers.multi_thread_utils import SafeThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FACET_NETWORKING_UPTIME = "networking_uptime"
+FACET_MONIT = "monit"
+FACET_DBMEMORY = "dbmemory"
+
+DBMEMORY_REDIS_CMD = "client list"
+
+# Commands to get each facet from a DUT
+SNAPSHOT_FACETS = {
+    FACET_NETWORKING_UPTIME: lambda dut: ['date +"%Y-%m-%d %H:%M:%S"',
+                                          "systemctl -p ExecMainStartTimestamp show networking"],
+    FACET_MONIT: lambda dut: ["sudo monit status"],
+    FACET_DBMEMORY: lambda dut: [asic.get_redis_cli_cmd(DBMEMORY_REDIS_CMD) for asic in dut.asics],
+}
+
+# Facets polled by each check item
+CHECK_FACETS = {
+    "check_interfaces": [FACET_NETWORKING_UPTIME],
+    "check_bgp": [FACET_NETWORKING_UPTIME],
+    "check_dbmemory": [FACET_DBMEMORY],
+    "check_monit": [FACET_NETWORKING_UPTIME, FACET_MONIT],
+    "check_processes": [FACET_NETWORKING_UPTIME],
+}
+
+SNAPSHOT_TIMEOUT = 120
+# Seconds after which the facets of a snapshot are too old to be used by a check item
+SNAPSHOT_MAX_AGE = 10
+MAX_SNAPSHOT_WORKERS = 8
+
+
+class DutSnapshot(object):
+    """Results of the facet commands of one DUT, got in one round trip."""
+
+    def __init__(self, hostname, facets=None, timestamp=None):
+        self.hostname = hostname
+        self.facets = facets if facets is not None else {}
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def take(self, facet, now=None):
+        """
+        Take the results of a facet out of the snapshot.
+
+        A facet is taken at most once, so a check item retrying its poll gets None and polls the DUT again.
+        Check items are run by parallel_run in forked processes, each of them has its own copy of the snapshot.
+        None is also returned when the snapshot is older than SNAPSHOT_MAX_AGE seconds.
+        """
+        results = self.facets.pop(facet, None)
+        if results is not None and (now or time.time()) - self.timestamp > SNAPSHOT_MAX_AGE:
+            logger.info("Snapshot of {} is older than {} seconds, facet {} will be polled".format(
+                self.hostname, SNAPSHOT_MAX_AGE, facet))
+            return None
+        return results
+
+
+def collect_snapshot(dut, facets):
+    """
+    Get the results of all the facets of a DUT in one shell_cmds task.
+
+    Args:
+        dut: The MultiAsicSonicHost.
+        facets: Names of the facets, keys of SNAPSHOT_FACETS.
+    Returns:
+        DutSnapshot of the DUT. Facets of failed commands are left out of the snapshot.
+    """
+    facet_cmds = [(facet, SNAPSHOT_FACETS[facet](dut)) for facet in facets]
+    cmds = [cmd for _, cmds in facet_cmds for cmd in cmds]
+    start = time.time()
+    results = dut.shell_batch(cmds, module_ignore_errors=True, timeout=SNAPSHOT_TIMEOUT)
+    snapshot = DutSnapshot(dut.hostname, timestamp=start)
+    index = 0
+    for facet, cmds in facet_cmds:
+        facet_results = results[index:index + len(cmds)]
+        index += len(cmds)
+        if any(result["failed"] for result in facet_results):
+            logger.info("Failed to get facet {} of {}, it will be polled by the check items".format(
+                facet, dut.hostname))
+            continue
+        snapshot.facets[facet] = facet_results
+    logger.info("Got snapshot of {} facets on {} in {:.2f} seconds".format(
+        len(snapshot.facets), dut.hostname, time.time() - start))
+    return snapshot
+
+
+def collect_snapshots(duthosts, check_items):
+    """
+    Get snapshot of the facets needed by the check items from all the DUTs in parallel.
+
+    Returns:
+        dict: hostname of the DUT to its DutSnapshot. A DUT is left out if its snapshot could not be got.
+    """
+    facets = []
+    for item in check_items:
+        facets.extend(facet for facet in CHECK_FACETS.get(item, []) if facet not in facets)
+    if not facets:
+        return {}
+
+    snapshots = {}
+
+    def _collect(dut):
+        try:
+            snapshots[dut.hostname] = collect_snapshot(dut, facets)
+        except Exception as e:
+            logger.warning("Failed to get snapshot of {}, check items will poll the DUT: {}".format(
+                dut.hostname, repr(e)))
+
+    nodes = list(duthosts.nodes)
+    with SafeThreadPoolExecutor(max_workers=max(min(len(nodes), MAX_SNAPSHOT_WORKERS), 1)) as executor:
+        for dut in nodes:
+            executor.submit(_collect, dut)
+    return snapshots
+
+
+def _take_facet(dut, facet, snapshots):
+    snapshot = snapshots.get(dut.hostname) if snapshots else None
+    return snapshot.take(facet) if snapshot else None
+
+
+def get_networking_uptime(dut, snapshots=None):
+    """Same as SonicHost.get_networking_uptime, from the snapshot of the DUT if it has the facet."""
+    results = _take_facet(dut, FACET_NETWORKING_UPTIME, snapshots)
+    if results is None:
+        return dut.get_networking_uptime()
+    now_result, props_result = results
+    start_time = {}
+    for line in props_result["stdout_lines"]:
+        fields = line.split("=")
+        if len(fields) >= 2:
+            start_time[fields[0]] = fields[1]
+    try:
+        return datetime.strptime(now_result["stdout"].strip(), "%Y-%m-%d %H:%M:%S") - \
+            datetime.strptime(start_time["ExecMainStartTimestamp"], "%a %Y-%m-%d %H:%M:%S %Z")
+    except Exception as e:
+        logger.error("Exception raised while getting networking restart time: %s" % repr(e))
+        return None
+
+
+def get_monit_services_status(dut, snapshots=None):
+    """Same as SonicHost.get_monit_services_status, from the snapshot of the DUT if it has the facet."""
+    results = _take_facet(dut, FACET_MONIT, snapshots)
+    if results is None:
+        return dut.get_monit_services_status()
+    return dut.parse_monit_services_status(results[0])
+
+
+def get_redis_client_list(dut, snapshots=None):
+    """Get output lines of redis 'client list' of each ASIC of the DUT, from the snapshot if it has the facet."""
+    results = _take_facet(dut, FACET_DBMEMORY, snapshots)
+    if results is None:
+        return [asic.run_redis_cli_cmd(DBMEMORY_REDIS_CMD)["stdout_lines"] for asic in dut.asics]
+    return [result["stdout_lines"] for result in results]
@@ -0,0 +1,127 @@
+"""
+Unit tests of the DUT state snapshot, the re-check after recovery and the check items run in processes.
+
+    python -m pytest --noconftest -p no:logging tests/common/plugins/sanity_check/unit_test/unittest_sanity_check.py -v
+"""
+import datetime
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from tests.common.plugins.sanity_check import checks, get_recheck_items, run_checks_in_processes, snapshot
+from tests.common.plugins.sanity_check.snapshot import CHECK_FACETS, SNAPSHOT_FACETS, SNAPSHOT_MAX_AGE, DutSnapshot
+
+CHECK_ITEMS = ["check_services", "check_interfaces", "check_bgp", "check_monit"]
+
+
+def _result(stdout="", failed=False):
+    return {"stdout": stdout, "stdout_lines": stdout.splitlines(), "failed": failed}
+
+
+def _dut(hostname, results):
+    dut = MagicMock()
+    dut.hostname = hostname
+    dut.asics = [MagicMock(), MagicMock()]
+    dut.shell_batch.return_value = results
+    return dut
+
+
+class TestDutSnapshot(unittest.TestCase):
+
+    def test_facet_taken_once(self):
+        dut_snapshot = DutSnapshot("dut1", {"monit": ["status"]}, timestamp=100)
+        self.assertEqual(dut_snapshot.take("monit", now=101), ["status"])
+        # A retry polls the DUT again
+        self.assertIsNone(dut_snapshot.take("monit", now=101))
+        self.assertIsNone(dut_snapshot.take("dbmemory", now=101))
+
+    def test_stale_facet_not_used(self):
+        dut_snapshot = DutSnapshot("dut1", {"monit": ["status"], "dbmemory": ["clients"]}, timestamp=100)
+        self.assertIsNone(dut_snapshot.take("monit", now=100 + SNAPSHOT_MAX_AGE + 1))
+        self.assertEqual(dut_snapshot.take("dbmemory", now=100 + SNAPSHOT_MAX_AGE), ["clients"])
+
+    def test_check_facets(self):
+        for item, facets in CHECK_FACETS.items():
+            self.assertIn(item, checks.CHECK_ITEMS)
+            for facet in facets:
+                self.assertIn(facet, SNAPSHOT_FACETS)
+
+    def test_collect_snapshot(self):
+        dut = _dut("dut1", [_result("2024-01-01 00:10:00"),
+                            _result("ExecMainStartTimestamp=Mon 2024-01-01 00:00:00 UTC"),
+                            _result("monit status"),
+                            _result("client 1"), _result(failed=True)])
+        dut_snapshot = snapshot.collect_snapshot(dut, ["networking_uptime", "monit", "dbmemory"])
+
+        cmds = dut.shell_batch.call_args[0][0]
+        self.assertEqual(len(cmds), 5)
+        self.assertEqual(cmds[2], "sudo monit status")
+        # The facet of a failed command is polled by the check items
+        self.assertEqual(sorted(dut_snapshot.facets), ["monit", "networking_uptime"])
+        self.assertEqual(snapshot.get_networking_uptime(dut, {"dut1": dut_snapshot}),
+                         datetime.timedelta(minutes=10))
+        dut.get_networking_uptime.assert_not_called()
+        # Taken already, polled from the DUT
+        snapshot.get_networking_uptime(dut, {"dut1": dut_snapshot})
+        dut.get_networking_uptime.assert_called_once_with()
+
+    def test_collect_snapshots(self):
+        dut = _dut("dut1", [_result("2024-01-01 00:10:00"),
+                            _result("ExecMainStartTimestamp=Mon 2024-01-01 00:00:00 UTC")])
+        duthosts = MagicMock()
+        duthosts.nodes = [dut]
+
+        self.assertEqual(snapshot.collect_snapshots(duthosts, ["check_services"]), {})
+        snapshots = snapshot.collect_snapshots(duthosts, ["check_interfaces", "check_bgp"])
+        self.assertEqual(list(snapshots), ["dut1"])
+        self.assertEqual(list(snapshots["dut1"].facets), ["networking_uptime"])
+        self.assertEqual(dut.shell_batch.call_count, 1)
+
+
+class TestGetRecheckItems(unittest.TestCase):
+
+    def test_failed_items_only(self):
+        failed_results = [{"check_item": "bgp", "failed": True}, {"check_item": "check_monit", "failed": True}]
+        self.assertEqual(get_recheck_items(CHECK_ITEMS, failed_results, [None, None]), ["check_bgp", "check_monit"])
+
+    def test_all_items_after_recover_method(self):
+        failed_results = [{"check_item": "bgp", "failed": True}]
+        for method in ["config_reload", "load_minigraph", "reboot", "warm_reboot", "fast_reboot", "adaptive"]:
+            self.assertEqual(get_recheck_items(CHECK_ITEMS, failed_results, [None, method]), CHECK_ITEMS)
+
+    def test_unknown_failed_item(self):
+        failed_results = [{"check_item": "mux_simulator", "failed": True}]
+        self.assertEqual(get_recheck_items(CHECK_ITEMS, failed_results, []), CHECK_ITEMS)
+
+
+def _item_result(item, **kwargs):
+    return {"check_item": item, "failed": False, "thread": threading.current_thread().name, "kwargs": kwargs}
+
+
+def _failing_item(**kwargs):
+    raise ValueError("check failed")
+
+
+class TestRunChecksInProcesses(unittest.TestCase):
+
+    def test_results_in_order(self):
+        items = ["check_{}".format(i) for i in range(5)]
+        fixtures = [lambda item=item, **kwargs: _item_result(item, **kwargs) for item in items]
+        results = run_checks_in_processes(items, fixtures, 2, stage="pre")
+        self.assertEqual([result["check_item"] for result in results], items)
+        for result in results:
+            self.assertEqual(result["thread"], "MainThread")
+            self.assertEqual(result["kwargs"], {"stage": "pre"})
+
+    def test_unpicklable_results(self):
+        results = run_checks_in_processes(["check_lock"], [lambda: {"failed": False, "lock": threading.Lock()}], 2)
+        self.assertEqual(results, [{"failed": False, "lock": "<not serializable>"}])
+
+    def test_exception_raised_after_all_items(self):
+        items = ["check_ok", "check_failing"]
+        with self.assertRaises(ValueError):
+            run_checks_in_processes(items, [lambda: _item_result("check_ok"), _failing_item], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
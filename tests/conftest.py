@@ -31,7 +31,7 @@ from tests.common.devices.csonic import CsonicHost
 from tests.common.devices.fanout import FanoutHost
 from tests.common.devices.k8s import K8sMasterHost
 from tests.common.devices.k8s import K8sMasterCluster
-from tests.common.devices.duthosts import DutHosts
+from tests.common.devices.duthosts import DutHosts, DEFAULT_INIT_WORKERS
 from tests.common.devices.vmhost import VMHost
 from tests.common.devices.base import NeighborDevice
 from tests.common.devices.cisco import CiscoHost
@@ -235,6 +235,9 @@ def pytest_addoption(parser):
                      help="Change (add|remove) post test check items based on pre test check items")
     parser.addoption("--recover_method", action="store", default="adaptive",
                      help="Set method to use for recover if sanity failed")
+    parser.addoption("--sanity_check_workers", action="store", type=int, default=8,
+                     help="Number of sanity check items run concurrently, each in its own process. "
+                          "1 to run them one by one")
 
     ########################
     #   pre-test options   #
@@ -325,6 +328,8 @@ def pytest_addoption(parser):
     parser.addoption("--parallel_followers", action="store", default=0, type=int, help="Number of parallel followers")
     parser.addoption("--parallel_mode", action="store", default=None, type=str,
                      help="Parallel mode to run the test. Either FULL_PARALLEL or RP_FIRST if parallel run enabled")
+    parser.addoption("--dut_init_workers", action="store", default=DEFAULT_INIT_WORKERS, type=int,
+                     help="Maximum number of DUT nodes initialized in parallel, 1 to initialize them one by one")
 
     ############################
     #   SmartSwitch options    #
@@ -605,7 +610,8 @@ def fixture_duthosts(enhance_inventory, ansible_adhoc, tbinfo, request, ipv6_onl
     """
     try:
         host = DutHosts(ansible_adhoc, tbinfo, request, get_specified_duts(request),
-                        target_hostname=get_target_hostname(request), is_parallel_leader=is_parallel_leader(request))
+                        target_hostname=get_target_hostname(request), is_parallel_leader=is_parallel_leader(request),
+                        init_workers=request.config.getoption("--dut_init_workers"))
         return host
     except BaseException as e:
         logger.error("Failed to initialize duthosts.")
@@ -666,7 +672,8 @@ def fixture_dpuhosts(enhance_inventory, ansible_adhoc, tbinfo, request, enable_n
     # sonic-dpu-mgmt-traffic.sh inbound -e --dpus all --ports 5021,5022,5023,5024
     try:
         host = DutHosts(ansible_adhoc, tbinfo, request, get_specified_dpus(request),
-                        target_hostname=get_target_hostname(request), is_parallel_leader=is_parallel_leader(request))
+                        target_hostname=get_target_hostname(request), is_parallel_leader=is_parallel_leader(request),
+                        init_workers=request.config.getoption("--dut_init_workers"))
         return host
     except BaseException as e:
         logger.error("Failed to initialize dpuhosts.")